@@ -110,6 +110,7 @@ class AvailabilityZoneController(wsgi.Controller):
         return self._describe_availability_zones(context)
 
     @wsgi.expected_errors(())
+    @wsgi.cached_response()
     def detail(self, req):
         """Returns a detailed list of availability zone."""
         context = req.environ['nova.context']
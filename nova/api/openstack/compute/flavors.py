@@ -32,6 +32,10 @@ from nova import utils
 ALIAS = 'flavors'
 
 
+def _get_flavors_version(context):
+    return objects.FlavorList.get_change_version(context)
+
+
 class FlavorsController(wsgi.Controller):
     """Flavor controller for the OpenStack API."""
 
@@ -39,6 +43,8 @@ class FlavorsController(wsgi.Controller):
 
     @validation.query_schema(schema.index_query)
     @wsgi.expected_errors(400)
+    @wsgi.cached_response(version=_get_flavors_version,
+                          query_params=schema.index_query['properties'])
     def index(self, req):
         """Return all flavors in brief."""
         limited_flavors = self._get_flavors(req)
@@ -46,6 +52,8 @@ class FlavorsController(wsgi.Controller):
 
     @validation.query_schema(schema.index_query)
     @wsgi.expected_errors(400)
+    @wsgi.cached_response(version=_get_flavors_version,
+                          query_params=schema.index_query['properties'])
     def detail(self, req):
         """Return all flavors in detail."""
         context = req.environ['nova.context']
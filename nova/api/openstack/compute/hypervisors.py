@@ -222,6 +222,8 @@ class HypervisorsController(wsgi.Controller):
     @validation.query_schema(hyper_schema.list_query_schema_v253,
                              UUID_FOR_ID_MIN_VERSION)
     @wsgi.expected_errors((400, 404))
+    @wsgi.cached_response(
+        query_params=hyper_schema.list_query_schema_v253['properties'])
     def detail(self, req):
         """Starting with the 2.53 microversion, the id field in the response
         is the compute_nodes.uuid value. Also, the search and servers routes
@@ -235,12 +237,15 @@ class HypervisorsController(wsgi.Controller):
     @wsgi.Controller.api_version("2.33", "2.52")  # noqa
     @validation.query_schema(hyper_schema.list_query_schema_v233)
     @wsgi.expected_errors((400))
+    @wsgi.cached_response(
+        query_params=hyper_schema.list_query_schema_v233['properties'])
     def detail(self, req):
         limit, marker = common.get_limit_and_marker(req)
         return self._detail(req, limit=limit, marker=marker, links=True)
 
     @wsgi.Controller.api_version("2.1", "2.32")  # noqa
     @wsgi.expected_errors(())
+    @wsgi.cached_response()
     def detail(self, req):
         return self._detail(req)
 
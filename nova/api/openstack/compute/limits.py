@@ -47,6 +47,8 @@ class LimitsController(wsgi.Controller):
     @wsgi.Controller.api_version("2.1", MAX_PROXY_API_SUPPORT_VERSION)
     @wsgi.expected_errors(())
     @validation.query_schema(limits.limits_query_schema)
+    @wsgi.cached_response(
+        query_params=limits.limits_query_schema['properties'])
     def index(self, req):
         return self._index(req)
 
@@ -54,6 +56,8 @@ class LimitsController(wsgi.Controller):
                                  MAX_IMAGE_META_PROXY_API_VERSION)  # noqa
     @wsgi.expected_errors(())
     @validation.query_schema(limits.limits_query_schema)
+    @wsgi.cached_response(
+        query_params=limits.limits_query_schema['properties'])
     def index(self, req):
         return self._index(req, FILTERED_LIMITS_2_36)
 
@@ -61,12 +65,16 @@ class LimitsController(wsgi.Controller):
         MIN_WITHOUT_IMAGE_META_PROXY_API_VERSION, '2.56')  # noqa
     @wsgi.expected_errors(())
     @validation.query_schema(limits.limits_query_schema)
+    @wsgi.cached_response(
+        query_params=limits.limits_query_schema['properties'])
     def index(self, req):
         return self._index(req, FILTERED_LIMITS_2_36, max_image_meta=False)
 
     @wsgi.Controller.api_version('2.57')  # noqa
     @wsgi.expected_errors(())
     @validation.query_schema(limits.limits_query_schema)
+    @wsgi.cached_response(
+        query_params=limits.limits_query_schema['properties'])
     def index(self, req):
         return self._index(req, FILTERED_LIMITS_2_57, max_image_meta=False)
 
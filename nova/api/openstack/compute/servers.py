@@ -296,6 +296,9 @@ class ServersController(wsgi.Controller):
             schema_servers.SERVER_LIST_IGNORE_SORT_KEY, ('host', 'node'))
 
         expected_attrs = []
+        # The detail view needs whole instances, the index view only a few of
+        # their columns.
+        columns_to_load = None
         if is_detail:
             if api_version_request.is_supported(req, '2.16'):
                 expected_attrs.append('services')
@@ -308,13 +311,15 @@ class ServersController(wsgi.Controller):
             # showing details
             expected_attrs = self._view_builder.get_show_expected_attrs(
                                                                 expected_attrs)
+        else:
+            columns_to_load = self._view_builder.get_index_columns()
 
         try:
             instance_list = self.compute_api.get_all(elevated or context,
                     search_opts=search_opts, limit=limit, marker=marker,
                     expected_attrs=expected_attrs, sort_keys=sort_keys,
                     sort_dirs=sort_dirs, cell_down_support=cell_down_support,
-                    all_tenants=all_tenants)
+                    all_tenants=all_tenants, columns_to_load=columns_to_load)
         except exception.MarkerNotFound:
             msg = _('marker [%s] not found') % marker
             raise exc.HTTPBadRequest(explanation=msg)
@@ -324,8 +329,9 @@ class ServersController(wsgi.Controller):
             instance_list = objects.InstanceList()
 
         if is_detail:
+            # NOTE: The view builder loads the faults of the instances
+            # along with their other details.
             instance_list._context = context
-            instance_list.fill_faults()
             response = self._view_builder.detail(
                 req, instance_list, cell_down_support=cell_down_support)
         else:
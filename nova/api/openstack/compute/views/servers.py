@@ -14,8 +14,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import functools
+
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import timeutils
 
 from nova.api.openstack import api_version_request
 from nova.api.openstack import common
@@ -61,6 +64,9 @@ class ViewBuilder(common.ViewBuilder):
     # shown.
     _show_expected_attrs = ['flavor', 'info_cache', 'metadata']
 
+    # The instance fields used by the index view.
+    _index_columns = ['display_name', 'uuid']
+
     def __init__(self):
         """Initialize view builder."""
         super(ViewBuilder, self).__init__()
@@ -140,6 +146,17 @@ class ViewBuilder(common.ViewBuilder):
         # results.
         return sorted(list(set(self._show_expected_attrs + expected_attrs)))
 
+    def get_index_columns(self):
+        """Returns the list of instance fields used by the index view
+
+        This should be used when listing instances so that only those
+        columns are loaded from the database. No lazy-loadable attribute is
+        used by the index view, whatever the microversion.
+
+        :returns: sorted list of instance fields
+        """
+        return list(self._index_columns)
+
     def _show_from_down_cell(self, request, instance, show_extra_specs,
                              show_server_groups):
         """Function that constructs the partial response for the instance."""
@@ -186,7 +203,8 @@ class ViewBuilder(common.ViewBuilder):
              show_extended_attr=None, show_host_status=None,
              show_keypair=True, show_srv_usg=True, show_sec_grp=True,
              show_extended_status=True, show_extended_volumes=True,
-             bdms=None, cell_down_support=False, show_server_groups=False):
+             bdms=None, cell_down_support=False, show_server_groups=False,
+             availability_zones=None):
         """Detailed view of a single instance."""
         if show_extra_specs is None:
             # detail will pre-calculate this for us. If we're doing show,
@@ -246,7 +264,12 @@ class ViewBuilder(common.ViewBuilder):
 
         context = request.environ['nova.context']
         if show_AZ:
-            az = avail_zone.get_instance_availability_zone(context, instance)
+            if (availability_zones is not None and
+                    instance.uuid in availability_zones):
+                az = availability_zones[instance.uuid]
+            else:
+                az = avail_zone.get_instance_availability_zone(context,
+                                                               instance)
             # NOTE(mriedem): The OS-EXT-AZ prefix should not be used for new
             # attributes after v2.1. They are only in v2.1 for backward compat
             # with v2.0.
@@ -373,26 +396,85 @@ class ViewBuilder(common.ViewBuilder):
             show_host_status = context.can(
                 servers_policies.SERVERS % 'show:host_status', fatal=False)
 
-        instance_uuids = [inst['uuid'] for inst in instances]
-        bdms = self._get_instance_bdms_in_multiple_cells(context,
-                                                         instance_uuids)
+        bdms, availability_zones, sg_bindings = self._prefetch(request,
+                                                               instances)
 
         # NOTE(gmann): pass show_sec_grp=False in _list_view() because
         # security groups for detail method will be added by separate
         # call to self._add_security_grps by passing the all servers
         # together. That help to avoid multiple neutron call for each server.
-        servers_dict = self._list_view(self.show, request, instances,
-                                       coll_name, show_extra_specs,
-                                       show_extended_attr=show_extended_attr,
-                                       show_host_status=show_host_status,
-                                       show_sec_grp=False,
-                                       bdms=bdms,
-                                       cell_down_support=cell_down_support)
+        servers_dict = self._list_view(
+            functools.partial(self.show,
+                              availability_zones=availability_zones),
+            request, instances, coll_name, show_extra_specs,
+            show_extended_attr=show_extended_attr,
+            show_host_status=show_host_status,
+            show_sec_grp=False,
+            bdms=bdms,
+            cell_down_support=cell_down_support)
 
         self._add_security_grps(request, list(servers_dict["servers"]),
-                                instances)
+                                instances, sg_bindings=sg_bindings)
         return servers_dict
 
+    def _prefetch(self, request, instances):
+        """Load in bulk what the detail view shows about the instances.
+
+        Rather than loading them instance by instance, this gets the block
+        device mappings and the latest faults of the instances with a single
+        query per cell, the availability zones of their hosts with at most a
+        single query, and their security groups with a single lookup in
+        Neutron. The time spent is logged and reported in the request log.
+
+        The faults are set on the instances. The block device mappings and
+        the availability zones are returned in dicts keyed by instance uuid,
+        along with the security group bindings, which are None unless Neutron
+        is used.
+        """
+        context = request.environ['nova.context']
+        # NOTE: The instances from down cells only have a few attributes
+        # set, which come from the API database, see show().
+        instances = [inst for inst in instances if 'display_name' in inst]
+
+        timer = timeutils.StopWatch()
+        timer.start()
+        fault_instances = [
+            inst for inst in instances
+            if 'fault' not in inst and
+            self._get_vm_status(inst) in self._fault_statuses]
+        bdms, faults = self._get_instance_records_in_multiple_cells(
+            context, [inst.uuid for inst in instances],
+            [inst.uuid for inst in fault_instances])
+        for instance in fault_instances:
+            # NOTE: Even if its cell failed, do not let the fault be
+            # lazy-loaded for each instance.
+            instance.fault = faults.get(instance.uuid)
+            instance.obj_reset_changes(['fault'])
+        cells_time = timer.elapsed()
+
+        availability_zones = avail_zone.get_instance_availability_zones(
+            context, instances)
+        azs_time = timer.elapsed() - cells_time
+
+        sg_bindings = None
+        if (instances and request.method != 'POST' and
+                openstack_driver.is_neutron_security_groups()):
+            sg_bindings = (
+                self.security_group_api.get_instances_security_groups_bindings(
+                    context, [{'id': inst.uuid} for inst in instances]))
+        total_time = timer.elapsed()
+
+        LOG.debug('Prefetched the details of %(count)i servers in '
+                  '%(total).3f seconds: %(cells).3f from the cells, %(azs).3f '
+                  'for the availability zones and %(sgs).3f for the security '
+                  'groups.',
+                  {'count': len(instances), 'total': total_time,
+                   'cells': cells_time, 'azs': azs_time,
+                   'sgs': total_time - cells_time - azs_time})
+        request.environ['nova.prefetch_time'] = (
+            request.environ.get('nova.prefetch_time', 0) + total_time)
+        return bdms, availability_zones, sg_bindings
+
     def _list_view(self, func, request, servers, coll_name, show_extra_specs,
                    show_extended_attr=None, show_host_status=None,
                    show_sec_grp=False, bdms=None, cell_down_support=False):
@@ -554,7 +636,7 @@ class ViewBuilder(common.ViewBuilder):
 
         return fault_dict
 
-    def _add_security_grps(self, req, servers, instances):
+    def _add_security_grps(self, req, servers, instances, sg_bindings=None):
         if not len(servers):
             return
         if not openstack_driver.is_neutron_security_groups():
@@ -572,10 +654,12 @@ class ViewBuilder(common.ViewBuilder):
             # instance are not in the db and have not been sent to neutron yet.
             if req.method != 'POST':
                 context = req.environ['nova.context']
-                sg_instance_bindings = (
-                    self.security_group_api
-                    .get_instances_security_groups_bindings(context,
-                                                            servers))
+                sg_instance_bindings = sg_bindings
+                if sg_instance_bindings is None:
+                    sg_instance_bindings = (
+                        self.security_group_api
+                        .get_instances_security_groups_bindings(context,
+                                                                servers))
                 for server in servers:
                     groups = sg_instance_bindings.get(server['id'])
                     if groups:
@@ -592,33 +676,75 @@ class ViewBuilder(common.ViewBuilder):
                     'security_groups', [{'name': 'default'}])
 
     @staticmethod
-    def _get_instance_bdms_in_multiple_cells(ctxt, instance_uuids):
+    def _get_cell_instance_records(ctxt, uuids_by_cell, fault_uuids):
+        instance_uuids = uuids_by_cell[ctxt.cell_uuid]
+        bdms = objects.BlockDeviceMappingList.bdms_by_instance_uuid(
+            ctxt, instance_uuids)
+        faults = {}
+        fault_uuids = [uuid for uuid in instance_uuids if uuid in fault_uuids]
+        if fault_uuids:
+            cell_faults = (
+                objects.InstanceFaultList.get_latest_by_instance_uuids(
+                    ctxt, fault_uuids))
+            faults = {fault.instance_uuid: fault for fault in cell_faults}
+        return bdms, faults
+
+    @classmethod
+    def _get_instance_records_in_multiple_cells(cls, ctxt, instance_uuids,
+                                                fault_uuids):
+        """Get the block device mappings and latest faults of instances.
+
+        :param ctxt: The RequestContext
+        :param instance_uuids: The uuids of the instances to get the block
+                               device mappings of
+        :param fault_uuids: The uuids of the instances to get the latest fault
+                            of
+        :returns: A tuple of a dict of lists of block device mappings and a
+                  dict of faults, both keyed by instance uuid
+        """
         inst_maps = objects.InstanceMappingList.get_by_instance_uuids(
                         ctxt, instance_uuids)
 
         cell_mappings = {}
+        uuids_by_cell = {}
         for inst_map in inst_maps:
-            if (inst_map.cell_mapping is not None and
-                    inst_map.cell_mapping.uuid not in cell_mappings):
-                cell_mappings.update(
-                    {inst_map.cell_mapping.uuid: inst_map.cell_mapping})
+            if inst_map.cell_mapping is not None:
+                cell_uuid = inst_map.cell_mapping.uuid
+                cell_mappings[cell_uuid] = inst_map.cell_mapping
+                uuids_by_cell.setdefault(cell_uuid, []).append(
+                    inst_map.instance_uuid)
 
         bdms = {}
+        faults = {}
+        fault_uuids = set(fault_uuids)
         results = nova_context.scatter_gather_cells(
                         ctxt, cell_mappings.values(),
                         nova_context.CELL_TIMEOUT,
-                        objects.BlockDeviceMappingList.bdms_by_instance_uuid,
-                        instance_uuids)
+                        cls._get_cell_instance_records, uuids_by_cell,
+                        fault_uuids)
         for cell_uuid, result in results.items():
             if isinstance(result, Exception):
-                LOG.warning('Failed to get block device mappings for cell %s',
-                            cell_uuid)
+                LOG.warning('Failed to get block device mappings and faults '
+                            'for cell %s', cell_uuid)
             elif result is nova_context.did_not_respond_sentinel:
-                LOG.warning('Timeout getting block device mappings for cell '
-                            '%s', cell_uuid)
+                LOG.warning('Timeout getting block device mappings and '
+                            'faults for cell %s', cell_uuid)
             else:
-                bdms.update(result)
-        return bdms
+                bdms.update(result[0])
+                faults.update(result[1])
+
+        # The instances without a cell mapping are from a legacy environment,
+        # their faults are in the default database.
+        mapped_uuids = set(inst_map.instance_uuid for inst_map in inst_maps
+                           if inst_map.cell_mapping is not None)
+        legacy_fault_uuids = fault_uuids - mapped_uuids
+        if legacy_fault_uuids:
+            legacy_faults = (
+                objects.InstanceFaultList.get_latest_by_instance_uuids(
+                    ctxt, list(legacy_fault_uuids)))
+            faults.update((fault.instance_uuid, fault)
+                          for fault in legacy_faults)
+        return bdms, faults
 
     def _add_volumes_attachments(self, server, bdms,
                                  add_delete_on_termination):
@@ -36,6 +36,7 @@ class RequestLog(base_wsgi.Middleware):
     _log_format = ('%(REMOTE_ADDR)s "%(REQUEST_METHOD)s %(REQUEST_URI)s" '
                    'status: %(status)s len: %(len)s '
                    'microversion: %(microversion)s time: %(time).6f')
+    _prefetch_log_format = ' prefetch: %(prefetch).6f'
 
     @staticmethod
     def _get_uri(environ):
@@ -77,7 +78,13 @@ class RequestLog(base_wsgi.Middleware):
         # set microversion if it exists
         if not req.api_version_request.is_null():
             data["microversion"] = req.api_version_request.get_string()
-        LOG.info(self._log_format, data)
+        log_format = self._log_format
+        # The time spent loading the details of the listed resources in bulk,
+        # if any.
+        if req.environ.get('nova.prefetch_time') is not None:
+            data['prefetch'] = req.environ['nova.prefetch_time']
+            log_format += self._prefetch_log_format
+        LOG.info(log_format, data)
 
     @webob.dec.wsgify(RequestClass=wsgi.Request)
     def __call__(self, req):
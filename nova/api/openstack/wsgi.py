@@ -15,6 +15,8 @@
 #    under the License.
 
 import functools
+import hashlib
+import operator
 
 import microversion_parse
 from oslo_log import log as logging
@@ -27,6 +29,8 @@ import webob
 from nova.api.openstack import api_version_request as api_version
 from nova.api.openstack import versioned_method
 from nova.api import wsgi
+from nova import cache_utils
+import nova.conf
 from nova import exception
 from nova import i18n
 from nova.i18n import _
@@ -34,6 +38,8 @@ from nova.i18n import _
 
 LOG = logging.getLogger(__name__)
 
+CONF = nova.conf.CONF
+
 _SUPPORTED_CONTENT_TYPES = (
     'application/json',
     'application/vnd.openstack.compute+json',
@@ -58,9 +64,18 @@ _METHODS_WITH_BODY = [
 # support is fully merged. It does not affect the V2 API.
 DEFAULT_API_VERSION = "2.1"
 
+_RESPONSE_CACHE = None
+
+# The request environment key where cached_response saves how to finish the
+# rendered response.
+RESPONSE_CACHE_ENV = 'nova.response_cache'
+
 # name of attribute to keep version method information
 VER_METHOD_ATTR = 'versioned_methods'
 
+# name of attribute to keep the versioned method matching each version
+VER_DISPATCH_ATTR = 'versioned_dispatch'
+
 # Names of headers used by clients to request a specific version
 # of the REST API
 API_VERSION_REQUEST_HEADER = 'OpenStack-API-Version'
@@ -568,6 +583,10 @@ class Resource(wsgi.Application):
 
             if resp_obj and not response:
                 response = resp_obj.serialize(request, accept)
+                cache_args = request.environ.pop(RESPONSE_CACHE_ENV, None)
+                if cache_args and response.status_int == 200:
+                    response = _finish_cached_response(request, response,
+                                                       *cache_args)
 
         if hasattr(response, 'headers'):
             for hdr, val in list(response.headers.items()):
@@ -707,6 +726,136 @@ def expected_errors(errors):
     return decorator
 
 
+def _get_response_cache():
+    global _RESPONSE_CACHE
+    if _RESPONSE_CACHE is None:
+        _RESPONSE_CACHE = cache_utils.get_client(
+            expiration_time=CONF.api.response_cache_time)
+    return _RESPONSE_CACHE
+
+
+def _response_cache_key(req, func, query_params):
+    # NOTE: Only the query parameters the method depends on are part of the
+    # key, in a normalized order, and a request with any other parameter is
+    # not cached at all. Otherwise every distinct query string would add an
+    # entry to the cache.
+    if not set(req.GET).issubset(query_params):
+        return None
+    query = sorted(req.GET.items(), key=operator.itemgetter(0))
+    # NOTE: The key covers everything the rendered body depends on besides
+    # the data itself, including the credentials the policy checks of the
+    # method were made with, so a cached body is only ever served to a user
+    # who was allowed to get it.
+    context = req.environ['nova.context']
+    version = req.api_version_request
+    scope = [func.__module__, func.__name__, req.path, query,
+             '' if version.is_null() else version.get_string(),
+             req.best_match_content_type(), context.user_id,
+             context.project_id, ','.join(sorted(context.roles)),
+             str(context.is_admin)]
+    scope = encodeutils.safe_encode('|'.join(six.text_type(s) if s else ''
+                                             for s in scope))
+    return 'api-response-%s' % hashlib.sha256(scope).hexdigest()
+
+
+def _conditional_response(req, body, etag):
+    if etag in req.if_none_match:
+        response = webob.Response(status=304)
+        response.headers.pop('Content-Type', None)
+    else:
+        response = webob.Response(body=body)
+        response.headers['Content-Type'] = req.best_match_content_type()
+    response.etag = etag
+    return response
+
+
+def _finish_cached_response(req, response, key, data_version):
+    """Adds the ETag to a rendered response and caches its body."""
+    body = response.body
+    etag = hashlib.sha1(body).hexdigest()
+    if key is not None:
+        _get_response_cache().set(
+            key, {'version': data_version, 'etag': etag, 'body': body})
+    if etag in req.if_none_match:
+        return _conditional_response(req, body, etag)
+    response.etag = etag
+    return response
+
+
+def cached_response(version=None, query_params=()):
+    """Decorator for GET API methods whose rendered responses are reusable.
+
+    The rendered response of the decorated method gets an ETag computed from
+    its body and a request whose If-None-Match header matches the ETag gets an
+    empty 304 response. When CONF.api.response_cache_time is set the rendered
+    body is also cached per path, query parameters, microversion and
+    credentials, and reused instead of calling the method.
+
+    :param version: An optional function taking the request context and
+                    returning a cheap to compute value which changes whenever
+                    the data rendered by the method changes. A cached body is
+                    only reused while the value is unchanged; without it the
+                    cached body is reused until it expires.
+    :param query_params: The names of the query parameters the method
+                         supports. The rendered body of a request with any
+                         other query parameter is not cached.
+    """
+    query_params = frozenset(query_params)
+
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapped(self, req, *args, **kwargs):
+            key = data_version = None
+            if CONF.api.response_cache_time:
+                key = _response_cache_key(req, f, query_params)
+            if key is not None:
+                if version is not None:
+                    data_version = version(req.environ['nova.context'])
+                cached = _get_response_cache().get(key)
+                if cached and cached['version'] == data_version:
+                    return _conditional_response(req, cached['body'],
+                                                 cached['etag'])
+            # NOTE: The method result is only rendered by the Resource, which
+            # finishes the response with what is saved here.
+            req.environ[RESPONSE_CACHE_ENV] = (key, data_version)
+            return f(self, req, *args, **kwargs)
+
+        return wrapped
+
+    return decorator
+
+
+def _build_version_dispatch(versioned_methods):
+    """Maps every version supported by the API to the matching methods.
+
+    Resolving a versioned method then takes a dict lookup for each request
+    instead of comparing the requested version with the range of every
+    version of the method.
+
+    :param versioned_methods: The dict of the VersionedMethod lists of a
+                              controller keyed by method name.
+    :returns: A dict keyed by method name of dicts mapping the (major, minor)
+              tuple of every version supported by the API to the
+              VersionedMethod to call for it. Versions not supported by any
+              version of the method are left out.
+    """
+    min_version = api_version.min_api_version()
+    max_version = api_version.max_api_version()
+    versions = [api_version.APIVersionRequest('%d.%d' % (
+                    min_version.ver_major, minor))
+                for minor in range(min_version.ver_minor,
+                                   max_version.ver_minor + 1)]
+    dispatch = {}
+    for name, func_list in versioned_methods.items():
+        by_version = dispatch.setdefault(name, {})
+        for ver in versions:
+            for func in func_list:
+                if ver.matches(func.start_version, func.end_version):
+                    by_version[(ver.ver_major, ver.ver_minor)] = func
+                    break
+    return dispatch
+
+
 class ControllerMetaclass(type):
     """Controller metaclass.
 
@@ -745,6 +894,8 @@ class ControllerMetaclass(type):
         cls_dict['wsgi_actions'] = actions
         if versioned_methods:
             cls_dict[VER_METHOD_ATTR] = versioned_methods
+            cls_dict[VER_DISPATCH_ATTR] = _build_version_dispatch(
+                versioned_methods)
 
         return super(ControllerMetaclass, mcs).__new__(mcs, name, bases,
                                                        cls_dict)
@@ -766,6 +917,14 @@ class Controller(object):
             self._view_builder = None
 
     def __getattribute__(self, key):
+        try:
+            version_meth_dict = object.__getattribute__(self, VER_METHOD_ATTR)
+        except AttributeError:
+            # No versioning on this class
+            return object.__getattribute__(self, key)
+
+        if not version_meth_dict or key not in version_meth_dict:
+            return object.__getattribute__(self, key)
 
         def version_select(*args, **kwargs):
             """Look for the method which matches the name supplied and version
@@ -784,29 +943,27 @@ class Controller(object):
             else:
                 ver = args[0].api_version_request
 
-            func_list = self.versioned_methods[key]
-            for func in func_list:
-                if ver.matches(func.start_version, func.end_version):
-                    # Update the version_select wrapper function so
-                    # other decorator attributes like wsgi.response
-                    # are still respected.
-                    functools.update_wrapper(version_select, func.func)
-                    return func.func(self, *args, **kwargs)
-
-            # No version match
-            raise exception.VersionNotFoundForAPIMethod(version=ver)
-
-        try:
-            version_meth_dict = object.__getattribute__(self, VER_METHOD_ATTR)
-        except AttributeError:
-            # No versioning on this class
-            return object.__getattribute__(self, key)
+            func = object.__getattribute__(self, VER_DISPATCH_ATTR).get(
+                key, {}).get((ver.ver_major, ver.ver_minor))
+            if func is None:
+                # The version is outside of the range supported by the API,
+                # look through the methods the slow way.
+                for versioned_func in version_meth_dict[key]:
+                    if ver.matches(versioned_func.start_version,
+                                   versioned_func.end_version):
+                        func = versioned_func
+                        break
+                else:
+                    # No version match
+                    raise exception.VersionNotFoundForAPIMethod(version=ver)
 
-        if version_meth_dict and \
-          key in object.__getattribute__(self, VER_METHOD_ATTR):
-            return version_select
+            # Update the version_select wrapper function so
+            # other decorator attributes like wsgi.response
+            # are still respected.
+            functools.update_wrapper(version_select, func.func)
+            return func.func(self, *args, **kwargs)
 
-        return object.__getattribute__(self, key)
+        return version_select
 
     # NOTE(cyeoh): This decorator MUST appear first (the outermost
     # decorator) on an API method for it to work correctly
@@ -25,6 +25,33 @@ from nova import exception
 from nova.i18n import _
 
 
+# NOTE: Building a validator extends the jsonschema validator class, so the
+# validators are built once per schema and reused by every request. The
+# schema is kept along with its validators so that its id is never reused.
+_VALIDATORS = {}
+_VERSION_RANGES = {}
+
+
+def _get_validator(schema, legacy_v2, is_body):
+    key = (id(schema), legacy_v2, is_body)
+    cached = _VALIDATORS.get(key)
+    if cached is None or cached[0] is not schema:
+        cached = (schema,
+                  validators._SchemaValidator(schema, legacy_v2, is_body))
+        _VALIDATORS[key] = cached
+    return cached[1]
+
+
+def _get_version_range(min_version, max_version):
+    key = (min_version, max_version)
+    version_range = _VERSION_RANGES.get(key)
+    if version_range is None:
+        version_range = (api_version.APIVersionRequest(min_version),
+                         api_version.APIVersionRequest(max_version))
+        _VERSION_RANGES[key] = version_range
+    return version_range
+
+
 def _schema_validation_helper(schema, target, min_version, max_version,
                               args, kwargs, is_body=True):
     """A helper method to execute JSON-Schema Validation.
@@ -51,8 +78,7 @@ def _schema_validation_helper(schema, target, min_version, max_version,
               performed.
     :raises: ValidationError, when the validation fails.
     """
-    min_ver = api_version.APIVersionRequest(min_version)
-    max_ver = api_version.APIVersionRequest(max_version)
+    min_ver, max_ver = _get_version_range(min_version, max_version)
 
     # The request object is always the second argument.
     # However numerous unittests pass in the request object
@@ -74,8 +100,7 @@ def _schema_validation_helper(schema, target, min_version, max_version,
         #  legacy_v2 | 2.0                | work
         #  legacy_v2 | 2.1+               | don't
         if min_version is None or min_version == '2.0':
-            schema_validator = validators._SchemaValidator(
-                schema, legacy_v2, is_body)
+            schema_validator = _get_validator(schema, legacy_v2, is_body)
             schema_validator.validate(target)
             return True
     elif ver.matches(min_ver, max_ver):
@@ -83,8 +108,7 @@ def _schema_validation_helper(schema, target, min_version, max_version,
         # the version range specified. Note that if both min
         # and max are not specified the validator will always
         # be run.
-        schema_validator = validators._SchemaValidator(
-            schema, legacy_v2, is_body)
+        schema_validator = _get_validator(schema, legacy_v2, is_body)
         schema_validator.validate(target)
         return True
 
@@ -194,3 +194,58 @@ def get_instance_availability_zone(context, instance):
         az = get_host_availability_zone(elevated, host)
         cache.set(cache_key, az)
     return az
+
+
+def get_instance_availability_zones(context, instances):
+    """Return the availability zones of the specified instances.
+
+    This is get_instance_availability_zone() for a list of instances, looking
+    up the cache once and the availability zones of the hosts missing from it
+    with a single query.
+
+    :returns: A dict of availability zones keyed by instance uuid
+    """
+    inst_hosts = {}
+    for instance in instances:
+        host = instance.host if 'host' in instance else None
+        if host:
+            inst_hosts[instance.uuid] = host
+
+    hosts = list(set(inst_hosts.values()))
+    cache = _get_cache()
+    azs = {}
+    if hosts:
+        azs = dict(zip(hosts, cache.get_multi(
+            [_make_cache_key(host) for host in hosts])))
+
+    missing = set()
+    for instance in instances:
+        host = inst_hosts.get(instance.uuid)
+        if not host:
+            continue
+        az_inst = instance.get('availability_zone')
+        # NOTE: An empty or stale cache entry is refreshed like in
+        # get_instance_availability_zone().
+        if not azs[host] or (az_inst is not None and azs[host] != az_inst):
+            missing.add(host)
+
+    if missing:
+        aggregates = objects.AggregateList.get_by_metadata_key(
+            context.elevated(), 'availability_zone', hosts=missing)
+        host_azs = {}
+        for aggregate in aggregates:
+            for host in aggregate.hosts:
+                host_azs.setdefault(
+                    host, aggregate.metadata['availability_zone'])
+        for host in missing:
+            azs[host] = host_azs.get(host, CONF.default_availability_zone)
+            cache.set(_make_cache_key(host), azs[host])
+
+    result = {}
+    for instance in instances:
+        host = inst_hosts.get(instance.uuid)
+        if host:
+            result[instance.uuid] = azs[host]
+        else:
+            result[instance.uuid] = instance.get('availability_zone')
+    return result
@@ -24,21 +24,26 @@
 from __future__ import print_function
 
 import argparse
+import collections
 import functools
+import os
 import re
 import sys
 import traceback
 
 from dateutil import parser as dateutil_parser
 import decorator
+import eventlet
 from keystoneauth1 import exceptions as ks_exc
 import netaddr
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_serialization import jsonutils
 from oslo_utils import encodeutils
 from oslo_utils import importutils
+from oslo_utils import timeutils
 from oslo_utils import uuidutils
 import prettytable
 import six
@@ -102,6 +107,57 @@ def mask_passwd_in_url(url):
     return urlparse.urlunparse(new_parsed)
 
 
+class _MigrationBatchSize(object):
+    """Adapt the batch size of an online data migration to how long its
+    batches take.
+
+    The size is halved when a batch takes longer than the target time and
+    doubled when a full batch takes less than half of it.
+    """
+
+    MIN_SIZE = 10
+    MAX_SIZE = 5000
+    TARGET_SECONDS = 2.0
+
+    def __init__(self, size=50):
+        self.size = size
+
+    def record(self, done, elapsed):
+        if elapsed > self.TARGET_SECONDS:
+            self.size = max(self.size // 2, self.MIN_SIZE)
+        elif elapsed < self.TARGET_SECONDS / 2 and done >= self.size:
+            self.size = min(self.size * 2, self.MAX_SIZE)
+
+
+def _load_state_file(state_file):
+    """Load the JSON state saved by a previous run of a command, or an empty
+    dict if there is none.
+    """
+    if not state_file or not os.path.exists(state_file):
+        return {}
+    with open(state_file) as f:
+        return jsonutils.loads(f.read())
+
+
+def _save_state_file(state_file, state):
+    if not state_file:
+        return
+    # Write a new file and rename it over the old one so that the state
+    # is never left half written.
+    tmp_file = state_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(jsonutils.dumps(state))
+    os.rename(tmp_file, state_file)
+
+
+def _remove_state_file(state_file):
+    """Remove the state saved by a command once there is nothing left to
+    resume.
+    """
+    if state_file and os.path.exists(state_file):
+        os.remove(state_file)
+
+
 def _db_error(caught_exception):
     print(caught_exception)
     print(_("The above error may show that the database has not "
@@ -423,6 +479,16 @@ class DbCommands(object):
         instance_mapping_obj.populate_user_id,
     )
 
+    # The online migrations which only work on the API database, targeting the
+    # cells themselves if they need to. With --all-cells, these are run once
+    # against the API database rather than once per cell database.
+    api_db_online_migrations = (
+        build_request_obj.delete_build_requests_with_no_instance_uuid,
+        consumer_obj.create_incomplete_consumers,
+        instance_mapping_obj.populate_queued_for_delete,
+        instance_mapping_obj.populate_user_id,
+    )
+
     def __init__(self):
         pass
 
@@ -511,14 +577,27 @@ Error: %s""") % six.text_type(e))
                 'max_rows as a batch size for each iteration.'))
     @args('--purge', action='store_true', dest='purge', default=False,
           help='Purge all data from shadow tables after archive completes')
+    @args('--workers', type=int, metavar='<number>', dest='workers',
+          default=1,
+          help='Number of tables that do not depend on each other to '
+               'archive concurrently in each database. Defaults to 1.')
+    @args('--sleep', type=float, metavar='<seconds>', dest='sleep',
+          default=0,
+          help='Number of seconds to sleep between batches of rows, to '
+               'limit the load on the database. Defaults to 0.')
+    @args('--all-cells', action='store_true', dest='all_cells',
+          default=False,
+          help='Archive the deleted rows of all cell databases, in parallel. '
+               'max_rows applies to each cell database separately.')
     def archive_deleted_rows(self, max_rows=1000, verbose=False,
-                             until_complete=False, purge=False):
+                             until_complete=False, purge=False, workers=1,
+                             sleep=0, all_cells=False):
         """Move deleted rows from production tables to shadow tables.
 
         Returns 0 if nothing was archived, 1 if some number of rows were
-        archived, 2 if max_rows is invalid, 3 if no connection could be
-        established to the API DB. If automating, this should be
-        run continuously while the result is 1, stopping at 0.
+        archived, 2 if max_rows, workers or sleep is invalid, 3 if no
+        connection could be established to the API DB. If automating, this
+        should be run continuously while the result is 1, stopping at 0.
         """
         max_rows = int(max_rows)
         if max_rows < 0:
@@ -528,13 +607,19 @@ Error: %s""") % six.text_type(e))
             print(_('max rows must be <= %(max_value)d') %
                   {'max_value': db.MAX_INT})
             return 2
+        if workers < 1:
+            print(_("Must supply a positive value for workers"))
+            return 2
+        if sleep < 0:
+            print(_("Must supply a non-negative value for sleep"))
+            return 2
 
         ctxt = context.get_admin_context()
         try:
             # NOTE(tssurya): This check has been added to validate if the API
             # DB is reachable or not as this is essential for purging the
             # related API database records of the deleted instances.
-            objects.CellMappingList.get_all(ctxt)
+            cells = objects.CellMappingList.get_all(ctxt)
         except db_exc.CantStartEngineError:
             print(_('Failed to connect to API DB so aborting this archival '
                     'attempt. Please check your config file to make sure that '
@@ -543,20 +628,84 @@ Error: %s""") % six.text_type(e))
             return 3
 
         table_to_rows_archived = {}
-        deleted_instance_uuids = []
-        if until_complete and verbose:
-            sys.stdout.write(_('Archiving') + '..')  # noqa
+        table_to_seconds = {}
+        if all_cells:
+            def _archive_cell(cell):
+                with context.target_cell(ctxt, cell) as cctxt:
+                    self._archive_deleted_rows(
+                        ctxt, cctxt, cell.name or cell.uuid, max_rows,
+                        until_complete, False, workers, sleep,
+                        table_to_rows_archived, table_to_seconds)
+
+            threads = [utils.spawn(_archive_cell, cell) for cell in cells]
+            try:
+                for thread in threads:
+                    thread.wait()
+            except KeyboardInterrupt:
+                for thread in threads:
+                    thread.kill()
+        else:
+            if until_complete and verbose:
+                sys.stdout.write(_('Archiving') + '..')  # noqa
+            self._archive_deleted_rows(
+                ctxt, ctxt, None, max_rows, until_complete,
+                until_complete and verbose, workers, sleep,
+                table_to_rows_archived, table_to_seconds)
+        if verbose:
+            if table_to_rows_archived:
+                self._print_dict(table_to_rows_archived, _('Table'),
+                                 dict_value=_('Number of Rows Archived'))
+                rates = dict(
+                    (table, int(table_to_rows_archived[table] / seconds))
+                    for table, seconds in table_to_seconds.items()
+                    if seconds and table_to_rows_archived.get(table))
+                if rates:
+                    self._print_dict(rates, _('Table'),
+                                     dict_value=_('Rows Archived Per Second'))
+            else:
+                print(_('Nothing was archived.'))
+
+        if table_to_rows_archived and purge:
+            if verbose:
+                print(_('Rows were archived, running purge...'))
+            self.purge(purge_all=True, verbose=verbose, all_cells=all_cells)
+
+        # NOTE(danms): Return nonzero if we archived something
+        return int(bool(table_to_rows_archived))
+
+    @staticmethod
+    def _archive_deleted_rows(ctxt, db_ctxt, cell_name, max_rows,
+                              until_complete, progress, workers, sleep,
+                              table_to_rows_archived, table_to_seconds):
+        """Archive the deleted rows of the database that db_ctxt targets,
+        and the API database records of the instances archived from it.
+
+        The rows archived and the seconds spent archiving are added to
+        table_to_rows_archived and table_to_seconds, keyed by table name,
+        prefixed with cell_name if it is set.
+        """
+        def _key(tablename):
+            if cell_name:
+                return '%s.%s' % (cell_name, tablename)
+            return tablename
+
         while True:
+            timings = {}
             try:
-                run, deleted_instance_uuids = db.archive_deleted_rows(max_rows)
+                run, deleted_instance_uuids = db.archive_deleted_rows(
+                    max_rows, context=db_ctxt, workers=workers,
+                    throttle=sleep, timings=timings)
             except KeyboardInterrupt:
-                run = {}
-                if until_complete and verbose:
+                run, deleted_instance_uuids = {}, []
+                if progress:
                     print('.' + _('stopped'))  # noqa
                     break
             for k, v in run.items():
-                table_to_rows_archived.setdefault(k, 0)
-                table_to_rows_archived[k] += v
+                table_to_rows_archived.setdefault(_key(k), 0)
+                table_to_rows_archived[_key(k)] += v
+            for k, v in timings.items():
+                table_to_seconds.setdefault(_key(k), 0)
+                table_to_seconds[_key(k)] += v
             if deleted_instance_uuids:
                 table_to_rows_archived.setdefault('instance_mappings', 0)
                 table_to_rows_archived.setdefault('request_specs', 0)
@@ -575,25 +724,11 @@ Error: %s""") % six.text_type(e))
             if not until_complete:
                 break
             elif not run:
-                if verbose:
+                if progress:
                     print('.' + _('complete'))  # noqa
                 break
-            if verbose:
+            if progress:
                 sys.stdout.write('.')
-        if verbose:
-            if table_to_rows_archived:
-                self._print_dict(table_to_rows_archived, _('Table'),
-                                 dict_value=_('Number of Rows Archived'))
-            else:
-                print(_('Nothing was archived.'))
-
-        if table_to_rows_archived and purge:
-            if verbose:
-                print(_('Rows were archived, running purge...'))
-            self.purge(purge_all=True, verbose=verbose)
-
-        # NOTE(danms): Return nonzero if we archived something
-        return int(bool(table_to_rows_archived))
 
     @args('--before', metavar='<before>', dest='before',
           help='If specified, purge rows from shadow tables that are older '
@@ -604,11 +739,26 @@ Error: %s""") % six.text_type(e))
           help='Print information about purged records')
     @args('--all-cells', dest='all_cells', action='store_true', default=False,
           help='Run against all cell databases')
+    @args('--max-rows', type=int, metavar='<number>', dest='max_rows',
+          help='Maximum number of rows to delete from the shadow tables of '
+               'each database. Rows are deleted in batches which are '
+               'committed as they go, so the purge can be continued by '
+               'running the command again. Defaults to no limit.')
+    @args('--sleep', type=float, metavar='<seconds>', dest='sleep',
+          default=0,
+          help='Number of seconds to sleep between batches of rows, to '
+               'limit the load on the database. Defaults to 0.')
     def purge(self, before=None, purge_all=False, verbose=False,
-              all_cells=False):
+              all_cells=False, max_rows=None, sleep=0):
         if before is None and purge_all is False:
             print(_('Either --before or --all is required'))
             return 1
+        if max_rows is not None and max_rows < 1:
+            print(_('Must supply a positive value for max_rows'))
+            return 1
+        if sleep < 0:
+            print(_('Must supply a non-negative value for sleep'))
+            return 1
         if before:
             try:
                 before_date = dateutil_parser.parse(before, fuzzy=True)
@@ -637,11 +787,15 @@ Error: %s""") % six.text_type(e))
                 with context.target_cell(admin_ctxt, cell) as cctxt:
                     deleted += sa_db.purge_shadow_tables(cctxt,
                                                          before_date,
-                                                         status_fn=status)
+                                                         status_fn=status,
+                                                         max_rows=max_rows,
+                                                         throttle=sleep)
         else:
             identity = _('DB')
             deleted = sa_db.purge_shadow_tables(admin_ctxt,
-                                                before_date, status_fn=status)
+                                                before_date, status_fn=status,
+                                                max_rows=max_rows,
+                                                throttle=sleep)
         if deleted:
             return 0
         else:
@@ -709,9 +863,165 @@ Error: %s""") % six.text_type(e))
                     break
         return migrations, exceptions
 
+    def _run_database_migrations(self, ctxt, database, migrations, max_count,
+                                 state, save_state, stats):
+        """Run the online migrations of one database until they are
+        complete.
+
+        Each round runs one batch of every migration that is not complete, in
+        order, and the rounds continue until one does not migrate anything.
+        The batch size of each migration adapts to how long its batches take.
+
+        :param database: the name of the database, used to report progress
+        :param migrations: the migration functions to run
+        :param max_count: the maximum number of records to migrate with each
+                          migration, or None for no limit
+        :param state: the persisted state of the migrations of this database,
+                      keyed by migration name. Migrations marked complete are
+                      skipped and are marked complete when they no longer
+                      find anything to migrate.
+        :param save_state: a function called to persist the state
+        :param stats: a dict updated with the (found, done, seconds) of each
+                      migration in this run, keyed by migration name
+        :returns: a tuple of whether the last round raised exceptions and
+                  whether any migration stopped because of max_count
+        """
+        batch_sizes = collections.defaultdict(_MigrationBatchSize)
+        limited = False
+        while True:
+            ran = 0
+            exceptions = False
+            for migration_meth in migrations:
+                name = migration_meth.__name__
+                migration_state = state.setdefault(
+                    name, {'complete': False, 'found': 0, 'done': 0})
+                if migration_state['complete']:
+                    continue
+                found, done, seconds = stats.get(name, (0, 0, 0))
+                count = batch_sizes[name].size
+                if max_count is not None:
+                    count = min(count, max_count - done)
+                    if count <= 0:
+                        limited = True
+                        continue
+
+                timer = timeutils.StopWatch()
+                timer.start()
+                try:
+                    batch_found, batch_done = migration_meth(ctxt, count)
+                except Exception:
+                    msg = (_("Error attempting to run %(method)s on "
+                             "%(database)s") % dict(method=migration_meth,
+                                                   database=database))
+                    print(msg)
+                    LOG.exception(msg)
+                    exceptions = True
+                    continue
+                elapsed = timer.elapsed()
+                batch_sizes[name].record(batch_done, elapsed)
+
+                if batch_found:
+                    print(_('%(database)s: %(total)i rows matched query '
+                            '%(meth)s, %(done)i migrated') % {
+                                'database': database,
+                                'total': batch_found,
+                                'meth': name,
+                                'done': batch_done})
+                stats[name] = (found + batch_found, done + batch_done,
+                               seconds + elapsed)
+                migration_state['found'] += batch_found
+                migration_state['done'] += batch_done
+                migration_state['complete'] = not batch_found
+                save_state()
+                ran += batch_done
+            if not ran:
+                return exceptions, limited
+
+    def _online_data_migrations_all_cells(self, ctxt, max_count, workers,
+                                          state_file):
+        """Run the online migrations against the API database and all cell
+        databases concurrently.
+        """
+        try:
+            cells = objects.CellMappingList.get_all(ctxt)
+        except db_exc.DBError:
+            print(_('Unable to get cell list from API DB. '
+                    'Is it configured?'))
+            return 4
+
+        api_migrations = [m for m in self.online_migrations
+                          if m in self.api_db_online_migrations]
+        cell_migrations = [m for m in self.online_migrations
+                           if m not in self.api_db_online_migrations]
+        state = _load_state_file(state_file)
+        save_state = functools.partial(_save_state_file, state_file, state)
+        stats = {}
+        results = {}
+
+        def _run(database, cell=None):
+            database_state = state.setdefault(database, {})
+            database_stats = stats.setdefault(database, {})
+            if cell is None:
+                results[database] = self._run_database_migrations(
+                    ctxt, database, api_migrations, max_count,
+                    database_state, save_state, database_stats)
+                return
+            with context.target_cell(ctxt, cell) as cctxt:
+                results[database] = self._run_database_migrations(
+                    cctxt, database, cell_migrations, max_count,
+                    database_state, save_state, database_stats)
+
+        pool = eventlet.GreenPool(size=workers or len(cells) + 1)
+        pool.spawn(_run, 'API')
+        for cell in cells:
+            pool.spawn(_run, cell.name or cell.uuid, cell)
+        pool.waitall()
+
+        t = prettytable.PrettyTable([_('Migration'),
+                                     _('Database'),
+                                     _('Total Needed'),  # Really: Total Found
+                                     _('Completed'),
+                                     _('Rows/s')])
+        for database in sorted(stats):
+            for name, (found, done, seconds) in sorted(
+                    stats[database].items()):
+                t.add_row([name, database, found, done,
+                           int(done / seconds) if seconds else '-'])
+        print(t)
+
+        if len(results) != len(cells) + 1 or any(
+                exceptions for exceptions, limited in results.values()):
+            print(_("Some migrations failed unexpectedly. Check log for "
+                    "details."))
+            return 2
+        if any(limited for exceptions, limited in results.values()):
+            return 1
+        # Every migration is complete in every database, so the next run,
+        # which may come with new migrations or new records to migrate after
+        # an upgrade, must not skip any of them.
+        _remove_state_file(state_file)
+        return 0
+
     @args('--max-count', metavar='<number>', dest='max_count',
-          help='Maximum number of objects to consider')
-    def online_data_migrations(self, max_count=None):
+          help='Maximum number of objects to consider. With --all-cells, '
+               'the maximum number of objects to migrate with each migration '
+               'in each database.')
+    @args('--all-cells', action='store_true', dest='all_cells',
+          default=False,
+          help='Run the migrations against the API database and all cell '
+               'databases concurrently, until they are complete, in '
+               'batches whose size adapts to how long they take.')
+    @args('--workers', type=int, metavar='<number>', dest='workers',
+          help='With --all-cells, the number of databases to migrate '
+               'concurrently. Defaults to all of them.')
+    @args('--state-file', metavar='<path>', dest='state_file',
+          help='With --all-cells, a file in which the progress of each '
+               'migration in each database is recorded. Migrations recorded '
+               'as complete are skipped when the command is run again. The '
+               'file is removed once every migration is complete in every '
+               'database.')
+    def online_data_migrations(self, max_count=None, all_cells=False,
+                               workers=None, state_file=None):
         ctxt = context.get_admin_context()
         if max_count is not None:
             try:
@@ -722,11 +1032,18 @@ Error: %s""") % six.text_type(e))
             if max_count < 1:
                 print(_('Must supply a positive value for max_number'))
                 return 127
-        else:
+        elif not all_cells:
             unlimited = True
             max_count = 50
             print(_('Running batches of %i until complete') % max_count)
 
+        if workers is not None and workers < 1:
+            print(_('Must supply a positive value for workers'))
+            return 127
+        if all_cells:
+            return self._online_data_migrations_all_cells(
+                ctxt, max_count, workers, state_file)
+
         ran = None
         migration_info = {}
         exceptions = False
@@ -1931,8 +2248,136 @@ class PlacementCommands(object):
             raise exception.AllocationCreateFailed(
                 instance=instance.uuid, provider=node_uuid)
 
+    @staticmethod
+    def _create_allocations_in_bulk(ctxt, instances, node_uuids, output,
+                                    placement):
+        """Creates allocations for instances with a single POST /allocations
+
+        :param ctxt: cell-targeted nova.context.RequestContext
+        :param instances: the instances which have no allocations
+        :param node_uuids: dict of Instance.uuid keys to the ComputeNode.uuid
+            of the instance
+        :param output: function that takes a single message for verbose output
+        :param placement: nova.scheduler.client.report.SchedulerReportClient
+            to communicate with the Placement service API.
+        :return: True if the allocations were created, False if the request
+            failed, in which case none of the allocations were created
+        """
+        data = {}
+        for instance in instances:
+            resources = scheduler_utils.resources_from_flavor(
+                instance, instance.flavor)
+            data[instance.uuid] = {
+                'allocations': {
+                    node_uuids[instance.uuid]: {'resources': resources}},
+                'project_id': instance.project_id,
+                'user_id': instance.user_id,
+                # A consumer generation of None means the consumer must not
+                # exist yet, so the request fails rather than overwrites the
+                # allocations of an instance which has some against another
+                # provider or got some since they were retrieved.
+                'consumer_generation': None,
+            }
+        try:
+            resp = placement.post(
+                '/allocations', data,
+                version=report.CONSUMER_GENERATION_VERSION,
+                global_request_id=ctxt.global_id)
+        except ks_exc.ClientException as e:
+            output(_('Failed to create allocations in bulk: %s') % e)
+            return False
+        if not resp:
+            output(_('Failed to create allocations in bulk: %s') % resp.text)
+            return False
+        for instance in instances:
+            output(_('Successfully created allocations for '
+                     'instance %(instance)s against resource '
+                     'provider %(provider)s.') %
+                   {'instance': instance.uuid,
+                    'provider': node_uuids[instance.uuid]})
+        return True
+
+    def _heal_instances_in_bulk(self, ctxt, instances, node_cache, output,
+                                placement, pool):
+        """Checks a page of instances for allocation healing concurrently
+
+        Rather than retrieving the allocations of each instance, the
+        allocations against the compute node resource providers of the
+        instances are retrieved, one request per provider, and the instances
+        without allocations against their compute node get them created with
+        a single POST /allocations request. Placement only reports the
+        consumer project/user for a single consumer, so the instances which
+        have allocations are still checked one at a time, but concurrently.
+
+        :param ctxt: cell-targeted nova.context.RequestContext
+        :param instances: the page of instances to check
+        :param node_cache: dict of Instance.node keys to ComputeNode.uuid
+            values; this cache is updated if a new node is processed.
+        :param output: function that takes a single message for verbose output
+        :param placement: nova.scheduler.client.report.SchedulerReportClient
+            to communicate with the Placement service API.
+        :param pool: eventlet.GreenPool bounding the concurrent requests to
+            the Placement service
+        :return: Number of instances that had allocations created or updated.
+        :raises: nova.exception.ComputeHostNotFound if a compute node for a
+            given instance without allocations cannot be found
+        :raises: ResourceProviderAllocationRetrievalFailed if unable to
+            retrieve the allocations against a compute node resource provider
+        :raises: AllocationCreateFailed if unable to create allocations for
+            a given instance against a given compute node resource provider
+        :raises: AllocationUpdateFailed if unable to update allocations for
+            a given instance with consumer project/user information
+        """
+        node_uuids = {}
+        for instance in instances:
+            # _heal_allocations_for_instance reports why these are skipped.
+            if instance.task_state is not None or instance.node is None:
+                continue
+            try:
+                node_uuids[instance.uuid] = self._get_compute_node_uuid(
+                    ctxt, instance, node_cache)
+            except exception.ComputeHostNotFound:
+                # This is only an error if the instance has no allocations,
+                # which _heal_allocations_for_instance finds out.
+                pass
+
+        def _get_consumers(node_uuid):
+            try:
+                allocs = placement.get_allocations_for_resource_provider(
+                    ctxt, node_uuid)
+            except ks_exc.ClientException as e:
+                raise exception.ResourceProviderAllocationRetrievalFailed(
+                    rp_uuid=node_uuid, error=e)
+            return node_uuid, allocs.allocations
+
+        consumers = dict(pool.imap(_get_consumers, set(node_uuids.values())))
+        missing = [instance for instance in instances
+                   if instance.uuid in node_uuids and
+                   instance.uuid not in consumers[node_uuids[instance.uuid]]]
+        missing_uuids = set(instance.uuid for instance in missing)
+        others = [instance for instance in instances
+                  if instance.uuid not in missing_uuids]
+
+        num_processed = 0
+        if missing:
+            if self._create_allocations_in_bulk(
+                    ctxt, missing, node_uuids, output, placement):
+                num_processed += len(missing)
+            else:
+                # Find out which of them could not be created.
+                others.extend(missing)
+
+        def _heal(instance):
+            return self._heal_allocations_for_instance(
+                ctxt, instance, node_cache, output, placement)
+
+        num_processed += len([healed for healed in pool.imap(_heal, others)
+                              if healed])
+        return num_processed
+
     def _heal_instances_in_cell(self, ctxt, max_count, unlimited, output,
-                                placement):
+                                placement, marker=None, save_marker=None,
+                                pool=None):
         """Checks for instances to heal in a given cell.
 
         :param ctxt: cell-targeted nova.context.RequestContext
@@ -1942,9 +2387,19 @@ class PlacementCommands(object):
         :param outout: function that takes a single message for verbose output
         :param placement: nova.scheduler.client.report.SchedulerReportClient
             to communicate with the Placement service API.
+        :param marker: uuid of the instance after which to start, to resume
+            an earlier run
+        :param save_marker: function called with the uuid of the last
+            instance of each batch once the batch has been processed, and
+            with None once every instance of the cell has been processed
+        :param pool: eventlet.GreenPool used to heal each batch of instances
+            concurrently and in bulk; if None, the instances are healed one
+            at a time
         :return: Number of instances that had allocations created.
         :raises: nova.exception.ComputeHostNotFound if a compute node for a
             given instance cannot be found
+        :raises: ResourceProviderAllocationRetrievalFailed if unable to
+            retrieve the allocations against a compute node resource provider
         :raises: AllocationCreateFailed if unable to create allocations for
             a given instance against a given compute node resource provider
         :raises: AllocationUpdateFailed if unable to update allocations for
@@ -1954,6 +2409,11 @@ class PlacementCommands(object):
         # This will save some queries for non-ironic instances to the
         # compute_nodes table.
         node_cache = {}
+        if pool is not None:
+            # Look up all the compute nodes of the cell with a single query.
+            node_cache = {
+                node.hypervisor_hostname: node.uuid
+                for node in objects.ComputeNodeList.get_all(ctxt)}
         # Track the total number of instances that have allocations created
         # for them in this cell. We return when num_processed equals max_count
         # and unlimited=True or we exhaust the number of instances to process
@@ -1961,24 +2421,39 @@ class PlacementCommands(object):
         num_processed = 0
         # Get all instances from this cell which have a host and are not
         # undergoing a task state transition. Go from oldest to newest.
-        # NOTE(mriedem): Unfortunately we don't have a marker to use
-        # between runs where the user is specifying --max-count.
-        # TODO(mriedem): Store a marker in system_metadata so we can
-        # automatically pick up where we left off without the user having
-        # to pass it in (if unlimited is False).
+        # The marker to resume from between runs where the user is
+        # specifying --max-count is recorded by save_marker, in the file
+        # given with --marker-file.
         filters = {'deleted': False}
-        instances = objects.InstanceList.get_by_filters(
-            ctxt, filters=filters, sort_key='created_at', sort_dir='asc',
-            limit=max_count, expected_attrs=['flavor'])
+        try:
+            instances = objects.InstanceList.get_by_filters(
+                ctxt, filters=filters, sort_key='created_at', sort_dir='asc',
+                limit=max_count, marker=marker, expected_attrs=['flavor'])
+        except exception.MarkerNotFound:
+            output(_('Marker instance %s not found, starting from the '
+                     'first instance.') % marker)
+            instances = objects.InstanceList.get_by_filters(
+                ctxt, filters=filters, sort_key='created_at', sort_dir='asc',
+                limit=max_count, expected_attrs=['flavor'])
         while instances:
             output(_('Found %s candidate instances.') % len(instances))
-            # For each instance in this list, we need to see if it has
-            # allocations in placement and if so, assume it's correct and
-            # continue.
-            for instance in instances:
-                if self._heal_allocations_for_instance(
-                        ctxt, instance, node_cache, output, placement):
-                    num_processed += 1
+            if pool is not None:
+                num_processed += self._heal_instances_in_bulk(
+                    ctxt, instances, node_cache, output, placement, pool)
+            else:
+                # For each instance in this list, we need to see if it has
+                # allocations in placement and if so, assume it's correct
+                # and continue.
+                for instance in instances:
+                    if self._heal_allocations_for_instance(
+                            ctxt, instance, node_cache, output, placement):
+                        num_processed += 1
+
+            # Use a marker to get the next page of instances in this cell.
+            # Note that InstanceList doesn't support slice notation.
+            marker = instances[len(instances) - 1].uuid
+            if save_marker is not None:
+                save_marker(marker)
 
             # Make sure we don't go over the max count. Note that we
             # don't include instances that already have allocations in the
@@ -1987,13 +2462,12 @@ class PlacementCommands(object):
             if not unlimited and num_processed == max_count:
                 return num_processed
 
-            # Use a marker to get the next page of instances in this cell.
-            # Note that InstanceList doesn't support slice notation.
-            marker = instances[len(instances) - 1].uuid
             instances = objects.InstanceList.get_by_filters(
                 ctxt, filters=filters, sort_key='created_at', sort_dir='asc',
                 limit=max_count, marker=marker, expected_attrs=['flavor'])
 
+        if save_marker is not None:
+            save_marker(None)
         return num_processed
 
     # FIXME(cdent): This needs to be addressed as part of extraction.
@@ -2015,7 +2489,21 @@ class PlacementCommands(object):
                '0 or 4.')
     @args('--verbose', action='store_true', dest='verbose', default=False,
           help='Provide verbose output during execution.')
-    def heal_allocations(self, max_count=None, verbose=False):
+    @args('--workers', type=int, metavar='<number>', dest='workers',
+          help='Heal the instances of each cell with up to this number of '
+               'concurrent requests to the Placement service. Existing '
+               'allocations are retrieved per compute node resource provider '
+               'and missing allocations are created in bulk. Unless '
+               '--max-count is specified, the cells are also healed '
+               'concurrently.')
+    @args('--marker-file', metavar='<path>', dest='marker_file',
+          help='A file in which the last instance processed in each cell is '
+               'recorded. When the command is run again, the instances of '
+               'each cell are processed starting after the recorded one. The '
+               'marker of a cell is removed once all its instances are '
+               'processed, and the file once no cell has a marker left.')
+    def heal_allocations(self, max_count=None, verbose=False, workers=None,
+                         marker_file=None):
         """Heals instance allocations in the Placement service
 
         Return codes:
@@ -2024,7 +2512,8 @@ class PlacementCommands(object):
         * 1: --max-count was reached and there are more instances to process.
         * 2: Unable to find a compute node record for a given instance.
         * 3: Unable to create (or update) allocations for an instance against
-             its compute node resource provider.
+             its compute node resource provider, or to retrieve the
+             allocations against a compute node resource provider.
         * 4: Command completed successfully but no allocations were created.
         * 127: Invalid input.
         """
@@ -2066,45 +2555,93 @@ class PlacementCommands(object):
             unlimited = True
             output(_('Running batches of %i until complete') % max_count)
 
+        if workers is not None and workers < 1:
+            print(_('Must supply a positive integer for --workers.'))
+            return 127
+
         ctxt = context.get_admin_context()
         cells = objects.CellMappingList.get_all(ctxt)
         if not cells:
             output(_('No cells to process.'))
             return 4
+        # TODO(mriedem): Use context.scatter_gather_skip_cell0.
+        # Skip cell0 since that is where instances go that do not get
+        # scheduled and hence would not have allocations against a host.
+        cells = [cell for cell in cells
+                 if cell.uuid != objects.CellMapping.CELL0_UUID]
 
         placement = report.SchedulerReportClient()
-        num_processed = 0
-        # TODO(mriedem): Use context.scatter_gather_skip_cell0.
-        for cell in cells:
-            # Skip cell0 since that is where instances go that do not get
-            # scheduled and hence would not have allocations against a host.
-            if cell.uuid == objects.CellMapping.CELL0_UUID:
-                continue
-            output(_('Looking for instances in cell: %s') % cell.identity)
+        markers = _load_state_file(marker_file)
 
-            limit_per_cell = max_count
-            if not unlimited:
-                # Adjust the limit for the next cell. For example, if the user
-                # only wants to process a total of 100 instances and we did
-                # 75 in cell1, then we only need 25 more from cell2 and so on.
-                limit_per_cell = max_count - num_processed
+        def _save_marker(cell, marker):
+            if marker is None:
+                # Every instance of the cell has been processed, so the next
+                # run must start from its first instance again.
+                markers.pop(cell.uuid, None)
+            else:
+                markers[cell.uuid] = marker
+            if markers:
+                _save_state_file(marker_file, markers)
+            else:
+                _remove_state_file(marker_file)
 
+        def _heal_cell(cell, limit_per_cell):
+            """Returns the number of instances processed in the cell and, if
+            healing failed, the return code and the exception.
+            """
+            output(_('Looking for instances in cell: %s') % cell.identity)
+            pool = eventlet.GreenPool(size=workers) if workers else None
             with context.target_cell(ctxt, cell) as cctxt:
                 try:
-                    num_processed += self._heal_instances_in_cell(
-                        cctxt, limit_per_cell, unlimited, output, placement)
+                    return self._heal_instances_in_cell(
+                        cctxt, limit_per_cell, unlimited, output, placement,
+                        marker=markers.get(cell.uuid),
+                        save_marker=functools.partial(_save_marker, cell),
+                        pool=pool), None
                 except exception.ComputeHostNotFound as e:
-                    print(e.format_message())
-                    return 2
+                    return 0, (2, e)
                 except (exception.AllocationCreateFailed,
-                        exception.AllocationUpdateFailed) as e:
+                        exception.AllocationUpdateFailed,
+                        exception.ResourceProviderAllocationRetrievalFailed
+                        ) as e:
+                    return 0, (3, e)
+
+        num_processed = 0
+        if workers and unlimited:
+            # There is no total to stay within, so heal the cells
+            # concurrently too.
+            cell_pool = eventlet.GreenPool(size=max(len(cells), 1))
+            errors = []
+            for cell_processed, error in cell_pool.imap(
+                    lambda cell: _heal_cell(cell, max_count), cells):
+                num_processed += cell_processed
+                if error:
+                    errors.append(error)
+            for code, e in errors:
+                print(e.format_message())
+            if errors:
+                return errors[0][0]
+        else:
+            for cell in cells:
+                limit_per_cell = max_count
+                if not unlimited:
+                    # Adjust the limit for the next cell. For example, if the
+                    # user only wants to process a total of 100 instances and
+                    # we did 75 in cell1, then we only need 25 more from cell2
+                    # and so on.
+                    limit_per_cell = max_count - num_processed
+
+                cell_processed, error = _heal_cell(cell, limit_per_cell)
+                if error:
+                    code, e = error
                     print(e.format_message())
-                    return 3
+                    return code
+                num_processed += cell_processed
 
                 # Make sure we don't go over the max count. Note that we
-                # don't include instances that already have allocations in the
-                # max_count number, only the number of instances that have
-                # successfully created allocations.
+                # don't include instances that already have allocations in
+                # the max_count number, only the number of instances that
+                # have successfully created allocations.
                 if num_processed == max_count:
                     output(_('Max count reached. Processed %s instances.')
                            % num_processed)
@@ -2323,6 +2860,125 @@ class PlacementCommands(object):
         return return_code
 
 
+class RpcCommands(object):
+    """Class for inspecting the RPC statistics of the nova services."""
+
+    _SORT_KEYS = {
+        'count': 'count',
+        'duration': 'duration',
+        'payload': 'payload_bytes',
+        'queue': 'queue_latency',
+    }
+
+    @staticmethod
+    def _merge_stats(totals, stats):
+        for key, value in stats.items():
+            if key.startswith('max_'):
+                totals[key] = max(totals.get(key, 0), value)
+            else:
+                totals[key] = totals.get(key, 0) + value
+
+    @staticmethod
+    def _average(total, count, scale=1):
+        if not count:
+            return '-'
+        return '%.1f' % (total * scale / count)
+
+    @args('--stats-dir', metavar='<path>', dest='stats_dir',
+          help=_('The directory the services write their RPC statistics to. '
+                 'Defaults to [DEFAULT]/rpc_stats_dir.'))
+    @args('--side', metavar='<side>', dest='side',
+          choices=('client', 'server'),
+          help=_('Only show the statistics of RPC clients or of RPC '
+                 'servers.'))
+    @args('--sort-by', metavar='<key>', dest='sort_by', default='duration',
+          choices=sorted(_SORT_KEYS),
+          help=_('Sort the methods by total count, duration, payload size or '
+                 'queue latency. Defaults to duration.'))
+    @args('--limit', metavar='<number>', dest='limit', type=int,
+          help=_('Maximum number of methods to show.'))
+    @args('--json', action='store_true', dest='as_json', default=False,
+          help=_('Print the aggregated statistics as JSON.'))
+    def stats(self, stats_dir=None, side=None, sort_by='duration',
+              limit=None, as_json=False):
+        """Aggregate and print the RPC statistics of the nova services.
+
+        The statistics written by every process of every service with
+        [DEFAULT]/rpc_stats_dir set are summed per RPC method.
+
+        Return codes:
+
+        * 0: The statistics were printed.
+        * 1: No statistics were found.
+        """
+        stats_dir = stats_dir or CONF.rpc_stats_dir
+        if not stats_dir:
+            print(_('No statistics directory was given and '
+                    '[DEFAULT]/rpc_stats_dir is not set.'))
+            return 1
+        try:
+            names = sorted(name for name in os.listdir(stats_dir)
+                           if name.endswith('.json'))
+        except OSError as e:
+            print(_('Unable to list %(dir)s: %(error)s') %
+                  {'dir': stats_dir, 'error': e})
+            return 1
+
+        totals = collections.defaultdict(dict)
+        processes = 0
+        for name in names:
+            try:
+                with open(os.path.join(stats_dir, name)) as f:
+                    process_stats = jsonutils.loads(f.read())
+            except (IOError, OSError, ValueError) as e:
+                print(_('Ignoring %(file)s: %(error)s') %
+                      {'file': name, 'error': e})
+                continue
+            processes += 1
+            for method_side in ('client', 'server'):
+                if side and method_side != side:
+                    continue
+                for method, stats in process_stats.get(
+                        method_side, {}).items():
+                    self._merge_stats(totals[(method_side, method)], stats)
+
+        if not totals:
+            print(_('No RPC statistics were found in %s.') % stats_dir)
+            return 1
+
+        sort_key = self._SORT_KEYS[sort_by]
+        rows = sorted(totals.items(), key=lambda item: item[1][sort_key],
+                      reverse=True)[:limit]
+        if as_json:
+            print(jsonutils.dumps(
+                [dict(stats, side=method_side, method=method)
+                 for (method_side, method), stats in rows],
+                indent=2, sort_keys=True))
+            return 0
+
+        t = prettytable.PrettyTable(
+            [_('Side'), _('Method'), _('Count'), _('Calls'), _('Casts'),
+             _('Failures'), _('Avg bytes'), _('Max bytes'),
+             _('Avg serialize ms'), _('Avg ms'), _('Max ms'),
+             _('Avg queue ms')])
+        for (method_side, method), stats in rows:
+            count = stats['count']
+            t.add_row([
+                method_side, method, count, stats['calls'], stats['casts'],
+                stats['failures'],
+                self._average(stats['payload_bytes'], count),
+                stats['max_payload_bytes'],
+                self._average(stats['serialization_time'], count, 1000),
+                self._average(stats['duration'], count, 1000),
+                '%.1f' % (stats['max_duration'] * 1000),
+                self._average(stats['queue_latency'],
+                              stats['queue_samples'], 1000)])
+        print(_('RPC statistics of %(count)d processes in %(dir)s:') %
+              {'count': processes, 'dir': stats_dir})
+        print(t)
+        return 0
+
+
 CATEGORIES = {
     'api_db': ApiDbCommands,
     'cell': CellCommands,
@@ -2330,7 +2986,8 @@ CATEGORIES = {
     'db': DbCommands,
     'floating': FloatingIpCommands,
     'network': NetworkCommands,
-    'placement': PlacementCommands
+    'placement': PlacementCommands,
+    'rpc': RpcCommands,
 }
 
 
@@ -24,6 +24,7 @@ import copy
 import functools
 import re
 import string
+import sys
 
 from castellan import key_manager
 from oslo_log import log as logging
@@ -256,6 +257,39 @@ def _get_image_meta_obj(image_meta_dict):
     return image_meta
 
 
+class _DependencyCall(object):
+    """A call to another service running in its own greenthread.
+
+    This lets independent validations against Glance, Neutron and Cinder be
+    done concurrently. The result of the call, or the exception it raised,
+    is returned, or raised, by result() and the time the call took is kept
+    in elapsed.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.elapsed = None
+        self._exc_info = None
+        self._thread = utils.spawn(self._run, func, *args, **kwargs)
+
+    def _run(self, func, *args, **kwargs):
+        timer = timeutils.StopWatch()
+        timer.start()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            # NOTE: Keep the exception to raise it in the caller's
+            # greenthread, when it gets the result.
+            self._exc_info = sys.exc_info()
+        finally:
+            self.elapsed = timer.elapsed()
+
+    def result(self):
+        result = self._thread.wait()
+        if self._exc_info is not None:
+            six.reraise(*self._exc_info)
+        return result
+
+
 @profiler.trace_cls("compute_api")
 class API(base.Base):
     """API for interacting with the compute manager."""
@@ -820,7 +854,8 @@ class API(base.Base):
                                          requested_networks, config_drive,
                                          auto_disk_config, reservation_id,
                                          max_count,
-                                         supports_port_resource_request):
+                                         supports_port_resource_request,
+                                         networks_call=None):
         """Verify all the input parameters regardless of the provisioning
         strategy being performed.
         """
@@ -841,8 +876,11 @@ class API(base.Base):
         # Note:  max_count is the number of instances requested by the user,
         # max_network_count is the maximum number of instances taking into
         # account any network quotas
-        max_network_count = self._check_requested_networks(context,
-                                     requested_networks, max_count)
+        if networks_call is not None:
+            max_network_count = networks_call.result()
+        else:
+            max_network_count = self._check_requested_networks(context,
+                                         requested_networks, max_count)
 
         kernel_id, ramdisk_id = self._handle_kernel_and_ramdisk(
                 context, kernel_id, ramdisk_id, boot_meta)
@@ -932,7 +970,7 @@ class API(base.Base):
             block_device_mapping, shutdown_terminate,
             instance_group, check_server_group_quota, filter_properties,
             key_pair, tags, trusted_certs, supports_multiattach,
-            network_metadata=None):
+            network_metadata=None, volumes=None):
         # Check quotas
         num_instances = compute_utils.check_num_instances_quota(
                 context, instance_type, min_count, max_count)
@@ -993,7 +1031,7 @@ class API(base.Base):
                 block_device_mapping = (
                     self._bdm_validate_set_size_and_instance(context,
                         instance, instance_type, block_device_mapping,
-                        supports_multiattach))
+                        supports_multiattach, volumes=volumes))
                 instance_tags = self._transform_tags(tags, instance.uuid)
 
                 build_request = objects.BuildRequest(context,
@@ -1121,7 +1159,7 @@ class API(base.Base):
         return certs_to_return
 
     def _get_bdm_image_metadata(self, context, block_device_mapping,
-                                legacy_bdm=True):
+                                legacy_bdm=True, volumes=None):
         """If we are booting from a volume, we need to get the
         volume details from Cinder and make sure we pass the
         metadata back accordingly.
@@ -1155,7 +1193,10 @@ class API(base.Base):
                     raise exception.InvalidBDMImage(id=image_id)
             elif volume_id:
                 try:
-                    volume = self.volume_api.get(context, volume_id)
+                    if volumes and volume_id in volumes:
+                        volume = volumes[volume_id].result()
+                    else:
+                        volume = self.volume_api.get(context, volume_id)
                 except exception.CinderConnectionFailed:
                     raise
                 except Exception:
@@ -1206,9 +1247,7 @@ class API(base.Base):
         block_device_mapping = block_device_mapping or []
         tags = tags or []
 
-        if image_href:
-            image_id, boot_meta = self._get_image(context, image_href)
-        else:
+        if not image_href:
             # This is similar to the logic in _retrieve_trusted_certs_object.
             if (trusted_certs or
                 (CONF.glance.verify_glance_signatures and
@@ -1217,9 +1256,29 @@ class API(base.Base):
                 msg = _("Image certificate validation is not supported "
                         "when booting from volume")
                 raise exception.CertificateValidationFailed(message=msg)
+
+        # The image, the requested networks and the volumes to attach are
+        # independent of each other, so look them up in Glance, Neutron and
+        # Cinder concurrently. The results are still consumed in the order the
+        # checks used to be done in, so the same error is raised first.
+        volumes = {}
+        for bdm in block_device_mapping:
+            volume_id = bdm.get('volume_id')
+            if volume_id and volume_id not in volumes:
+                volumes[volume_id] = _DependencyCall(
+                    self.volume_api.get, context, volume_id)
+        networks_call = _DependencyCall(self._check_requested_networks,
+                                        context, requested_networks,
+                                        max_count)
+
+        if image_href:
+            image_call = _DependencyCall(self._get_image, context, image_href)
+            image_id, boot_meta = image_call.result()
+        else:
             image_id = None
-            boot_meta = self._get_bdm_image_metadata(
-                context, block_device_mapping, legacy_bdm)
+            image_call = _DependencyCall(self._get_bdm_image_metadata,
+                context, block_device_mapping, legacy_bdm, volumes=volumes)
+            boot_meta = image_call.result()
 
         self._check_auto_disk_config(image=boot_meta,
                                      auto_disk_config=auto_disk_config)
@@ -1231,7 +1290,8 @@ class API(base.Base):
                     key_name, key_data, security_groups, availability_zone,
                     user_data, metadata, access_ip_v4, access_ip_v6,
                     requested_networks, config_drive, auto_disk_config,
-                    reservation_id, max_count, supports_port_resource_request)
+                    reservation_id, max_count, supports_port_resource_request,
+                    networks_call=networks_call)
 
         # max_net_count is the maximum number of instances requested by the
         # user adjusted for any network quota constraints, including
@@ -1262,12 +1322,23 @@ class API(base.Base):
 
         tags = self._create_tag_list_obj(context, tags)
 
+        # The volume calls are taken out of volumes as they are used while
+        # provisioning the instances, so keep them for the timings below.
+        volume_calls = list(volumes.items())
         instances_to_build = self._provision_instances(
             context, instance_type, min_count, max_count, base_options,
             boot_meta, security_groups, block_device_mapping,
             shutdown_terminate, instance_group, check_server_group_quota,
             filter_properties, key_pair, tags, trusted_certs,
-            supports_multiattach, network_metadata)
+            supports_multiattach, network_metadata, volumes=volumes)
+
+        LOG.debug('Create dependency timings: image %(image).3fs, networks '
+                  '%(networks).3fs, volumes %(volumes)s',
+                  {'image': image_call.elapsed or 0,
+                   'networks': networks_call.elapsed or 0,
+                   'volumes': ', '.join(
+                       '%s %.3fs' % (volume_id, call.elapsed or 0)
+                       for volume_id, call in volume_calls) or '-'})
 
         instances = []
         request_specs = []
@@ -1404,7 +1475,8 @@ class API(base.Base):
     def _bdm_validate_set_size_and_instance(self, context, instance,
                                             instance_type,
                                             block_device_mapping,
-                                            supports_multiattach=False):
+                                            supports_multiattach=False,
+                                            volumes=None):
         """Ensure the bdms are valid, then set size and associate with instance
 
         Because this method can be called multiple times when more than one
@@ -1414,7 +1486,7 @@ class API(base.Base):
                   instance_uuid=instance.uuid)
         self._validate_bdm(
             context, instance, instance_type, block_device_mapping,
-            supports_multiattach)
+            supports_multiattach, volumes=volumes)
         instance_block_device_mapping = block_device_mapping.obj_clone()
         for bdm in instance_block_device_mapping:
             bdm.volume_size = self._volume_size(instance_type, bdm)
@@ -1466,7 +1538,15 @@ class API(base.Base):
             raise exception.VolumeTypeSupportNotYetAvailable()
 
     def _validate_bdm(self, context, instance, instance_type,
-                      block_device_mappings, supports_multiattach=False):
+                      block_device_mappings, supports_multiattach=False,
+                      volumes=None):
+        """Validate the block device mappings of an instance.
+
+        :param volumes: Optional dict, keyed by volume id, of calls started
+            by _create_instance to fetch the volumes from Cinder. A call is
+            only used once, by the first instance validated, since attaching
+            the volume changes its state.
+        """
         # Make sure that the boot indexes make sense.
         # Setting a negative value or None indicates that the device should not
         # be used for booting.
@@ -1531,7 +1611,10 @@ class API(base.Base):
                         "size specified"))
             elif volume_id is not None:
                 try:
-                    volume = self.volume_api.get(context, volume_id)
+                    if volumes and volume_id in volumes:
+                        volume = volumes.pop(volume_id).result()
+                    else:
+                        volume = self.volume_api.get(context, volume_id)
                     self._check_attach_and_reserve_volume(
                         context, volume, instance, bdm, supports_multiattach)
                     bdm.volume_size = volume.get('size')
@@ -1926,6 +2009,8 @@ class API(base.Base):
                                 instance.destroy()
                     else:
                         instance.destroy()
+                    compute_utils.record_instance_usage(context, instance,
+                                                        sign=-1)
             except exception.InstanceNotFound:
                 pass
 
@@ -1982,6 +2067,8 @@ class API(base.Base):
                         with compute_utils.notify_about_instance_delete(
                                 self.notifier, context, instance):
                             instance.destroy()
+                        compute_utils.record_instance_usage(
+                            context, instance, sign=-1)
                     except exception.InstanceNotFound:
                         pass
                     # The instance was deleted or is already gone.
@@ -2055,6 +2142,8 @@ class API(base.Base):
                             if delete_type != 'soft_delete'
                             else 'delete'):
                         instance.destroy()
+                    compute_utils.record_instance_usage(context, instance,
+                                                        sign=-1)
                     LOG.info('Instance deleted and does not have host '
                              'field, its vm_state is %(state)s.',
                              {'state': instance.vm_state},
@@ -2265,8 +2354,15 @@ class API(base.Base):
         # during down cell (desperate) situation.
         im = objects.InstanceMapping.get_by_instance_uuid(context,
                                                           instance.uuid)
+        queued_for_delete = ('queued_for_delete' in im and
+                             im.queued_for_delete)
         im.queued_for_delete = qfd
         im.save()
+        # An instance stops counting towards quota usage once it is queued
+        # for deletion, and counts again if it is restored.
+        if bool(queued_for_delete) != qfd:
+            compute_utils.record_instance_usage(context, instance,
+                                                sign=-1 if qfd else 1)
 
     def _do_delete(self, context, instance, bdms, local=False):
         if local:
@@ -2452,7 +2548,7 @@ class API(base.Base):
 
     def _get_instance_map_or_none(self, context, instance_uuid):
         try:
-            inst_map = objects.InstanceMapping.get_by_instance_uuid(
+            inst_map = objects.InstanceMapping.get_by_instance_uuid_cached(
                     context, instance_uuid)
         except exception.InstanceMappingNotFound:
             # InstanceMapping should always be found generally. This exception
@@ -2602,7 +2698,8 @@ class API(base.Base):
 
     def get_all(self, context, search_opts=None, limit=None, marker=None,
                 expected_attrs=None, sort_keys=None, sort_dirs=None,
-                cell_down_support=False, all_tenants=False):
+                cell_down_support=False, all_tenants=False,
+                columns_to_load=None):
         """Get all instances filtered by one of the given parameters.
 
         If there is no filter and the context is an admin, it will retrieve
@@ -2623,6 +2720,12 @@ class API(base.Base):
                                   down. If False, instances from
                                   unreachable cells will be omitted.
         :param all_tenants: True if the "all_tenants" filter was passed.
+        :param columns_to_load: If not None, the list of instance fields the
+                                caller needs. Only those columns are loaded
+                                from the cell databases, and no table is
+                                joined except for the expected_attrs, which
+                                saves a lot of data transfer when listing
+                                many instances.
 
         """
         if search_opts is None:
@@ -2739,13 +2842,20 @@ class API(base.Base):
         # Only subtract from limit if it is not None
         limit = (limit - len(build_req_instances)) if limit else limit
 
-        # We could arguably avoid joining on security_groups if we're using
-        # neutron (which is the default) but if you're using neutron then the
-        # security_group_instance_association table should be empty anyway
-        # and the DB should optimize out that join, making it insignificant.
-        fields = ['metadata', 'info_cache', 'security_groups']
-        if expected_attrs:
-            fields.extend(expected_attrs)
+        if columns_to_load is not None:
+            fields = list(expected_attrs or [])
+            if filter_ip and 'info_cache' not in fields:
+                # The IP filter below needs the network info of the instances.
+                fields.append('info_cache')
+        else:
+            # We could arguably avoid joining on security_groups if we're
+            # using neutron (which is the default) but if you're using
+            # neutron then the security_group_instance_association table
+            # should be empty anyway and the DB should optimize out that
+            # join, making it insignificant.
+            fields = ['metadata', 'info_cache', 'security_groups']
+            if expected_attrs:
+                fields.extend(expected_attrs)
 
         if CONF.cells.enable:
             insts = self._do_old_style_instance_list_for_poor_cellsv1_users(
@@ -2754,7 +2864,8 @@ class API(base.Base):
         else:
             insts, down_cell_uuids = instance_list.get_instance_objects_sorted(
                 context, filters, limit, marker, fields, sort_keys, sort_dirs,
-                cell_down_support=cell_down_support)
+                cell_down_support=cell_down_support,
+                columns_to_load=columns_to_load)
 
         def _get_unique_filter_method():
             seen_uuids = set()
@@ -3485,9 +3596,11 @@ class API(base.Base):
         migration = objects.Migration.get_by_instance_and_status(
             elevated, instance.uuid, 'finished')
 
-        # If this is a resize down, a revert might go over quota.
-        self._check_quota_for_upsize(context, instance, instance.flavor,
-                                     instance.old_flavor)
+        # If this is a resize down, a revert might go over quota. The usage
+        # counters already count the larger of the old and new flavors.
+        if not CONF.quota.usage_counters:
+            self._check_quota_for_upsize(context, instance, instance.flavor,
+                                         instance.old_flavor)
 
         # The AZ for the server may have changed when it was migrated so while
         # we are in the API and have access to the API DB, update the
@@ -3514,6 +3627,7 @@ class API(base.Base):
 
         instance.task_state = task_states.RESIZE_REVERTING
         instance.save(expected_task_state=[None])
+        compute_utils.record_reverted_resize_usage(context, instance)
 
         migration.status = 'reverting'
         migration.save()
@@ -3554,6 +3668,10 @@ class API(base.Base):
                                            instance,
                                            migration,
                                            migration.source_compute)
+        # NOTE: When the resize is confirmed by the compute service once
+        # [DEFAULT]/resize_confirm_window expires, the usage counters keep
+        # counting the old flavor of a resize down until they are reconciled.
+        compute_utils.record_confirmed_resize_usage(context, instance)
 
     @staticmethod
     def _resize_cells_support(context, instance,
@@ -3666,6 +3784,8 @@ class API(base.Base):
         instance.progress = 0
         instance.update(extra_instance_updates)
         instance.save(expected_task_state=[None])
+        compute_utils.record_resize_usage(context, instance,
+                                          new_instance_type)
 
         if self.cell_type == 'api':
             # Create migration record.
@@ -5118,7 +5238,10 @@ class HostAPI(base.Base):
         if all_cells:
             services = []
             service_dict = nova_context.scatter_gather_all_cells(context,
-                objects.ServiceList.get_all, disabled, set_zones=set_zones)
+                nova_context.shared_read(
+                    objects.ServiceList.get_all,
+                    cache_time=CONF.api.service_list_cache_time),
+                disabled, set_zones=set_zones)
             for cell_uuid, service in service_dict.items():
                 if not nova_context.is_cell_failure_sentinel(service):
                     services.extend(service)
@@ -12,6 +12,7 @@
 
 import copy
 
+from nova import cache_utils
 from nova.compute import multi_cell_list
 import nova.conf
 from nova import context
@@ -23,6 +24,10 @@ from nova.objects import instance as instance_obj
 
 CONF = nova.conf.CONF
 
+# The cache of the page cursors, see the [api]/instance_list_cursor_cache_time
+# option.
+_CURSOR_CACHE = None
+
 
 class InstanceSortContext(multi_cell_list.RecordSortContext):
     def __init__(self, sort_keys, sort_dirs):
@@ -45,6 +50,8 @@ class InstanceSortContext(multi_cell_list.RecordSortContext):
 
 
 class InstanceLister(multi_cell_list.CrossCellLister):
+    keyset_pagination = True
+
     def __init__(self, sort_keys, sort_dirs, cells=None, batch_size=None):
         super(InstanceLister, self).__init__(
             InstanceSortContext(sort_keys, sort_dirs), cells=cells,
@@ -86,18 +93,75 @@ class InstanceLister(multi_cell_list.CrossCellLister):
             sort_dirs=self.sort_ctx.sort_dirs,
             **kwargs)
 
+    def get_by_sort_values(self, ctx, filters, limit, values, **kwargs):
+        return db.instance_get_all_by_filters_sort(
+            ctx, filters, limit=limit,
+            sort_keys=self.sort_ctx.sort_keys,
+            sort_dirs=self.sort_ctx.sort_dirs,
+            marker_values=dict(zip(self.sort_ctx.sort_keys, values)),
+            **kwargs)
+
+
+def _get_cursor_cache():
+    global _CURSOR_CACHE
+    if _CURSOR_CACHE is None:
+        _CURSOR_CACHE = cache_utils.get_client(
+            expiration_time=CONF.api.instance_list_cursor_cache_time)
+    return _CURSOR_CACHE
+
+
+def _cursor_cache_key(ctx, marker):
+    # NOTE: The cursors are scoped to the project so that a marker which
+    # could not be looked up by a user never gets resolved from the cache.
+    return 'instance-list-cursor-%s-%s' % (ctx.project_id, marker)
+
+
+def get_page_cursor(ctx, marker):
+    """Returns the PageCursor of the page ending with the marker, or None."""
+    if not marker or not CONF.api.instance_list_cursor_cache_time:
+        return None
+    encoded = _get_cursor_cache().get(_cursor_cache_key(ctx, marker))
+    if encoded is None:
+        return None
+    return multi_cell_list.PageCursor.decode(encoded)
+
+
+def save_page_cursor(ctx, lister, last_uuid):
+    """Stores the cursor following the records listed by the lister.
+
+    :param ctx: the RequestContext of the listing
+    :param lister: the InstanceLister which listed the page
+    :param last_uuid: the uuid of the last instance of the page, which is
+                      the marker of the next page
+    """
+    if not CONF.api.instance_list_cursor_cache_time:
+        return
+    cursor = lister.get_next_cursor()
+    if cursor is not None:
+        _get_cursor_cache().set(_cursor_cache_key(ctx, last_uuid),
+                                cursor.encode())
+
 
 # NOTE(danms): These methods are here for legacy glue reasons. We should not
 # replicate these for every data type we implement.
 def get_instances_sorted(ctx, filters, limit, marker, columns_to_join,
                          sort_keys, sort_dirs, cell_mappings=None,
-                         batch_size=None, cell_down_support=False):
+                         batch_size=None, cell_down_support=False,
+                         columns_to_load=None, cursor=None):
     instance_lister = InstanceLister(sort_keys, sort_dirs,
                                      cells=cell_mappings,
                                      batch_size=batch_size)
+    kwargs = {}
+    if cursor is not None:
+        kwargs['cursor'] = cursor
+    if columns_to_load is not None:
+        # The records are merge sorted across cells on the sort keys, so
+        # those columns are always needed.
+        kwargs['columns_to_load'] = sorted(
+            set(columns_to_load) | set(instance_lister.sort_ctx.sort_keys))
     instance_generator = instance_lister.get_records_sorted(
         ctx, filters, limit, marker, columns_to_join=columns_to_join,
-        cell_down_support=cell_down_support)
+        cell_down_support=cell_down_support, **kwargs)
     return instance_lister, instance_generator
 
 
@@ -129,11 +193,12 @@ def get_instance_list_cells_batch_size(limit, cells):
 
     # We never query a larger batch than the total requested, and never
     # smaller than the lower limit of 100.
-    return max(min(batch_size, limit), 100)
+    return max(min(batch_size, limit), multi_cell_list.MIN_BATCH_SIZE)
 
 
 def get_instance_objects_sorted(ctx, filters, limit, marker, expected_attrs,
-                                sort_keys, sort_dirs, cell_down_support=False):
+                                sort_keys, sort_dirs, cell_down_support=False,
+                                columns_to_load=None):
     """Return a list of instances and information about down cells.
 
     This returns a tuple of (objects.InstanceList, list(of down cell
@@ -142,6 +207,10 @@ def get_instance_objects_sorted(ctx, filters, limit, marker, expected_attrs,
     of any cells that did not respond (or raised an error) are included
     in the list as the second element of the tuple. That list is empty
     if all cells responded.
+
+    If columns_to_load is not None, only those columns of the instances are
+    loaded from the cell databases and the other fields of the returned
+    instances are left unset.
     """
     query_cell_subset = CONF.api.instance_list_per_project_cells
     # NOTE(danms): Replicated in part from instance_get_all_by_sort_filters(),
@@ -160,10 +229,12 @@ def get_instance_objects_sorted(ctx, filters, limit, marker, expected_attrs,
     batch_size = get_instance_list_cells_batch_size(limit, cell_mappings)
 
     columns_to_join = instance_obj._expected_cols(expected_attrs)
+    cursor = get_page_cursor(ctx, marker)
     instance_lister, instance_generator = get_instances_sorted(ctx, filters,
         limit, marker, columns_to_join, sort_keys, sort_dirs,
         cell_mappings=cell_mappings, batch_size=batch_size,
-        cell_down_support=cell_down_support)
+        cell_down_support=cell_down_support, columns_to_load=columns_to_load,
+        cursor=cursor)
 
     if 'fault' in expected_attrs:
         # We join fault above, so we need to make sure we don't ask
@@ -172,7 +243,10 @@ def get_instance_objects_sorted(ctx, filters, limit, marker, expected_attrs,
         expected_attrs.remove('fault')
 
     instance_list = instance_obj._make_instance_list(ctx,
-        objects.InstanceList(), instance_generator, expected_attrs)
+        objects.InstanceList(), instance_generator, expected_attrs,
+        loaded_columns=columns_to_load)
+    if instance_list:
+        save_page_cursor(ctx, instance_lister, instance_list[-1].uuid)
     down_cell_uuids = (instance_lister.cells_failed +
                        instance_lister.cells_timed_out)
     return instance_list, down_cell_uuids
@@ -59,6 +59,7 @@ from nova.cells import rpcapi as cells_rpcapi
 from nova import compute
 from nova.compute import build_results
 from nova.compute import claims
+from nova.compute import periodic
 from nova.compute import power_state
 from nova.compute import resource_tracker
 from nova.compute import rpcapi as compute_rpcapi
@@ -102,6 +103,13 @@ CONF = nova.conf.CONF
 
 LOG = logging.getLogger(__name__)
 
+# vm_states in which an instance with no task_state and a power state
+# matching the hypervisor needs no recovery when the service starts.
+_INIT_HOST_STEADY_VM_STATES = (vm_states.ACTIVE, vm_states.STOPPED,
+                               vm_states.PAUSED, vm_states.SUSPENDED,
+                               vm_states.RESCUED, vm_states.RESIZED,
+                               vm_states.SHELVED)
+
 get_notifier = functools.partial(rpc.get_notifier, service='compute')
 wrap_exception = functools.partial(exception_wrapper.wrap_exception,
                                    get_notifier=get_notifier,
@@ -531,6 +539,13 @@ class ComputeManager(manager.Manager):
         # This is a dict, keyed by instance uuid, to a two-item tuple of
         # migration object and Future for the queued live migration.
         self._waiting_live_migrations = {}
+        # This is the set of Futures of the live migrations submitted to the
+        # executor which have not completed yet, queued or running.
+        self._live_migration_futures = set()
+        # This is a dict, keyed by instance uuid, to the power state reported
+        # by the driver for steady instances whose initialization is deferred
+        # until the service has started.
+        self._deferred_init_instances = {}
 
         super(ComputeManager, self).__init__(service_name="compute",
                                              *args, **kwargs)
@@ -543,6 +558,24 @@ class ComputeManager(manager.Manager):
                             self.driver.need_legacy_block_device_info
         self.rt = resource_tracker.ResourceTracker(self.host, self.driver)
         self.reportclient = self.rt.reportclient
+        self._periodic_runner = periodic.PeriodicTaskRunner(
+            self, is_busy=self._is_busy_for_periodic_tasks)
+
+    def periodic_tasks(self, context, raise_on_error=False):
+        """Tasks to be run at a periodic interval."""
+        return self._periodic_runner.run(context,
+                                         raise_on_error=raise_on_error)
+
+    def _is_busy_for_periodic_tasks(self):
+        """Returns True if deferrable periodic tasks should be postponed."""
+        threshold = CONF.compute.periodic_task_busy_threshold
+        if not threshold:
+            return False
+        in_progress = len(self._live_migration_futures)
+        if CONF.max_concurrent_builds:
+            in_progress += (CONF.max_concurrent_builds -
+                            self._build_semaphore.balance)
+        return in_progress >= threshold
 
     def reset(self):
         LOG.info('Reloading compute RPC API')
@@ -956,20 +989,7 @@ class ComputeManager(manager.Manager):
             return
 
         net_info = instance.get_network_info()
-        try:
-            self.driver.plug_vifs(instance, net_info)
-        except NotImplementedError as e:
-            LOG.debug(e, instance=instance)
-        except exception.VirtualInterfacePlugException:
-            # NOTE(mriedem): If we get here, it could be because the vif_type
-            # in the cache is "binding_failed" or "unbound".
-            # The periodic task _heal_instance_info_cache checks for this
-            # condition. It should fix this by binding the ports again when
-            # it gets to this instance.
-            LOG.exception('Virtual interface plugging failed for instance. '
-                          'The port binding:host_id may need to be manually '
-                          'updated.', instance=instance)
-            self._set_instance_obj_error_state(context, instance)
+        if not self._init_instance_vifs(context, instance, net_info):
             return
 
         if instance.task_state == task_states.RESIZE_MIGRATING:
@@ -1015,13 +1035,124 @@ class ComputeManager(manager.Manager):
         if expect_running and CONF.resume_guests_state_on_host_boot:
             self._resume_guests_state(context, instance, net_info)
         elif drv_state == power_state.RUNNING:
-            # VMwareAPI drivers will raise an exception
+            self._init_instance_filtering_rules(instance, net_info)
+
+    def _init_instance_vifs(self, context, instance, net_info):
+        """Plug the VIFs of an instance during service init.
+
+        :returns: False if plugging failed and the instance was put into
+                  ERROR state, True otherwise
+        """
+        try:
+            self.driver.plug_vifs(instance, net_info)
+        except NotImplementedError as e:
+            LOG.debug(e, instance=instance)
+        except exception.VirtualInterfacePlugException:
+            # NOTE(mriedem): If we get here, it could be because the vif_type
+            # in the cache is "binding_failed" or "unbound".
+            # The periodic task _heal_instance_info_cache checks for this
+            # condition. It should fix this by binding the ports again when
+            # it gets to this instance.
+            LOG.exception('Virtual interface plugging failed for instance. '
+                          'The port binding:host_id may need to be manually '
+                          'updated.', instance=instance)
+            self._set_instance_obj_error_state(context, instance)
+            return False
+        return True
+
+    def _init_instance_filtering_rules(self, instance, net_info):
+        # VMwareAPI drivers will raise an exception
+        try:
+            self.driver.ensure_filtering_rules_for_instance(
+                                   instance, net_info)
+        except NotImplementedError:
+            LOG.debug('Hypervisor driver does not support '
+                      'firewall rules', instance=instance)
+
+    def _is_instance_steady_on_init(self, instance, drv_state):
+        """Returns True if the instance needs no recovery action on init.
+
+        An instance is steady if it is owned by this host, is not in the
+        middle of any operation and the hypervisor agrees with the power
+        state recorded in the database.
+        """
+        return (instance.host == self.host and
+                instance.task_state is None and
+                instance.vm_state in _INIT_HOST_STEADY_VM_STATES and
+                drv_state == instance.power_state)
+
+    def _init_instances_concurrently(self, context, instances):
+        """Initialize instances during service init using a bounded pool.
+
+        The power state of every instance is fetched with a single bulk
+        driver query. Steady instances (see _is_instance_steady_on_init) are
+        remembered and only have their VIFs plugged and filtering rules
+        ensured once the service has started, see post_start_hook. Every
+        other instance goes through _init_instance on a pool of
+        [compute]/init_host_workers greenthreads.
+        """
+        drv_states = self.driver.get_power_states(instances)
+        pool = eventlet.GreenPool(size=CONF.compute.init_host_workers)
+        deferred = {}
+        for instance in instances:
+            drv_state = drv_states.get(instance.uuid, power_state.NOSTATE)
+            if self._is_instance_steady_on_init(instance, drv_state):
+                deferred[instance.uuid] = drv_state
+            else:
+                pool.spawn_n(self._init_instance_safe, context, instance)
+        pool.waitall()
+        LOG.info('Initialized %(active)d instances in a transitional state, '
+                 'deferring initialization of %(deferred)d steady instances.',
+                 {'active': len(instances) - len(deferred),
+                  'deferred': len(deferred)})
+        self._deferred_init_instances = deferred
+
+    def _init_instance_safe(self, context, instance):
+        try:
+            self._init_instance(context, instance)
+        except Exception:
+            # we don't want that an exception blocks the init_host
+            LOG.exception('Failed to initialize instance', instance=instance)
+
+    def _init_deferred_instances(self, context):
+        """Finish the initialization of steady instances in the background.
+
+        The instances are reloaded in a single query since their state may
+        have changed while the service was already consuming RPC messages;
+        anything that is no longer steady is left alone.
+        """
+        deferred = self._deferred_init_instances
+        self._deferred_init_instances = {}
+        instances = objects.InstanceList.get_by_filters(
+            context, {'uuid': list(deferred), 'host': self.host,
+                      'deleted': False},
+            expected_attrs=['info_cache', 'metadata'])
+
+        def _init_steady_instance(instance):
+            drv_state = deferred[instance.uuid]
+            if not self._is_instance_steady_on_init(instance, drv_state):
+                return
             try:
-                self.driver.ensure_filtering_rules_for_instance(
-                                       instance, net_info)
-            except NotImplementedError:
-                LOG.debug('Hypervisor driver does not support '
-                          'firewall rules', instance=instance)
+                net_info = instance.get_network_info()
+                if (self._init_instance_vifs(context, instance, net_info) and
+                        drv_state == power_state.RUNNING):
+                    self._init_instance_filtering_rules(instance, net_info)
+            except Exception:
+                LOG.exception('Failed to initialize instance',
+                              instance=instance)
+
+        if CONF.defer_iptables_apply:
+            self.driver.filter_defer_apply_on()
+        try:
+            pool = eventlet.GreenPool(size=CONF.compute.init_host_workers)
+            for instance in instances:
+                pool.spawn_n(_init_steady_instance, instance)
+            pool.waitall()
+        finally:
+            if CONF.defer_iptables_apply:
+                self.driver.filter_defer_apply_off()
+        LOG.info('Finished deferred initialization of %d steady instances.',
+                 len(instances))
 
     def _resume_guests_state(self, context, instance, net_info):
         LOG.info('Rebooting instance after nova-compute restart.',
@@ -1213,9 +1344,14 @@ class ComputeManager(manager.Manager):
             evacuated_instances = self._destroy_evacuated_instances(context)
 
             # Initialise instances on the host that are not evacuating
-            for instance in instances:
+            instances_to_init = [
+                instance for instance in instances
                 if (not evacuated_instances or
-                        instance.uuid not in evacuated_instances):
+                    instance.uuid not in evacuated_instances)]
+            if CONF.compute.init_host_workers > 1 and instances_to_init:
+                self._init_instances_concurrently(context, instances_to_init)
+            else:
+                for instance in instances_to_init:
                     self._init_instance(context, instance)
 
         finally:
@@ -1263,6 +1399,14 @@ class ComputeManager(manager.Manager):
         self.update_available_resource(nova.context.get_admin_context(),
                                        startup=True)
 
+    def post_start_hook(self):
+        """After the service has started consuming RPC messages, finish the
+        initialization of any steady instances deferred by init_host.
+        """
+        if self._deferred_init_instances:
+            utils.spawn_n(self._init_deferred_instances,
+                          nova.context.get_admin_context())
+
     def _get_power_state(self, context, instance):
         """Retrieve the power state for the given instance."""
         LOG.debug('Checking state', instance=instance)
@@ -1757,6 +1901,7 @@ class ComputeManager(manager.Manager):
         self.query_client.delete_instance_info(context, self.host,
                                                instance_uuid)
 
+    @periodic.task_options(io_bound=True)
     @periodic_task.periodic_task(spacing=CONF.scheduler_instance_sync_interval)
     def _sync_scheduler_instance_info(self, context):
         if not self.send_instance_updates:
@@ -2195,7 +2340,11 @@ class ComputeManager(manager.Manager):
         try:
             scheduler_hints = self._get_scheduler_hints(filter_properties,
                                                         request_spec)
-            with self.rt.instance_claim(context, instance, node, limits):
+            # NOTE: The claim saves the host of the instance under the
+            # resource semaphore, coalescing only starts once it is done.
+            with self.rt.instance_claim(context, instance, node, limits), \
+                    instance.coalesce_saves(
+                        enabled=CONF.compute.coalesce_instance_saves):
                 # NOTE(russellb) It's important that this validation be done
                 # *after* the resource tracker instance claim, as that is where
                 # the host is set on the instance.
@@ -4452,7 +4601,9 @@ class ComputeManager(manager.Manager):
     def _resize_instance(self, context, instance, image,
                          migration, instance_type, clean_shutdown):
         with self._error_out_instance_on_exception(context, instance), \
-             errors_out_migration_ctxt(migration):
+             errors_out_migration_ctxt(migration), \
+             instance.coalesce_saves(
+                 enabled=CONF.compute.coalesce_instance_saves):
             network_info = self.network_api.get_instance_nw_info(context,
                                                                  instance)
 
@@ -4712,7 +4863,9 @@ class ComputeManager(manager.Manager):
         bdms = objects.BlockDeviceMappingList.get_by_instance_uuid(
             context, instance.uuid)
 
-        with self._error_out_instance_on_exception(context, instance):
+        with self._error_out_instance_on_exception(context, instance), \
+             instance.coalesce_saves(
+                 enabled=CONF.compute.coalesce_instance_saves):
             image_meta = objects.ImageMeta.from_dict(image)
             network_info = self._finish_resize(context, instance, migration,
                                                disk_info, image_meta, bdms)
@@ -6571,6 +6724,8 @@ class ComputeManager(manager.Manager):
                 self._do_live_migration, context, dest, instance,
                 block_migration, migration, migrate_data)
             self._waiting_live_migrations[instance.uuid] = (migration, future)
+            self._live_migration_futures.add(future)
+            future.add_done_callback(self._live_migration_futures.discard)
         except RuntimeError:
             # GreenThreadPoolExecutor.submit will raise RuntimeError if the
             # pool is shutdown, which happens in
@@ -7196,6 +7351,7 @@ class ComputeManager(manager.Manager):
                 return True
         return False
 
+    @periodic.task_options(io_bound=True, deferrable=True)
     @periodic_task.periodic_task(
         spacing=CONF.heal_instance_info_cache_interval)
     def _heal_instance_info_cache(self, context):
@@ -7456,6 +7612,7 @@ class ComputeManager(manager.Manager):
                 LOG.exception('Periodic task failed to offload instance.',
                               instance=instance)
 
+    @periodic.task_options(deferrable=True)
     @periodic_task.periodic_task
     def _instance_usage_audit(self, context):
         if not CONF.instance_usage_audit:
@@ -7508,6 +7665,7 @@ class ComputeManager(manager.Manager):
             % (self.host, num_instances, time.time() - start_time))
         task_log.end_task()
 
+    @periodic.task_options(io_bound=True, deferrable=True)
     @periodic_task.periodic_task(spacing=CONF.bandwidth_poll_interval)
     def _poll_bandwidth_usage(self, context):
 
@@ -7548,26 +7706,29 @@ class ComputeManager(manager.Manager):
                 return
 
             refreshed = timeutils.utcnow()
+            instance_uuids = list(set(bw_ctr['uuid']
+                                      for bw_ctr in bw_counters))
+            curr_usages = self._get_bw_usages_by_uuid_and_mac(
+                context, instance_uuids, start_time)
+            prev_usages = None
+            usages = []
             for bw_ctr in bw_counters:
-                # Allow switching of greenthreads between queries.
-                greenthread.sleep(0)
                 bw_in = 0
                 bw_out = 0
                 last_ctr_in = None
                 last_ctr_out = None
-                usage = objects.BandwidthUsage.get_by_instance_uuid_and_mac(
-                    context, bw_ctr['uuid'], bw_ctr['mac_address'],
-                    start_period=start_time, use_slave=True)
+                key = (bw_ctr['uuid'], bw_ctr['mac_address'])
+                usage = curr_usages.get(key)
                 if usage:
                     bw_in = usage.bw_in
                     bw_out = usage.bw_out
                     last_ctr_in = usage.last_ctr_in
                     last_ctr_out = usage.last_ctr_out
                 else:
-                    usage = (objects.BandwidthUsage.
-                             get_by_instance_uuid_and_mac(
-                        context, bw_ctr['uuid'], bw_ctr['mac_address'],
-                        start_period=prev_time, use_slave=True))
+                    if prev_usages is None:
+                        prev_usages = self._get_bw_usages_by_uuid_and_mac(
+                            context, instance_uuids, prev_time)
+                    usage = prev_usages.get(key)
                     if usage:
                         last_ctr_in = usage.last_ctr_in
                         last_ctr_out = usage.last_ctr_out
@@ -7586,16 +7747,29 @@ class ComputeManager(manager.Manager):
                     else:
                         bw_out += (bw_ctr['bw_out'] - last_ctr_out)
 
-                objects.BandwidthUsage(context=context).create(
-                                              bw_ctr['uuid'],
-                                              bw_ctr['mac_address'],
-                                              bw_in,
-                                              bw_out,
-                                              bw_ctr['bw_in'],
-                                              bw_ctr['bw_out'],
-                                              start_period=start_time,
-                                              last_refreshed=refreshed,
-                                              update_cells=update_cells)
+                usages.append({'uuid': bw_ctr['uuid'],
+                               'mac': bw_ctr['mac_address'],
+                               'bw_in': bw_in,
+                               'bw_out': bw_out,
+                               'last_ctr_in': bw_ctr['bw_in'],
+                               'last_ctr_out': bw_ctr['bw_out']})
+
+            if usages:
+                objects.BandwidthUsageList.create_bulk(
+                    context, usages, start_period=start_time,
+                    last_refreshed=refreshed, update_cells=update_cells)
+
+    @staticmethod
+    def _get_bw_usages_by_uuid_and_mac(context, instance_uuids, start_period):
+        """Returns a dict, keyed by (instance uuid, mac), of BandwidthUsage
+        objects for the given audit period.
+        """
+        usages = {}
+        for usage in objects.BandwidthUsageList.get_by_uuids(
+                context, instance_uuids, start_period=start_period,
+                use_slave=True):
+            usages.setdefault((usage.instance_uuid, usage.mac), usage)
+        return usages
 
     def _get_host_volume_bdms(self, context, use_slave=False):
         """Return all block device mappings on a compute host."""
@@ -7613,24 +7787,29 @@ class ComputeManager(manager.Manager):
 
     def _update_volume_usage_cache(self, context, vol_usages):
         """Updates the volume usage cache table with a list of stats."""
+        if not vol_usages:
+            return
+        usages = []
         for usage in vol_usages:
-            # Allow switching of greenthreads between queries.
+            instance = usage['instance']
+            usages.append({'volume_id': usage['volume'],
+                           'instance_uuid': instance.uuid,
+                           'project_id': instance.project_id,
+                           'user_id': instance.user_id,
+                           'availability_zone': instance.availability_zone,
+                           'curr_reads': usage['rd_req'],
+                           'curr_read_bytes': usage['rd_bytes'],
+                           'curr_writes': usage['wr_req'],
+                           'curr_write_bytes': usage['wr_bytes']})
+        for vol_usage in objects.VolumeUsageList.update_bulk(context,
+                                                             usages):
+            # Allow switching of greenthreads between notifications.
             greenthread.sleep(0)
-            vol_usage = objects.VolumeUsage(context)
-            vol_usage.volume_id = usage['volume']
-            vol_usage.instance_uuid = usage['instance'].uuid
-            vol_usage.project_id = usage['instance'].project_id
-            vol_usage.user_id = usage['instance'].user_id
-            vol_usage.availability_zone = usage['instance'].availability_zone
-            vol_usage.curr_reads = usage['rd_req']
-            vol_usage.curr_read_bytes = usage['rd_bytes']
-            vol_usage.curr_writes = usage['wr_req']
-            vol_usage.curr_write_bytes = usage['wr_bytes']
-            vol_usage.save()
             self.notifier.info(context, 'volume.usage', vol_usage.to_dict())
             compute_utils.notify_about_volume_usage(context, vol_usage,
                                                     self.host)
 
+    @periodic.task_options(io_bound=True, deferrable=True)
     @periodic_task.periodic_task(spacing=CONF.volume_usage_poll_interval)
     def _poll_volume_usage(self, context):
         if CONF.volume_usage_poll_interval == 0:
@@ -7650,6 +7829,7 @@ class ComputeManager(manager.Manager):
 
         self._update_volume_usage_cache(context, vol_usages)
 
+    @periodic.task_options(deferrable=True)
     @periodic_task.periodic_task(spacing=CONF.sync_power_state_interval,
                                  run_immediately=True)
     def _sync_power_states(self, context):
@@ -8038,6 +8218,7 @@ class ComputeManager(manager.Manager):
                 LOG.error("No compute node record for host %s", self.host)
             return []
 
+    @periodic.task_options(deferrable=True)
     @periodic_task.periodic_task(
         spacing=CONF.running_deleted_instance_poll_interval)
     def _cleanup_running_deleted_instances(self, context):
@@ -8346,6 +8527,7 @@ class ComputeManager(manager.Manager):
             else:
                 self._process_instance_event(instance, event)
 
+    @periodic.task_options(io_bound=True, deferrable=True)
     @periodic_task.periodic_task(spacing=CONF.image_cache_manager_interval,
                                  external_process_ok=True)
     def _run_image_cache_manager_pass(self, context):
@@ -8371,6 +8553,7 @@ class ComputeManager(manager.Manager):
 
         self.driver.manage_image_cache(context, filtered_instances)
 
+    @periodic.task_options(deferrable=True)
     @periodic_task.periodic_task(spacing=CONF.instance_delete_interval)
     def _run_pending_deletes(self, context):
         """Retry any pending instance file deletes."""
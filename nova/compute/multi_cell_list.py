@@ -11,6 +11,8 @@
 #    under the License.
 
 import abc
+import base64
+import collections
 import copy
 import heapq
 
@@ -18,6 +20,7 @@ import eventlet
 import six
 
 from oslo_log import log as logging
+from oslo_serialization import msgpackutils
 
 import nova.conf
 from nova import context
@@ -28,6 +31,10 @@ LOG = logging.getLogger(__name__)
 
 CONF = nova.conf.CONF
 
+# The smallest batch requested from a cell, see the
+# [api]/instance_list_cells_batch_strategy option.
+MIN_BATCH_SIZE = 100
+
 
 class RecordSortContext(object):
     def __init__(self, sort_keys, sort_dirs):
@@ -49,6 +56,47 @@ class RecordSortContext(object):
         return 0
 
 
+class PageCursor(object):
+    """A keyset cursor on a page of a cross-cell listing.
+
+    This records the values of the sort keys of the last record of a page
+    and how many records each cell contributed to the page. The next page
+    can then be listed by seeking past those values in every cell, without
+    looking up the marker record, and the batch requested from each cell can
+    be sized after what it contributed to the previous page.
+
+    The cursor is opaque to its users, who store and pass around its
+    encoded form.
+    """
+    def __init__(self, sort_keys, sort_dirs, values, cell_counts=None):
+        self.sort_keys = list(sort_keys)
+        self.sort_dirs = list(sort_dirs)
+        self.values = list(values)
+        self.cell_counts = dict(cell_counts or {})
+
+    def matches(self, sort_ctx):
+        """Returns True if the cursor was built for the given sort order."""
+        return (self.sort_keys == list(sort_ctx.sort_keys) and
+                self.sort_dirs == list(sort_ctx.sort_dirs))
+
+    def encode(self):
+        return base64.urlsafe_b64encode(msgpackutils.dumps(
+            [self.sort_keys, self.sort_dirs, self.values,
+             self.cell_counts])).decode('ascii')
+
+    @classmethod
+    def decode(cls, encoded):
+        """Returns the cursor encoded by encode(), or None if it is invalid.
+        """
+        try:
+            sort_keys, sort_dirs, values, cell_counts = msgpackutils.loads(
+                base64.urlsafe_b64decode(encoded.encode('ascii')))
+        except Exception:
+            LOG.debug('Ignoring invalid page cursor %s', encoded)
+            return None
+        return cls(sort_keys, sort_dirs, values, cell_counts)
+
+
 class RecordWrapper(object):
     """Wrap a DB object from the database so it is sortable.
 
@@ -86,6 +134,14 @@ class RecordWrapper(object):
         return r == -1
 
 
+class _SkippedCellRecord(RecordWrapper):
+    """The did_not_respond_sentinel of a cell which was not queried."""
+    def __init__(self, cell_uuid):
+        self.cell_uuid = cell_uuid
+        self._sort_ctx = None
+        self._db_record = context.did_not_respond_sentinel
+
+
 def query_wrapper(ctx, fn, *args, **kwargs):
     """This is a helper to run a query with predictable fail semantics.
 
@@ -96,11 +152,19 @@ def query_wrapper(ctx, fn, *args, **kwargs):
     be handled by the main get_objects_sorted() feeder loop quickly and
     gracefully.
     """
+    responded = False
     with eventlet.timeout.Timeout(context.CELL_TIMEOUT, exception.CellTimeout):
         try:
             for record in fn(ctx, *args, **kwargs):
+                # NOTE: The caller stops reading the records once it has
+                # enough of them, so the cell is known to be responding as
+                # soon as it returns its first one.
+                if not responded:
+                    responded = True
+                    context.CELL_BREAKER.record_response(ctx.cell_uuid)
                 yield record
         except exception.CellTimeout:
+            context.CELL_BREAKER.record_timeout(ctx.cell_uuid)
             # Here, we yield a RecordWrapper (no sort_ctx needed since
             # we won't call into the implementation's comparison routines)
             # wrapping the sentinel indicating timeout.
@@ -112,6 +176,8 @@ def query_wrapper(ctx, fn, *args, **kwargs):
             # wrapping the exception object indicating failure.
             yield RecordWrapper(ctx, None, e.__class__(e.args))
             return
+    if not responded:
+        context.CELL_BREAKER.record_response(ctx.cell_uuid)
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -125,6 +191,10 @@ class CrossCellLister(object):
     your data type from cell databases.
 
     """
+    # Whether get_by_sort_values() is implemented, in which case the records
+    # following a batch or a PageCursor are listed by value.
+    keyset_pagination = False
+
     def __init__(self, sort_ctx, cells=None, batch_size=None):
         self.sort_ctx = sort_ctx
         self.cells = cells
@@ -132,6 +202,8 @@ class CrossCellLister(object):
         self._cells_responded = set()
         self._cells_failed = set()
         self._cells_timed_out = set()
+        self._cell_counts = collections.Counter()
+        self._last_record = None
 
     @property
     def cells_responded(self):
@@ -216,6 +288,50 @@ class CrossCellLister(object):
         """
         pass
 
+    def get_by_sort_values(self, ctx, filters, limit, values, **kwargs):
+        """List records by filters, sorted and following the given values.
+
+        This is like get_by_filters() except that the listing starts right
+        after a record whose sort_keys properties would have the given
+        values, which saves looking up a marker record. Listers
+        implementing it must set keyset_pagination to True.
+
+        :param ctx: A RequestContext
+        :param filters: A dict of column=filter items
+        :param limit: A numeric limit on the number of results, or None
+        :param values: The values of the sort_keys properties to start after
+        :returns: A list of records
+        """
+        raise NotImplementedError()
+
+    def get_next_cursor(self):
+        """Returns a PageCursor following the records listed so far.
+
+        This should be called once the generator returned by
+        get_records_sorted() has been consumed. It returns None if no
+        record was listed.
+        """
+        if self._last_record is None:
+            return None
+        return PageCursor(self.sort_ctx.sort_keys, self.sort_ctx.sort_dirs,
+                          [self._last_record[key]
+                           for key in self.sort_ctx.sort_keys],
+                          self._cell_counts)
+
+    def _get_cell_batch_size(self, cell_uuid, limit, cursor):
+        """Returns the size of the batches to request from a cell.
+
+        If a cursor is provided, this is sized after the number of records
+        the cell contributed to the previous page, 10% more than that, so
+        that cells contributing most of the records are queried in fewer
+        round trips and the others do not return many unused records.
+        """
+        batch_size = self.batch_size or limit
+        if cursor is None or not limit or not batch_size:
+            return batch_size
+        count = cursor.cell_counts.get(cell_uuid, 0)
+        return min(max(int(count * 1.10), MIN_BATCH_SIZE), limit)
+
     def get_records_sorted(self, ctx, filters, limit, marker, **kwargs):
         """Get a cross-cell list of records matching filters.
 
@@ -244,11 +360,19 @@ class CrossCellLister(object):
                                   is ignored and if its False, results are
                                   either skipped or erred based on the value of
                                   CONF.api.list_records_by_skipping_down_cells.
+        :param cursor: A PageCursor returned by get_next_cursor() for the
+                       previous page, whose last record is the marker. It is
+                       ignored unless the lister supports keyset pagination
+                       and the sort order matches.
         """
 
         cell_down_support = kwargs.pop('cell_down_support', False)
+        cursor = kwargs.pop('cursor', None)
+        if cursor is not None and not (self.keyset_pagination and
+                                       cursor.matches(self.sort_ctx)):
+            cursor = None
 
-        if marker:
+        if marker and not cursor:
             # A marker identifier was provided from the API. Call this
             # the 'global' marker as it determines where we start the
             # process across all cells. Look up the record in
@@ -285,7 +409,15 @@ class CrossCellLister(object):
 
             marker_id = self.marker_identifier
 
-            if marker:
+            # With keyset pagination, the values of the sort keys of the last
+            # record listed, which the next batch follows.
+            local_values = None
+
+            if cursor:
+                # The cursor holds the values of the sort keys of the
+                # marker, just seek past them in every cell.
+                local_values = cursor.values
+            elif marker:
                 if cctx.cell_uuid == global_marker_cell:
                     local_marker = marker
                 else:
@@ -333,7 +465,8 @@ class CrossCellLister(object):
             # If a batch size was provided, use that as the limit per
             # batch. If not, then ask for the entire $limit in a single
             # batch.
-            batch_size = self.batch_size or limit
+            batch_size = self._get_cell_batch_size(cctx.cell_uuid, limit,
+                                                   cursor)
 
             # Keep track of how many we have returned in all batches
             return_count = 0
@@ -352,15 +485,21 @@ class CrossCellLister(object):
                     query_size = batch_size
 
                 # Get one batch
-                query_result = self.get_by_filters(
-                    cctx, filters,
-                    limit=query_size or None, marker=local_marker,
-                    **kwargs)
+                if local_values is not None:
+                    query_result = self.get_by_sort_values(
+                        cctx, filters, query_size or None, local_values,
+                        **kwargs)
+                else:
+                    query_result = self.get_by_filters(
+                        cctx, filters,
+                        limit=query_size or None, marker=local_marker,
+                        **kwargs)
 
                 # Yield wrapped results from the batch, counting as we go
                 # (to avoid traversing the list to count). Also, update our
                 # local_marker each time so that local_marker is the end of
                 # this batch in order to find the next batch.
+                item = None
                 for item in query_result:
                     local_marker = item[self.marker_identifier]
                     yield RecordWrapper(cctx, self.sort_ctx, item)
@@ -370,6 +509,12 @@ class CrossCellLister(object):
                 if not batch_count:
                     break
 
+                if self.keyset_pagination:
+                    # The next batch follows the last record of this one,
+                    # there is no need to look it up again as a marker.
+                    local_values = [item[key]
+                                    for key in self.sort_ctx.sort_keys]
+
                 return_count += batch_count
                 LOG.debug(('Listed batch of %(batch)i results from cell '
                            'out of %(limit)s limit. Returned %(total)i '
@@ -393,6 +538,12 @@ class CrossCellLister(object):
             results = context.scatter_gather_all_cells(ctx,
                                                        query_wrapper, do_query)
 
+        for cell_uuid, result in results.items():
+            if result is context.did_not_respond_sentinel:
+                # The cell was skipped for not responding, see
+                # context.CellCircuitBreaker, so it has no generator.
+                results[cell_uuid] = iter([_SkippedCellRecord(cell_uuid)])
+
         # If a limit was provided, it was passed to the per-cell query
         # routines.  That means we have NUM_CELLS * limit items across
         # results. So, we need to consume from that limit below and
@@ -439,6 +590,8 @@ class CrossCellLister(object):
                     self._cells_responded.remove(item.cell_uuid)
                 continue
 
+            self._cell_counts[item.cell_uuid] += 1
+            self._last_record = item._db_record
             yield item._db_record
             self._cells_responded.add(item.cell_uuid)
             total_limit -= 1
@@ -0,0 +1,257 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Periodic task execution engine for the compute manager.
+
+This replaces the serial loop of oslo.service's PeriodicTasks for the
+compute manager. It honours the same ``@periodic_task`` declarations and
+adds:
+
+* configurable jitter on the spacing of every task, so that many compute
+  services do not hit the conductor at the same time;
+* deferral of tasks marked as deferrable while the service is busy building
+  or migrating instances;
+* a concurrent lane, backed by a bounded green thread pool, for tasks marked
+  as I/O bound so that they do not delay the others;
+* per task timing statistics which can be dumped to a local file.
+"""
+
+import os
+import random
+
+import eventlet
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+from oslo_service import periodic_task
+from oslo_utils import reflection
+from oslo_utils import timeutils
+
+import nova.conf
+
+
+CONF = nova.conf.CONF
+LOG = logging.getLogger(__name__)
+
+# A deferred task is retried after this fraction of its spacing. A task is
+# never deferred twice in a row.
+_DEFER_FRACTION = 0.1
+
+
+def task_options(io_bound=False, deferrable=False):
+    """Decorator annotating a periodic task for the PeriodicTaskRunner.
+
+    It must be applied on top of ``@periodic_task.periodic_task``.
+
+    :param io_bound: the task mostly waits on external services and may run
+                     in the concurrent lane
+    :param deferrable: the task may be postponed while the compute service
+                       is busy
+    """
+    def decorator(f):
+        f._periodic_io_bound = io_bound
+        f._periodic_deferrable = deferrable
+        return f
+    return decorator
+
+
+class TaskStats(object):
+    """Timing statistics of a single periodic task."""
+
+    def __init__(self):
+        self.runs = 0
+        self.failures = 0
+        self.deferrals = 0
+        self.overruns = 0
+        self.skipped_in_flight = 0
+        self.last_duration = None
+        self.max_duration = 0.0
+        self.total_duration = 0.0
+        self.last_run_at = None
+
+    def record(self, duration, spacing, failed):
+        self.runs += 1
+        if failed:
+            self.failures += 1
+        if duration > spacing:
+            self.overruns += 1
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+        self.total_duration += duration
+        self.last_run_at = timeutils.utcnow().isoformat()
+
+    def to_dict(self):
+        return {
+            'runs': self.runs,
+            'failures': self.failures,
+            'deferrals': self.deferrals,
+            'overruns': self.overruns,
+            'skipped_in_flight': self.skipped_in_flight,
+            'last_duration': self.last_duration,
+            'max_duration': self.max_duration,
+            'average_duration': (self.total_duration / self.runs
+                                 if self.runs else None),
+            'last_run_at': self.last_run_at,
+        }
+
+
+class PeriodicTaskRunner(object):
+    """Runs the periodic tasks declared on a manager.
+
+    :param manager: a nova.manager.Manager whose class declares periodic
+                    tasks
+    :param is_busy: callable returning True when deferrable tasks should be
+                    postponed
+    """
+
+    def __init__(self, manager, is_busy=None):
+        self.manager = manager
+        self.is_busy = is_busy or (lambda: False)
+        self.stats = {}
+        self._in_flight = set()
+        self._deferred = set()
+        workers = CONF.compute.periodic_task_workers
+        self._pool = eventlet.GreenPool(size=workers) if workers else None
+
+    def _next_run(self, last_run, spacing):
+        """Find the nearest boundary in the past and add jitter to it.
+
+        This mirrors oslo.service, except that the amount of jitter is
+        configurable through [compute]/periodic_task_jitter.
+        """
+        current_time = timeutils.now()
+        if last_run is None:
+            return current_time
+        offset = (current_time - last_run) % spacing
+        jitter = spacing * random.random() * CONF.compute.periodic_task_jitter
+        return current_time - offset + jitter
+
+    def _get_stats(self, task_name):
+        return self.stats.setdefault(task_name, TaskStats())
+
+    def _run_task(self, task, task_name, full_task_name, spacing, context,
+                  raise_on_error):
+        # NOTE: A task interrupted by anything which is not an Exception, such
+        # as the GreenletExit of a stopping service, is recorded as failed too
+        # but is not caught.
+        failed = True
+        timer = timeutils.StopWatch()
+        timer.start()
+        try:
+            task(self.manager, context)
+            failed = False
+        except Exception:
+            if raise_on_error:
+                raise
+            LOG.exception("Error during %(full_task_name)s",
+                          {"full_task_name": full_task_name})
+        finally:
+            duration = timer.elapsed()
+            self._get_stats(task_name).record(duration, spacing, failed)
+            self._in_flight.discard(task_name)
+            if duration > spacing:
+                LOG.warning('Periodic task %(task)s took %(duration).2f '
+                            'seconds which is longer than its spacing of '
+                            '%(spacing)d seconds.',
+                            {'task': full_task_name, 'duration': duration,
+                             'spacing': spacing})
+            else:
+                LOG.debug('Periodic task %(task)s took %(duration).2f '
+                          'seconds.',
+                          {'task': full_task_name, 'duration': duration})
+
+    def run(self, context, raise_on_error=False):
+        """Run the periodic tasks which are due.
+
+        :returns: the number of seconds until the next task is due
+        """
+        manager = self.manager
+        cls_name = reflection.get_class_name(manager, fully_qualified=False)
+        idle_for = periodic_task.DEFAULT_INTERVAL
+        busy = None
+        for task_name, task in manager._periodic_tasks:
+            if (task._periodic_external_ok and not
+                    manager.conf.run_external_periodic_tasks):
+                continue
+            full_task_name = '.'.join([cls_name, task_name])
+
+            spacing = manager._periodic_spacing[task_name]
+            last_run = manager._periodic_last_run[task_name]
+
+            # Check if due, if not skip
+            idle_for = min(idle_for, spacing)
+            if last_run is not None:
+                delta = last_run + spacing - timeutils.now()
+                if delta > 0:
+                    idle_for = min(idle_for, delta)
+                    continue
+
+            if task_name in self._in_flight:
+                # The previous run in the concurrent lane has not finished
+                # yet, do not pile up another one behind it.
+                LOG.debug('Periodic task %s is still running, skipping.',
+                          full_task_name)
+                self._get_stats(task_name).skipped_in_flight += 1
+                continue
+
+            if getattr(task, '_periodic_deferrable', False):
+                if task_name in self._deferred:
+                    self._deferred.discard(task_name)
+                else:
+                    if busy is None:
+                        busy = self.is_busy()
+                    if busy:
+                        LOG.debug('Deferring periodic task %s since the '
+                                  'service is busy.', full_task_name)
+                        self._deferred.add(task_name)
+                        self._get_stats(task_name).deferrals += 1
+                        retry = spacing * _DEFER_FRACTION
+                        manager._periodic_last_run[task_name] = (
+                            timeutils.now() - spacing + retry)
+                        idle_for = min(idle_for, retry)
+                        continue
+
+            LOG.debug("Running periodic task %(full_task_name)s",
+                      {"full_task_name": full_task_name})
+            manager._periodic_last_run[task_name] = self._next_run(
+                last_run, spacing)
+
+            if self._pool and getattr(task, '_periodic_io_bound', False):
+                self._in_flight.add(task_name)
+                self._pool.spawn_n(self._run_task, task, task_name,
+                                   full_task_name, spacing, context, False)
+            else:
+                self._run_task(task, task_name, full_task_name, spacing,
+                               context, raise_on_error)
+            eventlet.sleep(0)
+
+        self.dump_stats()
+        return idle_for
+
+    def get_stats(self):
+        """Returns a dict, keyed by task name, of per task statistics."""
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def dump_stats(self):
+        """Write the statistics to [compute]/periodic_task_stats_file."""
+        path = CONF.compute.periodic_task_stats_file
+        if not path:
+            return
+        tmp_path = '%s.tmp' % path
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(jsonutils.dumps(self.get_stats(), indent=2,
+                                        sort_keys=True))
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            LOG.warning('Unable to write periodic task statistics to '
+                        '%(path)s: %(error)s', {'path': path, 'error': e})
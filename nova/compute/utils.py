@@ -1033,6 +1033,112 @@ def get_headroom(quotas, usages, deltas):
     return headroom
 
 
+def _apply_usage_counter_deltas(context, instance, deltas):
+    try:
+        objects.Quotas.apply_usage_deltas(context, instance.project_id,
+                                          instance.user_id, deltas)
+    except Exception:
+        # The counters are corrected by the next reconciliation, so failing
+        # to update them should not fail the operation.
+        LOG.exception('Failed to update the quota usage counters with '
+                      '%s.', deltas, instance=instance)
+
+
+def _counted_usage(flavors):
+    # An instance being resized counts the larger of its old and new flavors
+    # until the resize is confirmed or reverted, the same as the recount in
+    # InstanceList.get_counts_by_user.
+    flavors = [flavor for flavor in flavors if flavor is not None]
+    return {'cores': max(flavor['vcpus'] for flavor in flavors),
+            'ram': max(flavor['memory_mb'] for flavor in flavors)}
+
+
+def _instance_flavors(instance):
+    # The old and new flavors are left behind by a failed resize, so they
+    # only count while the instance is being resized.
+    if (instance.vm_state == vm_states.RESIZED or
+            instance.task_state in task_states.resizing_states):
+        return [instance.flavor, instance.old_flavor, instance.new_flavor]
+    return [instance.flavor]
+
+
+def _record_flavor_change_usage(context, instance, old_flavors, new_flavors):
+    if not CONF.quota.usage_counters:
+        return
+    old_usage = _counted_usage(old_flavors)
+    new_usage = _counted_usage(new_flavors)
+    deltas = {resource: new_usage[resource] - old_usage[resource]
+              for resource in new_usage}
+    if any(deltas.values()):
+        _apply_usage_counter_deltas(context, instance, deltas)
+
+
+def record_instance_usage(context, instance, sign=1):
+    """Record the creation or deletion of an instance in the usage counters.
+
+    This is a no-op unless [quota]usage_counters is enabled.
+
+    :param context: The request context for database access
+    :param instance: The instance which was created or deleted
+    :param sign: 1 if the instance now counts towards quota usage, -1 if it
+                 no longer does
+    """
+    if not CONF.quota.usage_counters:
+        return
+    usage = _counted_usage(_instance_flavors(instance))
+    deltas = {'instances': sign, 'cores': sign * usage['cores'],
+              'ram': sign * usage['ram']}
+    _apply_usage_counter_deltas(context, instance, deltas)
+
+
+def record_resize_usage(context, instance, new_flavor):
+    """Record the start of the resize of an instance in the usage counters.
+
+    The instance counts the larger of its old and new flavors until the
+    resize is confirmed or reverted. This is a no-op unless
+    [quota]usage_counters is enabled.
+
+    :param context: The request context for database access
+    :param instance: The instance being resized, holding its current flavor
+    :param new_flavor: The flavor the instance is resized to
+    """
+    _record_flavor_change_usage(context, instance, [instance.flavor],
+                                [instance.flavor, new_flavor])
+
+
+def record_confirmed_resize_usage(context, instance):
+    """Record the confirmation of the resize of an instance in the usage
+    counters.
+
+    This is a no-op unless [quota]usage_counters is enabled.
+
+    :param context: The request context for database access
+    :param instance: The instance whose resize is confirmed, holding both its
+                     old and new flavors
+    """
+    if not CONF.quota.usage_counters or instance.old_flavor is None:
+        return
+    _record_flavor_change_usage(context, instance,
+                                [instance.old_flavor, instance.flavor],
+                                [instance.flavor])
+
+
+def record_reverted_resize_usage(context, instance):
+    """Record the revert of the resize of an instance in the usage counters.
+
+    This is a no-op unless [quota]usage_counters is enabled.
+
+    :param context: The request context for database access
+    :param instance: The instance whose resize is reverted, holding both its
+                     old and new flavors
+    """
+    if not CONF.quota.usage_counters or instance.old_flavor is None:
+        return
+    _record_flavor_change_usage(context, instance,
+                                [instance.old_flavor, instance.flavor],
+                                [instance.old_flavor])
+
+
 def check_num_instances_quota(context, instance_type, min_count,
                               max_count, project_id=None, user_id=None,
                               orig_num_req=None):
@@ -14,6 +14,7 @@
 
 """Handles database requests from other nova services."""
 
+import collections
 import contextlib
 import copy
 import functools
@@ -103,7 +104,7 @@ class ConductorManager(manager.Manager):
     namespace.  See the ComputeTaskManager class for details.
     """
 
-    target = messaging.Target(version='3.0')
+    target = messaging.Target(version='3.2')
 
     def __init__(self, *args, **kwargs):
         super(ConductorManager, self).__init__(service_name='conductor',
@@ -130,8 +131,15 @@ class ConductorManager(manager.Manager):
         except Exception:
             raise messaging.ExpectedException()
 
+    @staticmethod
+    def _compact_result(context, result):
+        return nova_object.obj_primitive_to_compact(
+            nova_object.NovaObjectSerializer().serialize_entity(
+                context, result))
+
     def object_class_action_versions(self, context, objname, objmethod,
-                                     object_versions, args, kwargs):
+                                     object_versions, args, kwargs,
+                                     compact=False):
         objclass = nova_object.NovaObject.obj_class_from_name(
             objname, object_versions[objname])
         args = tuple([context] + list(args))
@@ -153,10 +161,20 @@ class ConductorManager(manager.Manager):
                 result = result.obj_to_primitive(
                     target_version=target_version,
                     version_manifest=object_versions)
+        if compact:
+            return self._compact_result(context, result)
         return result
 
-    def object_action(self, context, objinst, objmethod, args, kwargs):
-        """Perform an action on an object."""
+    def object_action(self, context, objinst, objmethod, args, kwargs,
+                      delta=False, compact=False):
+        """Perform an action on an object.
+
+        :param delta: True if only some of the fields of the object were
+            sent, in which case the fields which were not sent are only
+            returned if they are in objinst.obj_delta_save_refreshed
+        :param compact: True to return the updates and the result encoded
+            with nova.objects.base.obj_primitive_to_compact()
+        """
         oldobj = objinst.obj_clone()
         result = self._object_dispatch(objinst, objmethod, args, kwargs)
         updates = dict()
@@ -166,6 +184,10 @@ class ConductorManager(manager.Manager):
             if not objinst.obj_attr_is_set(name):
                 # Avoid demand-loading anything
                 continue
+            if (delta and not oldobj.obj_attr_is_set(name) and
+                    name not in objinst.obj_delta_save_refreshed):
+                # The caller has its own value of the fields it did not send
+                continue
             if (not oldobj.obj_attr_is_set(name) or
                     getattr(oldobj, name) != getattr(objinst, name)):
                 updates[name] = field.to_primitive(objinst, name,
@@ -173,6 +195,8 @@ class ConductorManager(manager.Manager):
         # This is safe since a field named this would conflict with the
         # method anyway
         updates['obj_what_changed'] = objinst.obj_what_changed()
+        if compact:
+            return self._compact_result(context, (updates, result))
         return updates, result
 
     def object_backport_versions(self, context, objinst, object_versions):
@@ -1200,6 +1224,31 @@ class ComputeTaskManager(base.Base):
                 bdm.update_or_create()
         return instance_block_device_mapping
 
+    def _create_block_device_mappings(self, context, cell, instances,
+                                      block_device_mapping):
+        """Create the BlockDeviceMapping objects of several instances of the
+        same cell in the db, in one transaction.
+
+        :returns: A dict, keyed by instance uuid, of the instances'
+            BlockDeviceMappingList objects
+        """
+        bdms_by_instance = {}
+        new_bdms = []
+        for instance in instances:
+            instance_block_device_mapping = copy.deepcopy(
+                block_device_mapping)
+            for bdm in instance_block_device_mapping:
+                bdm.volume_size = self._volume_size(instance.flavor, bdm)
+                bdm.instance_uuid = instance.uuid
+            LOG.debug("block_device_mapping %s",
+                      list(instance_block_device_mapping), instance=instance)
+            bdms_by_instance[instance.uuid] = instance_block_device_mapping
+            new_bdms.extend(instance_block_device_mapping)
+        if new_bdms:
+            with try_target_cell(context, cell) as cctxt:
+                objects.BlockDeviceMappingList.create_bulk(cctxt, new_bdms)
+        return bdms_by_instance
+
     def _create_tags(self, context, instance_uuid, tags):
         """Create the Tags objects in the db."""
         if tags:
@@ -1249,6 +1298,7 @@ class ComputeTaskManager(base.Base):
         for instance in instances_by_uuid.values():
             with obj_target_cell(instance, cell0) as cctxt:
                 instance.create()
+                compute_utils.record_instance_usage(context, instance)
 
                 # NOTE(mnaser): In order to properly clean-up volumes after
                 #               being buried in cell0, we need to store BDMs.
@@ -1358,6 +1408,16 @@ class ComputeTaskManager(base.Base):
         cell_mapping_cache = {}
         instances = []
         host_az = {}  # host=az cache to optimize multi-create
+        # The instances to create, grouped by cell so that each cell's
+        # instances are created in one database transaction.
+        instances_by_cell = collections.OrderedDict()
+
+        # Before we create the instances, let's make one final check that the
+        # build requests are still around and weren't deleted by the user
+        # already.
+        existing_build_requests = (
+            objects.BuildRequestList.get_existing_instance_uuids(
+                context, instance_uuids))
 
         for (build_request, request_spec, host_list) in six.moves.zip(
                 build_requests, request_specs, host_lists):
@@ -1388,13 +1448,7 @@ class ComputeTaskManager(base.Base):
 
             cell = host_mapping.cell_mapping
 
-            # Before we create the instance, let's make one final check that
-            # the build request is still around and wasn't deleted by the user
-            # already.
-            try:
-                objects.BuildRequest.get_by_instance_uuid(
-                    context, instance.uuid)
-            except exception.BuildRequestNotFound:
+            if instance.uuid not in existing_build_requests:
                 # the build request is gone so we're done for this instance
                 LOG.debug('While scheduling instance, the build request '
                           'was already deleted.', instance=instance)
@@ -1403,16 +1457,22 @@ class ComputeTaskManager(base.Base):
                 self.report_client.delete_allocation_for_instance(
                     context, instance.uuid)
                 continue
-            else:
-                if host.service_host not in host_az:
-                    host_az[host.service_host] = (
-                        availability_zones.get_host_availability_zone(
-                            context, host.service_host))
-                instance.availability_zone = host_az[host.service_host]
-                with obj_target_cell(instance, cell):
-                    instance.create()
-                    instances.append(instance)
-                    cell_mapping_cache[instance.uuid] = cell
+
+            if host.service_host not in host_az:
+                host_az[host.service_host] = (
+                    availability_zones.get_host_availability_zone(
+                        context, host.service_host))
+            instance.availability_zone = host_az[host.service_host]
+            instances.append(instance)
+            cell_mapping_cache[instance.uuid] = cell
+            instances_by_cell.setdefault(cell.uuid, (cell, []))[1].append(
+                instance)
+
+        for cell, cell_instances in instances_by_cell.values():
+            with try_target_cell(context, cell) as cctxt:
+                objects.InstanceList.create_bulk(cctxt, cell_instances)
+            for instance in cell_instances:
+                compute_utils.record_instance_usage(context, instance)
 
         # NOTE(melwitt): We recheck the quota after creating the
         # objects to prevent users from allocating more resources
@@ -1434,6 +1494,7 @@ class ComputeTaskManager(base.Base):
 
         zipped = six.moves.zip(build_requests, request_specs, host_lists,
                               instances)
+        to_build = []
         for (build_request, request_spec, host_list, instance) in zipped:
             if instance is None:
                 # Skip placeholders that were buried in cell0 or had their
@@ -1475,9 +1536,32 @@ class ComputeTaskManager(base.Base):
                 objects.InstanceAction.action_start(
                     cctxt, instance.uuid, instance_actions.CREATE,
                     want_result=False)
-                instance_bdms = self._create_block_device_mapping(
-                    cell, instance.flavor, instance.uuid, block_device_mapping)
-                instance_tags = self._create_tags(cctxt, instance.uuid, tags)
+            to_build.append((build_request, request_spec, host, host_list,
+                             filter_props, instance, cell))
+
+        # Create the block device mappings and tags, and map the instances to
+        # their cells, with one write per cell rather than per instance.
+        bdms_by_instance = {}
+        tags_by_instance = {}
+        for cell, cell_instances in instances_by_cell.values():
+            bdms_by_instance.update(self._create_block_device_mappings(
+                context, cell, cell_instances, block_device_mapping))
+            if tags:
+                with try_target_cell(context, cell) as cctxt:
+                    tags_by_instance.update(objects.TagList.create_bulk(
+                        cctxt, [instance.uuid for instance in cell_instances],
+                        [tag.tag for tag in tags]))
+            # Update mapping for instances. Normally this check is guarded by
+            # a try/except but if we're here we know that a newer nova-api
+            # handled the build process and would have created the mappings.
+            objects.InstanceMappingList.set_cell_mapping_bulk(
+                context, [instance.uuid for instance in cell_instances], cell)
+
+        to_cast = []
+        for (build_request, request_spec, host, host_list, filter_props,
+                instance, cell) in to_build:
+            instance_bdms = bdms_by_instance[instance.uuid]
+            instance_tags = tags_by_instance.get(instance.uuid, tags)
 
             # TODO(Kevin Zheng): clean this up once instance.create() handles
             # tags; we do this so the instance.create notification in
@@ -1485,14 +1569,6 @@ class ComputeTaskManager(base.Base):
             instance.tags = instance_tags if instance_tags \
                 else objects.TagList()
 
-            # Update mapping for instance. Normally this check is guarded by
-            # a try/except but if we're here we know that a newer nova-api
-            # handled the build process and would have created the mapping
-            inst_mapping = objects.InstanceMapping.get_by_instance_uuid(
-                context, instance.uuid)
-            inst_mapping.cell_mapping = cell
-            inst_mapping.save()
-
             if not self._delete_build_request(
                     context, build_request, instance, cell, instance_bdms,
                     instance_tags):
@@ -1500,7 +1576,13 @@ class ComputeTaskManager(base.Base):
                 # the instance is gone and we don't have anything to build for
                 # this one.
                 continue
+            to_cast.append((request_spec, host, host_list, filter_props,
+                            instance, cell, instance_bdms))
 
+        # Only now that all the database work is done, fan the builds out to
+        # the compute hosts.
+        for (request_spec, host, host_list, filter_props, instance, cell,
+                instance_bdms) in to_cast:
             # NOTE(danms): Compute RPC expects security group names or ids
             # not objects, so convert this to a list of names until we can
             # pass the objects.
@@ -1606,6 +1688,8 @@ class ComputeTaskManager(base.Base):
                         source=fields.NotificationSource.CONDUCTOR):
                     try:
                         instance.destroy()
+                        compute_utils.record_instance_usage(
+                            context, instance, sign=-1)
                     except exception.InstanceNotFound:
                         pass
                     except exception.ObjectActionError:
@@ -1614,6 +1698,8 @@ class ComputeTaskManager(base.Base):
                         try:
                             instance.refresh()
                             instance.destroy()
+                            compute_utils.record_instance_usage(
+                                context, instance, sign=-1)
                         except exception.InstanceNotFound:
                             pass
             for bdm in instance_bdms:
@@ -196,6 +196,12 @@ class ConductorAPI(object):
     that they can handle the version_cap being set to 3.0.
 
     * Remove provider_fw_rule_get_all()
+
+    ... Pike, Queens and Rocky support message version 3.0.
+
+    * 3.1 - Added delta to object_action()
+    * 3.2 - Added compact to object_class_action_versions() and
+      object_action()
     """
 
     VERSION_ALIASES = {
@@ -208,6 +214,9 @@ class ConductorAPI(object):
         'mitaka': '3.0',
         'newton': '3.0',
         'ocata': '3.0',
+        'pike': '3.0',
+        'queens': '3.0',
+        'rocky': '3.0',
     }
 
     def __init__(self):
@@ -232,18 +241,41 @@ class ConductorAPI(object):
                                                  versions,
                                                  args, kwargs)
 
+    def _can_send_compact(self):
+        return (CONF.conductor.compact_objects and
+                self.client.can_send_version('3.2'))
+
     def object_class_action_versions(self, context, objname, objmethod,
                                      object_versions, args, kwargs):
-        cctxt = self.client.prepare()
-        return cctxt.call(context, 'object_class_action_versions',
-                          objname=objname, objmethod=objmethod,
-                          object_versions=object_versions,
-                          args=args, kwargs=kwargs)
+        msg_args = {'objname': objname, 'objmethod': objmethod,
+                    'object_versions': object_versions,
+                    'args': args, 'kwargs': kwargs}
+        version = '3.0'
+        if self._can_send_compact():
+            version = '3.2'
+            msg_args['compact'] = True
+        cctxt = self.client.prepare(version=version)
+        return cctxt.call(context, 'object_class_action_versions', **msg_args)
 
     def object_action(self, context, objinst, objmethod, args, kwargs):
-        cctxt = self.client.prepare()
-        return cctxt.call(context, 'object_action', objinst=objinst,
-                          objmethod=objmethod, args=args, kwargs=kwargs)
+        msg_args = {'objinst': objinst, 'objmethod': objmethod,
+                    'args': args, 'kwargs': kwargs}
+        version = '3.0'
+        # NOTE: Cells v1 syncs whole instances between the cells when they
+        # are saved, so they are not delta encoded with it.
+        if (objmethod == 'save' and CONF.conductor.delta_object_save and
+                objinst.obj_delta_save_keys and not CONF.cells.enable and
+                self.client.can_send_version('3.1')):
+            version = '3.1'
+            msg_args['objinst'] = objinst.obj_delta_for_save()
+            msg_args['delta'] = True
+        if self._can_send_compact():
+            version = '3.2'
+            msg_args['compact'] = True
+            msg_args['objinst'] = objects_base.obj_primitive_to_compact(
+                msg_args['objinst'].obj_to_primitive())
+        cctxt = self.client.prepare(version=version)
+        return cctxt.call(context, 'object_action', **msg_args)
 
     def object_backport_versions(self, context, objinst, object_versions):
         cctxt = self.client.prepare()
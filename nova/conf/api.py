@@ -328,6 +328,33 @@ Related options:
 
 * instance_list_cells_batch_strategy
 * max_limit
+"""),
+    cfg.IntOpt("instance_list_cursor_cache_time",
+        min=0,
+        default=0,
+        help="""
+Number of seconds the API keeps the keyset cursor of an instance list page.
+
+The cursor records the values of the sort keys of the last instance of a page
+and how many instances each cell contributed to it. When the next page is
+requested with that instance as the marker, the API seeks directly past those
+values in every cell database, instead of looking the marker instance up in
+its cell and its equivalent in every other cell, and sizes the batch it
+requests from each cell after what that cell contributed to the previous
+page.
+
+The cursors are stored with the caching backend configured in the ``[cache]``
+section, which should be shared by all the API workers for this to be
+effective. Since the cursor holds the values the sort keys had when the page
+was listed, a page may start slightly differently than without the cursor if
+the marker instance was updated in between.
+
+A value of 0 disables the cursors.
+
+Related options:
+
+* instance_list_cells_batch_strategy
+* [cache]/enabled
 """),
     cfg.BoolOpt("list_records_by_skipping_down_cells",
         default=True,
@@ -343,6 +370,136 @@ partial for certain requests containing those records. In those cases this
 option will be ignored. See "Handling Down Cells" section of the Compute API
 guide (https://developer.openstack.org/api-guide/compute/down_cells.html) for
 more information.
+"""),
+    cfg.IntOpt("cell_timeout_failure_threshold",
+        min=0,
+        default=0,
+        help="""
+Number of consecutive timeouts after which a cell is considered down.
+
+When a cell database does not respond to a number of consecutive queries made
+across cells, for instance to list servers or services, the following queries
+skip that cell right away and handle it as not responding, instead of waiting
+for it until the timeout every time. After ``cell_timeout_retry_interval``
+seconds, a single query is sent to the cell again to find out whether it
+recovered.
+
+This applies to every service querying all the cells in parallel, including
+nova-api and nova-scheduler. A value of 0 disables this, all the cells are
+always queried.
+
+Related options:
+
+* cell_timeout_retry_interval
+* list_records_by_skipping_down_cells
+"""),
+    cfg.IntOpt("cell_timeout_retry_interval",
+        min=1,
+        default=60,
+        help="""
+Number of seconds a cell considered down is skipped before being queried again.
+
+Related options:
+
+* cell_timeout_failure_threshold
+"""),
+    cfg.IntOpt("service_list_cache_time",
+        min=0,
+        default=0,
+        help="""
+Number of seconds the services listed from all the cells are cached.
+
+Listing the services across all the cells, like the ``os-services`` API does,
+queries every cell database. When this is set, the services listed from a cell
+are reused for that many seconds by the requests of the same user with the
+same filters, so the listing may not reflect a service update made in the
+meantime. A value of 0 disables the cache.
+
+Identical listings running at the same time always share their queries to the
+cell databases, whatever the value of this option.
+"""),
+    cfg.IntOpt("instance_mapping_cache_size",
+        min=0,
+        default=0,
+        help="""
+Maximum number of instance mappings each API worker keeps in memory.
+
+Almost every server action starts by looking up in the API database which cell
+the server lives in. Once a server is in a cell it rarely moves, so when this
+is set the API workers keep the most recently used instance mappings, along
+with their cell mappings, and skip that lookup. A mapping is dropped from the
+cache of a worker when that worker updates or deletes it, and otherwise after
+``instance_mapping_cache_time`` seconds, which bounds how long a change made by
+another service, like ``nova-manage cell_v2 map_instances`` or
+``nova-manage cell_v2 update_cell``, may go unnoticed by the API.
+
+Servers which are not yet scheduled to a cell are never cached. A value of 0
+disables the cache.
+
+Related options:
+
+* instance_mapping_cache_time
+"""),
+    cfg.IntOpt("instance_mapping_cache_time",
+        min=1,
+        default=300,
+        help="""
+Number of seconds an API worker keeps an instance mapping in memory.
+
+Related options:
+
+* instance_mapping_cache_size
+"""),
+    cfg.IntOpt("response_cache_time",
+        min=0,
+        default=0,
+        help="""
+Number of seconds the rendered responses of some listing APIs are cached.
+
+The flavor, availability zone detail, hypervisor detail and limits listings
+are requested very often by clients and dashboards while the data behind them
+changes rarely. When this is set, the rendered response body of those APIs is
+reused for that many seconds by the requests of the same user with the same
+path, query parameters and microversion. Requests with query parameters those
+APIs do not support are not cached. The cached flavor listings are dropped as
+soon as a flavor changes, while the other listings may not reflect a change
+made in the meantime. A value of 0 disables the cache.
+
+Whatever the value of this option, those APIs return an ``ETag`` header and
+answer a request whose ``If-None-Match`` header matches it with an empty
+``304 Not Modified`` response.
+"""),
+    cfg.IntOpt("policy_cache_size",
+        min=0,
+        default=0,
+        help="""
+Maximum number of policy check results each API worker keeps in memory.
+
+Every API request checks one or more policy rules, and some requests check the
+same rules many times. The result of a rule only depends on the credentials of
+the request and on the few attributes of the target the rule looks at, like
+its project. When this is set, the API workers keep the most recently used
+results keyed by those and reuse them instead of evaluating the rules again.
+The results are kept for ``policy_cache_time`` seconds at most, which bounds
+how long a change to the policy file may take to apply to them.
+
+Rules using checks which may depend on anything else, like the ``http`` check
+or checks provided by other libraries, are never cached. A value of 0 disables
+the cache.
+
+Related options:
+
+* policy_cache_time
+"""),
+    cfg.IntOpt("policy_cache_time",
+        min=1,
+        default=60,
+        help="""
+Number of seconds an API worker keeps a policy check result in memory.
+
+Related options:
+
+* policy_cache_size
 """),
 ]
 
@@ -60,6 +60,43 @@ entry.
     cfg.StrOpt(
         'tempdir',
         help='Explicitly specify the temporary working directory.'),
+    cfg.IntOpt(
+        'http_connection_pool_size',
+        default=10,
+        min=1,
+        help='''
+Maximum number of HTTP connections kept open to each host of a service.
+
+The clients of the Image, Networking, Block Storage, Placement and Identity
+services share one keystoneauth session per service, and so share its HTTP
+connections. This is the number of idle connections kept open to each host of
+the service for reuse. When more requests than this are made concurrently to a
+host, additional connections are opened and closed after use, unless
+``http_connection_pool_block`` is set.
+
+The ``idle_connections``, ``connections`` and ``requests`` statistics in the
+"Keystoneauth Sessions" section of the Guru Meditation Report show whether
+connections are reused.
+
+Related options:
+
+* http_connection_pool_block
+'''),
+    cfg.BoolOpt(
+        'http_connection_pool_block',
+        default=False,
+        help='''
+Wait for a connection to be released rather than opening a new one.
+
+When True, no more than ``http_connection_pool_size`` connections are opened
+to each host of the Image, Networking, Block Storage, Placement and Identity
+services, and requests wait for one of them to be available. This bounds the
+load a service puts on those hosts at the cost of queuing requests.
+
+Related options:
+
+* http_connection_pool_size
+'''),
 ]
 
 
@@ -853,6 +853,118 @@ Possible values:
 
 * -1 means unlimited
 * Any integer >= 0 represents the maximum allowed
+"""),
+    cfg.IntOpt('init_host_workers',
+        default=1,
+        min=1,
+        help="""
+Number of greenthreads used to initialize instances when the compute service
+starts.
+
+With the default value of 1 every instance on the host is initialized
+serially before the service starts consuming RPC messages. With a value
+greater than 1 the power state of all instances is fetched from the
+hypervisor in a single bulk query. Instances which have no task state and
+whose power state matches the database need no recovery action; plugging
+their VIFs and ensuring their firewall rules is deferred until after the
+service has started. Only instances in a transitional state go through the
+full initialization, concurrently on a pool of this size, before the service
+reports ready.
+
+Possible values:
+
+* 1: initialize instances serially (the historical behavior).
+* Any integer greater than 1 represents the maximum number of instances
+  initialized concurrently.
+
+Related options:
+
+* ``[DEFAULT]/resume_guests_state_on_host_boot``
+"""),
+    cfg.FloatOpt('periodic_task_jitter',
+        default=0.05,
+        min=0.0,
+        max=1.0,
+        help="""
+Maximum jitter added to the spacing of the compute periodic tasks, as a
+fraction of that spacing.
+
+After each run of a periodic task, a random delay of up to this fraction of
+its spacing is added before the next run. This spreads the load that a large
+number of compute services put on the conductor and the databases. The
+default of 0.05 matches the jitter historically applied by oslo.service.
+
+Possible values:
+
+* A float between 0.0 and 1.0. 0.0 disables jitter.
+"""),
+    cfg.IntOpt('periodic_task_busy_threshold',
+        default=0,
+        min=0,
+        help="""
+Number of in-progress instance builds and live migrations at which deferrable
+compute periodic tasks are postponed.
+
+While the compute service is at least this busy, periodic tasks which are not
+critical to scheduling, such as bandwidth and volume usage polling, are
+retried after a tenth of their spacing instead of running immediately. A task
+is never deferred twice in a row. Live migrations are counted from the time
+they are queued on the source compute service until they complete. Builds are
+only counted when ``[DEFAULT]/max_concurrent_builds`` is not 0.
+
+Possible values:
+
+* 0: never defer periodic tasks.
+* Any positive integer representing the busy threshold.
+"""),
+    cfg.IntOpt('periodic_task_workers',
+        default=0,
+        min=0,
+        help="""
+Number of greenthreads used to run I/O bound compute periodic tasks
+concurrently with the other periodic tasks.
+
+Periodic tasks which mostly wait on other services, for example when polling
+bandwidth or volume usage or healing the instance info cache, are run on a
+pool of this size so that a slow run does not delay the other periodic tasks.
+A task is never started again while its previous run is still in progress.
+
+Possible values:
+
+* 0: run every periodic task serially.
+* Any positive integer representing the size of the pool.
+"""),
+    cfg.StrOpt('periodic_task_stats_file',
+        help="""
+Path of a file to which the compute service writes statistics about its
+periodic tasks.
+
+When set, the number of runs, failures, deferrals and overruns as well as the
+last, maximum and average duration of each periodic task are written to this
+file as JSON every time the periodic tasks are processed.
+
+Possible values:
+
+* None (default): statistics are not written.
+* A path writable by the compute service.
+"""),
+    cfg.BoolOpt('coalesce_instance_saves',
+        default=False,
+        help="""
+Merge the intermediate instance updates made while building, resizing and
+migrating instances.
+
+When enabled, the updates of an instance which are not guarded by an expected
+task state, for example the ``block_device_mapping`` task state set while
+building or the progress reported by some virt drivers, are deferred and
+written along with the next guarded update. This reduces the number of
+conductor RPC calls, database writes and ``instance.update`` notifications
+per operation, at the cost of some intermediate task states not being visible
+through the API.
+
+Related options:
+
+* ``[DEFAULT]/max_concurrent_builds``
 """),
 ]
 
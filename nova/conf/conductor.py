@@ -31,6 +31,46 @@ ALL_OPTS = [
         help="""
 Number of workers for OpenStack Conductor service. The default will be the
 number of CPUs available.
+"""),
+    cfg.BoolOpt(
+        'delta_object_save',
+        default=False,
+        help="""
+Send only the changed fields of objects saved through the conductor.
+
+Services without database access, such as nova-compute, save objects like
+instances, compute nodes and migrations by sending them to the conductor. By
+default the whole object is sent, including fields which did not change, and
+the conductor sends back every field that the save changed. When this option
+is True, only the changed fields and the fields identifying the object are
+sent, and only the changed fields and the ones the save refreshes from the
+database, such as ``updated_at``, are sent back. This reduces the size of the
+messages and the serialization work on both ends.
+
+Fields which were not sent are not refreshed from the database on the caller,
+and the conductor may need to load some of them from the database to send
+notifications. This option is only used by services which send objects to the
+conductor, and requires the conductor services to be upgraded to this
+release; it has no effect when ``[upgrade_levels]/conductor`` is pinned to an
+older one.
+"""),
+    cfg.BoolOpt(
+        'compact_objects',
+        default=False,
+        help="""
+Encode the objects exchanged with the conductor compactly.
+
+Objects are sent over RPC as nested JSON documents which repeat the name,
+namespace and version of every object and the name of every field, so that a
+list of a few hundred instances takes several megabytes. When this option is
+True, the objects sent to and returned by the conductor for remoted object
+methods are encoded with msgpack instead, recording the name, namespace,
+version and field names of each kind of object once per message. This makes
+the messages several times smaller.
+
+This option is only used by services which send objects to the conductor, and
+requires the conductor services to be upgraded to this release; it has no
+effect when ``[upgrade_levels]/conductor`` is pinned to an older one.
 """),
 ]
 
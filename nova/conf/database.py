@@ -156,10 +156,78 @@ placement_db_opts = [
 ]  # noqa
 
 
+cell_db_group = cfg.OptGroup('cell_database',
+    title='Cell Database Options',
+    help="""
+Options for the connections to the cell databases which are opened by the
+services targeting cells, such as nova-api, nova-scheduler and the
+superconductor. Each cell gets its own connection pool, so the number of
+connections opened by such a service grows with the number of cells. By
+default the pools are sized with the options of the ``[database]`` group.
+""")
+
+cell_db_opts = [
+    cfg.IntOpt('max_pool_size',
+        min=0,
+        help="""
+Maximum number of connections kept open in the connection pool of each cell
+database.
+
+If unset, the ``[database]/max_pool_size`` option is used.
+
+Related options:
+
+* max_overflow
+"""),
+    cfg.IntOpt('max_overflow',
+        min=-1,
+        help="""
+Number of connections which can be opened to a cell database on top of
+``max_pool_size`` when all the pooled connections are in use. Those
+connections are closed rather than returned to the pool once used.
+
+If unset, the ``[database]/max_overflow`` option is used.
+
+Related options:
+
+* max_pool_size
+"""),
+    cfg.IntOpt('pool_timeout',
+        min=0,
+        help="""
+Number of seconds to wait for a connection to a cell database to be returned
+to the pool when ``max_pool_size`` and ``max_overflow`` connections are in
+use.
+
+If unset, the ``[database]/pool_timeout`` option is used.
+"""),
+    cfg.IntOpt('idle_timeout',
+        default=0,
+        min=0,
+        help="""
+Number of seconds after which the pooled connections to a cell database which
+has not been targeted are closed.
+
+Services which target many cells, or cells which are rarely used, otherwise
+keep up to ``max_pool_size`` connections open to every cell database they
+ever targeted. The connections are opened again the next time the cell is
+targeted. The pools are checked when cells are targeted, so the connections
+of an idle cell are closed between ``idle_timeout`` and twice that number of
+seconds after the cell was last targeted.
+
+Possible values:
+
+* 0 to keep the connections open (the default).
+* A positive integer, the number of seconds.
+"""),
+]
+
+
 def register_opts(conf):
     oslo_db_options.set_defaults(conf, connection=_DEFAULT_SQL_CONNECTION)
     conf.register_opts(api_db_opts, group=api_db_group)
     conf.register_opts(placement_db_opts, group=placement_db_group)
+    conf.register_opts(cell_db_opts, group=cell_db_group)
 
 
 def list_opts():
@@ -178,4 +246,5 @@ def list_opts():
     return {
         api_db_group: api_db_opts,
         placement_db_group: placement_db_opts,
+        cell_db_group: cell_db_opts,
     }
@@ -293,6 +293,69 @@ impossible for a user to exceed their quota with the caveat that it will,
 however, be possible for a REST API user to be rejected with a 403 response in
 the event of a collision close to reaching their quota limit, even if the user
 has enough quota available when they made the request.
+"""),
+    cfg.BoolOpt('usage_counters',
+        default=False,
+        help="""
+Keep instance, core and ram usage counters in the API database.
+
+With counting quotas, every server create, resize, restore and unshelve counts
+the instances, cores and ram of the project by querying every cell the project
+has instances in. For projects with many instances this becomes the dominant
+cost of the quota check. When this option is True, the API and superconductor
+services maintain per-project and per-user usage counters in the API database
+which are updated as instances are created, deleted, restored and resized, and
+quota checks read those counters instead of counting across cells. An instance
+being resized counts the larger of the cores and ram of its old and new
+flavors until the resize is confirmed or reverted, so reverting a resize down
+never goes over quota.
+
+The counters for a project are seeded from a count across cells the first time
+the project's usage is checked. They can drift from the real usage when an
+operation fails part way through, or when a resize down is confirmed
+automatically by the compute service (see ``[DEFAULT]/resize_confirm_window``),
+which does not have access to the API database. The
+``usage_counter_reconcile_interval`` option controls how often the counters are
+corrected by recounting.
+
+Related options:
+
+* usage_counter_reconcile_interval
+"""),
+    cfg.IntOpt('usage_counter_reconcile_interval',
+        default=3600,
+        min=-1,
+        help="""
+Interval in seconds between usage counter reconciliations.
+
+When ``usage_counters`` is enabled, the nova-scheduler service periodically
+recounts the instances, cores and ram of every tracked project across the cells
+and overwrites the counters in the API database, correcting any drift.
+
+Possible values:
+
+* A positive integer, the number of seconds between reconciliations.
+* 0 to run the reconciliation at the default periodic interval (60 seconds).
+* -1 to disable the reconciliation.
+
+Related options:
+
+* usage_counters
+* usage_counter_reconcile_batch_size
+"""),
+    cfg.IntOpt('usage_counter_reconcile_batch_size',
+        default=100,
+        min=1,
+        help="""
+Maximum number of projects recounted per usage counter reconciliation.
+
+Projects are reconciled in order, starting with the ones whose counters were
+reconciled least recently, so that every tracked project is eventually
+recounted without a single run holding the scheduler for too long.
+
+Related options:
+
+* usage_counter_reconcile_interval
 """),
 ]
 
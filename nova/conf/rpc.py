@@ -32,6 +32,48 @@ Operations with RPC calls that utilize this value:
 Related options:
 
 * rpc_response_timeout
+"""),
+    cfg.StrOpt("rpc_stats_dir",
+        help="""
+Directory to which the service writes statistics about its RPC messages.
+
+When set, the RPC clients and servers of the service record, for each RPC
+method, the number of calls and casts sent and of messages handled, the size
+of the serialized payloads, the time spent serializing them, the time spent
+waiting for calls to return, the time spent by the servers handling the
+messages and the time messages spent queued between the client and the server.
+Every process of the service writes its statistics as JSON to a
+``<binary>-<pid>.json`` file in this directory, and the
+``nova-manage rpc stats`` command aggregates them.
+
+Measuring the payload sizes requires serializing the payloads to JSON an
+additional time, so this should only be enabled while investigating RPC
+performance. The queue latency is measured using the wall clock of the client
+and of the server and is only accurate if their clocks are synchronized. It
+is only measured for messages sent by services which also have this option
+set.
+
+Possible values:
+
+* None (default): statistics are not recorded.
+* A directory writable by the service.
+
+Related options:
+
+* rpc_stats_interval
+"""),
+    cfg.IntOpt("rpc_stats_interval",
+        default=60,
+        min=1,
+        help="""
+Minimum interval in seconds between two writes of the RPC statistics.
+
+The statistics are written when a message is sent or handled and the previous
+write is at least this old, as well as when the service stops.
+
+Related options:
+
+* rpc_stats_dir
 """),
 ]
 
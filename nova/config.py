@@ -16,13 +16,17 @@
 #    under the License.
 
 from oslo_log import log
+from oslo_reports import guru_meditation_report as gmr
+from oslo_reports.models import with_default_views
 from oslo_utils import importutils
 
 from nova.api.openstack.placement import db_api as placement_db
 from nova.common import config
 import nova.conf
+from nova import context
 from nova.db.sqlalchemy import api as sqlalchemy_api
 from nova import rpc
+from nova import utils
 from nova import version
 
 profiler = importutils.try_import('osprofiler.opts')
@@ -30,6 +34,28 @@ profiler = importutils.try_import('osprofiler.opts')
 
 CONF = nova.conf.CONF
 
+_GMR_SECTIONS_REGISTERED = False
+
+
+def _ksa_session_stats():
+    return with_default_views.ModelWithDefaultViews(
+        utils.get_ksa_session_stats())
+
+
+def _cell_connection_stats():
+    return with_default_views.ModelWithDefaultViews(
+        context.CELL_CONNECTIONS.get_stats())
+
+
+def _register_gmr_sections():
+    global _GMR_SECTIONS_REGISTERED
+    if not _GMR_SECTIONS_REGISTERED:
+        gmr.TextGuruMeditation.register_section('Keystoneauth Sessions',
+                                                _ksa_session_stats)
+        gmr.TextGuruMeditation.register_section('Cell Connections',
+                                                _cell_connection_stats)
+        _GMR_SECTIONS_REGISTERED = True
+
 
 def parse_args(argv, default_config_files=None, configure_db=True,
                init_rpc=True):
@@ -60,6 +86,8 @@ def parse_args(argv, default_config_files=None, configure_db=True,
     if init_rpc:
         rpc.init(CONF)
 
+    _register_gmr_sections()
+
     if configure_db:
         sqlalchemy_api.configure(CONF)
         placement_db.configure(CONF)
@@ -19,8 +19,11 @@
 
 from contextlib import contextmanager
 import copy
+import inspect
 import warnings
 
+import eventlet
+import eventlet.event
 import eventlet.queue
 import eventlet.timeout
 from keystoneauth1.access import service_catalog as ksa_service_catalog
@@ -29,8 +32,12 @@ from oslo_context import context
 from oslo_db.sqlalchemy import enginefacade
 from oslo_log import log as logging
 from oslo_utils import timeutils
+from oslo_versionedobjects import base as ovo_base
 import six
+from sqlalchemy import event as sa_event
+from sqlalchemy import pool as sa_pool
 
+import nova.conf
 from nova import exception
 from nova.i18n import _
 from nova import objects
@@ -38,10 +45,7 @@ from nova import policy
 from nova import utils
 
 LOG = logging.getLogger(__name__)
-# TODO(melwitt): This cache should be cleared whenever WSGIService receives a
-# SIGHUP and periodically based on an expiration time. Currently, none of the
-# cell caches are purged, so neither is this one, for now.
-CELL_CACHE = {}
+CONF = nova.conf.CONF
 # NOTE(melwitt): Used for the scatter-gather utility to indicate we timed out
 # waiting for a result from a cell.
 did_not_respond_sentinel = object()
@@ -341,6 +345,245 @@ def authorize_quota_class_context(context, class_name):
             raise exception.Forbidden()
 
 
+class _CellConnections(object):
+    """The database and message queue connections of a cell."""
+
+    def __init__(self, cell_mapping):
+        # avoid circular import
+        from nova.db import api as db
+        from nova import rpc
+
+        self.identity = cell_mapping.identity
+        self.database_connection = cell_mapping.database_connection
+        self.transport_url = cell_mapping.transport_url
+        self.updated_at = _updated_at(cell_mapping)
+        self.last_used = timeutils.now()
+        self.idle = False
+        self.engines = []
+        self.stats = {
+            'connects': 0,
+            'checkouts': 0,
+            'overflow_checkouts': 0,
+            'exhausted': 0,
+            'invalidations': 0,
+            'disposals': 0,
+        }
+        self.last_error = None
+        # NOTE: The database engines, and so their connection pools, are only
+        # created when the cell database is first used.
+        self.db_connection = db.create_context_manager(
+            self.database_connection, on_engine_create=self._watch_engine)
+        self.mq_connection = None
+        if not self.transport_url.startswith('none'):
+            self.mq_connection = rpc.create_transport(self.transport_url)
+
+    def is_outdated_by(self, cell_mapping):
+        """Returns True if the cell mapping is more recent than the one the
+        connections were made from and has different URLs.
+        """
+        if (self.database_connection == cell_mapping.database_connection and
+                self.transport_url == cell_mapping.transport_url):
+            return False
+        # NOTE: Services hold on to cell mappings loaded at different times,
+        # so only a mapping which was updated after the one used to make the
+        # connections replaces them, rather than any mapping which differs.
+        updated_at = _updated_at(cell_mapping)
+        return updated_at is not None and (self.updated_at is None or
+                                           updated_at > self.updated_at)
+
+    def _watch_engine(self, engine):
+        self.engines.append(engine)
+
+        def on_connect(dbapi_connection, connection_record):
+            self.stats['connects'] += 1
+
+        def on_checkout(dbapi_connection, connection_record,
+                        connection_proxy):
+            self.stats['checkouts'] += 1
+            pool = engine.pool
+            if not isinstance(pool, sa_pool.QueuePool):
+                return
+            checked_out = pool.checkedout()
+            if checked_out > pool.size():
+                self.stats['overflow_checkouts'] += 1
+            # NOTE: SQLAlchemy has no event for a checkout which has to wait
+            # for a connection to be returned, so count the checkouts after
+            # which the pool has no connection left to give instead.
+            max_overflow = pool._max_overflow
+            if (max_overflow > -1 and
+                    checked_out >= pool.size() + max_overflow):
+                self.stats['exhausted'] += 1
+
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            self.stats['invalidations'] += 1
+            if exception is not None:
+                self.last_error = six.text_type(exception)
+
+        # NOTE: The listeners are kept by the pools recreated when the engine
+        # is disposed.
+        sa_event.listen(engine, 'connect', on_connect)
+        sa_event.listen(engine, 'checkout', on_checkout)
+        sa_event.listen(engine, 'invalidate', on_invalidate)
+
+    def touch(self):
+        self.last_used = timeutils.now()
+        self.idle = False
+
+    def dispose(self):
+        """Closes the pooled database connections.
+
+        The connections are opened again when the cell database is next used.
+        """
+        for engine in self.engines:
+            engine.dispose()
+        self.stats['disposals'] += 1
+
+    def close(self):
+        """Closes the connections once they are evicted.
+
+        The contexts targeted at the cell before it was evicted may still be
+        in use. Their checked out database connections are only closed once
+        returned, and the message queue transport is only cleaned up after
+        CONF.long_rpc_timeout seconds, once their RPC calls are over.
+        """
+        for engine in self.engines:
+            engine.dispose()
+        if self.mq_connection is not None:
+            eventlet.spawn_after(CONF.long_rpc_timeout, _cleanup_transport,
+                                 self.identity, self.mq_connection)
+
+    def get_stats(self):
+        stats = dict(self.stats, checked_out=0, pooled=0,
+                     last_error=self.last_error,
+                     idle_seconds=int(timeutils.now() - self.last_used))
+        for engine in self.engines:
+            if isinstance(engine.pool, sa_pool.QueuePool):
+                stats['checked_out'] += engine.pool.checkedout()
+                stats['pooled'] += engine.pool.checkedin()
+        return stats
+
+
+def _cleanup_transport(identity, transport):
+    try:
+        transport.cleanup()
+    except Exception:
+        LOG.exception('Failed to clean up the message queue transport of '
+                      'cell %s', identity)
+
+
+def _updated_at(cell_mapping):
+    if cell_mapping.obj_attr_is_set('updated_at'):
+        return cell_mapping.updated_at
+
+
+class CellConnectionRegistry(object):
+    """Holds the database and message queue connections of the cells.
+
+    The connections of a cell are made the first time it is targeted, with a
+    database connection pool sized with the [cell_database] options. They are
+    replaced when the cell is targeted with a mapping updated with different
+    URLs, and closed when the cell is not found anymore by prune(). The pooled
+    database connections of the cells which have not been targeted for
+    CONF.cell_database.idle_timeout seconds are closed, to be opened again
+    when the cell is next targeted.
+    """
+    def __init__(self):
+        self._cells = {}
+        self._next_sweep = None
+
+    def get(self, cell_mapping):
+        """Returns the connections of a cell, making them if needed."""
+        # Synchronize access to the cache by multiple API workers.
+        @utils.synchronized(cell_mapping.uuid)
+        def get_or_make_connections():
+            cell = self._cells.get(cell_mapping.uuid)
+            if cell is not None and cell.is_outdated_by(cell_mapping):
+                LOG.info('The database or transport URL of cell %s changed, '
+                         'replacing its connections', cell_mapping.identity)
+                self._evict(cell_mapping.uuid)
+                cell = None
+            if cell is None:
+                cell = _CellConnections(cell_mapping)
+                self._cells[cell_mapping.uuid] = cell
+            return cell
+
+        cell = get_or_make_connections()
+        cell.touch()
+        self._dispose_idle()
+        return cell
+
+    def _evict(self, cell_uuid):
+        cell = self._cells.pop(cell_uuid, None)
+        if cell is not None:
+            cell.close()
+
+    def evict(self, cell_uuid):
+        """Forgets the connections of a cell, closing its pooled database
+        connections.
+        """
+        @utils.synchronized(cell_uuid)
+        def evict():
+            self._evict(cell_uuid)
+
+        evict()
+
+    def prune(self, cell_mappings):
+        """Evicts the connections of the cells missing from cell_mappings and
+        of those whose mapping was updated with different URLs.
+
+        :param cell_mappings: All the CellMapping objects, freshly loaded
+        """
+        mappings = {cell_mapping.uuid: cell_mapping
+                    for cell_mapping in cell_mappings}
+        for cell_uuid, cell in list(self._cells.items()):
+            cell_mapping = mappings.get(cell_uuid)
+            if cell_mapping is None:
+                LOG.info('Cell %s was deleted, closing its connections',
+                         cell.identity)
+                self.evict(cell_uuid)
+            elif cell.is_outdated_by(cell_mapping):
+                LOG.info('The database or transport URL of cell %s changed, '
+                         'closing its connections', cell.identity)
+                self.evict(cell_uuid)
+
+    def _dispose_idle(self):
+        timeout = CONF.cell_database.idle_timeout
+        if not timeout:
+            return
+        now = timeutils.now()
+        if self._next_sweep is not None and now < self._next_sweep:
+            return
+        self._next_sweep = now + timeout
+        for cell in list(self._cells.values()):
+            if (not cell.idle and cell.engines and
+                    now - cell.last_used >= timeout):
+                LOG.debug('Closing the database connections of cell %(cell)s '
+                          'which was not used for %(timeout)i seconds',
+                          {'cell': cell.identity, 'timeout': timeout})
+                cell.dispose()
+                cell.idle = True
+
+    def get_stats(self):
+        """Returns statistics about the connections of the cells.
+
+        The statistics are keyed by cell uuid. For each cell they include the
+        number of database connections opened, checked out of the pool, checked
+        out on top of the pool size (overflow_checkouts), checked out leaving
+        no connection for the next checkout, which has to wait (exhausted),
+        and invalidated after an error, along with the number of connections
+        currently checked out and pooled.
+        """
+        return {cell_uuid: cell.get_stats()
+                for cell_uuid, cell in list(self._cells.items())}
+
+    def reset(self):
+        self._cells.clear()
+        self._next_sweep = None
+
+
+CELL_CONNECTIONS = CellConnectionRegistry()
+
+
 def set_target_cell(context, cell_mapping):
     """Adds database connection information to the context
     for communicating with the given target_cell.
@@ -353,33 +596,11 @@ def set_target_cell(context, cell_mapping):
     :param context: The RequestContext to add connection information
     :param cell_mapping: An objects.CellMapping object or None
     """
-    global CELL_CACHE
     if cell_mapping is not None:
-        # avoid circular import
-        from nova.db import api as db
-        from nova import rpc
-
-        # Synchronize access to the cache by multiple API workers.
-        @utils.synchronized(cell_mapping.uuid)
-        def get_or_set_cached_cell_and_set_connections():
-            try:
-                cell_tuple = CELL_CACHE[cell_mapping.uuid]
-            except KeyError:
-                db_connection_string = cell_mapping.database_connection
-                context.db_connection = db.create_context_manager(
-                    db_connection_string)
-                if not cell_mapping.transport_url.startswith('none'):
-                    context.mq_connection = rpc.create_transport(
-                        cell_mapping.transport_url)
-                context.cell_uuid = cell_mapping.uuid
-                CELL_CACHE[cell_mapping.uuid] = (context.db_connection,
-                                                 context.mq_connection)
-            else:
-                context.db_connection = cell_tuple[0]
-                context.mq_connection = cell_tuple[1]
-                context.cell_uuid = cell_mapping.uuid
-
-        get_or_set_cached_cell_and_set_connections()
+        cell = CELL_CONNECTIONS.get(cell_mapping)
+        context.db_connection = cell.db_connection
+        context.mq_connection = cell.mq_connection
+        context.cell_uuid = cell_mapping.uuid
     else:
         context.db_connection = None
         context.mq_connection = None
@@ -410,6 +631,183 @@ def target_cell(context, cell_mapping):
     yield cctxt
 
 
+class CellCircuitBreaker(object):
+    """Tracks the cells which time out when scatter-gathering.
+
+    Once a cell timed out CONF.api.cell_timeout_failure_threshold times in a
+    row, it is tripped: it is skipped as if it did not respond, without
+    waiting for it, for CONF.api.cell_timeout_retry_interval seconds. Then a
+    single call is let through to find out if the cell recovered, which
+    closes the breaker if the cell responds, and trips it again otherwise.
+    """
+    def __init__(self):
+        self._timeouts = {}
+        self._retry_at = {}
+
+    def is_tripped(self, cell_uuid):
+        """Returns True if calls to the cell should be skipped."""
+        retry_at = self._retry_at.get(cell_uuid)
+        if retry_at is None or not CONF.api.cell_timeout_failure_threshold:
+            return False
+        now = timeutils.now()
+        if now < retry_at:
+            return True
+        # Let this call through and skip the others until it is done.
+        self._retry_at[cell_uuid] = now + CONF.api.cell_timeout_retry_interval
+        return False
+
+    def record_timeout(self, cell_uuid):
+        threshold = CONF.api.cell_timeout_failure_threshold
+        if not threshold:
+            return
+        timeouts = self._timeouts.get(cell_uuid, 0) + 1
+        self._timeouts[cell_uuid] = timeouts
+        if timeouts >= threshold:
+            if timeouts == threshold:
+                LOG.warning('Cell %(cell)s timed out %(count)i times in a '
+                            'row, skipping it for %(interval)i seconds',
+                            {'cell': cell_uuid, 'count': timeouts,
+                             'interval': CONF.api.cell_timeout_retry_interval})
+            self._retry_at[cell_uuid] = (
+                timeutils.now() + CONF.api.cell_timeout_retry_interval)
+
+    def record_response(self, cell_uuid):
+        self._timeouts.pop(cell_uuid, None)
+        if self._retry_at.pop(cell_uuid, None) is not None:
+            LOG.info('Cell %s is responding again', cell_uuid)
+
+    def reset(self):
+        self._timeouts.clear()
+        self._retry_at.clear()
+
+
+CELL_BREAKER = CellCircuitBreaker()
+
+# The calls to shared_read() functions in progress, by call key, and the
+# cached results of those with a cache time, by call key.
+_SHARED_READS = {}
+_SHARED_READ_CACHE = {}
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(v) for v in value)
+    return value
+
+
+def _set_result_context(result, context):
+    if isinstance(result, ovo_base.VersionedObject):
+        result._context = context
+        if isinstance(result, ovo_base.ObjectListBase):
+            for obj in result.objects:
+                _set_result_context(obj, context)
+
+
+class _SharedRead(object):
+    """A read-only function whose identical calls can share their result.
+
+    See shared_read().
+    """
+    def __init__(self, fn, cache_time=0):
+        self.fn = fn
+        self.cache_time = cache_time
+
+    def __eq__(self, other):
+        return (isinstance(other, _SharedRead) and self.fn == other.fn and
+                self.cache_time == other.cache_time)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.fn, self.cache_time))
+
+    def _get_key(self, context, args, kwargs):
+        try:
+            key = (self.fn, context.cell_uuid, context.project_id,
+                   context.user_id, context.is_admin, context.read_deleted,
+                   tuple(sorted(context.roles)), _freeze(args),
+                   _freeze(kwargs))
+            hash(key)
+        except TypeError:
+            # The arguments cannot be compared, do not share this call.
+            return None
+        return key
+
+    def _copy_result(self, result, context):
+        result = copy.deepcopy(result)
+        _set_result_context(result, context)
+        return result
+
+    def __call__(self, context, *args, **kwargs):
+        key = self._get_key(context, args, kwargs)
+        if key is None:
+            return self.fn(context, *args, **kwargs)
+
+        if self.cache_time:
+            cached = _SHARED_READ_CACHE.get(key)
+            if cached is not None and cached[0] > timeutils.now():
+                return self._copy_result(cached[1], context)
+
+        in_progress = _SHARED_READS.get(key)
+        if in_progress is not None:
+            return self._copy_result(in_progress.wait(), context)
+
+        event = eventlet.event.Event()
+        _SHARED_READS[key] = event
+        try:
+            result = self.fn(context, *args, **kwargs)
+        except Exception as e:
+            event.send_exception(e)
+            raise
+        except BaseException:
+            # NOTE: This call was killed, most likely because the
+            # scatter-gather timed out, let the calls sharing it time out.
+            event.send_exception(exception.CellTimeout())
+            raise
+        finally:
+            _SHARED_READS.pop(key, None)
+
+        # NOTE: The waiters copy the result when they are next scheduled, by
+        # when the caller may have changed its own result, so they get a
+        # snapshot which nobody else holds. The cache keeps the same one.
+        snapshot = self._copy_result(result, None)
+        event.send(snapshot)
+        if self.cache_time:
+            now = timeutils.now()
+            for cached_key, cached in list(_SHARED_READ_CACHE.items()):
+                if cached[0] <= now:
+                    _SHARED_READ_CACHE.pop(cached_key, None)
+            _SHARED_READ_CACHE[key] = (now + self.cache_time, snapshot)
+        return result
+
+
+def shared_read(fn, cache_time=0):
+    """Wraps a read-only function to call with scatter_gather_cells().
+
+    The identical calls to the returned function in progress at the same time
+    in a cell, which are calls with the same arguments and a context with the
+    same user, project, roles and read_deleted attribute, share a single call
+    to fn. Each caller gets its own copy of the result, targeted at its own
+    context if it is a versioned object or a list of them.
+
+    :param fn: The read-only function to call for each cell
+    :param cache_time: If not 0, the number of seconds the result of a call
+                       is reused for the identical calls which follow
+    :returns: The function to pass to scatter_gather_cells()
+    """
+    return _SharedRead(fn, cache_time=cache_time)
+
+
+def reset_shared_reads():
+    """Drops the cached results of the shared_read() functions."""
+    _SHARED_READ_CACHE.clear()
+
+
 def scatter_gather_cells(context, cell_mappings, timeout, fn, *args, **kwargs):
     """Target cells in parallel and return their results.
 
@@ -426,13 +824,15 @@ def scatter_gather_cells(context, cell_mappings, timeout, fn, *args, **kwargs):
     :param kwargs: The kwargs for the function to call for each cell
     :returns: A dict {cell_uuid: result} containing the joined results. The
               did_not_respond_sentinel will be returned if a cell did not
-              respond within the timeout. The exception object will
-              be returned if the call to a cell raised an exception. The
-              exception will be logged.
+              respond within the timeout, or if it is skipped because it
+              has been timing out (see CellCircuitBreaker). The exception
+              object will be returned if the call to a cell raised an
+              exception. The exception will be logged.
     """
     greenthreads = []
     queue = eventlet.queue.LightQueue()
     results = {}
+    skipped = {}
 
     def gather_result(cell_mapping, fn, context, *args, **kwargs):
         cell_uuid = cell_mapping.uuid
@@ -448,6 +848,11 @@ def scatter_gather_cells(context, cell_mappings, timeout, fn, *args, **kwargs):
         queue.put((cell_uuid, result))
 
     for cell_mapping in cell_mappings:
+        if CELL_BREAKER.is_tripped(cell_mapping.uuid):
+            LOG.debug('Skipping cell %s which is not responding',
+                      cell_mapping.uuid)
+            skipped[cell_mapping.uuid] = did_not_respond_sentinel
+            continue
         greenthreads.append((cell_mapping.uuid,
                              utils.spawn(gather_result, cell_mapping,
                                          fn, context, *args, **kwargs)))
@@ -469,9 +874,15 @@ def scatter_gather_cells(context, cell_mappings, timeout, fn, *args, **kwargs):
             results[cell_uuid] = did_not_respond_sentinel
             LOG.warning('Timed out waiting for response from cell %s',
                         cell_uuid)
+            CELL_BREAKER.record_timeout(cell_uuid)
         else:
             greenthread.wait()
+            # NOTE: A generator is only run by the caller, which is
+            # responsible for reporting how the cell responded.
+            if not inspect.isgenerator(results[cell_uuid]):
+                CELL_BREAKER.record_response(cell_uuid)
 
+    results.update(skipped)
     return results
 
 
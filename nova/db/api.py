@@ -75,9 +75,10 @@ def not_equal(*values):
     return IMPL.not_equal(*values)
 
 
-def create_context_manager(connection):
+def create_context_manager(connection, on_engine_create=None):
     """Return a context manager for a cell database connection."""
-    return IMPL.create_context_manager(connection=connection)
+    return IMPL.create_context_manager(connection=connection,
+                                       on_engine_create=on_engine_create)
 
 
 ###################
@@ -748,6 +749,13 @@ def instance_create(context, values):
     return IMPL.instance_create(context, values)
 
 
+def instance_create_bulk(context, values_list):
+    """Create several instances, from a list of values dictionaries, in a
+    single transaction.
+    """
+    return IMPL.instance_create_bulk(context, values_list)
+
+
 def instance_destroy(context, instance_uuid, constraint=None):
     """Destroy the instance or raise if it does not exist."""
     return IMPL.instance_destroy(context, instance_uuid, constraint)
@@ -790,15 +798,23 @@ def instance_get_all_by_filters(context, filters, sort_key='created_at',
 
 def instance_get_all_by_filters_sort(context, filters, limit=None,
                                      marker=None, columns_to_join=None,
-                                     sort_keys=None, sort_dirs=None):
+                                     sort_keys=None, sort_dirs=None,
+                                     columns_to_load=None, marker_values=None):
     """Get all instances that match all filters sorted by multiple keys.
 
     sort_keys and sort_dirs must be a list of strings.
+
+    If columns_to_load is not None, only those columns of the instances table
+    are loaded, and the instances are returned as dicts holding only them.
+
+    marker_values can be given instead of a marker, as a dict of the values of
+    the sort keys to list the instances after.
     """
     return IMPL.instance_get_all_by_filters_sort(
         context, filters, limit=limit, marker=marker,
         columns_to_join=columns_to_join, sort_keys=sort_keys,
-        sort_dirs=sort_dirs)
+        sort_dirs=sort_dirs, columns_to_load=columns_to_load,
+        marker_values=marker_values)
 
 
 def instance_get_by_sort_filters(context, sort_keys, sort_dirs, values):
@@ -1199,6 +1215,11 @@ def block_device_mapping_create(context, values, legacy=True):
     return IMPL.block_device_mapping_create(context, values, legacy)
 
 
+def block_device_mapping_create_bulk(context, values_list, legacy=True):
+    """Create several entries of block device mapping in one transaction."""
+    return IMPL.block_device_mapping_create_bulk(context, values_list, legacy)
+
+
 def block_device_mapping_update(context, bdm_id, values, legacy=True):
     """Update an entry of block device mapping."""
     return IMPL.block_device_mapping_update(context, bdm_id, values, legacy)
@@ -1617,6 +1638,28 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return rv
 
 
+def bw_usage_update_bulk(context, usages, start_period, last_refreshed=None,
+                         update_cells=True):
+    """Update cached bandwidth usage for several instance networks at once.
+
+    :param usages: list of dicts with the uuid, mac, bw_in, bw_out,
+                   last_ctr_in and last_ctr_out keys. Records are created
+                   as needed.
+    """
+    IMPL.bw_usage_update_bulk(context, usages, start_period,
+                              last_refreshed=last_refreshed)
+    if update_cells:
+        for usage in usages:
+            try:
+                cells_rpcapi.CellsAPI().bw_usage_update_at_top(context,
+                        usage['uuid'], usage['mac'], start_period,
+                        usage['bw_in'], usage['bw_out'],
+                        usage['last_ctr_in'], usage['last_ctr_out'],
+                        last_refreshed)
+            except Exception:
+                LOG.exception("Failed to notify cells of bw_usage update")
+
+
 ###################
 
 
@@ -1638,6 +1681,19 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
                                  update_totals=update_totals)
 
 
+def vol_usage_update_bulk(context, usages, update_totals=False):
+    """Update cached volume usage for several volumes at once.
+
+    :param usages: list of dicts with the volume_id, instance_uuid,
+                   project_id, user_id, availability_zone, curr_reads,
+                   curr_read_bytes, curr_writes and curr_write_bytes keys.
+                   Records are created as needed.
+    :returns: the list of updated volume usage records
+    """
+    return IMPL.vol_usage_update_bulk(context, usages,
+                                      update_totals=update_totals)
+
+
 ###################
 
 
@@ -1783,10 +1839,18 @@ def task_log_get(context, task_name, period_beginning,
 ####################
 
 
-def archive_deleted_rows(max_rows=None):
+def archive_deleted_rows(max_rows=None, context=None, workers=1, throttle=0,
+                         timings=None):
     """Move up to max_rows rows from production tables to corresponding shadow
     tables.
 
+    :param max_rows: the maximum number of rows to archive, in all tables
+    :param context: the context targeting the database to archive, the main
+                    database if None
+    :param workers: the number of tables to archive concurrently
+    :param throttle: the number of seconds to sleep between batches
+    :param timings: if set, a dict that is updated with the number of
+                    seconds spent archiving each table
     :returns: dict that maps table name to number of rows archived from that
               table, for example:
 
@@ -1799,7 +1863,9 @@ def archive_deleted_rows(max_rows=None):
         }
 
     """
-    return IMPL.archive_deleted_rows(max_rows=max_rows)
+    return IMPL.archive_deleted_rows(max_rows=max_rows, context=context,
+                                     workers=workers, throttle=throttle,
+                                     timings=timings)
 
 
 def pcidevice_online_data_migration(context, max_count):
@@ -1823,6 +1889,11 @@ def instance_tag_set(context, instance_uuid, tags):
     return IMPL.instance_tag_set(context, instance_uuid, tags)
 
 
+def instance_tag_create_bulk(context, instance_uuids, tags):
+    """Add the same list of tags to several new instances."""
+    return IMPL.instance_tag_create_bulk(context, instance_uuids, tags)
+
+
 def instance_tag_get_by_instance_uuid(context, instance_uuid):
     """Get all tags for a given instance."""
     return IMPL.instance_tag_get_by_instance_uuid(context, instance_uuid)
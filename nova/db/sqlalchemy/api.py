@@ -23,7 +23,9 @@ import datetime
 import functools
 import inspect
 import sys
+import time
 
+import eventlet
 from oslo_db import api as oslo_db_api
 from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import enginefacade
@@ -47,6 +49,7 @@ from sqlalchemy.orm import aliased
 from sqlalchemy.orm import contains_eager
 from sqlalchemy.orm import joinedload
 from sqlalchemy.orm import joinedload_all
+from sqlalchemy.orm import load_only
 from sqlalchemy.orm import noload
 from sqlalchemy.orm import undefer
 from sqlalchemy.schema import Table
@@ -109,13 +112,29 @@ def configure(conf):
             lambda eng: profiler_sqlalchemy.add_tracing(sa, eng, "db"))
 
 
-def create_context_manager(connection=None):
+def _get_cell_db_conf(connection=None):
+    kw = _get_db_conf(CONF.database, connection=connection)
+    for name in ('max_pool_size', 'max_overflow', 'pool_timeout'):
+        value = CONF.cell_database[name]
+        if value is not None:
+            kw[name] = value
+    return kw
+
+
+def create_context_manager(connection=None, on_engine_create=None):
     """Create a database context manager object.
 
+    The connection pool is sized with the [cell_database] options, when set,
+    rather than with the [database] ones.
+
     : param connection: The database connection string
+    : param on_engine_create: A function called with each engine created by
+                              the context manager
     """
     ctxt_mgr = enginefacade.transaction_context()
-    ctxt_mgr.configure(**_get_db_conf(CONF.database, connection=connection))
+    ctxt_mgr.configure(**_get_cell_db_conf(connection=connection))
+    if on_engine_create is not None:
+        ctxt_mgr.append_on_engine_create(on_engine_create)
     return ctxt_mgr
 
 
@@ -144,6 +163,17 @@ def get_api_engine():
 
 
 _SHADOW_TABLE_PREFIX = 'shadow_'
+
+# The number of rows archived in the first batch of every table, and the
+# bounds and target duration the batch size is adapted within.
+_ARCHIVE_INITIAL_BATCH_SIZE = 1000
+_ARCHIVE_MIN_BATCH_SIZE = 10
+_ARCHIVE_MAX_BATCH_SIZE = 10000
+_ARCHIVE_TARGET_BATCH_SECONDS = 1.0
+# The id of the last deleted instance walked by
+# _soft_delete_instance_dependents, keyed by database URL and table name.
+_INSTANCE_DEPENDENTS_MARKERS = {}
+
 _DEFAULT_QUOTA_NAME = 'default'
 PER_PROJECT_QUOTAS = ['fixed_ips', 'floating_ips', 'networks']
 
@@ -1727,6 +1757,53 @@ def instance_create(context, values):
 
     security_group_ensure_default(context)
 
+    instance_ref = _instance_create(context, values, {})
+
+    # create the instance uuid to ec2_id mapping entry for instance
+    ec2_instance_create(context, instance_ref['uuid'])
+
+    # Parity with the return value of instance_get_all_by_filters_sort()
+    # Obviously a newly-created instance record can't already have a fault
+    # record because of the FK constraint, so this is fine.
+    instance_ref.fault = None
+
+    return instance_ref
+
+
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@pick_context_manager_writer
+def instance_create_bulk(context, values_list):
+    """Create several new Instance records in the database.
+
+    All the records, and their related records, are added to the session and
+    written in a single flush, so the ORM can batch the inserts into each
+    table instead of doing a round trip per instance.
+
+    context - request context object
+    values_list - list of dicts containing column values.
+    """
+
+    security_group_ensure_default(context)
+
+    sec_groups_cache = {}
+    instance_refs = [_instance_create(context, values, sec_groups_cache)
+                     for values in values_list]
+    context.session.add_all([models.InstanceIdMapping(uuid=ref['uuid'])
+                             for ref in instance_refs])
+    context.session.flush()
+
+    for instance_ref in instance_refs:
+        instance_ref.fault = None
+    return instance_refs
+
+
+def _instance_create(context, values, sec_groups_cache):
+    """Add a new Instance model, built from values, to the session.
+
+    sec_groups_cache is a dict used to look up each set of security groups
+    only once when creating several instances.
+    """
     values = values.copy()
     values['metadata'] = _metadata_refs(
             values.get('metadata'), models.InstanceMetadata)
@@ -1767,17 +1844,13 @@ def instance_create(context, values):
 
     if 'hostname' in values:
         _validate_unique_server_name(context, values['hostname'])
-    instance_ref.security_groups = _get_sec_group_models(security_groups)
+    sec_groups_key = tuple(security_groups)
+    if sec_groups_key not in sec_groups_cache:
+        sec_groups_cache[sec_groups_key] = _get_sec_group_models(
+            security_groups)
+    instance_ref.security_groups = list(sec_groups_cache[sec_groups_key])
     context.session.add(instance_ref)
 
-    # create the instance uuid to ec2_id mapping entry for instance
-    ec2_instance_create(context, instance_ref['uuid'])
-
-    # Parity with the return value of instance_get_all_by_filters_sort()
-    # Obviously a newly-created instance record can't already have a fault
-    # record because of the FK constraint, so this is fine.
-    instance_ref.fault = None
-
     return instance_ref
 
 
@@ -1895,7 +1968,8 @@ def _build_instance_get(context, columns_to_join=None):
     return query
 
 
-def _instances_fill_metadata(context, instances, manual_joins=None):
+def _instances_fill_metadata(context, instances, manual_joins=None,
+                             loaded_only=False):
     """Selectively fill instances with manually-joined metadata. Note that
     instance will be converted to a dict.
 
@@ -1904,6 +1978,9 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
     :param manual_joins: list of tables to manually join (can be any
                          combination of 'metadata' and 'system_metadata' or
                          None to take the default of both)
+    :param loaded_only: if True, only the columns and joins which were loaded
+                        by the query are put in the dicts, instead of loading
+                        the deferred columns one instance at a time
     """
     uuids = [inst['uuid'] for inst in instances]
 
@@ -1933,7 +2010,11 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
 
     filled_instances = []
     for inst in instances:
-        inst = dict(inst)
+        if loaded_only:
+            inst = {key: value for key, value in inst.__dict__.items()
+                    if not key.startswith('_')}
+        else:
+            inst = dict(inst)
         inst['system_metadata'] = sys_meta[inst['uuid']]
         inst['metadata'] = meta[inst['uuid']]
         if 'pci_devices' in manual_joins:
@@ -1945,6 +2026,25 @@ def _instances_fill_metadata(context, instances, manual_joins=None):
     return filled_instances
 
 
+class _SortValuesMarker(object):
+    """Stands for a marker record given by the values of its sort keys.
+
+    The sort keys which are not given, like the default ones added by
+    process_sort_params(), are None and thus left out of the comparison by
+    paginate_query().
+    """
+    def __init__(self, values):
+        self._values = values
+
+    def __getattr__(self, key):
+        return self._values.get(key)
+
+
+# The columns of the instances table which Instance._from_db_object() always
+# needs, whichever subset of the columns was asked for.
+_INSTANCE_REQUIRED_COLUMNS = frozenset(['id', 'uuid', 'deleted', 'cleaned'])
+
+
 def _manual_join_columns(columns_to_join):
     """Separate manually joined columns from columns_to_join
 
@@ -2037,11 +2137,20 @@ def _get_query_nova_resource_by_changes_time(query, filters, model_object):
 @pick_context_manager_reader_allow_async
 def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                                      columns_to_join=None, sort_keys=None,
-                                     sort_dirs=None):
+                                     sort_dirs=None, columns_to_load=None,
+                                     marker_values=None):
     """Return instances that match all filters sorted by the given keys.
     Deleted instances will be returned by default, unless there's a filter that
     says otherwise.
 
+    If columns_to_load is not None, only those columns of the instances table,
+    along with the ones always needed to build an Instance object, are
+    selected.
+
+    Instead of a marker uuid, marker_values can be a dict of the values of the
+    sort keys to return the instances after, which saves looking the marker
+    instance up.
+
     Depending on the name of a filter, matching for that filter is
     performed using either exact matching or as regular expression
     matching. Exact matching is applied for the following filters::
@@ -2121,6 +2230,10 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
         else:
             query_prefix = query_prefix.options(joinedload(column))
 
+    if columns_to_load is not None:
+        query_prefix = query_prefix.options(load_only(
+            *(set(columns_to_load) | _INSTANCE_REQUIRED_COLUMNS)))
+
     # Note: order_by is done in the sqlalchemy.utils.py paginate_query(),
     # no need to do it here as well
 
@@ -2232,6 +2345,8 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
                     context.elevated(read_deleted='yes'), marker)
         except exception.InstanceNotFound:
             raise exception.MarkerNotFound(marker=marker)
+    elif marker_values is not None:
+        marker = _SortValuesMarker(marker_values)
     try:
         query_prefix = sqlalchemyutils.paginate_query(query_prefix,
                                models.Instance, limit,
@@ -2241,7 +2356,8 @@ def instance_get_all_by_filters_sort(context, filters, limit=None, marker=None,
     except db_exc.InvalidSortKey:
         raise exception.InvalidSortKey()
 
-    return _instances_fill_metadata(context, query_prefix.all(), manual_joins)
+    return _instances_fill_metadata(context, query_prefix.all(), manual_joins,
+                                    loaded_only=columns_to_load is not None)
 
 
 @require_context
@@ -3722,6 +3838,22 @@ def _set_or_validate_uuid(values):
 @require_context
 @pick_context_manager_writer
 def block_device_mapping_create(context, values, legacy=True):
+    bdm_ref = _block_device_mapping_model(values, legacy)
+    bdm_ref.save(context.session)
+    return bdm_ref
+
+
+@require_context
+@pick_context_manager_writer
+def block_device_mapping_create_bulk(context, values_list, legacy=True):
+    bdm_refs = [_block_device_mapping_model(values, legacy)
+                for values in values_list]
+    context.session.add_all(bdm_refs)
+    context.session.flush()
+    return bdm_refs
+
+
+def _block_device_mapping_model(values, legacy):
     _scrub_empty_str_values(values, ['volume_size'])
     values = _from_legacy_values(values, legacy)
     convert_objects_related_datetimes(values)
@@ -3730,7 +3862,6 @@ def block_device_mapping_create(context, values, legacy=True):
 
     bdm_ref = models.BlockDeviceMapping()
     bdm_ref.update(values)
-    bdm_ref.save(context.session)
     return bdm_ref
 
 
@@ -4877,6 +5008,63 @@ def bw_usage_update(context, uuid, mac, start_period, bw_in, bw_out,
     return bwusage
 
 
+@require_context
+@oslo_db_api.wrap_db_retry(max_retries=5, retry_on_deadlock=True)
+@pick_context_manager_writer
+def bw_usage_update_bulk(context, usages, start_period, last_refreshed=None):
+    if not usages:
+        return
+
+    if last_refreshed is None:
+        last_refreshed = timeutils.utcnow()
+
+    ts_values = {'last_refreshed': last_refreshed,
+                 'start_period': start_period}
+    ts_keys = ('start_period', 'last_refreshed')
+    ts_values = convert_objects_related_datetimes(ts_values, *ts_keys)
+
+    # NOTE(pkholkin): order_by() is needed here to ensure that the
+    # same record is updated every time. It can be removed after adding
+    # unique constraint to this model.
+    query = model_query(context, models.BandwidthUsage,
+                        (models.BandwidthUsage.id,
+                         models.BandwidthUsage.uuid,
+                         models.BandwidthUsage.mac),
+                        read_deleted='yes').\
+        filter_by(start_period=ts_values['start_period']).\
+        filter(models.BandwidthUsage.uuid.in_(
+            set(usage['uuid'] for usage in usages))).\
+        order_by(asc(models.BandwidthUsage.id))
+    existing = {}
+    for bw_id, uuid, mac in query:
+        existing.setdefault((uuid, mac), bw_id)
+
+    to_update = []
+    to_create = []
+    for usage in usages:
+        values = {'last_refreshed': ts_values['last_refreshed'],
+                  'last_ctr_in': usage['last_ctr_in'],
+                  'last_ctr_out': usage['last_ctr_out'],
+                  'bw_in': usage['bw_in'],
+                  'bw_out': usage['bw_out']}
+        bw_id = existing.get((usage['uuid'], usage['mac']))
+        if bw_id is not None:
+            values['_id'] = bw_id
+            to_update.append(values)
+        else:
+            values.update(start_period=ts_values['start_period'],
+                          uuid=usage['uuid'],
+                          mac=usage['mac'])
+            to_create.append(values)
+
+    tab = models.BandwidthUsage.__table__
+    if to_update:
+        context.session.execute(
+            tab.update().where(tab.c.id == sql.bindparam('_id')), to_update)
+    if to_create:
+        context.session.execute(tab.insert(), to_create)
+
+
 ####################
 
 
@@ -4892,14 +5080,9 @@ def vol_get_usage_by_time(context, begin):
                               )).all()
 
 
-@require_context
-@pick_context_manager_writer
-def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
-                     instance_id, project_id, user_id, availability_zone,
-                     update_totals=False):
-
-    refreshed = timeutils.utcnow()
-
+def _vol_usage_update(context, current_usage, refreshed, id, rd_req,
+                      rd_bytes, wr_req, wr_bytes, instance_id, project_id,
+                      user_id, availability_zone, update_totals=False):
     values = {}
     # NOTE(dricco): We will be mostly updating current usage records vs
     # updating total or creating records. Optimize accordingly.
@@ -4930,10 +5113,6 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
                   'user_id': user_id,
                   'availability_zone': availability_zone}
 
-    current_usage = model_query(context, models.VolumeUsage,
-                        read_deleted="yes").\
-                        filter_by(volume_id=id).\
-                        first()
     if current_usage:
         if (rd_req < current_usage['curr_reads'] or
             rd_bytes < current_usage['curr_read_bytes'] or
@@ -4969,7 +5148,6 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
 
         current_usage.update(values)
         current_usage.save(context.session)
-        context.session.refresh(current_usage)
         return current_usage
 
     vol_usage = models.VolumeUsage()
@@ -4997,6 +5175,55 @@ def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
     return vol_usage
 
 
+@require_context
+@pick_context_manager_writer
+def vol_usage_update(context, id, rd_req, rd_bytes, wr_req, wr_bytes,
+                     instance_id, project_id, user_id, availability_zone,
+                     update_totals=False):
+    current_usage = model_query(context, models.VolumeUsage,
+                        read_deleted="yes").\
+                        filter_by(volume_id=id).\
+                        first()
+    vol_usage = _vol_usage_update(
+        context, current_usage, timeutils.utcnow(), id, rd_req, rd_bytes,
+        wr_req, wr_bytes, instance_id, project_id, user_id,
+        availability_zone, update_totals=update_totals)
+    if current_usage:
+        context.session.refresh(vol_usage)
+    return vol_usage
+
+
+@require_context
+@pick_context_manager_writer
+def vol_usage_update_bulk(context, usages, update_totals=False):
+    if not usages:
+        return []
+
+    refreshed = timeutils.utcnow()
+    volume_ids = [usage['volume_id'] for usage in usages]
+    query = model_query(context, models.VolumeUsage, read_deleted="yes").\
+        filter(models.VolumeUsage.volume_id.in_(volume_ids))
+    current_usages = {}
+    for current_usage in query:
+        current_usages.setdefault(current_usage.volume_id, current_usage)
+
+    vol_usages = []
+    for usage in usages:
+        vol_usages.append(_vol_usage_update(
+            context, current_usages.get(usage['volume_id']), refreshed,
+            usage['volume_id'], usage['curr_reads'],
+            usage['curr_read_bytes'], usage['curr_writes'],
+            usage['curr_write_bytes'], usage['instance_uuid'],
+            usage['project_id'], usage['user_id'],
+            usage['availability_zone'], update_totals=update_totals))
+
+    if current_usages:
+        # The totals of existing records were updated with SQL expressions
+        # which expired them, load the new values with a single query.
+        query.all()
+    return vol_usages
+
+
 ####################
 
 
@@ -5469,14 +5696,189 @@ def _archive_if_instance_deleted(table, shadow_table, instances, conn,
         return 0
 
 
-def _archive_deleted_rows_for_table(tablename, max_rows):
+class _ArchiveBudget(object):
+    """The number of rows that may still be archived by one
+    archive_deleted_rows call.
+
+    The tables archived concurrently share a single budget, which they draw
+    from batch by batch. This does not need a lock because the greenthreads
+    never yield between checking and updating it.
+    """
+
+    def __init__(self, max_rows):
+        # None means that there is no limit.
+        self.remaining = max_rows
+
+    @property
+    def exhausted(self):
+        return self.remaining is not None and self.remaining <= 0
+
+    def take(self, count):
+        """Reserve up to count rows and return how many were reserved."""
+        if self.remaining is None:
+            return count
+        count = max(min(count, self.remaining), 0)
+        self.remaining -= count
+        return count
+
+    def give_back(self, count):
+        """Return the reserved rows that were not archived after all."""
+        if self.remaining is not None:
+            self.remaining += count
+
+
+class _ArchiveBatchSize(object):
+    """Adapt the size of archive batches to the observed statement latency.
+
+    The size is halved when a batch takes longer than the target time and
+    doubled when a full batch takes less than half of it, within
+    _ARCHIVE_MIN_BATCH_SIZE and _ARCHIVE_MAX_BATCH_SIZE.
+    """
+
+    def __init__(self, size=_ARCHIVE_INITIAL_BATCH_SIZE,
+                 target=_ARCHIVE_TARGET_BATCH_SECONDS):
+        self.size = size
+        self.target = target
+
+    def record(self, rows, elapsed):
+        if elapsed > self.target:
+            self.size = max(self.size // 2, _ARCHIVE_MIN_BATCH_SIZE)
+        elif elapsed < self.target / 2 and rows >= self.size:
+            self.size = min(self.size * 2, _ARCHIVE_MAX_BATCH_SIZE)
+
+
+def _soft_delete_instance_dependents(conn, table, batch_size, max_rows):
+    """Soft delete the rows of table that belong to deleted instances.
+
+    Tables instance_actions, instance_actions_events and migrations are not
+    soft deleted along with their instance. The deleted instances are walked
+    in batches of batch_size on their primary key so that every UPDATE only
+    touches the rows of a bounded number of instances.
+
+    The walk resumes after the last instance walked by the previous call for
+    the same database and table, wrapping around to the first deleted
+    instance, and stops early once max_rows rows were soft deleted. The
+    archive budget is then used up by these rows, so the deleted instances
+    whose rows were not walked yet are not archived before them.
+
+    :param max_rows: the number of rows to soft delete before stopping, or
+                     None to walk every deleted instance
+    """
+    instances = models.BASE.metadata.tables['instances']
+    instance_actions = models.BASE.metadata.tables['instance_actions']
+    key = (str(conn.engine.url), table.name)
+    start = _INSTANCE_DEPENDENTS_MARKERS.pop(key, None)
+    marker = start
+    # Whether the walk went past the last deleted instance and started over
+    # from the first one, up to where it started.
+    wrapped = start is None
+    soft_deleted = 0
+    while True:
+        query = sql.select([instances.c.id, instances.c.uuid]).where(
+            instances.c.deleted != instances.c.deleted.default.arg)
+        if marker is not None:
+            query = query.where(instances.c.id > marker)
+        if wrapped and start is not None:
+            query = query.where(instances.c.id <= start)
+        rows = conn.execute(
+            query.order_by(instances.c.id).limit(batch_size)).fetchall()
+        if rows:
+            marker = rows[-1][0]
+            deleted_uuids = [r[1] for r in rows]
+
+            if table.name == 'instance_actions_events':
+                # NOTE(clecomte): we have to grab all the relation from
+                # instances because instance_actions_events rely on
+                # action_id and not uuid
+                owned = table.c.action_id.in_(
+                    sql.select([instance_actions.c.id]).where(
+                        instance_actions.c.instance_uuid.in_(deleted_uuids)))
+            else:
+                owned = table.c.instance_uuid.in_(deleted_uuids)
+            soft_deleted += conn.execute(
+                table.update().values(deleted=table.c.id).where(
+                    and_(owned,
+                         table.c.deleted == table.c.deleted.default.arg))
+            ).rowcount
+
+        if len(rows) < batch_size and wrapped:
+            return
+        if max_rows is not None and soft_deleted >= max_rows:
+            _INSTANCE_DEPENDENTS_MARKERS[key] = marker
+            return
+        if len(rows) < batch_size:
+            wrapped = True
+            marker = None
+
+
+def _archive_batch(conn, table, shadow_table, column, marker, limit):
+    """Move the next batch of up to limit deleted rows after marker to the
+    shadow table.
+
+    The batch is selected as a range of the primary key so that the INSERT
+    and DELETE statements only need an index range scan, no matter how
+    large the batch is.
+
+    :returns: a tuple of the number of rows archived, the uuids of the
+              archived instances if table is instances, and the marker to
+              continue from, which is None once there are no rows left.
+    """
+    deleted_column = table.c.deleted
+    select = sql.select([column],
+                        deleted_column != deleted_column.default.arg)
+    if marker is not None:
+        select = select.where(column > marker)
+    rows = conn.execute(select.order_by(column).limit(limit)).fetchall()
+    if not rows:
+        return 0, [], None
+    low, high = rows[0][0], rows[-1][0]
+
+    in_range = and_(deleted_column != deleted_column.default.arg,
+                    column.between(low, high))
+    insert = shadow_table.insert(inline=True).from_select(
+        [c.name for c in table.c], sql.select([table], in_range))
+    # Only delete what made it to the shadow table, in case more rows of the
+    # range were soft deleted since the INSERT.
+    shadow_column = shadow_table.c[column.name]
+    archived = and_(in_range, column.in_(
+        sql.select([shadow_column], shadow_column.between(low, high))))
+
+    instance_uuids = []
+    # Group the insert and delete in a transaction.
+    with conn.begin():
+        conn.execute(insert)
+        # NOTE(tssurya): In order to facilitate the deletion of records from
+        # instance_mappings, request_specs and instance_group_member tables in
+        # the nova_api DB, the rows of deleted instances from the instances
+        # table are stored prior to their deletion. Basically the uuids of the
+        # archived instances are queried and returned.
+        if table.name == 'instances':
+            instance_uuids = [r[0] for r in conn.execute(
+                sql.select([table.c.uuid], archived)).fetchall()]
+        result_delete = conn.execute(table.delete().where(archived))
+    return result_delete.rowcount, instance_uuids, high
+
+
+def _archive_deleted_rows_for_table(tablename, max_rows, context=None,
+                                    budget=None, throttle=0):
     """Move up to max_rows rows from one tables to the corresponding
     shadow table.
 
+    The rows are moved in batches whose size adapts to how long each batch
+    takes.
+
+    :param tablename: the name of the table to archive
+    :param max_rows: the maximum number of rows to archive, None for no limit
+    :param context: the context targeting the database to archive, the main
+                    database if None
+    :param budget: an _ArchiveBudget shared with other tables, which is used
+                   instead of max_rows if set
+    :param throttle: the number of seconds to sleep between batches
     :returns: number of rows archived
     """
-    engine = get_engine()
-    conn = engine.connect()
+    if budget is None:
+        budget = _ArchiveBudget(max_rows)
+    engine = get_engine(context=context)
     metadata = MetaData()
     metadata.bind = engine
     # NOTE(tdurakov): table metadata should be received
@@ -5500,91 +5902,124 @@ def _archive_deleted_rows_for_table(tablename, max_rows):
         column = table.c.domain
     else:
         column = table.c.id
-    # NOTE(guochbo): Use DeleteFromSelect to avoid
-    # database's limit of maximum parameter in one SQL statement.
-    deleted_column = table.c.deleted
-    columns = [c.name for c in table.c]
-
-    # NOTE(clecomte): Tables instance_actions and instances_actions_events
-    # have to be manage differently so we soft-delete them here to let
-    # the archive work the same for all tables
-    # NOTE(takashin): The record in table migrations should be
-    # soft deleted when the instance is deleted.
-    # This is just for upgrading.
-    if tablename in ("instance_actions", "migrations"):
-        instances = models.BASE.metadata.tables["instances"]
-        deleted_instances = sql.select([instances.c.uuid]).\
-            where(instances.c.deleted != instances.c.deleted.default.arg)
-        update_statement = table.update().values(deleted=table.c.id).\
-            where(table.c.instance_uuid.in_(deleted_instances))
-
-        conn.execute(update_statement)
-
-    elif tablename == "instance_actions_events":
-        # NOTE(clecomte): we have to grab all the relation from
-        # instances because instance_actions_events rely on
-        # action_id and not uuid
-        instances = models.BASE.metadata.tables["instances"]
-        instance_actions = models.BASE.metadata.tables["instance_actions"]
-        deleted_instances = sql.select([instances.c.uuid]).\
-            where(instances.c.deleted != instances.c.deleted.default.arg)
-        deleted_actions = sql.select([instance_actions.c.id]).\
-            where(instance_actions.c.instance_uuid.in_(deleted_instances))
-
-        update_statement = table.update().values(deleted=table.c.id).\
-            where(table.c.action_id.in_(deleted_actions))
-
-        conn.execute(update_statement)
+    batch_size = _ArchiveBatchSize()
 
-    select = sql.select([column],
-                        deleted_column != deleted_column.default.arg).\
-                        order_by(column).limit(max_rows)
-    rows = conn.execute(select).fetchall()
-    records = [r[0] for r in rows]
-
-    if records:
-        insert = shadow_table.insert(inline=True).\
-                from_select(columns, sql.select([table], column.in_(records)))
-        delete = table.delete().where(column.in_(records))
-        # NOTE(tssurya): In order to facilitate the deletion of records from
-        # instance_mappings, request_specs and instance_group_member tables in
-        # the nova_api DB, the rows of deleted instances from the instances
-        # table are stored prior to their deletion. Basically the uuids of the
-        # archived instances are queried and returned.
-        if tablename == "instances":
-            query_select = sql.select([table.c.uuid], table.c.id.in_(records))
-            rows = conn.execute(query_select).fetchall()
-            deleted_instance_uuids = [r[0] for r in rows]
-
-        try:
-            # Group the insert and delete in a transaction.
-            with conn.begin():
-                conn.execute(insert)
-                result_delete = conn.execute(delete)
-            rows_archived = result_delete.rowcount
-        except db_exc.DBReferenceError as ex:
-            # A foreign key constraint keeps us from deleting some of
-            # these rows until we clean up a dependent table.  Just
-            # skip this table for now; we'll come back to it later.
-            LOG.warning("IntegrityError detected when archiving table "
-                        "%(tablename)s: %(error)s",
-                        {'tablename': tablename, 'error': six.text_type(ex)})
-
-    if ((max_rows is None or rows_archived < max_rows)
-            and 'instance_uuid' in columns):
-        instances = models.BASE.metadata.tables['instances']
-        limit = max_rows - rows_archived if max_rows is not None else None
-        extra = _archive_if_instance_deleted(table, shadow_table, instances,
-                                             conn, limit)
-        rows_archived += extra
+    conn = engine.connect()
+    try:
+        # NOTE(clecomte): Tables instance_actions and instances_actions_events
+        # have to be manage differently so we soft-delete them here to let
+        # the archive work the same for all tables
+        # NOTE(takashin): The record in table migrations should be
+        # soft deleted when the instance is deleted.
+        # This is just for upgrading.
+        if (tablename in ("instance_actions", "instance_actions_events",
+                          "migrations") and not budget.exhausted):
+            _soft_delete_instance_dependents(conn, table, batch_size.size,
+                                             budget.remaining)
+
+        marker = None
+        while not budget.exhausted:
+            limit = budget.take(batch_size.size)
+            timer = timeutils.StopWatch()
+            timer.start()
+            try:
+                archived, instance_uuids, marker = _archive_batch(
+                    conn, table, shadow_table, column, marker, limit)
+            except db_exc.DBReferenceError as ex:
+                # A foreign key constraint keeps us from deleting some of
+                # these rows until we clean up a dependent table.  Just
+                # skip this table for now; we'll come back to it later.
+                LOG.warning("IntegrityError detected when archiving table "
+                            "%(tablename)s: %(error)s",
+                            {'tablename': tablename,
+                             'error': six.text_type(ex)})
+                budget.give_back(limit)
+                break
+            budget.give_back(limit - archived)
+            rows_archived += archived
+            deleted_instance_uuids.extend(instance_uuids)
+            if marker is None:
+                break
+            batch_size.record(archived, timer.elapsed())
+            if throttle:
+                time.sleep(throttle)
+
+        if 'instance_uuid' in table.c:
+            instances = models.BASE.metadata.tables['instances']
+            while not budget.exhausted:
+                limit = budget.take(batch_size.size)
+                extra = _archive_if_instance_deleted(
+                    table, shadow_table, instances, conn, limit)
+                budget.give_back(limit - extra)
+                rows_archived += extra
+                if extra < limit:
+                    break
+                if throttle:
+                    time.sleep(throttle)
+    finally:
+        conn.close()
 
     return rows_archived, deleted_instance_uuids
 
 
-def archive_deleted_rows(max_rows=None):
+def _archive_waves(metadata):
+    """Group the tables to archive into waves that can be archived in order.
+
+    A table is placed in a later wave than every table that references it,
+    so the rows referencing a deleted row are archived before it is. The
+    tables of the same wave do not depend on each other and can be archived
+    concurrently.
+
+    Besides the foreign keys, the tables that hold rows of an instance are
+    treated as referencing the instances table, because their deleted rows
+    are only found by looking for deleted instances.
+
+    :returns: a list of lists of table names
+    """
+    tables = [t for t in metadata.sorted_tables
+              # skip the special sqlalchemy-migrate migrate_version table and
+              # any shadow tables
+              if not (t.name == 'migrate_version' or
+                      t.name.startswith(_SHADOW_TABLE_PREFIX))]
+    referrers = collections.defaultdict(set)
+    for table in tables:
+        for fkey in table.foreign_keys:
+            if fkey.column.table is not table:
+                referrers[fkey.column.table.name].add(table.name)
+        if ('instance_uuid' in table.c or
+                table.name == 'instance_actions_events'):
+            referrers['instances'].add(table.name)
+
+    waves = {}
+
+    def _wave(tablename, seen=()):
+        if tablename not in waves:
+            # Guard against reference cycles, which would otherwise recurse
+            # forever; the tables of a cycle are archived together.
+            seen += (tablename,)
+            waves[tablename] = max([_wave(referrer, seen) + 1
+                                    for referrer in referrers[tablename]
+                                    if referrer not in seen] or [0])
+        return waves[tablename]
+
+    grouped = collections.defaultdict(list)
+    for table in tables:
+        grouped[_wave(table.name)].append(table.name)
+    return [grouped[wave] for wave in sorted(grouped)]
+
+
+def archive_deleted_rows(max_rows=None, context=None, workers=1, throttle=0,
+                         timings=None):
     """Move up to max_rows rows from production tables to the corresponding
     shadow tables.
 
+    :param max_rows: the maximum number of rows to archive, in all tables
+    :param context: the context targeting the database to archive, the main
+                    database if None
+    :param workers: the number of tables to archive concurrently
+    :param throttle: the number of seconds to sleep between batches
+    :param timings: if set, a dict that is updated with the number of
+                    seconds spent archiving each table
     :returns: dict that maps table name to number of rows archived from that
               table, for example:
 
@@ -5599,29 +6034,36 @@ def archive_deleted_rows(max_rows=None):
     """
     table_to_rows_archived = {}
     deleted_instance_uuids = []
-    total_rows_archived = 0
-    meta = MetaData(get_engine(use_slave=True))
+    budget = _ArchiveBudget(max_rows)
+    meta = MetaData(get_engine(use_slave=True, context=context))
     meta.reflect()
-    # Reverse sort the tables so we get the leaf nodes first for processing.
-    for table in reversed(meta.sorted_tables):
-        tablename = table.name
-        rows_archived = 0
-        # skip the special sqlalchemy-migrate migrate_version table and any
-        # shadow tables
-        if (tablename == 'migrate_version' or
-                tablename.startswith(_SHADOW_TABLE_PREFIX)):
-            continue
-        rows_archived,\
-        deleted_instance_uuid = _archive_deleted_rows_for_table(
-                tablename, max_rows=max_rows - total_rows_archived)
-        total_rows_archived += rows_archived
-        if tablename == 'instances':
-            deleted_instance_uuids = deleted_instance_uuid
-        # Only report results for tables that had updates.
-        if rows_archived:
-            table_to_rows_archived[tablename] = rows_archived
-        if total_rows_archived >= max_rows:
+
+    def _archive(tablename):
+        timer = timeutils.StopWatch()
+        timer.start()
+        rows_archived, deleted_instance_uuid = (
+            _archive_deleted_rows_for_table(tablename, max_rows,
+                                            context=context, budget=budget,
+                                            throttle=throttle))
+        return tablename, rows_archived, deleted_instance_uuid, timer.elapsed()
+
+    pool = eventlet.GreenPool(size=workers)
+    for wave in _archive_waves(meta):
+        if budget.exhausted:
             break
+        for tablename, rows_archived, deleted_instance_uuid, elapsed in (
+                pool.imap(_archive, wave)):
+            if timings is not None:
+                timings[tablename] = timings.get(tablename, 0) + elapsed
+            if tablename == 'instances':
+                deleted_instance_uuids = deleted_instance_uuid
+            # Only report results for tables that had updates.
+            if rows_archived:
+                table_to_rows_archived[tablename] = rows_archived
+                LOG.debug('Archived %(rows)d rows from %(table)s in '
+                          '%(elapsed).2f seconds',
+                          {'rows': rows_archived, 'table': tablename,
+                           'elapsed': elapsed})
     return table_to_rows_archived, deleted_instance_uuids
 
 
@@ -5631,13 +6073,145 @@ def _purgeable_tables(metadata):
                 t.name.endswith('migrate_version'))]
 
 
-def purge_shadow_tables(context, before_date, status_fn=None):
+def _parse_partition_bound(description):
+    """Parse the upper bound of a RANGE COLUMNS partition on a timestamp
+    column, as found in information_schema.PARTITIONS.
+
+    :returns: a datetime, or None if the bound is MAXVALUE or not a
+              timestamp
+    """
+    description = description.strip("'")
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.datetime.strptime(description, fmt)
+        except ValueError:
+            pass
+    return None
+
+
+def _purge_table_partitions(conn, table, col, before_date, status_fn):
+    """Drop the partitions of a shadow table which only hold rows older than
+    before_date.
+
+    Shadow tables are not partitioned by nova, but operators can partition
+    them on MySQL by RANGE COLUMNS of the column used to purge them, in which
+    case dropping a partition is much cheaper than deleting its rows.
+
+    :returns: the estimated number of rows dropped
+    """
+    if conn.engine.name != 'mysql':
+        return 0
+    partitions = conn.execute(sql.text(
+        "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, PARTITION_EXPRESSION, "
+        "TABLE_ROWS FROM information_schema.PARTITIONS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table "
+        "AND PARTITION_METHOD = 'RANGE COLUMNS' "
+        "ORDER BY PARTITION_ORDINAL_POSITION"), table=table.name).fetchall()
+    to_drop = []
+    dropped_rows = 0
+    for name, description, expression, table_rows in partitions:
+        if expression.strip('`') != col.name:
+            return 0
+        bound = _parse_partition_bound(description)
+        # The rows of a partition are strictly below its bound, so it can go
+        # if its bound is not after before_date. Partitions are ordered by
+        # their bound so we can stop at the first one that has to stay.
+        if bound is None or bound > before_date.replace(tzinfo=None):
+            break
+        to_drop.append(name)
+        dropped_rows += table_rows or 0
+    # A table must keep at least one partition.
+    if to_drop and len(to_drop) == len(partitions):
+        to_drop.pop()
+    if not to_drop:
+        return 0
+
+    conn.execute('ALTER TABLE `%s` DROP PARTITION %s' % (
+        table.name, ', '.join('`%s`' % name for name in to_drop)))
+    status_fn(_('Dropped partitions %(partitions)s of %(table)s based on '
+                'timestamp column %(col)s') % {
+                    'partitions': ', '.join(to_drop),
+                    'table': table.name,
+                    'col': col.name})
+    return dropped_rows
+
+
+def _purge_table_rows(conn, table, col, before_date, budget, throttle):
+    """Delete the rows of a shadow table older than before_date, or all of
+    them if before_date is None.
+
+    The rows are deleted in batches of consecutive primary keys, each of
+    which is committed on its own, so that no statement has to hold a large
+    number of row locks or undo records. The shadow tables have no index on
+    their timestamp columns, so walking the primary key also means that the
+    whole purge only scans each table once.
+
+    :returns: the number of rows deleted
+    """
+    conditions = []
+    if col is not None:
+        conditions.append(col < before_date)
+    primary_key = list(table.primary_key.columns)
+    if len(primary_key) != 1:
+        delete = table.delete()
+        if conditions:
+            delete = delete.where(and_(*conditions))
+        return conn.execute(delete).rowcount
+    key = primary_key[0]
+
+    batch_size = _ArchiveBatchSize()
+    deleted = 0
+    marker = None
+    while not budget.exhausted:
+        limit = budget.take(batch_size.size)
+        timer = timeutils.StopWatch()
+        timer.start()
+        select = sql.select([key])
+        if conditions:
+            select = select.where(and_(*conditions))
+        if marker is not None:
+            select = select.where(key > marker)
+        keys = [r[0] for r in conn.execute(
+            select.order_by(key).limit(limit)).fetchall()]
+        if not keys:
+            budget.give_back(limit)
+            break
+        marker = keys[-1]
+        delete = table.delete().where(
+            and_(key.between(keys[0], keys[-1]), *conditions))
+        result = conn.execute(delete)
+        budget.give_back(limit - result.rowcount)
+        deleted += result.rowcount
+        if len(keys) < limit:
+            break
+        batch_size.record(result.rowcount, timer.elapsed())
+        if throttle:
+            time.sleep(throttle)
+    return deleted
+
+
+def purge_shadow_tables(context, before_date, status_fn=None, max_rows=None,
+                        throttle=0):
+    """Delete rows from the shadow tables.
+
+    :param context: the context targeting the database to purge
+    :param before_date: only delete the rows older than this datetime, or
+                        all rows if None
+    :param status_fn: a function called with a message about the progress
+    :param max_rows: the maximum number of rows to delete, in all tables.
+                     Rows are deleted in batches that are committed as they
+                     go, so a purge that stops at max_rows can be continued
+                     by running it again.
+    :param throttle: the number of seconds to sleep between batches
+    :returns: the number of rows deleted
+    """
     engine = get_engine(context=context)
     conn = engine.connect()
     metadata = MetaData()
     metadata.bind = engine
     metadata.reflect()
     total_deleted = 0
+    budget = _ArchiveBudget(max_rows)
 
     if status_fn is None:
         status_fn = lambda m: None
@@ -5650,36 +6224,41 @@ def purge_shadow_tables(context, before_date, status_fn=None):
         'shadow_instance_actions_events': 'created_at',
     }
 
-    for table in _purgeable_tables(metadata):
-        if before_date is None:
-            col = None
-        elif table.name in overrides:
-            col = getattr(table.c, overrides[table.name])
-        elif hasattr(table.c, 'deleted_at'):
-            col = table.c.deleted_at
-        elif hasattr(table.c, 'updated_at'):
-            col = table.c.updated_at
-        elif hasattr(table.c, 'created_at'):
-            col = table.c.created_at
-        else:
-            status_fn(_('Unable to purge table %(table)s because it '
-                        'has no timestamp column') % {
-                            'table': table.name})
-            continue
-
-        if col is not None:
-            delete = table.delete().where(col < before_date)
-        else:
-            delete = table.delete()
-
-        deleted = conn.execute(delete)
-        if deleted.rowcount > 0:
-            status_fn(_('Deleted %(rows)i rows from %(table)s based on '
-                        'timestamp column %(col)s') % {
-                            'rows': deleted.rowcount,
-                            'table': table.name,
-                            'col': col is None and '(n/a)' or col.name})
-        total_deleted += deleted.rowcount
+    try:
+        for table in _purgeable_tables(metadata):
+            if budget.exhausted:
+                break
+            if before_date is None:
+                col = None
+            elif table.name in overrides:
+                col = getattr(table.c, overrides[table.name])
+            elif hasattr(table.c, 'deleted_at'):
+                col = table.c.deleted_at
+            elif hasattr(table.c, 'updated_at'):
+                col = table.c.updated_at
+            elif hasattr(table.c, 'created_at'):
+                col = table.c.created_at
+            else:
+                status_fn(_('Unable to purge table %(table)s because it '
+                            'has no timestamp column') % {
+                                'table': table.name})
+                continue
+
+            if col is not None:
+                total_deleted += _purge_table_partitions(
+                    conn, table, col, before_date, status_fn)
+
+            deleted = _purge_table_rows(conn, table, col, before_date,
+                                        budget, throttle)
+            if deleted > 0:
+                status_fn(_('Deleted %(rows)i rows from %(table)s based on '
+                            'timestamp column %(col)s') % {
+                                'rows': deleted,
+                                'table': table.name,
+                                'col': col is None and '(n/a)' or col.name})
+            total_deleted += deleted
+    finally:
+        conn.close()
 
     return total_deleted
 
@@ -5828,6 +6407,17 @@ def instance_tag_set(context, instance_uuid, tags):
         resource_id=instance_uuid).all()
 
 
+@pick_context_manager_writer
+def instance_tag_create_bulk(context, instance_uuids, tags):
+    # NOTE: This is only used for instances which were just created, so
+    # unlike instance_tag_set there are no existing tags to look up.
+    data = [{'resource_id': instance_uuid, 'tag': tag}
+            for instance_uuid in instance_uuids
+            for tag in sorted(set(tags))]
+    if data:
+        context.session.execute(models.Tag.__table__.insert(), data)
+
+
 @pick_context_manager_reader
 def instance_tag_get_by_instance_uuid(context, instance_uuid):
     _check_instance_exists_in_project(context, instance_uuid)
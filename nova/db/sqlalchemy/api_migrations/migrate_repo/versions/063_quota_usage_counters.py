@@ -0,0 +1,44 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""Database migrations for quota usage counters"""
+
+from migrate import UniqueConstraint
+from sqlalchemy import Column
+from sqlalchemy import DateTime
+from sqlalchemy import Integer
+from sqlalchemy import MetaData
+from sqlalchemy import String
+from sqlalchemy import Table
+
+
+def upgrade(migrate_engine):
+    meta = MetaData()
+    meta.bind = migrate_engine
+
+    quota_usage_counters = Table('quota_usage_counters', meta,
+        Column('created_at', DateTime),
+        Column('updated_at', DateTime),
+        Column('id', Integer, primary_key=True, nullable=False,
+               autoincrement=True),
+        Column('project_id', String(length=255), nullable=False),
+        Column('user_id', String(length=255), nullable=False),
+        Column('instances', Integer, nullable=False, default=0),
+        Column('cores', Integer, nullable=False, default=0),
+        Column('ram', Integer, nullable=False, default=0),
+        Column('generation', Integer, nullable=False, default=0),
+        UniqueConstraint('project_id', 'user_id',
+            name='uniq_quota_usage_counters0project_id0user_id'),
+        mysql_engine='InnoDB',
+        mysql_charset='utf8'
+    )
+
+    quota_usage_counters.create(checkfirst=True)
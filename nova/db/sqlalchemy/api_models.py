@@ -584,6 +584,26 @@ class Reservation(API_BASE):
         primaryjoin='Reservation.usage_id == QuotaUsage.id')
 
 
+class QuotaUsageCounter(API_BASE):
+    """Represents the counted instance usage of a user within a project."""
+
+    __tablename__ = 'quota_usage_counters'
+    __table_args__ = (
+        schema.UniqueConstraint('project_id', 'user_id',
+            name='uniq_quota_usage_counters0project_id0user_id'),
+    )
+    id = Column(Integer, primary_key=True, nullable=False, autoincrement=True)
+    project_id = Column(String(255), nullable=False)
+    user_id = Column(String(255), nullable=False)
+
+    instances = Column(Integer, nullable=False, default=0)
+    cores = Column(Integer, nullable=False, default=0)
+    ram = Column(Integer, nullable=False, default=0)
+    # Incremented whenever the counts are updated, so that a reconciliation
+    # can tell whether they changed while the usage was being counted.
+    generation = Column(Integer, nullable=False, default=0)
+
+
 class Trait(API_BASE):
     """Represents a trait."""
 
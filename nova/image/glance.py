@@ -34,7 +34,6 @@ from cursive import signature_utils
 import glanceclient
 import glanceclient.exc
 from glanceclient.v2 import schemas
-from keystoneauth1 import loading as ks_loading
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
 from oslo_utils import excutils
@@ -63,8 +62,7 @@ def _session_and_auth(context):
     global _SESSION
 
     if not _SESSION:
-        _SESSION = ks_loading.load_session_from_conf_options(
-            CONF, nova.conf.glance.glance_group.name)
+        _SESSION = utils.get_ksa_session(nova.conf.glance.glance_group.name)
 
     auth = service_auth.get_auth_plugin(context)
 
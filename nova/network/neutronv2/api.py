@@ -169,8 +169,7 @@ def _get_auth_plugin(context, admin=False):
 def _get_session():
     global _SESSION
     if not _SESSION:
-        _SESSION = ks_loading.load_session_from_conf_options(
-            CONF, nova.conf.neutron.NEUTRON_GROUP)
+        _SESSION = utils.get_ksa_session(nova.conf.neutron.NEUTRON_GROUP)
     return _SESSION
 
 
@@ -14,13 +14,17 @@
 
 """Nova common internal object model"""
 
+import base64
 import contextlib
 import datetime
 import functools
 import traceback
+import zlib
 
+import msgpack
 import netaddr
 import oslo_messaging as messaging
+from oslo_serialization import jsonutils
 from oslo_utils import versionutils
 from oslo_versionedobjects import base as ovoo_base
 from oslo_versionedobjects import exception as ovoo_exc
@@ -94,6 +98,15 @@ class NovaObject(ovoo_base.VersionedObject):
     OBJ_SERIAL_NAMESPACE = 'nova_object'
     OBJ_PROJECT_NAMESPACE = 'nova'
 
+    # NOTE: These are nova-specific. With [conductor]/delta_object_save
+    # enabled, save() is remoted to the conductor with only the changed
+    # fields and these fields identifying the object, see
+    # obj_delta_for_save(). Objects which do not set any are sent whole.
+    obj_delta_save_keys = ()
+    # The fields that save() refreshes from the database which are returned
+    # to the caller although they were not sent.
+    obj_delta_save_refreshed = ()
+
     # NOTE(ndipanov): This is nova-specific
     @staticmethod
     def should_migrate_data():
@@ -114,6 +127,25 @@ class NovaObject(ovoo_base.VersionedObject):
         finally:
             self._context = original_context
 
+    def obj_delta_save_fields(self):
+        """Returns the names of the fields save() needs to be remoted."""
+        return set(self.obj_delta_save_keys) | self.obj_what_changed()
+
+    def obj_delta_for_save(self):
+        """Returns a copy of this object with only the fields that save()
+        needs, for it to be remoted with delta encoding.
+
+        The copy shares the values of the fields with this object.
+        """
+        changes = self.obj_what_changed()
+        names = set(name for name in self.obj_delta_save_fields()
+                    if self.obj_attr_is_set(name))
+        delta = self.__class__(context=self._context)
+        for name in names:
+            setattr(delta, name, getattr(self, name))
+        delta.obj_reset_changes(names - changes)
+        return delta
+
 
 class NovaPersistentObject(object):
     """Mixin class for Persistent objects.
@@ -213,7 +245,10 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
         return entity
 
     def deserialize_entity(self, context, entity):
-        if isinstance(entity, dict) and 'nova_object.name' in entity:
+        if isinstance(entity, dict) and 'nova_object.compact' in entity:
+            entity = self.deserialize_entity(
+                context, obj_primitive_from_compact(entity))
+        elif isinstance(entity, dict) and 'nova_object.name' in entity:
             entity = self._process_object(context, entity)
         elif isinstance(entity, (tuple, list, set, dict)):
             entity = self._process_iterable(context, self.deserialize_entity,
@@ -221,6 +256,116 @@ class NovaObjectSerializer(messaging.NoOpSerializer):
         return entity
 
 
+# The version of the compact encoding of object primitives, recorded in
+# every encoded value so that the encoding can evolve.
+COMPACT_VERSION = 1
+# The msgpack extension type of an object primitive in the compact encoding
+_COMPACT_OBJECT = 1
+_COMPACT_OBJECT_KEYS = frozenset(['nova_object.name', 'nova_object.namespace',
+                                  'nova_object.version', 'nova_object.data'])
+
+
+def _compact_key(key):
+    # NOTE: Convert keys the same way as JSON does, so that both encodings
+    # decode to the same value.
+    if isinstance(key, six.string_types):
+        return key
+    return jsonutils.dumps(key)
+
+
+class _CompactEncoder(object):
+    """Replaces the object primitives in a value with msgpack extension
+    types, recording the name, namespace, version and field names of each
+    kind of object once in the schemas.
+    """
+
+    def __init__(self):
+        self.schemas = []
+        self._schema_indexes = {}
+
+    def encode(self, value):
+        if isinstance(value, dict):
+            keys = set(value)
+            if (_COMPACT_OBJECT_KEYS <= keys and
+                    keys <= _COMPACT_OBJECT_KEYS | {'nova_object.changes'}):
+                return self._encode_object(value)
+            return {_compact_key(k): self.encode(v) for k, v in value.items()}
+        if isinstance(value, (list, tuple, set)):
+            return [self.encode(v) for v in value]
+        return value
+
+    def _encode_object(self, primitive):
+        data = primitive['nova_object.data']
+        names = tuple(sorted(data))
+        schema = (primitive['nova_object.name'],
+                  primitive['nova_object.namespace'],
+                  primitive['nova_object.version'],
+                  names)
+        index = self._schema_indexes.get(schema)
+        if index is None:
+            index = self._schema_indexes[schema] = len(self.schemas)
+            self.schemas.append(list(schema[:3]) + [list(names)])
+        # The changed fields are recorded by their ordinal in the schema.
+        changes = primitive.get('nova_object.changes')
+        if changes is not None:
+            changes = [names.index(name) if name in data else name
+                       for name in changes]
+        values = [self.encode(data[name]) for name in names]
+        return msgpack.ExtType(_COMPACT_OBJECT, msgpack.packb(
+            [index, values, changes], use_bin_type=False,
+            default=jsonutils.to_primitive))
+
+
+def obj_primitive_to_compact(value):
+    """Encode a value containing object primitives compactly.
+
+    The value, typically the primitive of an object or a list of them, is
+    encoded with msgpack, with the fields of each object as a list ordered
+    by field name rather than a dict, and the name, namespace and version of
+    the objects and their field names recorded once for each kind of object.
+    The encoded value is then compressed, which mostly shrinks the JSON
+    documents held in fields like InstanceInfoCache.network_info. The result
+    can be sent over RPC and decoded with obj_primitive_from_compact().
+    """
+    encoder = _CompactEncoder()
+    data = msgpack.packb(encoder.encode(value), use_bin_type=False,
+                         default=jsonutils.to_primitive)
+    # NOTE: The fastest compression level still shrinks the repetitive
+    # primitives of object lists several times over.
+    data = zlib.compress(data, 1)
+    return {'nova_object.compact': COMPACT_VERSION,
+            'nova_object.schemas': encoder.schemas,
+            'nova_object.data': base64.b64encode(data).decode('ascii')}
+
+
+def obj_primitive_from_compact(compact):
+    """Decode a value encoded with obj_primitive_to_compact().
+
+    :returns: the value, with its object primitives as they were before
+        being encoded
+    """
+    schemas = compact['nova_object.schemas']
+
+    def _ext_hook(code, data):
+        if code != _COMPACT_OBJECT:
+            return msgpack.ExtType(code, data)
+        index, values, changes = msgpack.unpackb(
+            data, ext_hook=_ext_hook, raw=False)
+        name, namespace, version, names = schemas[index]
+        primitive = {'nova_object.name': name,
+                     'nova_object.namespace': namespace,
+                     'nova_object.version': version,
+                     'nova_object.data': dict(zip(names, values))}
+        if changes is not None:
+            primitive['nova_object.changes'] = [
+                names[change] if isinstance(change, six.integer_types)
+                else change for change in changes]
+        return primitive
+
+    data = zlib.decompress(base64.b64decode(compact['nova_object.data']))
+    return msgpack.unpackb(data, ext_hook=_ext_hook, raw=False)
+
+
 def obj_to_primitive(obj):
     """Recursively turn an object into a python primitive.
 
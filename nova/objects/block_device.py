@@ -435,6 +435,34 @@ class BlockDeviceMappingList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(
                 context, cls(), objects.BlockDeviceMapping, db_bdms or [])
 
+    @classmethod
+    def create_bulk(cls, context, bdms):
+        """Create several new block device mappings in one transaction.
+
+        This is used by the conductor when creating the instances of a
+        multi-create request, so unlike BlockDeviceMapping.create() it is not
+        remotable and does not support cells v1.
+
+        :param context: The request context, targeted at the cell in which
+                        to create the block device mappings
+        :param bdms: List of new BlockDeviceMapping objects to create
+        """
+        updates = []
+        for bdm in bdms:
+            if bdm.obj_attr_is_set('id'):
+                raise exception.ObjectActionError(action='create',
+                                                  reason='already created')
+            changes = bdm.obj_get_changes()
+            if 'instance' in changes:
+                raise exception.ObjectActionError(action='create',
+                                                  reason='instance assigned')
+            updates.append(changes)
+        db_bdms = db.block_device_mapping_create_bulk(context, updates,
+                                                      legacy=False)
+        for bdm, db_bdm in zip(bdms, db_bdms):
+            with bdm.obj_alternate_context(context):
+                bdm._from_db_object(context, bdm, db_bdm)
+
     def root_bdm(self):
         """It only makes sense to call this method when the
         BlockDeviceMappingList contains BlockDeviceMappings from
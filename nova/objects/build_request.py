@@ -279,6 +279,23 @@ class BuildRequestList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.BuildRequest,
                                   db_build_reqs)
 
+    @staticmethod
+    @db.api_context_manager.reader
+    def _get_instance_uuids_from_db(context, instance_uuids):
+        return context.session.query(
+            api_models.BuildRequest.instance_uuid).filter(
+            api_models.BuildRequest.instance_uuid.in_(instance_uuids)).all()
+
+    @classmethod
+    def get_existing_instance_uuids(cls, context, instance_uuids):
+        """Return the set of the given instance uuids which still have a build
+        request, without loading the build requests themselves.
+        """
+        if not instance_uuids:
+            return set()
+        return set(row.instance_uuid for row in
+                   cls._get_instance_uuids_from_db(context, instance_uuids))
+
     @staticmethod
     def _pass_exact_filters(instance, filters):
         for filter_key, filter_val in filters.items():
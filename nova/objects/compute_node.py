@@ -97,6 +97,12 @@ class ComputeNode(base.NovaPersistentObject, base.NovaObject):
         'mapped': fields.IntegerField(),
         }
 
+    obj_delta_save_keys = ('id',)
+    # NOTE: save() may update the allocation ratios from the configuration.
+    obj_delta_save_refreshed = ('updated_at', 'cpu_allocation_ratio',
+                                'ram_allocation_ratio',
+                                'disk_allocation_ratio')
+
     def obj_make_compatible(self, primitive, target_version):
         super(ComputeNode, self).obj_make_compatible(primitive, target_version)
         target_version = versionutils.convert_version_to_tuple(target_version)
@@ -15,6 +15,7 @@
 from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import utils as sqlalchemyutils
 from oslo_utils import versionutils
+from sqlalchemy import func
 from sqlalchemy import or_
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql.expression import asc
@@ -628,6 +629,17 @@ def _flavor_get_all_from_db(context, inactive, filters, sort_key, sort_dir,
     return [_dict_with_extra_specs(i) for i in query.all()]
 
 
+@db_api.api_context_manager.reader
+def _flavor_get_change_version_from_db(context):
+    parts = []
+    for model in (api_models.Flavors, api_models.FlavorExtraSpecs,
+                  api_models.FlavorProjects):
+        parts.extend(context.session.query(
+            func.count(model.id), func.max(model.id),
+            func.max(model.updated_at)).one())
+    return ':'.join(str(part) for part in parts)
+
+
 @base.NovaObjectRegistry.register
 class FlavorList(base.ObjectListBase, base.NovaObject):
     VERSION = '1.1'
@@ -649,3 +661,14 @@ class FlavorList(base.ObjectListBase, base.NovaObject):
         return base.obj_make_list(context, cls(context), objects.Flavor,
                                   api_db_flavors,
                                   expected_attrs=['extra_specs'])
+
+    @classmethod
+    def get_change_version(cls, context):
+        """Returns a string which changes whenever any flavor changes.
+
+        The version is derived from the number of rows, the highest id and
+        the latest update time of the flavors, their extra specs and their
+        projects, so it is cheap to compute compared to listing the flavors
+        and changes on any flavor create, update or delete.
+        """
+        return _flavor_get_change_version_from_db(context)
@@ -13,11 +13,13 @@
 #    under the License.
 
 import contextlib
+import functools
 
 from oslo_config import cfg
 from oslo_db import exception as db_exc
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+from oslo_utils import excutils
 from oslo_utils import timeutils
 from oslo_utils import versionutils
 from sqlalchemy import or_
@@ -105,6 +107,99 @@ def _expected_cols(expected_attrs):
 _NO_DATA_SENTINEL = object()
 
 
+class _SaveCoalescer(object):
+    """Tracks the save() calls deferred by Instance.coalesce_saves().
+
+    Deferring a save() simply leaves the changes on the object, the next
+    save() which is actually performed writes all of them at once. Since the
+    database has not seen the task_state and vm_state values set by the
+    deferred calls, the guard of the next save() is extended with the values
+    the database is known to hold.
+    """
+
+    _GUARDED_FIELDS = ('task_state', 'vm_state')
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.deferred = 0
+        self.coalesced = 0
+        self._snapshot()
+
+    def _snapshot(self):
+        # Remember the values known to be in the database for the fields
+        # used as guards.
+        changes = self.instance.obj_what_changed()
+        self.known = {}
+        for field in self._GUARDED_FIELDS:
+            if field not in changes and self.instance.obj_attr_is_set(field):
+                self.known[field] = self.instance[field]
+        self.pending = {}
+
+    def _expand_guard(self, field, expected):
+        if (expected is None or field not in self.pending or
+                field not in self.known):
+            return expected
+        if not isinstance(expected, (list, tuple, set)):
+            expected = [expected]
+        if (self.pending[field] in expected and
+                self.known[field] not in expected):
+            expected = list(expected) + [self.known[field]]
+        return expected
+
+    def save(self, expected_vm_state=None, expected_task_state=None,
+             admin_state_reset=False):
+        if (expected_vm_state is None and expected_task_state is None and
+                not admin_state_reset):
+            changes = self.instance.obj_what_changed()
+            for field in self._GUARDED_FIELDS:
+                if field in changes:
+                    self.pending[field] = self.instance[field]
+            if changes:
+                self.deferred += 1
+            return
+        self.flush(
+            expected_vm_state=self._expand_guard('vm_state',
+                                                 expected_vm_state),
+            expected_task_state=self._expand_guard('task_state',
+                                                   expected_task_state),
+            admin_state_reset=admin_state_reset)
+
+    def flush(self, **kwargs):
+        """Performs the save() now, along with the deferred ones."""
+        instance = self.instance
+        instance._save_coalescer = None
+        try:
+            instance.save(**kwargs)
+        finally:
+            instance._save_coalescer = self
+        self.coalesced += self.deferred
+        self.deferred = 0
+        self._snapshot()
+
+
+def _coalescable_save(fn):
+    """Decorator routing Instance.save() through the active coalescer."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if self._save_coalescer is None:
+            return fn(self, *args, **kwargs)
+        return self._save_coalescer.save(*args, **kwargs)
+    return wrapper
+
+
+def _flush_coalesced_saves(fn):
+    """Decorator writing the deferred changes before calling the method.
+
+    This is needed by the methods resetting the changes of the instance.
+    """
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if self._save_coalescer is not None and self._save_coalescer.deferred:
+            self._save_coalescer.flush()
+        return fn(self, *args, **kwargs)
+    return wrapper
+
+
 # TODO(berrange): Remove NovaObjectDictCompat
 @base.NovaObjectRegistry.register
 class Instance(base.NovaPersistentObject, base.NovaObject,
@@ -219,6 +314,12 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
 
     obj_extra_fields = ['name']
 
+    obj_delta_save_keys = ('uuid',)
+    obj_delta_save_refreshed = ('updated_at',)
+
+    # Set by coalesce_saves() for the duration of its block.
+    _save_coalescer = None
+
     def obj_make_compatible(self, primitive, target_version):
         super(Instance, self).obj_make_compatible(primitive, target_version)
         target_version = versionutils.convert_version_to_tuple(target_version)
@@ -357,10 +458,15 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
         self.obj_reset_changes(['flavor', 'old_flavor', 'new_flavor'])
 
     @staticmethod
-    def _from_db_object(context, instance, db_inst, expected_attrs=None):
+    def _from_db_object(context, instance, db_inst, expected_attrs=None,
+                        loaded_columns=None):
         """Method to help with migration to objects.
 
         Converts a database entity to a formal object.
+
+        If loaded_columns is not None, the database entity was listed with
+        only those columns, and the fields missing from it which are not in
+        loaded_columns are left unset.
         """
         instance._context = context
         if expected_attrs is None:
@@ -373,6 +479,12 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 instance.deleted = db_inst['deleted'] == db_inst['id']
             elif field == 'cleaned':
                 instance.cleaned = db_inst['cleaned'] == 1
+            elif (loaded_columns is not None and
+                    field not in loaded_columns and field not in db_inst):
+                # NOTE: The instance was listed with only a subset of its
+                # columns (see instance_get_all_by_filters_sort), leave the
+                # field unset.
+                continue
             else:
                 instance[field] = db_inst[field]
 
@@ -518,6 +630,14 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
 
     @base.remotable
     def create(self):
+        updates, expected_attrs = self._get_create_updates()
+        db_inst = db.instance_create(self._context, updates)
+        self._finish_create(db_inst, expected_attrs)
+
+    def _get_create_updates(self):
+        """Return the database values and the expected_attrs to create this
+        instance with.
+        """
         if self.obj_attr_is_set('id'):
             raise exception.ObjectActionError(action='create',
                                               reason='already created')
@@ -597,7 +717,9 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 trusted_certs.obj_to_primitive())
         else:
             updates['extra']['trusted_certs'] = None
-        db_inst = db.instance_create(self._context, updates)
+        return updates, expected_attrs
+
+    def _finish_create(self, db_inst, expected_attrs):
         self._from_db_object(self._context, self, db_inst, expected_attrs)
 
         # NOTE(danms): The EC2 ids are created on their first load. In order
@@ -725,6 +847,15 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                 value = jsonutils.dumps(obj.obj_to_primitive())
             self._extra_values_to_save[field] = value
 
+    def obj_delta_save_fields(self):
+        names = super(Instance, self).obj_delta_save_fields()
+        # _save_flavor() writes the three flavors together.
+        flavors = set(['flavor', 'old_flavor', 'new_flavor'])
+        if names & flavors:
+            names |= flavors
+        return names
+
+    @_coalescable_save
     @base.remotable
     def save(self, expected_vm_state=None,
              expected_task_state=None, admin_state_reset=False):
@@ -869,6 +1000,7 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
 
         self.obj_reset_changes()
 
+    @_flush_coalesced_saves
     @base.remotable
     def refresh(self, use_slave=False):
         extra = [field for field in INSTANCE_OPTIONAL_ATTRS
@@ -1058,6 +1190,50 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
                     self.migration_context, attr_name)
                 setattr(self, inst_attr_name, attr_value)
 
+    @contextlib.contextmanager
+    def coalesce_saves(self, enabled=True):
+        """Context manager merging the unguarded save() calls of a block.
+
+        Within the block, save() calls given neither an expected_vm_state,
+        an expected_task_state nor admin_state_reset are deferred. Their
+        changes are written along with the next guarded save(), which is
+        still performed synchronously, or when the block is left.
+
+        If the block raises, the deferred changes are only written if the
+        task_state of the instance in the database is still the last one
+        written from here, so that a concurrent delete is not overwritten.
+
+        :param enabled: if False, this is a no-op
+        """
+        if not enabled or self._save_coalescer is not None:
+            yield
+            return
+
+        coalescer = _SaveCoalescer(self)
+        self._save_coalescer = coalescer
+        try:
+            yield
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                self._save_coalescer = None
+                if coalescer.deferred and 'task_state' in coalescer.known:
+                    try:
+                        self.save(expected_task_state=[
+                            coalescer.known['task_state']])
+                    except Exception as e:
+                        LOG.debug('Unable to save the deferred changes of '
+                                  'the instance: %s', e, instance=self)
+        else:
+            self._save_coalescer = None
+            if coalescer.deferred:
+                self.save()
+                coalescer.coalesced += coalescer.deferred
+            if coalescer.coalesced:
+                LOG.debug('Coalesced %d instance save(s).',
+                          coalescer.coalesced, instance=self)
+        finally:
+            self._save_coalescer = None
+
     @contextlib.contextmanager
     def mutated_migration_context(self):
         """Context manager to temporarily apply the migration context.
@@ -1268,7 +1444,8 @@ class Instance(base.NovaPersistentObject, base.NovaObject,
             self._context, self.uuid)
 
 
-def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
+def _make_instance_list(context, inst_list, db_inst_list, expected_attrs,
+                        loaded_columns=None):
     get_fault = expected_attrs and 'fault' in expected_attrs
     inst_faults = {}
     if get_fault:
@@ -1287,7 +1464,7 @@ def _make_instance_list(context, inst_list, db_inst_list, expected_attrs):
     for db_inst in db_inst_list:
         inst_obj = inst_cls._from_db_object(
                 context, inst_cls(context), db_inst,
-                expected_attrs=expected_attrs)
+                expected_attrs=expected_attrs, loaded_columns=loaded_columns)
         if get_fault:
             inst_obj.fault = inst_faults.get(inst_obj.uuid, None)
         inst_list.objects.append(inst_obj)
@@ -1342,6 +1519,26 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
                 marker=marker, columns_to_join=_expected_cols(expected_attrs))
         return db_inst_list
 
+    @classmethod
+    def create_bulk(cls, context, instances):
+        """Create several new instances in a single database transaction.
+
+        This is used by the conductor to create the instances of a
+        multi-create request which were scheduled to the same cell, so
+        unlike Instance.create() it is not remotable.
+
+        :param context: The request context, targeted at the cell in which
+                        to create the instances
+        :param instances: List of new Instance objects to create
+        """
+        creates = [instance._get_create_updates() for instance in instances]
+        db_insts = db.instance_create_bulk(
+            context, [updates for updates, expected_attrs in creates])
+        for instance, db_inst, (updates, expected_attrs) in zip(
+                instances, db_insts, creates):
+            with instance.obj_alternate_context(context):
+                instance._finish_create(db_inst, expected_attrs)
+
     @base.remotable_classmethod
     def get_by_filters(cls, context, filters,
                        sort_key='created_at', sort_dir='desc', limit=None,
@@ -1571,6 +1768,83 @@ class InstanceList(base.ObjectListBase, base.NovaObject):
         """
         return cls._get_counts_in_db(context, project_id, user_id=user_id)
 
+    @staticmethod
+    @db_api.pick_context_manager_reader
+    def _get_counts_by_user_in_db(context, project_id):
+        # NOTE: This uses the same filters as _get_counts_in_db so that the
+        # usage counters reconciled from it match the counted quota usage.
+        not_soft_deleted = or_(
+            models.Instance.vm_state != vm_states.SOFT_DELETED,
+            models.Instance.vm_state == null()
+            )
+        rows = context.session.query(
+            models.Instance.user_id,
+            func.count(models.Instance.id),
+            func.sum(models.Instance.vcpus),
+            func.sum(models.Instance.memory_mb)).\
+            filter_by(deleted=0).\
+            filter(not_soft_deleted).\
+            filter_by(project_id=project_id).\
+            group_by(models.Instance.user_id).\
+            all()
+        fields = ('instances', 'cores', 'ram')
+        counts = {row[0]: {field: int(row[idx + 1] or 0)
+                           for idx, field in enumerate(fields)}
+                  for row in rows}
+
+        # NOTE: Unlike _get_counts_in_db, an instance being resized counts
+        # the larger of its old and new flavors until the resize is confirmed
+        # or reverted, the same as the usage counters do. The old and new
+        # flavors are left behind by a failed resize, so they are only read
+        # for the instances in a resize.
+        resizing = context.session.query(
+            models.Instance.user_id,
+            models.Instance.vcpus,
+            models.Instance.memory_mb,
+            models.InstanceExtra.flavor).\
+            join(models.InstanceExtra,
+                 models.InstanceExtra.instance_uuid == models.Instance.uuid).\
+            filter(models.Instance.deleted == 0).\
+            filter(not_soft_deleted).\
+            filter(models.Instance.project_id == project_id).\
+            filter(or_(
+                models.Instance.vm_state == vm_states.RESIZED,
+                models.Instance.task_state.in_(
+                    task_states.resizing_states))).\
+            all()
+        for user_id, vcpus, memory_mb, db_flavor in resizing:
+            if not db_flavor:
+                continue
+            flavor_info = jsonutils.loads(db_flavor)
+            flavors = [objects.Flavor.obj_from_primitive(flavor_info[key])
+                       for key in ('old', 'new') if flavor_info.get(key)]
+            vcpus = vcpus or 0
+            memory_mb = memory_mb or 0
+            counts[user_id]['cores'] += max(
+                [vcpus] + [flavor.vcpus for flavor in flavors]) - vcpus
+            counts[user_id]['ram'] += max(
+                [memory_mb] + [flavor.memory_mb for flavor in flavors]
+            ) - memory_mb
+        return counts
+
+    @classmethod
+    def get_counts_by_user(cls, context, project_id):
+        """Get the counts of Instance objects in a project, per user.
+
+        Unlike get_counts, an instance being resized counts the larger of the
+        cores and ram of its old and new flavors.
+
+        :param context: The request context for database access
+        :param project_id: The project_id to count across
+        :returns: A dict keyed by user_id of the user-scoped counts. For
+                  example:
+
+                    {<user_id>: {'instances': <count across user>,
+                                 'cores': <count across user>,
+                                 'ram': <count across user>}}
+        """
+        return cls._get_counts_by_user_in_db(context, project_id)
+
     @staticmethod
     @db_api.pick_context_manager_reader
     def _get_count_by_hosts(context, hosts):
@@ -13,12 +13,14 @@
 import collections
 
 from oslo_log import log as logging
+from oslo_utils import timeutils
 from oslo_utils import versionutils
 import six
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql import false
 from sqlalchemy.sql import or_
 
+import nova.conf
 from nova import context as nova_context
 from nova.db.sqlalchemy import api as db_api
 from nova.db.sqlalchemy import api_models
@@ -31,6 +33,7 @@ from nova.objects import fields
 from nova.objects import virtual_interface
 
 
+CONF = nova.conf.CONF
 LOG = logging.getLogger(__name__)
 
 
@@ -50,6 +53,11 @@ class InstanceMapping(base.NovaTimestampObject, base.NovaObject):
         'queued_for_delete': fields.BooleanField(default=False),
         }
 
+    # In-process LRU cache of the mappings of scheduled instances, keyed by
+    # instance uuid, of (expiry time, mapping) tuples. See
+    # get_by_instance_uuid_cached().
+    _CACHE = collections.OrderedDict()
+
     def obj_make_compatible(self, primitive, target_version):
         super(InstanceMapping, self).obj_make_compatible(primitive,
                                                          target_version)
@@ -113,6 +121,53 @@ class InstanceMapping(base.NovaTimestampObject, base.NovaObject):
         db_mapping = cls._get_by_instance_uuid_from_db(context, instance_uuid)
         return cls._from_db_object(context, cls(), db_mapping)
 
+    @staticmethod
+    def _bind_context(mapping, context):
+        mapping._context = context
+        if mapping.cell_mapping is not None:
+            mapping.cell_mapping._context = context
+        return mapping
+
+    @classmethod
+    def get_by_instance_uuid_cached(cls, context, instance_uuid):
+        """Get an instance mapping, caching it once the instance is in a cell.
+
+        This is meant for the API service, see the
+        [api]instance_mapping_cache_size option. The cache is local to the
+        process, and a mapping is dropped from it when it is saved or
+        destroyed by this process or when it expires. Callers get their own
+        copy of the mapping and may update it.
+        """
+        if not CONF.api.instance_mapping_cache_size:
+            return cls.get_by_instance_uuid(context, instance_uuid)
+
+        entry = cls._CACHE.pop(instance_uuid, None)
+        if entry is not None and entry[0] > timeutils.now():
+            # Move the mapping back to the most recently used end.
+            cls._CACHE[instance_uuid] = entry
+            return cls._bind_context(entry[1].obj_clone(), context)
+
+        mapping = cls.get_by_instance_uuid(context, instance_uuid)
+        # An unscheduled instance gets its cell soon, so it is not cached.
+        if mapping.cell_mapping is not None:
+            cached = cls._bind_context(mapping.obj_clone(), None)
+            cls._CACHE[instance_uuid] = (
+                timeutils.now() + CONF.api.instance_mapping_cache_time,
+                cached)
+            while len(cls._CACHE) > CONF.api.instance_mapping_cache_size:
+                cls._CACHE.popitem(last=False)
+        return mapping
+
+    @classmethod
+    def clear_cache(cls, instance_uuids=None):
+        """Drop the given instance mappings, or all of them, from the cache.
+        """
+        if instance_uuids is None:
+            cls._CACHE.clear()
+            return
+        for instance_uuid in instance_uuids:
+            cls._CACHE.pop(instance_uuid, None)
+
     @staticmethod
     @db_api.api_context_manager.writer
     def _create_in_db(context, updates):
@@ -164,6 +219,7 @@ class InstanceMapping(base.NovaTimestampObject, base.NovaObject):
                 changes)
         self._from_db_object(self._context, self, db_mapping)
         self.obj_reset_changes()
+        self.clear_cache([self.instance_uuid])
 
     @staticmethod
     @db_api.api_context_manager.writer
@@ -176,6 +232,7 @@ class InstanceMapping(base.NovaTimestampObject, base.NovaObject):
     @base.remotable
     def destroy(self):
         self._destroy_in_db(self._context, self.instance_uuid)
+        self.clear_cache([self.instance_uuid])
 
 
 @db_api.api_context_manager.writer
@@ -351,8 +408,23 @@ class InstanceMappingList(base.ObjectListBase, base.NovaObject):
 
     @classmethod
     def destroy_bulk(cls, context, instance_uuids):
+        objects.InstanceMapping.clear_cache(instance_uuids)
         return cls._destroy_bulk_in_db(context, instance_uuids)
 
+    @staticmethod
+    @db_api.api_context_manager.writer
+    def _set_cell_mapping_bulk_in_db(context, instance_uuids, cell_id):
+        return context.session.query(api_models.InstanceMapping).filter(
+                api_models.InstanceMapping.instance_uuid.in_(instance_uuids)).\
+                update({'cell_id': cell_id}, synchronize_session=False)
+
+    @classmethod
+    def set_cell_mapping_bulk(cls, context, instance_uuids, cell_mapping):
+        """Map several instances to a cell with a single update."""
+        objects.InstanceMapping.clear_cache(instance_uuids)
+        return cls._set_cell_mapping_bulk_in_db(context, instance_uuids,
+                                                cell_mapping.id)
+
     @staticmethod
     @db_api.api_context_manager.reader
     def _get_not_deleted_by_cell_and_project_from_db(context, cell_uuid,
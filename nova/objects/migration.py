@@ -67,6 +67,9 @@ class Migration(base.NovaPersistentObject, base.NovaObject,
         'disk_remaining': fields.IntegerField(nullable=True),
         }
 
+    obj_delta_save_keys = ('id',)
+    obj_delta_save_refreshed = ('updated_at',)
+
     @staticmethod
     def _from_db_object(context, migration, db_migration):
         for key in migration.fields:
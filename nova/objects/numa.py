@@ -264,17 +264,24 @@ class NUMATopology(base.NovaObject):
 class NUMATopologyLimits(base.NovaObject):
     # Version 1.0: Initial version
     # Version 1.1: Add network_metadata field
-    VERSION = '1.1'
+    # Version 1.2: Add host_cells field
+    VERSION = '1.2'
 
     fields = {
         'cpu_allocation_ratio': fields.FloatField(),
         'ram_allocation_ratio': fields.FloatField(),
         'network_metadata': fields.ObjectField('NetworkMetadata'),
+        # The ids of the host NUMA cells, in instance cell order, which the
+        # scheduler fitted the instance onto. This is only a hint used to
+        # check that fit first when claiming.
+        'host_cells': fields.ListOfIntegersField(),
     }
 
     def obj_make_compatible(self, primitive, target_version):
         super(NUMATopologyLimits, self).obj_make_compatible(primitive,
                                                             target_version)
         target_version = versionutils.convert_version_to_tuple(target_version)
+        if target_version < (1, 2):
+            primitive.pop('host_cells', None)
         if target_version < (1, 1):
             primitive.pop('network_metadata', None)
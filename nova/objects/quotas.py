@@ -15,6 +15,8 @@
 import collections
 
 from oslo_db import exception as db_exc
+from oslo_log import log as logging
+from sqlalchemy.sql import func
 
 from nova.db import api as db
 from nova.db.sqlalchemy import api as db_api
@@ -25,6 +27,8 @@ from nova.objects import base
 from nova.objects import fields
 from nova import quota
 
+LOG = logging.getLogger(__name__)
+
 
 def ids_from_instance(context, instance):
     if (context.is_admin and
@@ -53,6 +57,13 @@ def ids_from_server_group(context, server_group):
     return ids_from_instance(context, server_group)
 
 
+# The resources whose usage is kept in the quota_usage_counters table.
+USAGE_COUNTER_RESOURCES = ('instances', 'cores', 'ram')
+# The number of times the usage of a project is counted before giving up on
+# reconciling its counters when they keep changing during the count.
+USAGE_COUNTER_RECONCILE_ATTEMPTS = 3
+
+
 @base.NovaObjectRegistry.register
 class Quotas(base.NovaObject):
     # Version 1.0: initial version
@@ -475,6 +486,174 @@ class Quotas(base.NovaObject):
             main_db_quotas_dict[k] = v
         return main_db_quotas_dict
 
+    @staticmethod
+    @db_api.api_context_manager.reader
+    def _get_usage_counts_from_db(context, project_id, user_id=None):
+        model = api_models.QuotaUsageCounter
+        project_result = context.session.query(
+            func.count(model.id), func.sum(model.instances),
+            func.sum(model.cores), func.sum(model.ram)).\
+                        filter_by(project_id=project_id).\
+                        first()
+        if not project_result[0]:
+            # The usage of this project is not tracked by the counters yet.
+            return None
+        counts = {'project': {resource: int(project_result[idx + 1] or 0)
+                              for idx, resource in
+                              enumerate(USAGE_COUNTER_RESOURCES)}}
+        if user_id:
+            user_row = context.session.query(model).\
+                        filter_by(project_id=project_id).\
+                        filter_by(user_id=user_id).\
+                        first()
+            counts['user'] = {resource: getattr(user_row, resource, 0)
+                              for resource in USAGE_COUNTER_RESOURCES}
+        return counts
+
+    @staticmethod
+    @db_api.api_context_manager.writer
+    def _apply_usage_deltas_in_db(context, project_id, user_id, deltas):
+        model = api_models.QuotaUsageCounter
+        query = context.session.query(model).\
+                        filter_by(project_id=project_id)
+        # NOTE: This is a locking read so that it waits for the counters of
+        # the project being replaced by a reconciliation, and the deltas are
+        # then added to the new counts instead of being lost.
+        if not query.with_for_update().first():
+            # Untracked projects are seeded from a full count the next time
+            # their usage is checked, so there is nothing to update yet.
+            return False
+        updates = {getattr(model, resource): getattr(model, resource) + delta
+                   for resource, delta in deltas.items()}
+        updates[model.generation] = model.generation + 1
+        result = query.filter_by(user_id=user_id).\
+                        update(updates, synchronize_session=False)
+        if not result:
+            counter = model(project_id=project_id, user_id=user_id)
+            for resource in USAGE_COUNTER_RESOURCES:
+                setattr(counter, resource, deltas.get(resource, 0))
+            counter.save(context.session)
+        return True
+
+    @staticmethod
+    @db_api.api_context_manager.reader
+    def _get_usage_counter_generations_from_db(context, project_id):
+        model = api_models.QuotaUsageCounter
+        rows = context.session.query(model.id, model.generation).\
+                        filter_by(project_id=project_id).\
+                        all()
+        return dict(rows)
+
+    @staticmethod
+    @db_api.api_context_manager.writer
+    def _replace_usage_counts_in_db(context, project_id, generations,
+                                    counts_by_user):
+        model = api_models.QuotaUsageCounter
+        query = context.session.query(model).\
+                        filter_by(project_id=project_id)
+        # NOTE: The rows are recreated with new ids when they are replaced,
+        # so comparing the generation of every row id tells whether any
+        # counter was updated, created or replaced since the generations
+        # were read.
+        current = query.with_entities(model.id, model.generation).\
+                        with_for_update().\
+                        all()
+        if dict(current) != generations:
+            return False
+        query.delete(synchronize_session=False)
+        # An empty project keeps a single zeroed row so that it stays tracked.
+        for user_id, counts in (counts_by_user or {'': {}}).items():
+            counter = model(project_id=project_id, user_id=user_id)
+            for resource in USAGE_COUNTER_RESOURCES:
+                setattr(counter, resource, counts.get(resource, 0))
+            context.session.add(counter)
+        return True
+
+    @staticmethod
+    @db_api.api_context_manager.reader
+    def _get_usage_counter_projects_from_db(context, limit):
+        model = api_models.QuotaUsageCounter
+        # The rows of a project are recreated when it is reconciled, so the
+        # oldest created_at tells how long ago that was.
+        oldest = func.min(model.created_at)
+        rows = context.session.query(model.project_id, oldest).\
+                        group_by(model.project_id).\
+                        order_by(oldest.asc()).\
+                        limit(limit).\
+                        all()
+        return [row[0] for row in rows]
+
+    # NOTE: The following methods maintain the optional usage counters in the
+    # API database, see the [quota]usage_counters option. They are not
+    # remotable because only services with API database access use them.
+    @classmethod
+    def get_usage_counts(cls, context, project_id, user_id=None):
+        """Get the counted instances, cores and ram of a project.
+
+        :returns: A dict in the same format as InstanceList.get_counts(), or
+                  None if the usage of the project is not tracked yet.
+        """
+        return cls._get_usage_counts_from_db(context, project_id,
+                                             user_id=user_id)
+
+    @classmethod
+    def apply_usage_deltas(cls, context, project_id, user_id, deltas):
+        """Add deltas to the counted usage of a user within a project.
+
+        :param deltas: A dict of resource name to the signed amount to add,
+                       for example {'instances': -1, 'cores': -2, 'ram': -512}
+        :returns: False if the usage of the project is not tracked yet and
+                  nothing was updated, True otherwise.
+        """
+        try:
+            return cls._apply_usage_deltas_in_db(context, project_id,
+                                                 user_id, deltas)
+        except db_exc.DBDuplicateEntry:
+            # Another request created the row of this user first, so the
+            # update will find it this time.
+            return cls._apply_usage_deltas_in_db(context, project_id,
+                                                 user_id, deltas)
+
+    @classmethod
+    def reconcile_usage_counts(cls, context, project_id, count_usage):
+        """Replace the counted usage of a project.
+
+        The usage is counted without holding any lock on the counters, and
+        they are only replaced if they did not change meanwhile, so the
+        deltas applied concurrently are not lost. Otherwise the usage is
+        counted again, up to USAGE_COUNTER_RECONCILE_ATTEMPTS times.
+
+        :param count_usage: A callable taking no arguments which counts the
+                            usage of the project and returns a dict of
+                            user_id to the dict of instances, cores and ram
+                            counted for that user, or None if the count is
+                            incomplete and must not be stored
+        :returns: The dict returned by count_usage, or None if the counters
+                  were left unchanged because the count was incomplete or
+                  they kept changing while it was counted
+        """
+        for _ in range(USAGE_COUNTER_RECONCILE_ATTEMPTS):
+            generations = cls._get_usage_counter_generations_from_db(
+                context, project_id)
+            counts_by_user = count_usage()
+            if counts_by_user is None:
+                return None
+            try:
+                if cls._replace_usage_counts_in_db(
+                        context, project_id, generations, counts_by_user):
+                    return counts_by_user
+            except db_exc.DBDuplicateEntry:
+                # Another request started tracking this project first.
+                pass
+            LOG.debug('The quota usage counters of project %s changed while '
+                      'it was counted.', project_id)
+        return None
+
+    @classmethod
+    def get_usage_counter_projects(cls, context, limit):
+        """Get the tracked projects, least recently reconciled first."""
+        return cls._get_usage_counter_projects_from_db(context, limit)
+
 
 @base.NovaObjectRegistry.register
 class QuotasNoOp(Quotas):
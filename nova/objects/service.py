@@ -511,7 +511,7 @@ def get_minimum_version_all_cells(context, binaries, require_all=False):
 
     results = nova_context.scatter_gather_all_cells(
         context,
-        Service._db_service_get_minimum_version,
+        nova_context.shared_read(Service._db_service_get_minimum_version),
         binaries)
 
     min_version = None
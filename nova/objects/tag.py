@@ -71,6 +71,23 @@ class TagList(base.ObjectListBase, base.NovaObject):
         db_tags = db.instance_tag_set(context, resource_id, tags)
         return base.obj_make_list(context, cls(), objects.Tag, db_tags)
 
+    @classmethod
+    def create_bulk(cls, context, resource_ids, tags):
+        """Add the same tags to several new instances.
+
+        This is used by the conductor when creating the instances of a
+        multi-create request, so unlike create() it is not remotable.
+
+        :returns: A dict, keyed by resource id, of TagList objects
+        """
+        tags = sorted(set(tags))
+        db.instance_tag_create_bulk(context, resource_ids, tags)
+        return {resource_id: base.obj_make_list(
+                    context, cls(), objects.Tag,
+                    [{'resource_id': resource_id, 'tag': tag}
+                     for tag in tags])
+                for resource_id in resource_ids}
+
     @base.remotable_classmethod
     def destroy(cls, context, resource_id):
         db.instance_tag_delete_all(context, resource_id)
@@ -98,3 +98,26 @@ class VolumeUsage(base.NovaPersistentObject, base.NovaObject):
             'writes': self.writes,
             'write_bytes': self.write_bytes
         }
+
+
+@base.NovaObjectRegistry.register
+class VolumeUsageList(base.ObjectListBase, base.NovaObject):
+    # Version 1.0: Initial version
+    VERSION = '1.0'
+
+    fields = {
+        'objects': fields.ListOfObjectsField('VolumeUsage'),
+    }
+
+    @base.remotable_classmethod
+    def update_bulk(cls, context, usages, update_totals=False):
+        """Create or update several volume usage records at once.
+
+        :param usages: list of dicts with the volume_id, instance_uuid,
+                       project_id, user_id, availability_zone, curr_reads,
+                       curr_read_bytes, curr_writes and curr_write_bytes keys
+        """
+        db_vol_usages = db.vol_usage_update_bulk(
+            context, usages, update_totals=update_totals)
+        return base.obj_make_list(context, cls(context), VolumeUsage,
+                                  db_vol_usages)
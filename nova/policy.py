@@ -14,6 +14,7 @@
 #    under the License.
 
 """Policy Engine For Nova."""
+import collections
 import copy
 import re
 
@@ -21,6 +22,7 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_policy import policy
 from oslo_utils import excutils
+from oslo_utils import timeutils
 
 
 from nova import exception
@@ -40,6 +42,13 @@ USER_BASED_RESOURCES = ['os-keypairs']
 # rules whether were updated.
 saved_file_rules = []
 KEY_EXPR = re.compile(r'%\((\w+)\)s')
+# Any target key substituted in the match of a check.
+_TARGET_KEY_EXPR = re.compile(r'%\(([^)]*)\)')
+# What the result of the rule of each action depends on, see _compile_rule.
+_COMPILED_RULES = {}
+# The cached authorization results, see _cached_authorize.
+_RESULT_CACHE = collections.OrderedDict()
+_MISSING = object()
 
 
 def reset():
@@ -47,6 +56,8 @@ def reset():
     if _ENFORCER:
         _ENFORCER.clear()
         _ENFORCER = None
+    _COMPILED_RULES.clear()
+    _RESULT_CACHE.clear()
 
 
 def init(policy_file=None, rules=None, default_rule=None, use_conf=True):
@@ -120,6 +131,8 @@ def set_rules(rules, overwrite=True, use_conf=False):
 
     init(use_conf=False)
     _ENFORCER.set_rules(rules, overwrite, use_conf)
+    _COMPILED_RULES.clear()
+    _RESULT_CACHE.clear()
 
 
 def authorize(context, action, target, do_raise=True, exc=None):
@@ -155,8 +168,14 @@ def authorize(context, action, target, do_raise=True, exc=None):
     if not exc:
         exc = exception.PolicyNotAuthorized
     try:
-        result = _ENFORCER.authorize(action, target, credentials,
-                                     do_raise=do_raise, exc=exc, action=action)
+        if CONF.api.policy_cache_size:
+            result = _cached_authorize(action, target, credentials)
+            if not result and do_raise:
+                raise exc(action=action)
+        else:
+            result = _ENFORCER.authorize(action, target, credentials,
+                                         do_raise=do_raise, exc=exc,
+                                         action=action)
     except policy.PolicyNotRegistered:
         with excutils.save_and_reraise_exception():
             LOG.exception(_LE('Policy not registered'))
@@ -168,6 +187,117 @@ def authorize(context, action, target, do_raise=True, exc=None):
     return result
 
 
+def _compile_rule(action):
+    """Returns what the result of the rule of an action depends on.
+
+    :returns: A tuple of the (name, rule) pairs of the rules used by the
+              action and of the sorted target keys those rules look at, or
+              of None instead of the keys when the rules use checks whose
+              result may depend on anything else than the credentials and
+              those keys, like the http check. The tuple is only valid as
+              long as the rules it lists are the current ones.
+    """
+    rules = _ENFORCER.rules
+    compiled = _COMPILED_RULES.get(action)
+    if compiled is not None and all(rules.get(name) is rule
+                                    for name, rule in compiled[0]):
+        return compiled
+
+    used_rules = []
+    keys = set()
+
+    def walk(check):
+        if isinstance(check, (policy.AndCheck, policy.OrCheck)):
+            return all([walk(rule) for rule in check.rules])
+        if isinstance(check, policy.NotCheck):
+            return walk(check.rule)
+        if isinstance(check, policy.RuleCheck):
+            return use_rule(check.match)
+        if isinstance(check, IsAdminCheck):
+            return True
+        # NOTE: Only the checks provided by oslo.policy besides the http
+        # ones are known to depend on nothing else than the credentials and
+        # the target keys in their match.
+        if (type(check).__module__ != policy.Check.__module__ or
+                getattr(check, 'kind', None) in ('http', 'https')):
+            return False
+        keys.update(_TARGET_KEY_EXPR.findall(getattr(check, 'match', '')))
+        return True
+
+    def use_rule(name):
+        if name in [used[0] for used in used_rules]:
+            return True
+        rule = rules.get(name)
+        used_rules.append((name, rule))
+        # NOTE: Missing rules fall back to the default rule, leave those to
+        # the enforcer.
+        return rule is not None and walk(rule)
+
+    cacheable = use_rule(action)
+    compiled = (tuple(used_rules), sorted(keys) if cacheable else None)
+    _COMPILED_RULES[action] = compiled
+    return compiled
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(val))
+                            for key, val in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(val) for val in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(_freeze(val) for val in value)
+    # Raises TypeError for anything else which is not hashable.
+    hash(value)
+    return value
+
+
+def _cached_authorize(action, target, credentials):
+    """Returns the result of a policy check, caching it when possible.
+
+    The result of the rule of an action only depends on the credentials and
+    on the few target keys used by the rule, so it is cached using those as
+    the key, for CONF.api.policy_cache_time seconds at most.
+    """
+    # NOTE: The enforcer only reloads the policy files when a result is not
+    # cached, checking whether they changed is what takes most of the time
+    # of a check. The results computed with rules replaced since then are
+    # dropped below, so a change to the policy files is applied to the
+    # cached results within CONF.api.policy_cache_time seconds.
+    used_rules, keys = _compile_rule(action)
+    cache_key = None
+    if keys is not None:
+        try:
+            values = []
+            for key in keys:
+                try:
+                    values.append(_freeze(target[key]))
+                except KeyError:
+                    values.append(_MISSING)
+            cache_key = (action, tuple(values),
+                         _freeze(dict(credentials.items())))
+        except Exception:
+            # The target or the credentials can not be part of the key,
+            # for example when a target key can not be lazy-loaded.
+            cache_key = None
+
+    if cache_key is not None:
+        entry = _RESULT_CACHE.pop(cache_key, None)
+        if (entry is not None and entry[0] is used_rules and
+                entry[1] > timeutils.now()):
+            # Move the result back to the most recently used end.
+            _RESULT_CACHE[cache_key] = entry
+            return entry[2]
+
+    result = _ENFORCER.authorize(action, target, credentials)
+    if cache_key is not None:
+        _RESULT_CACHE[cache_key] = (
+            used_rules, timeutils.now() + CONF.api.policy_cache_time, result)
+        while len(_RESULT_CACHE) > CONF.api.policy_cache_size:
+            _RESULT_CACHE.popitem(last=False)
+    return result
+
+
 def check_is_admin(context):
     """Whether or not roles contains 'admin' role according to policy setting.
 
@@ -1137,6 +1137,13 @@ def _instances_cores_ram_count(context, project_id, user_id=None):
                           'cores': <count across user>,
                           'ram': <count across user>}}
     """
+    if CONF.quota.usage_counters:
+        counts = objects.Quotas.get_usage_counts(context, project_id,
+                                                 user_id=user_id)
+        if counts is None:
+            counts = _seed_usage_counters(context, project_id,
+                                          user_id=user_id)
+        return counts
     # TODO(melwitt): Counting across cells for instances means we will miss
     # counting resources if a cell is down. In the future, we should query
     # placement for cores/ram and InstanceMappings for instances (once we are
@@ -1151,7 +1158,8 @@ def _instances_cores_ram_count(context, project_id, user_id=None):
         context, project_id)
     results = nova_context.scatter_gather_cells(
         context, cell_mappings, nova_context.CELL_TIMEOUT,
-        objects.InstanceList.get_counts, project_id, user_id=user_id)
+        nova_context.shared_read(objects.InstanceList.get_counts),
+        project_id, user_id=user_id)
     total_counts = {'project': {'instances': 0, 'cores': 0, 'ram': 0}}
     if user_id:
         total_counts['user'] = {'instances': 0, 'cores': 0, 'ram': 0}
@@ -1165,6 +1173,91 @@ def _instances_cores_ram_count(context, project_id, user_id=None):
     return total_counts
 
 
+def _instances_cores_ram_count_by_user(context, project_id):
+    """Get the counts of instances, cores, and ram of a project per user.
+
+    :param context: The request context for database access
+    :param project_id: The project_id to count across
+    :returns: A tuple of the dict of user_id to user-scoped counts, and
+              whether every cell the project has instances in responded
+    """
+    cell_mappings = objects.CellMappingList.get_by_project_id(
+        context, project_id)
+    results = nova_context.scatter_gather_cells(
+        context, cell_mappings, nova_context.CELL_TIMEOUT,
+        nova_context.shared_read(objects.InstanceList.get_counts_by_user),
+        project_id)
+    counts_by_user = {}
+    complete = True
+    for result in results.values():
+        if nova_context.is_cell_failure_sentinel(result):
+            complete = False
+            continue
+        for user_id, counts in result.items():
+            user_counts = counts_by_user.setdefault(
+                user_id, {'instances': 0, 'cores': 0, 'ram': 0})
+            for resource, count in counts.items():
+                user_counts[resource] += count
+    return counts_by_user, complete
+
+
+def _seed_usage_counters(context, project_id, user_id=None):
+    """Count the usage of a project across cells and store it in the counters.
+
+    The counters are only written when every cell responded, so that a down
+    cell does not get its instances forgotten until the next reconciliation.
+    The deltas of the operations which complete while the project is counted
+    are not recorded since it is not tracked yet, so they are only counted if
+    the count sees them, or else by the next reconciliation.
+    """
+    results = []
+
+    def count_usage():
+        counts_by_user, complete = _instances_cores_ram_count_by_user(
+            context, project_id)
+        results.append(counts_by_user)
+        return counts_by_user if complete else None
+
+    objects.Quotas.reconcile_usage_counts(context, project_id, count_usage)
+    # The count is retried if the counters of the project changed meanwhile,
+    # and the last one is the most accurate.
+    counts_by_user = results[-1]
+    total_counts = {'project': {'instances': 0, 'cores': 0, 'ram': 0}}
+    for counts in counts_by_user.values():
+        for resource, count in counts.items():
+            total_counts['project'][resource] += count
+    if user_id:
+        total_counts['user'] = dict(counts_by_user.get(
+            user_id, {'instances': 0, 'cores': 0, 'ram': 0}))
+    return total_counts
+
+
+def reconcile_usage_counters(context, limit):
+    """Recount the usage of the tracked projects to correct counter drift.
+
+    :param context: The request context for database access
+    :param limit: The maximum number of projects to reconcile
+    :returns: The number of projects whose counters were reconciled
+    """
+    reconciled = 0
+    for project_id in objects.Quotas.get_usage_counter_projects(context,
+                                                                limit):
+        def count_usage(project_id=project_id):
+            counts_by_user, complete = _instances_cores_ram_count_by_user(
+                context, project_id)
+            return counts_by_user if complete else None
+
+        if objects.Quotas.reconcile_usage_counts(
+                context, project_id, count_usage) is None:
+            LOG.warning('Not reconciling the quota usage counters of '
+                        'project %s because not every cell responded or '
+                        'they kept changing while it was counted.',
+                        project_id)
+            continue
+        reconciled += 1
+    return reconciled
+
+
 def _server_group_count(context, project_id, user_id=None):
     """Get the counts of server groups in the database.
 
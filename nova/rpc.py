@@ -26,13 +26,19 @@ __all__ = [
 ]
 
 import functools
+import os
+import sys
+import threading
+import time
 
 from oslo_log import log as logging
 import oslo_messaging as messaging
 from oslo_messaging.rpc import dispatcher
+from oslo_messaging.rpc import server as rpc_server
 from oslo_serialization import jsonutils
 from oslo_service import periodic_task
 from oslo_utils import importutils
+from oslo_utils import timeutils
 import six
 
 import nova.conf
@@ -97,6 +103,7 @@ def cleanup():
     assert NOTIFICATION_TRANSPORT is not None
     assert LEGACY_NOTIFIER is not None
     assert NOTIFIER is not None
+    RPC_STATS.dump()
     TRANSPORT.cleanup()
     NOTIFICATION_TRANSPORT.cleanup()
     TRANSPORT = NOTIFICATION_TRANSPORT = LEGACY_NOTIFIER = NOTIFIER = None
@@ -191,6 +198,268 @@ class ProfilerRequestContextSerializer(RequestContextSerializer):
                      self).deserialize_context(context)
 
 
+# The key of the serialized context in which the time a message is sent is
+# stamped, so that the receiving server can measure the time spent queued.
+_SENT_AT_KEY = 'rpc_sent_at'
+
+
+class _Measurement(object):
+    """Serialization costs of the RPC message currently being processed."""
+
+    def __init__(self):
+        self.serialization_time = 0.0
+        self.payload_bytes = 0
+        self.queue_latency = None
+
+
+class MethodStats(object):
+    """Aggregated statistics of a single RPC method on one side."""
+
+    def __init__(self):
+        self.count = 0
+        self.calls = 0
+        self.casts = 0
+        self.failures = 0
+        self.payload_bytes = 0
+        self.max_payload_bytes = 0
+        self.serialization_time = 0.0
+        self.duration = 0.0
+        self.max_duration = 0.0
+        self.queue_latency = 0.0
+        self.max_queue_latency = 0.0
+        self.queue_samples = 0
+
+    def record(self, kind, duration, measurement, failed):
+        self.count += 1
+        if kind == 'call':
+            self.calls += 1
+        elif kind == 'cast':
+            self.casts += 1
+        if failed:
+            self.failures += 1
+        self.payload_bytes += measurement.payload_bytes
+        self.max_payload_bytes = max(self.max_payload_bytes,
+                                     measurement.payload_bytes)
+        self.serialization_time += measurement.serialization_time
+        self.duration += duration
+        self.max_duration = max(self.max_duration, duration)
+        if measurement.queue_latency is not None:
+            self.queue_samples += 1
+            self.queue_latency += measurement.queue_latency
+            self.max_queue_latency = max(self.max_queue_latency,
+                                         measurement.queue_latency)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'calls': self.calls,
+            'casts': self.casts,
+            'failures': self.failures,
+            'payload_bytes': self.payload_bytes,
+            'max_payload_bytes': self.max_payload_bytes,
+            'serialization_time': self.serialization_time,
+            'duration': self.duration,
+            'max_duration': self.max_duration,
+            'queue_latency': self.queue_latency,
+            'max_queue_latency': self.max_queue_latency,
+            'queue_samples': self.queue_samples,
+        }
+
+
+class RPCStats(object):
+    """Aggregates the statistics of the RPC messages of this process.
+
+    Statistics are kept per side (``client`` or ``server``) and per
+    ``<topic>.<method>``. On the client side the duration is the time spent
+    in call() or cast(), including waiting for the reply of a call, and the
+    payload is the serialized context and arguments. On the server side the
+    duration is the time spent in the endpoint method, excluding the
+    serialization, and the payload is the serialized result.
+    """
+
+    def __init__(self):
+        self._stats = {'client': {}, 'server': {}}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_at = timeutils.utcnow().isoformat()
+        self._last_dump = timeutils.now()
+
+    @property
+    def current(self):
+        """The measurement of the message processed by this thread, if any."""
+        return getattr(self._local, 'measurement', None)
+
+    def measure(self, side, topic, method, kind, fn, *args, **kwargs):
+        """Call fn, recording its duration against the given method."""
+        measurement = _Measurement()
+        # NOTE: A server handling a message may itself send messages, so the
+        # measurement of the outer message is restored afterwards.
+        previous = self.current
+        self._local.measurement = measurement
+        failed = False
+        start = timeutils.now()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            duration = timeutils.now() - start
+            self._local.measurement = previous
+            if side == 'server':
+                duration = max(0.0,
+                               duration - measurement.serialization_time)
+            self.record(side, '%s.%s' % (topic, method), kind, duration,
+                        measurement, failed)
+
+    def record(self, side, name, kind, duration, measurement, failed):
+        with self._lock:
+            stats = self._stats[side].get(name)
+            if stats is None:
+                stats = self._stats[side][name] = MethodStats()
+            stats.record(kind, duration, measurement, failed)
+        if (CONF.rpc_stats_dir and
+                timeutils.now() - self._last_dump >= CONF.rpc_stats_interval):
+            self.dump()
+
+    def get_stats(self):
+        """Returns the statistics keyed by side and by method."""
+        with self._lock:
+            return {side: {name: stats.to_dict()
+                           for name, stats in methods.items()}
+                    for side, methods in self._stats.items()}
+
+    def dump(self):
+        """Write the statistics to a file in [DEFAULT]/rpc_stats_dir.
+
+        Each process writes its own ``<binary>-<pid>.json`` file.
+        """
+        self._last_dump = timeutils.now()
+        if not CONF.rpc_stats_dir:
+            return
+        binary = os.path.basename(sys.argv[0]) or 'nova'
+        path = os.path.join(CONF.rpc_stats_dir,
+                            '%s-%d.json' % (binary, os.getpid()))
+        tmp_path = '%s.tmp' % path
+        stats = {
+            'binary': binary,
+            'host': CONF.host,
+            'pid': os.getpid(),
+            'started_at': self._started_at,
+            'updated_at': timeutils.utcnow().isoformat(),
+        }
+        stats.update(self.get_stats())
+        try:
+            with open(tmp_path, 'w') as f:
+                f.write(jsonutils.dumps(stats, indent=2, sort_keys=True))
+            os.rename(tmp_path, path)
+        except (IOError, OSError) as e:
+            LOG.warning('Unable to write RPC statistics to %(path)s: '
+                        '%(error)s', {'path': path, 'error': e})
+
+
+RPC_STATS = RPCStats()
+
+
+class InstrumentedSerializer(messaging.Serializer):
+    """Records the serialization costs of the message being processed.
+
+    This wraps the serializer of RPC clients and servers when
+    [DEFAULT]/rpc_stats_dir is set. The time spent serializing and
+    deserializing, and the size of what is serialized, are added to the
+    measurement of the message currently processed by the thread.
+    """
+
+    def __init__(self, base):
+        self._base = base
+
+    def _timed(self, fn, context, entity, size=False):
+        measurement = RPC_STATS.current
+        if measurement is None:
+            return fn(context, entity)
+        start = timeutils.now()
+        result = fn(context, entity)
+        measurement.serialization_time += timeutils.now() - start
+        if size:
+            measurement.payload_bytes += len(jsonutils.dumps(result))
+        return result
+
+    def serialize_entity(self, context, entity):
+        return self._timed(self._base.serialize_entity, context, entity,
+                           size=True)
+
+    def deserialize_entity(self, context, entity):
+        return self._timed(self._base.deserialize_entity, context, entity)
+
+    def serialize_context(self, context):
+        _context = self._base.serialize_context(context)
+        measurement = RPC_STATS.current
+        if measurement is not None:
+            measurement.payload_bytes += len(jsonutils.dumps(_context))
+            # NOTE: This is wall clock time, the queue latency measured by the
+            # server is only meaningful if the clocks of the hosts are
+            # synchronized.
+            _context[_SENT_AT_KEY] = time.time()
+        return _context
+
+    def deserialize_context(self, context):
+        sent_at = context.pop(_SENT_AT_KEY, None)
+        measurement = RPC_STATS.current
+        if sent_at is not None and measurement is not None:
+            measurement.queue_latency = max(0.0, time.time() - sent_at)
+        return self._base.deserialize_context(context)
+
+
+class _InstrumentedCallContext(object):
+    """Wraps a prepared RPC client to record its calls and casts."""
+
+    def __init__(self, cctxt):
+        self._cctxt = cctxt
+
+    def __getattr__(self, name):
+        return getattr(self._cctxt, name)
+
+    def prepare(self, *args, **kwargs):
+        return _InstrumentedCallContext(self._cctxt.prepare(*args, **kwargs))
+
+    def call(self, ctxt, method, **kwargs):
+        return RPC_STATS.measure('client', self._cctxt.target.topic, method,
+                                 'call', self._cctxt.call, ctxt, method,
+                                 **kwargs)
+
+    def cast(self, ctxt, method, **kwargs):
+        return RPC_STATS.measure('client', self._cctxt.target.topic, method,
+                                 'cast', self._cctxt.cast, ctxt, method,
+                                 **kwargs)
+
+
+class InstrumentedRPCClient(messaging.RPCClient):
+    """An RPC client recording the statistics of the messages it sends."""
+
+    def prepare(self, *args, **kwargs):
+        return _InstrumentedCallContext(
+            super(InstrumentedRPCClient, self).prepare(*args, **kwargs))
+
+
+class InstrumentedRPCDispatcher(dispatcher.RPCDispatcher):
+    """An RPC dispatcher recording the statistics of the messages handled."""
+
+    def __init__(self, topic, *args, **kwargs):
+        super(InstrumentedRPCDispatcher, self).__init__(*args, **kwargs)
+        self._topic = topic
+
+    def dispatch(self, incoming):
+        return RPC_STATS.measure(
+            'server', self._topic, incoming.message.get('method'), None,
+            super(InstrumentedRPCDispatcher, self).dispatch, incoming)
+
+
+def _get_client_class():
+    if CONF.rpc_stats_dir:
+        return InstrumentedRPCClient
+    return messaging.RPCClient
+
+
 def get_transport_url(url_str=None):
     return messaging.TransportURL.parse(CONF, url_str)
 
@@ -203,8 +472,10 @@ def get_client(target, version_cap=None, serializer=None,
         serializer = ProfilerRequestContextSerializer(serializer)
     else:
         serializer = RequestContextSerializer(serializer)
+    if CONF.rpc_stats_dir:
+        serializer = InstrumentedSerializer(serializer)
 
-    return messaging.RPCClient(TRANSPORT,
+    return _get_client_class()(TRANSPORT,
                                target,
                                version_cap=version_cap,
                                serializer=serializer,
@@ -219,6 +490,12 @@ def get_server(target, endpoints, serializer=None):
     else:
         serializer = RequestContextSerializer(serializer)
     access_policy = dispatcher.DefaultRPCAccessPolicy
+    if CONF.rpc_stats_dir:
+        serializer = InstrumentedSerializer(serializer)
+        rpc_dispatcher = InstrumentedRPCDispatcher(
+            target.topic, endpoints, serializer, access_policy)
+        return rpc_server.RPCServer(TRANSPORT, target, rpc_dispatcher,
+                                    'eventlet')
     return messaging.get_rpc_server(TRANSPORT,
                                     target,
                                     endpoints,
@@ -439,7 +716,7 @@ class ClientRouter(periodic_task.PeriodicTasks):
         transport = context.mq_connection
         if transport:
             cmt = self.default_client.call_monitor_timeout
-            return messaging.RPCClient(transport, self.target,
+            return _get_client_class()(transport, self.target,
                                        version_cap=self.version_cap,
                                        serializer=self.serializer,
                                        call_monitor_timeout=cmt)
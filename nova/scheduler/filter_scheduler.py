@@ -195,6 +195,9 @@ class FilterScheduler(driver.Scheduler):
         # The list of hosts that have been selected (and claimed).
         claimed_hosts = []
 
+        # The NUMA topologies fitted onto each of those hosts.
+        numa_topologies = []
+
         for num, instance_uuid in enumerate(instance_uuids):
             # In a multi-create request, the first request spec from the list
             # is passed to the scheduler and that request spec's instance_uuid
@@ -256,8 +259,8 @@ class FilterScheduler(driver.Scheduler):
 
             # Now consume the resources so the filter/weights will change for
             # the next instance.
-            self._consume_selected_host(claimed_host, spec_obj,
-                                        instance_uuid=instance_uuid)
+            numa_topologies.append(self._consume_selected_host(
+                claimed_host, spec_obj, instance_uuid=instance_uuid))
 
         # Check if we were able to fulfill the request. If not, this call will
         # raise a NoValidHost exception.
@@ -268,7 +271,8 @@ class FilterScheduler(driver.Scheduler):
         # find alternates for each host.
         selections_to_return = self._get_alternate_hosts(
             claimed_hosts, spec_obj, hosts, num, num_alts,
-            alloc_reqs_by_rp_uuid, allocation_request_version)
+            alloc_reqs_by_rp_uuid, allocation_request_version,
+            numa_topologies=numa_topologies)
         return selections_to_return
 
     def _ensure_sufficient_hosts(self, context, hosts, required_count,
@@ -317,6 +321,8 @@ class FilterScheduler(driver.Scheduler):
         """
         # The list of hosts selected for each instance
         selected_hosts = []
+        # The NUMA topologies fitted onto each of those hosts.
+        numa_topologies = []
 
         for num in range(num_instances):
             instance_uuid = instance_uuids[num] if instance_uuids else None
@@ -333,8 +339,8 @@ class FilterScheduler(driver.Scheduler):
                 break
             selected_host = hosts[0]
             selected_hosts.append(selected_host)
-            self._consume_selected_host(selected_host, spec_obj,
-                                        instance_uuid=instance_uuid)
+            numa_topologies.append(self._consume_selected_host(
+                selected_host, spec_obj, instance_uuid=instance_uuid))
 
         # Check if we were able to fulfill the request. If not, this call will
         # raise a NoValidHost exception.
@@ -345,14 +351,23 @@ class FilterScheduler(driver.Scheduler):
         # representing the selected host along with zero or more alternates
         # from the same cell.
         selections_to_return = self._get_alternate_hosts(selected_hosts,
-                spec_obj, hosts, num, num_alts)
+                spec_obj, hosts, num, num_alts,
+                numa_topologies=numa_topologies)
         return selections_to_return
 
     @staticmethod
     def _consume_selected_host(selected_host, spec_obj, instance_uuid=None):
+        """Consumes the resources of the request on the selected host.
+
+        :returns: the InstanceNUMATopology fitted onto the host, if any
+        """
         LOG.debug("Selected host: %(host)s", {'host': selected_host},
                   instance_uuid=instance_uuid)
         selected_host.consume_from_request(spec_obj)
+        # NOTE: consume_from_request() replaces the requested topology with
+        # the one fitted onto the host.
+        numa_topology = (spec_obj.numa_topology
+                         if 'numa_topology' in spec_obj else None)
         # If we have a server group, add the selected host to it for the
         # (anti-)affinity filters to filter out hosts for subsequent instances
         # in a multi-create request.
@@ -367,10 +382,25 @@ class FilterScheduler(driver.Scheduler):
                 # about the keys.
                 selected_host.instances[instance_uuid] = (
                     objects.Instance(uuid=instance_uuid))
+        return numa_topology
+
+    @staticmethod
+    def _set_numa_host_cells(selection, numa_topology):
+        """Records in the limits of the selection the host NUMA cells the
+        instance was fitted onto, so that the compute claim checks them first.
+        """
+        if (numa_topology is None or selection.limits is None or
+                selection.limits.numa_topology is None):
+            return
+        # The limits are shared by all the selections of the host.
+        numa_limits = selection.limits.numa_topology.obj_clone()
+        numa_limits.host_cells = [cell.id for cell in numa_topology.cells]
+        selection.limits.numa_topology = numa_limits
 
     def _get_alternate_hosts(self, selected_hosts, spec_obj, hosts, index,
                              num_alts, alloc_reqs_by_rp_uuid=None,
-                             allocation_request_version=None):
+                             allocation_request_version=None,
+                             numa_topologies=None):
         # We only need to filter/weigh the hosts again if we're dealing with
         # more than one instance and are going to be picking alternates.
         if index > 0 and num_alts > 0:
@@ -383,7 +413,7 @@ class FilterScheduler(driver.Scheduler):
         # representing the selected host along with alternates from the same
         # cell.
         selections_to_return = []
-        for selected_host in selected_hosts:
+        for num, selected_host in enumerate(selected_hosts):
             # This is the list of hosts for one particular instance.
             if alloc_reqs_by_rp_uuid:
                 selected_alloc_req = alloc_reqs_by_rp_uuid.get(
@@ -393,6 +423,8 @@ class FilterScheduler(driver.Scheduler):
             selection = objects.Selection.from_host_state(selected_host,
                     allocation_request=selected_alloc_req,
                     allocation_request_version=allocation_request_version)
+            if numa_topologies:
+                self._set_numa_host_cells(selection, numa_topologies[num])
             selected_plus_alts = [selection]
             cell_uuid = selected_host.cell_uuid
             # This will populate the alternates with many of the same unclaimed
@@ -646,6 +646,8 @@ class HostManager(object):
         # reset signal handler and also upon startup of the scheduler.
         context = context_module.RequestContext()
         temp_cells = objects.CellMappingList.get_all(context)
+        # Close the connections to the cells which were deleted or updated.
+        context_module.CELL_CONNECTIONS.prune(temp_cells)
         # NOTE(tssurya): filtering cell0 from the list since it need
         # not be considered for scheduling.
         for c in temp_cells:
@@ -80,6 +80,16 @@ class SchedulerManager(manager.Manager):
     def _run_periodic_tasks(self, context):
         self.driver.run_periodic_tasks(context)
 
+    @periodic_task.periodic_task(
+        spacing=CONF.quota.usage_counter_reconcile_interval)
+    def _reconcile_quota_usage_counters(self, context):
+        if not CONF.quota.usage_counters:
+            return
+        reconciled = quota.reconcile_usage_counters(
+            context, CONF.quota.usage_counter_reconcile_batch_size)
+        LOG.debug('Reconciled the quota usage counters of %d projects.',
+                  reconciled)
+
     def reset(self):
         # NOTE(tssurya): This is a SIGHUP handler which will reset the cells
         # and enabled cells caches in the host manager. So every time an
@@ -245,12 +245,15 @@ class TestCase(testtools.TestCase):
             objects_base.NovaObjectRegistry._registry._obj_classes)
         self.addCleanup(self._restore_obj_registry)
         objects.Service.clear_min_version_cache()
+        objects.InstanceMapping.clear_cache()
 
         # NOTE(danms): Reset the cached list of cells
         from nova.compute import api
         api.CELLS = []
-        context.CELL_CACHE = {}
+        context.CELL_CONNECTIONS.reset()
         context.CELLS = []
+        context.CELL_BREAKER.reset()
+        context.reset_shared_reads()
 
         self.cell_mappings = {}
         self.host_mappings = {}
@@ -280,6 +283,10 @@ class TestCase(testtools.TestCase):
         # caching of that value.
         utils._IS_NEUTRON = None
 
+        # Drop the keystoneauth sessions shared by the service clients, as
+        # they may have been loaded from another test's configuration.
+        utils.reset_ksa_sessions()
+
         # Reset the global QEMU version flag.
         images.QEMU_VERSION = None
 
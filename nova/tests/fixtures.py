@@ -517,7 +517,8 @@ class CellDatabases(fixtures.Fixture):
         if raised_exc:
             raise raised_exc
 
-    def _wrap_create_context_manager(self, connection=None):
+    def _wrap_create_context_manager(self, connection=None,
+                                     on_engine_create=None):
         ctxt_mgr = self._ctxt_mgrs[connection]
         return ctxt_mgr
 
@@ -731,6 +731,13 @@ class NovaAPIMigrationsWalk(test_migrations.WalkVersionsMixin):
         self.assertIndexExists(engine, 'instance_mappings',
                                'instance_mappings_user_id_project_id_idx')
 
+    def _check_063(self, engine, data):
+        for column in ['created_at', 'updated_at', 'id', 'project_id',
+                       'user_id', 'instances', 'cores', 'ram', 'generation']:
+            self.assertColumnExists(engine, 'quota_usage_counters', column)
+        self.assertUniqueConstraintExists(engine, 'quota_usage_counters',
+                                          ['project_id', 'user_id'])
+
 
 class TestNovaAPIMigrationsWalkSQLite(NovaAPIMigrationsWalk,
                                       test_fixtures.OpportunisticDBTestMixin,
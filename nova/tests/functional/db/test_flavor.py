@@ -175,3 +175,20 @@ class FlavorObjectTestCase(test.NoDBTestCase):
         flavor.create()
         self.assertRaises(exception.MarkerNotFound,
                           self._test_get_all, 2, marker='noflavoratall')
+
+    def test_get_change_version(self):
+        versions = [objects.FlavorList.get_change_version(self.context)]
+        flavor = objects.Flavor(context=self.context, **fake_api_flavor)
+        flavor.create()
+        versions.append(objects.FlavorList.get_change_version(self.context))
+        flavor.extra_specs = {'foo': 'baz'}
+        flavor.save()
+        versions.append(objects.FlavorList.get_change_version(self.context))
+        flavor.remove_access('project1')
+        versions.append(objects.FlavorList.get_change_version(self.context))
+        flavor.destroy()
+        versions.append(objects.FlavorList.get_change_version(self.context))
+        # NOTE: Destroying the only flavor gets back to the version of the
+        # empty tables, which is fine since they render the same.
+        self.assertEqual(versions[0], versions[-1])
+        self.assertEqual(4, len(set(versions)))
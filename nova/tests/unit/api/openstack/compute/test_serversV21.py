@@ -15,6 +15,8 @@
 #    under the License.
 
 import collections
+import contextlib
+import copy
 import datetime
 import ddt
 
@@ -714,7 +716,8 @@ class ServersControllerTest(ControllerTest):
             req.environ['nova.context'], expected_attrs=[], limit=1000,
             marker=None, search_opts={'deleted': False, 'project_id': 'fake'},
             sort_dirs=['desc'], sort_keys=['created_at'],
-            cell_down_support=False, all_tenants=False)
+            cell_down_support=False, all_tenants=False,
+            columns_to_load=['display_name', 'uuid'])
 
     def test_get_server_list_with_reservation_id(self):
         req = self.req('/fake/servers?reservation_id=foo')
@@ -807,7 +810,8 @@ class ServersControllerTest(ControllerTest):
             limit=1000, marker=None,
             search_opts={'deleted': False, 'project_id': 'fake'},
             sort_dirs=['desc'], sort_keys=['created_at'],
-            cell_down_support=False, all_tenants=False)
+            cell_down_support=False, all_tenants=False,
+            columns_to_load=None)
 
     def test_get_server_details_with_bad_name(self):
         req = self.req('/fake/servers/detail?name=%2Binstance')
@@ -926,7 +930,8 @@ class ServersControllerTest(ControllerTest):
         self.mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=mock.ANY, limit=mock.ANY, marker=mock.ANY,
             expected_attrs=mock.ANY, sort_keys=[], sort_dirs=[],
-            cell_down_support=False, all_tenants=False)
+            cell_down_support=False, all_tenants=False,
+            columns_to_load=['display_name', 'uuid'])
 
     def test_get_servers_ignore_sort_key_only_one_dir(self):
         req = self.req(
@@ -935,7 +940,8 @@ class ServersControllerTest(ControllerTest):
         self.mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=mock.ANY, limit=mock.ANY, marker=mock.ANY,
             expected_attrs=mock.ANY, sort_keys=['user_id'],
-            sort_dirs=['asc'], cell_down_support=False, all_tenants=False)
+            sort_dirs=['asc'], cell_down_support=False, all_tenants=False,
+            columns_to_load=['display_name', 'uuid'])
 
     def test_get_servers_ignore_sort_key_with_no_sort_dir(self):
         req = self.req('/fake/servers?sort_key=vcpus&sort_key=user_id')
@@ -943,7 +949,8 @@ class ServersControllerTest(ControllerTest):
         self.mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=mock.ANY, limit=mock.ANY, marker=mock.ANY,
             expected_attrs=mock.ANY, sort_keys=['user_id'], sort_dirs=[],
-            cell_down_support=False, all_tenants=False)
+            cell_down_support=False, all_tenants=False,
+            columns_to_load=['display_name', 'uuid'])
 
     def test_get_servers_ignore_sort_key_with_bad_sort_dir(self):
         req = self.req('/fake/servers?sort_key=vcpus&sort_dir=bad_dir')
@@ -951,7 +958,8 @@ class ServersControllerTest(ControllerTest):
         self.mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=mock.ANY, limit=mock.ANY, marker=mock.ANY,
             expected_attrs=mock.ANY, sort_keys=[], sort_dirs=[],
-            cell_down_support=False, all_tenants=False)
+            cell_down_support=False, all_tenants=False,
+            columns_to_load=['display_name', 'uuid'])
 
     def test_get_servers_non_admin_with_admin_only_sort_key(self):
         req = self.req('/fake/servers?sort_key=host&sort_dir=desc')
@@ -965,13 +973,15 @@ class ServersControllerTest(ControllerTest):
         self.mock_get_all.assert_called_once_with(
             mock.ANY, search_opts=mock.ANY, limit=mock.ANY, marker=mock.ANY,
             expected_attrs=mock.ANY, sort_keys=['node'], sort_dirs=['desc'],
-            cell_down_support=False, all_tenants=False)
+            cell_down_support=False, all_tenants=False,
+            columns_to_load=None)
 
     def test_get_servers_with_bad_option(self):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             db_list = [fakes.stub_instance(100, uuid=uuids.fake)]
             return instance_obj._make_instance_list(
                 context, objects.InstanceList(), db_list, FIELDS)
@@ -988,13 +998,15 @@ class ServersControllerTest(ControllerTest):
             limit=1000, marker=None,
             search_opts={'deleted': False, 'project_id': 'fake'},
             sort_dirs=['desc'], sort_keys=['created_at'],
-            cell_down_support=False, all_tenants=False)
+            cell_down_support=False, all_tenants=False,
+            columns_to_load=['display_name', 'uuid'])
 
     def test_get_servers_allows_image(self):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('image', search_opts)
             self.assertEqual(search_opts['image'], '12345')
@@ -1148,7 +1160,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('flavor', search_opts)
             # flavor is an integer ID
@@ -1184,7 +1197,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], [vm_states.ACTIVE])
@@ -1203,7 +1217,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('task_state', search_opts)
             self.assertEqual([task_states.REBOOT_PENDING,
@@ -1227,7 +1242,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'],
                              [vm_states.ACTIVE, vm_states.STOPPED])
@@ -1260,7 +1276,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIn('vm_state', search_opts)
             self.assertEqual(search_opts['vm_state'], ['deleted'])
 
@@ -1319,7 +1336,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('name', search_opts)
             self.assertEqual(search_opts['name'], 'whee.*')
@@ -1347,7 +1365,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('changes-since', search_opts)
             changes_since = datetime.datetime(2011, 1, 24, 17, 8, 1,
@@ -1387,7 +1406,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1416,7 +1436,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1449,7 +1470,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             # Allowed by user
             self.assertIn('name', search_opts)
@@ -1483,7 +1505,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip', search_opts)
             self.assertEqual(search_opts['ip'], '10\..*')
@@ -1505,7 +1528,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip6', search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -1528,7 +1552,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('ip6', search_opts)
             self.assertEqual(search_opts['ip6'], 'ffff.*')
@@ -1551,7 +1576,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('access_ip_v4', search_opts)
             self.assertEqual(search_opts['access_ip_v4'], 'ffff.*')
@@ -1574,7 +1600,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('access_ip_v6', search_opts)
             self.assertEqual(search_opts['access_ip_v6'], 'ffff.*')
@@ -1713,7 +1740,8 @@ class ServersControllerTest(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             cur = api_version_request.APIVersionRequest(self.wsgi_api_version)
             v216 = api_version_request.APIVersionRequest('2.16')
             if cur >= v216:
@@ -2437,7 +2465,8 @@ class ServerControllerTestV266(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('changes-before', search_opts)
             changes_before = datetime.datetime(2011, 1, 24, 17, 8, 1,
@@ -2475,7 +2504,8 @@ class ServerControllerTestV266(ControllerTest):
         def fake_get_all(context, search_opts=None,
                          limit=None, marker=None,
                          expected_attrs=None, sort_keys=None, sort_dirs=None,
-                         cell_down_support=False, all_tenants=False):
+                         cell_down_support=False, all_tenants=False,
+                         columns_to_load=None):
             self.assertIsNotNone(search_opts)
             self.assertIn('changes-since', search_opts)
             changes_since = datetime.datetime(2011, 1, 23, 17, 8, 1,
@@ -4524,9 +4554,10 @@ class ServersControllerCreateTest(test.TestCase):
         self._test_create(params, no_image=True)
 
         mock_validate_bdm.assert_called_once_with(
-            mock.ANY, mock.ANY, mock.ANY, mock.ANY, mock.ANY)
+            mock.ANY, mock.ANY, mock.ANY, mock.ANY, mock.ANY,
+            volumes=mock.ANY)
         mock_bdm_image_metadata.assert_called_once_with(
-            mock.ANY, mock.ANY, False)
+            mock.ANY, mock.ANY, False, volumes=mock.ANY)
 
     @mock.patch.object(compute_api.API, '_validate_bdm')
     @mock.patch.object(compute_api.API, '_get_bdm_image_metadata')
@@ -4763,7 +4794,8 @@ class ServersControllerCreateTest(test.TestCase):
                                                   mock.ANY,
                                                   mock.ANY,
                                                   mock.ANY,
-                                                  mock.ANY)
+                                                  mock.ANY,
+                                                  volumes=mock.ANY)
 
     @mock.patch.object(compute_api.API, '_validate_bdm')
     def test_create_instance_bdm_missing_device_name(self, mock_validate_bdm):
@@ -4785,7 +4817,8 @@ class ServersControllerCreateTest(test.TestCase):
                                                   mock.ANY,
                                                   mock.ANY,
                                                   mock.ANY,
-                                                  mock.ANY)
+                                                  mock.ANY,
+                                                  volumes=mock.ANY)
 
     @mock.patch.object(
         block_device.BlockDeviceDict, '_validate',
@@ -4848,7 +4881,7 @@ class ServersControllerCreateTest(test.TestCase):
             test.MatchType(objects.Instance),
             test.MatchType(objects.Flavor),
             test.MatchType(objects.BlockDeviceMappingList),
-            False)
+            False, volumes=mock.ANY)
 
     def test_create_instance_with_volumes_enabled(self):
         params = {'block_device_mapping': self.bdm}
@@ -4885,7 +4918,7 @@ class ServersControllerCreateTest(test.TestCase):
         self.stub_out('nova.compute.api.API.create', create)
         self._test_create_bdm(params, no_image=True)
         mock_get_bdm_image_metadata.assert_called_once_with(
-            mock.ANY, self.bdm, True)
+            mock.ANY, self.bdm, True, volumes=mock.ANY)
 
     @mock.patch.object(compute_api.API, '_get_bdm_image_metadata')
     def test_create_instance_with_imageRef_as_empty_string(
@@ -6901,16 +6934,140 @@ class ServersViewBuilderTest(test.TestCase):
         bdms = fake_bdms_get_all_by_instance_uuids()
         # just faking a nova list scenario
         mock_sg.return_value = {
-            uuids.cell1: bdms[0],
+            uuids.cell1: (bdms[0], {}),
             uuids.cell2: exception.BDMNotFound(id='fake')
         }
         ctxt = context.RequestContext('fake', 'fake')
-        result = self.view_builder._get_instance_bdms_in_multiple_cells(
-            ctxt, [self.instance.uuid])
+        result = self.view_builder._get_instance_records_in_multiple_cells(
+            ctxt, [self.instance.uuid], [])
         # will get the result from cell1
-        self.assertEqual(result, bdms[0])
+        self.assertEqual((bdms[0], {}), result)
         mock_sg.assert_called_once()
 
+    @mock.patch('nova.objects.InstanceFaultList.get_latest_by_instance_uuids')
+    @mock.patch('nova.objects.BlockDeviceMappingList.bdms_by_instance_uuid')
+    @mock.patch('nova.objects.InstanceMappingList.get_by_instance_uuids')
+    def test_get_instance_records_in_multiple_cells(self, mock_get_im,
+                                                    mock_bdms, mock_faults):
+        self.useFixture(nova_fixtures.SpawnIsSynchronousFixture())
+
+        @contextlib.contextmanager
+        def fake_target_cell(ctxt, cell_mapping):
+            cctxt = copy.copy(ctxt)
+            cctxt.cell_uuid = cell_mapping.uuid
+            yield cctxt
+
+        self.stub_out('nova.context.target_cell', fake_target_cell)
+        cell1 = objects.CellMapping(uuid=uuids.cell1, name='cell1',
+                                    database_connection='fake://',
+                                    transport_url='none:///')
+        cell2 = objects.CellMapping(uuid=uuids.cell2, name='cell2',
+                                    database_connection='fake://',
+                                    transport_url='none:///')
+        mock_get_im.return_value = [
+            objects.InstanceMapping(instance_uuid=uuids.inst1,
+                                    cell_mapping=cell1),
+            objects.InstanceMapping(instance_uuid=uuids.inst2,
+                                    cell_mapping=cell2),
+            objects.InstanceMapping(instance_uuid=uuids.inst3,
+                                    cell_mapping=cell1),
+            objects.InstanceMapping(instance_uuid=uuids.inst4,
+                                    cell_mapping=None)]
+
+        def fake_bdms(ctxt, instance_uuids):
+            return {uuid: [ctxt.cell_uuid] for uuid in instance_uuids}
+
+        def fake_faults(ctxt, instance_uuids):
+            return [objects.InstanceFault(instance_uuid=uuid,
+                                          message=str(ctxt.cell_uuid))
+                    for uuid in instance_uuids]
+
+        mock_bdms.side_effect = fake_bdms
+        mock_faults.side_effect = fake_faults
+        ctxt = context.RequestContext('fake', 'fake')
+        bdms, faults = (
+            self.view_builder._get_instance_records_in_multiple_cells(
+                ctxt, [uuids.inst1, uuids.inst2, uuids.inst3, uuids.inst4],
+                [uuids.inst1, uuids.inst2, uuids.inst4]))
+
+        # One query per cell, for the instances of the cell only.
+        self.assertEqual({uuids.inst1: [uuids.cell1],
+                          uuids.inst2: [uuids.cell2],
+                          uuids.inst3: [uuids.cell1]}, bdms)
+        self.assertEqual(2, mock_bdms.call_count)
+        self.assertEqual(
+            {uuids.inst1: str(uuids.cell1), uuids.inst2: str(uuids.cell2),
+             uuids.inst4: 'None'},
+            {uuid: fault.message for uuid, fault in faults.items()})
+        # The unmapped instance fault is looked up with the given context.
+        self.assertEqual(3, mock_faults.call_count)
+        mock_faults.assert_any_call(ctxt, [uuids.inst4])
+
+    @mock.patch('nova.availability_zones.get_instance_availability_zones')
+    @mock.patch.object(views.servers.ViewBuilder,
+                       '_get_instance_records_in_multiple_cells')
+    def test_prefetch(self, mock_records, mock_azs):
+        self.instance.vm_state = vm_states.ERROR
+        active = fake_instance.fake_instance_obj(
+            self.request.context, uuid=uuids.active, vm_state=vm_states.ACTIVE,
+            task_state=None)
+        fault = objects.InstanceFault(instance_uuid=self.uuid, code=500)
+        fault.obj_reset_changes()
+        mock_records.return_value = (mock.sentinel.bdms, {self.uuid: fault})
+        mock_azs.return_value = mock.sentinel.azs
+
+        bdms, azs, sg_bindings = self.view_builder._prefetch(
+            self.request, [self.instance, active])
+
+        self.assertEqual(mock.sentinel.bdms, bdms)
+        self.assertEqual(mock.sentinel.azs, azs)
+        # Neutron is not used.
+        self.assertIsNone(sg_bindings)
+        mock_records.assert_called_once_with(
+            self.request.environ['nova.context'], [self.uuid, uuids.active],
+            [self.uuid])
+        mock_azs.assert_called_once_with(
+            self.request.environ['nova.context'], [self.instance, active])
+        self.assertEqual(fault, self.instance.fault)
+        self.assertNotIn('fault', self.instance.obj_what_changed())
+        self.assertIn('nova.prefetch_time', self.request.environ)
+
+    @mock.patch('nova.availability_zones.get_instance_availability_zones',
+                return_value={})
+    @mock.patch.object(views.servers.ViewBuilder,
+                       '_get_instance_records_in_multiple_cells',
+                       return_value=({}, {}))
+    def test_prefetch_fault_not_found(self, mock_records, mock_azs):
+        self.instance.vm_state = vm_states.ERROR
+        self.view_builder._prefetch(self.request, [self.instance])
+        # The fault is not lazy-loaded later on.
+        self.assertIsNone(self.instance.fault)
+
+    @mock.patch('nova.availability_zones.get_instance_availability_zones',
+                return_value={})
+    @mock.patch.object(views.servers.ViewBuilder,
+                       '_get_instance_records_in_multiple_cells',
+                       return_value=({}, {}))
+    def test_prefetch_neutron_security_groups(self, mock_records, mock_azs):
+        self.flags(use_neutron=True)
+        self.view_builder.security_group_api = mock.Mock()
+        mock_sgs = (
+            self.view_builder.security_group_api.
+            get_instances_security_groups_bindings)
+        mock_sgs.return_value = mock.sentinel.bindings
+        bdms, azs, sg_bindings = self.view_builder._prefetch(
+            self.request, [self.instance])
+        self.assertEqual(mock.sentinel.bindings, sg_bindings)
+        mock_sgs.assert_called_once_with(
+            self.request.environ['nova.context'], [{'id': self.uuid}])
+
+    def test_build_server_detail_with_prefetched_az(self):
+        output = self.view_builder.show(
+            self.request, self.instance,
+            availability_zones={self.uuid: 'prefetched-az'})
+        self.assertEqual('prefetched-az',
+                         output['server']['OS-EXT-AZ:availability_zone'])
+
     def test_build_server(self):
         expected_server = {
             "server": {
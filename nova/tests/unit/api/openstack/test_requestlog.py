@@ -18,6 +18,8 @@ import mock
 import fixtures as fx
 import testtools
 
+from nova.api.openstack import requestlog
+from nova.api.openstack import wsgi
 from nova.tests import fixtures
 from nova.tests.unit import conf_fixture
 
@@ -146,3 +148,15 @@ class TestRequestLogMiddleware(testtools.TestCase):
         api.api_request('/', strip_version=True)
         self.assertNotIn("nova.api.openstack.requestlog",
                 self.stdlog.logger.output)
+
+    @mock.patch('nova.api.openstack.requestlog.RequestLog._should_emit',
+                return_value=True)
+    def test_logs_prefetch_time(self, emit):
+        """Ensure the time spent prefetching details is logged if any."""
+        self.useFixture(conf_fixture.ConfFixture())
+        middleware = requestlog.RequestLog(None)
+        req = wsgi.Request.blank('/servers/detail')
+        req.environ['nova.prefetch_time'] = 0.25
+        middleware._log_req(req, {}, 0)
+        self.assertIn('microversion: - time: ', self.stdlog.logger.output)
+        self.assertIn(' prefetch: 0.250000', self.stdlog.logger.output)
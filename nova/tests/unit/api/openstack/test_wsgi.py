@@ -10,6 +10,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import fixtures
 import mock
 from oslo_serialization import jsonutils
 import six
@@ -19,6 +20,7 @@ import webob
 from nova.api.openstack import api_version_request as api_version
 from nova.api.openstack import versioned_method
 from nova.api.openstack import wsgi
+from nova import context
 from nova import exception
 from nova import test
 from nova.tests.unit.api.openstack import fakes
@@ -926,6 +928,36 @@ class TestController(test.NoDBTestCase):
                                                                  func_list)
         self.assertTrue(result)
 
+    def test_version_dispatch(self):
+        class Controller(wsgi.Controller):
+            @wsgi.Controller.api_version('2.1', '2.4')
+            def index(self, req):
+                return 'old'
+
+            @wsgi.Controller.api_version('2.10')  # noqa
+            def index(self, req):
+                return 'new'
+
+        dispatch = Controller.versioned_dispatch['index']
+        self.assertEqual('old', dispatch[(2, 1)].func(None, None))
+        self.assertEqual('old', dispatch[(2, 4)].func(None, None))
+        self.assertNotIn((2, 5), dispatch)
+        self.assertEqual('new', dispatch[(2, 10)].func(None, None))
+        max_version = api_version.max_api_version()
+        self.assertIn((max_version.ver_major, max_version.ver_minor),
+                      dispatch)
+
+        controller = Controller()
+        req = fakes.HTTPRequest.blank('', version='2.3')
+        self.assertEqual('old', controller.index(req))
+        req = fakes.HTTPRequest.blank('', version='2.7')
+        self.assertRaises(exception.VersionNotFoundForAPIMethod,
+                          controller.index, req)
+        # Versions newer than the API supports are not in the table.
+        req = fakes.HTTPRequest.blank('', version='2.%d' % (
+            max_version.ver_minor + 1))
+        self.assertEqual('new', controller.index(req))
+
 
 class ExpectedErrorTestCase(test.NoDBTestCase):
 
@@ -963,3 +995,102 @@ class ExpectedErrorTestCase(test.NoDBTestCase):
             raise exception.PolicyNotAuthorized(action="foo")
 
         self.assertRaises(exception.PolicyNotAuthorized, fake_func)
+
+
+class CachedResponseTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(CachedResponseTestCase, self).setUp()
+        self.useFixture(fixtures.MonkeyPatch(
+            'nova.api.openstack.wsgi._RESPONSE_CACHE', None))
+        self.calls = 0
+        self.version = 1
+        test_case = self
+
+        class Controller(object):
+            @wsgi.cached_response(version=lambda ctxt: test_case.version,
+                                  query_params=('limit', 'marker'))
+            def index(self, req):
+                test_case.calls += 1
+                return {'version': test_case.version}
+
+        self.controller = Controller()
+        self.app = fakes.TestRouter(self.controller)
+
+    def _get(self, path='/tests', etag=None, user_id='fake-user'):
+        req = webob.Request.blank(path)
+        req.environ['nova.context'] = context.RequestContext(
+            user_id, 'fake-project')
+        if etag:
+            req.headers['If-None-Match'] = '"%s"' % etag
+        return req.get_response(self.app)
+
+    def test_etag_without_cache(self):
+        response = self._get()
+        self.assertEqual(200, response.status_int)
+        self.assertEqual({'version': 1}, jsonutils.loads(response.body))
+        self.assertIsNotNone(response.etag)
+
+        response = self._get(etag=response.etag)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(b'', response.body)
+        # The method was called since nothing is cached.
+        self.assertEqual(2, self.calls)
+
+        response = self._get(etag='other')
+        self.assertEqual(200, response.status_int)
+        self.assertEqual({'version': 1}, jsonutils.loads(response.body))
+        self.assertEqual(3, self.calls)
+
+    def test_cached_body_reused(self):
+        self.flags(response_cache_time=60, group='api')
+        etag = self._get().etag
+
+        response = self._get()
+        self.assertEqual(200, response.status_int)
+        self.assertEqual({'version': 1}, jsonutils.loads(response.body))
+        self.assertEqual(etag, response.etag)
+        self.assertEqual('application/json', response.content_type)
+
+        response = self._get(etag=etag)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(1, self.calls)
+
+    def test_cached_body_dropped_on_version_change(self):
+        self.flags(response_cache_time=60, group='api')
+        etag = self._get().etag
+        self.version = 2
+
+        response = self._get(etag=etag)
+        self.assertEqual(200, response.status_int)
+        self.assertEqual({'version': 2}, jsonutils.loads(response.body))
+        self.assertNotEqual(etag, response.etag)
+        self.assertEqual(2, self.calls)
+
+    def test_cached_body_scoped(self):
+        self.flags(response_cache_time=60, group='api')
+        self._get()
+        self._get(user_id='other-user')
+        self._get(path='/tests?limit=1')
+        self.assertEqual(3, self.calls)
+
+    def test_cached_body_query_params_normalized(self):
+        self.flags(response_cache_time=60, group='api')
+        self._get(path='/tests?limit=1&marker=abc')
+        self._get(path='/tests?marker=abc&limit=1')
+        self.assertEqual(1, self.calls)
+
+    @mock.patch('nova.api.openstack.wsgi._get_response_cache')
+    def test_unknown_query_params_not_cached(self, mock_cache):
+        self.flags(response_cache_time=60, group='api')
+        response = self._get(path='/tests?limit=1&foo=bar')
+        self.assertEqual(200, response.status_int)
+        self.assertIsNotNone(response.etag)
+        response = self._get(path='/tests?foo=bar', etag=response.etag)
+        self.assertEqual(304, response.status_int)
+        self.assertEqual(2, self.calls)
+        mock_cache.assert_not_called()
+
+    def test_direct_call_returns_result(self):
+        req = fakes.HTTPRequest.blank('/tests')
+        self.assertEqual({'version': 1}, self.controller.index(req))
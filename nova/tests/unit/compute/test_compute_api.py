@@ -286,6 +286,63 @@ class _ComputeAPIUnitTestMixIn(object):
                           instance_type=self._create_flavor(),
                           image_href=None)
 
+    @mock.patch('nova.compute.api.API._check_auto_disk_config',
+                side_effect=exception.AutoDiskConfigDisabledByImage(image='x'))
+    @mock.patch('nova.compute.api.API._check_requested_networks')
+    @mock.patch.object(cinder.API, 'get')
+    def test_create_volume_backed_fetches_dependencies_once(
+            self, mock_get, mock_check_networks, mock_check_auto_disk):
+        # The volumes and networks are looked up before the boot metadata is
+        # needed, and the volume fetched for the boot metadata is reused
+        # instead of being fetched from Cinder again.
+        mock_get.return_value = {'id': uuids.volume_id, 'bootable': True,
+                                 'volume_image_metadata': {}}
+        bdms = [{'device_name': 'vda', 'volume_id': uuids.volume_id,
+                 'source_type': 'volume', 'destination_type': 'volume',
+                 'boot_index': 0},
+                {'device_name': 'vdb', 'volume_id': uuids.volume_id,
+                 'source_type': 'volume', 'destination_type': 'volume',
+                 'boot_index': 1}]
+
+        self.assertRaises(exception.AutoDiskConfigDisabledByImage,
+                          self.compute_api.create, self.context,
+                          self._create_flavor(), None,
+                          block_device_mapping=bdms, legacy_bdm=False)
+        mock_get.assert_called_once_with(self.context, uuids.volume_id)
+        mock_check_networks.assert_called_once_with(self.context, None, 1)
+
+    @mock.patch('nova.compute.api.LOG.debug')
+    @mock.patch('nova.compute.api.API._provision_instances', return_value=[])
+    @mock.patch('nova.compute.api.API._checks_for_create_and_rebuild')
+    @mock.patch('nova.compute.api.API._check_and_transform_bdm')
+    @mock.patch('nova.compute.api.API._validate_and_build_base_options',
+                return_value=({}, 1, None, ['default'], None))
+    @mock.patch('nova.compute.api.API._check_auto_disk_config')
+    @mock.patch('nova.compute.api.API._get_bdm_image_metadata',
+                return_value={})
+    @mock.patch.object(cinder.API, 'get')
+    def test_create_logs_volume_timings(self, mock_get, mock_get_meta,
+                                       mock_check_auto_disk, mock_validate,
+                                       mock_transform, mock_checks,
+                                       mock_provision, mock_debug):
+        # The volume calls are consumed while provisioning the instances,
+        # the timings are still logged for them.
+        self.flags(recheck_quota=False, group='quota')
+        mock_provision.side_effect = (
+            lambda *args, **kwargs: kwargs['volumes'].clear() or [])
+        bdms = [{'device_name': 'vda', 'volume_id': uuids.volume_id,
+                 'source_type': 'volume', 'destination_type': 'volume',
+                 'boot_index': 0}]
+
+        with mock.patch.object(self.compute_api, 'compute_task_api'):
+            self.compute_api.create(self.context, self._create_flavor(),
+                                    None, block_device_mapping=bdms,
+                                    legacy_bdm=False)
+        timings = [call[0][1] for call in mock_debug.call_args_list
+                   if call[0][0].startswith('Create dependency timings')]
+        self.assertEqual(1, len(timings))
+        self.assertIn(uuids.volume_id, timings[0]['volumes'])
+
     def _test_create_max_net_count(self, max_net_count, min_count, max_count):
         with test.nested(
             mock.patch.object(self.compute_api, '_get_image',
@@ -1813,6 +1870,8 @@ class _ComputeAPIUnitTestMixIn(object):
         mock_confirm = self.useFixture(
             fixtures.MockPatchObject(self.compute_api.compute_rpcapi,
                                      'confirm_resize')).mock
+        mock_usage = self.useFixture(fixtures.MockPatch(
+            'nova.compute.utils.record_confirmed_resize_usage')).mock
 
         mock_elevated.return_value = self.context
         if not mig_ref_passed:
@@ -1835,6 +1894,7 @@ class _ComputeAPIUnitTestMixIn(object):
                                             'confirmResize')
         mock_confirm.assert_called_once_with(self.context, fake_inst, fake_mig,
                                              'compute-source')
+        mock_usage.assert_called_once_with(self.context, fake_inst)
 
         if not mig_ref_passed:
             mock_get.assert_called_once_with(self.context, fake_inst['uuid'],
@@ -1843,6 +1903,27 @@ class _ComputeAPIUnitTestMixIn(object):
     def test_confirm_resize(self):
         self._test_confirm_resize()
 
+    @mock.patch('nova.compute.utils.record_confirmed_resize_usage')
+    @mock.patch('nova.objects.Migration.get_by_instance_and_status')
+    def test_confirm_resize_on_deleting_does_not_record_usage(self, mock_get,
+                                                              mock_usage):
+        # The old and new flavors of the resized instance stop counting when
+        # it is queued for deletion.
+        inst = self._create_instance_obj(
+            params=dict(vm_state=vm_states.RESIZED))
+        mock_get.return_value = objects.Migration(
+            id=1, status='finished', source_compute='compute-source')
+        with test.nested(
+            mock.patch.object(self.compute_api, '_record_action_start'),
+            mock.patch.object(self.compute_api.compute_rpcapi,
+                              'confirm_resize'),
+        ) as (mock_record_action, mock_confirm):
+            self.compute_api._confirm_resize_on_deleting(self.context, inst)
+            mock_confirm.assert_called_once_with(
+                self.context, inst, mock_get.return_value, 'compute-source',
+                cast=False)
+        mock_usage.assert_not_called()
+
     def test_confirm_resize_with_migration_ref(self):
         self._test_confirm_resize(mig_ref_passed=True)
 
@@ -1875,10 +1956,13 @@ class _ComputeAPIUnitTestMixIn(object):
             mock.patch.object(fake_inst, 'save', side_effect=_check_state),
             mock.patch.object(fake_mig, 'save', side_effect=_check_mig),
             mock.patch.object(self.compute_api, '_record_action_start'),
-            mock.patch.object(self.compute_api.compute_rpcapi, 'revert_resize')
+            mock.patch.object(self.compute_api.compute_rpcapi,
+                              'revert_resize'),
+            mock.patch('nova.compute.utils.record_reverted_resize_usage')
         ) as (mock_inst_save, mock_mig_save, mock_record_action,
-              mock_revert_resize):
+              mock_revert_resize, mock_usage):
             self.compute_api.revert_resize(self.context, fake_inst)
+            mock_usage.assert_called_once_with(self.context, fake_inst)
 
             mock_elevated.assert_called_once_with()
             mock_get_migration.assert_called_once_with(
@@ -1896,6 +1980,15 @@ class _ComputeAPIUnitTestMixIn(object):
     def test_revert_resize(self):
         self._test_revert_resize()
 
+    def test_revert_resize_usage_counters(self):
+        # The usage counters already count the larger of the old and new
+        # flavors, so reverting cannot go over quota.
+        self.flags(usage_counters=True, group='quota')
+        with mock.patch.object(self.compute_api,
+                               '_check_quota_for_upsize') as mock_check:
+            self._test_revert_resize()
+        mock_check.assert_not_called()
+
     @mock.patch('nova.availability_zones.get_host_availability_zone',
                 return_value='nova')
     @mock.patch('nova.objects.Quotas.check_deltas')
@@ -1969,6 +2062,8 @@ class _ComputeAPIUnitTestMixIn(object):
         mock_resize = self.useFixture(
             fixtures.MockPatchObject(self.compute_api.compute_task_api,
                                      'resize_instance')).mock
+        mock_usage = self.useFixture(fixtures.MockPatch(
+            'nova.compute.utils.record_resize_usage')).mock
 
         if host_name:
             mock_get_all_by_host.return_value = [objects.ComputeNode(
@@ -2115,6 +2210,8 @@ class _ComputeAPIUnitTestMixIn(object):
 
                 mock_inst_save.assert_called_once_with(
                     expected_task_state=[None])
+                mock_usage.assert_called_once_with(self.context, fake_inst,
+                                                   new_flavor)
             else:
                 # This is a migration
                 mock_validate.assert_not_called()
@@ -4361,6 +4458,50 @@ class _ComputeAPIUnitTestMixIn(object):
         mock_reserve_volume.assert_called_once_with(
             self.context, volume_id)
 
+    @mock.patch.object(objects.service, 'get_minimum_version_all_cells',
+                       return_value=
+                       compute_api.CINDER_V3_ATTACH_MIN_COMPUTE_VERSION - 1)
+    @mock.patch.object(cinder.API, 'get')
+    @mock.patch.object(cinder.API, 'reserve_volume')
+    def test_validate_bdm_uses_prefetched_volume(self, mock_reserve_volume,
+                                                 mock_get,
+                                                 mock_get_min_ver_all):
+        instance = self._create_instance_obj()
+        del instance.id
+        instance_type = self._create_flavor()
+        volume_id = uuids.volume_id
+        volume_info = {'status': 'available',
+                       'attach_status': 'detached',
+                       'id': volume_id,
+                       'size': 3,
+                       'multiattach': False}
+        volume_call = mock.Mock()
+        volume_call.result.return_value = volume_info
+        volumes = {volume_id: volume_call}
+        bdms = [objects.BlockDeviceMapping(
+                **fake_block_device.FakeDbBlockDeviceDict(
+                {
+                 'boot_index': 0,
+                 'volume_id': volume_id,
+                 'source_type': 'volume',
+                 'destination_type': 'volume',
+                 'device_name': 'vda',
+                }))]
+        self.compute_api._validate_bdm(self.context, instance, instance_type,
+                                       bdms, volumes=volumes)
+
+        # The prefetched volume is used once and then forgotten.
+        mock_get.assert_not_called()
+        self.assertEqual({}, volumes)
+        self.assertEqual(3, bdms[0].volume_size)
+        mock_reserve_volume.assert_called_once_with(
+            self.context, volume_id)
+
+        mock_get.return_value = volume_info
+        self.compute_api._validate_bdm(self.context, instance, instance_type,
+                                       bdms, volumes=volumes)
+        mock_get.assert_called_once_with(self.context, volume_id)
+
     @mock.patch.object(objects.service, 'get_minimum_version_all_cells',
                        return_value=
                        compute_api.CINDER_V3_ATTACH_MIN_COMPUTE_VERSION - 1)
@@ -4790,7 +4931,7 @@ class _ComputeAPIUnitTestMixIn(object):
                         instance_tags, trusted_certs, False)
             validate_bdm.assert_has_calls([mock.call(
                 ctxt, test.MatchType(objects.Instance), flavor,
-                block_device_mappings, False)] * max_count)
+                block_device_mappings, False, volumes=None)] * max_count)
 
             for rs, br, im in instances_to_build:
                 self.assertIsInstance(br.instance, objects.Instance)
@@ -5637,6 +5778,25 @@ class _ComputeAPIUnitTestMixIn(object):
         mock_get.assert_called_once_with(self.context, inst.uuid)
         mock_save.assert_called_once_with()
 
+    @mock.patch('nova.compute.utils.record_instance_usage')
+    @mock.patch.object(objects.InstanceMapping, 'save')
+    @mock.patch.object(objects.InstanceMapping, 'get_by_instance_uuid')
+    def test_update_queued_for_deletion_records_usage(self, mock_get,
+                                                      mock_save, mock_record):
+        inst = objects.Instance(uuid=uuids.inst)
+        im = objects.InstanceMapping(instance_uuid=uuids.inst,
+                                     queued_for_delete=False)
+        mock_get.return_value = im
+        self.compute_api._update_queued_for_deletion(self.context, inst, True)
+        mock_record.assert_called_once_with(self.context, inst, sign=-1)
+        # Queueing an already queued instance does not count it twice.
+        mock_record.reset_mock()
+        self.compute_api._update_queued_for_deletion(self.context, inst, True)
+        mock_record.assert_not_called()
+        self.compute_api._update_queued_for_deletion(self.context, inst,
+                                                     False)
+        mock_record.assert_called_once_with(self.context, inst, sign=1)
+
     @mock.patch.object(objects.InstanceMappingList,
                        'get_not_deleted_by_cell_and_project')
     def test_generate_minimal_construct_for_down_cells(self, mock_get_ims):
@@ -5698,7 +5858,8 @@ class _ComputeAPIUnitTestMixIn(object):
                 cell_down_support=False)
             fields = ['metadata', 'info_cache', 'security_groups']
             mock_inst_get.assert_called_once_with(self.context, {}, None, None,
-                fields, None, None, cell_down_support=False)
+                fields, None, None, cell_down_support=False,
+                columns_to_load=None)
             for i, instance in enumerate(cell_instances):
                 self.assertEqual(instance, insts[i])
             mock_get_ims.assert_not_called()
@@ -5728,7 +5889,8 @@ class _ComputeAPIUnitTestMixIn(object):
             fields = ['metadata', 'info_cache', 'security_groups']
             mock_inst_get.assert_called_once_with(self.context, {},
                                                   3, None, fields, None, None,
-                                                  cell_down_support=True)
+                                                  cell_down_support=True,
+                                                  columns_to_load=None)
             for i, instance in enumerate(partial_instances + full_instances):
                 self.assertTrue(obj_base.obj_equal_prims(instance, insts[i]))
             # With an original limit of 3, and 0 build requests but 2 instances
@@ -6098,7 +6260,8 @@ class _ComputeAPIUnitTestMixIn(object):
             fields = ['metadata', 'info_cache', 'security_groups']
             mock_inst_get.assert_called_once_with(
                 self.context, {'foo': 'bar'}, None, None,
-                fields, ['baz'], ['desc'], cell_down_support=False)
+                fields, ['baz'], ['desc'], cell_down_support=False,
+                columns_to_load=None)
             for i, instance in enumerate(build_req_instances + cell_instances):
                 self.assertEqual(instance, instances[i])
 
@@ -6133,7 +6296,8 @@ class _ComputeAPIUnitTestMixIn(object):
             fields = ['metadata', 'info_cache', 'security_groups']
             mock_inst_get.assert_called_once_with(
                 self.context, {'foo': 'bar'}, None, None,
-                fields, ['baz'], ['desc'], cell_down_support=False)
+                fields, ['baz'], ['desc'], cell_down_support=False,
+                columns_to_load=None)
             for i, instance in enumerate(build_req_instances + cell_instances):
                 self.assertEqual(instance, instances[i])
 
@@ -6168,7 +6332,8 @@ class _ComputeAPIUnitTestMixIn(object):
             fields = ['metadata', 'info_cache', 'security_groups']
             mock_inst_get.assert_called_once_with(
                 self.context, {'foo': 'bar'}, 8, None,
-                fields, ['baz'], ['desc'], cell_down_support=False)
+                fields, ['baz'], ['desc'], cell_down_support=False,
+                columns_to_load=None)
             for i, instance in enumerate(build_req_instances + cell_instances):
                 self.assertEqual(instance, instances[i])
 
@@ -6206,7 +6371,8 @@ class _ComputeAPIUnitTestMixIn(object):
             mock_inst_get.assert_called_once_with(
                 mock.ANY, {'foo': 'bar'},
                 8, None,
-                fields, ['baz'], ['desc'], cell_down_support=False)
+                fields, ['baz'], ['desc'], cell_down_support=False,
+                columns_to_load=None)
             for i, instance in enumerate(build_req_instances +
                                          cell_instances):
                 self.assertEqual(instance, instances[i])
@@ -6646,6 +6812,36 @@ class ComputeAPIUnitTestCase(_ComputeAPIUnitTestMixIn, test.NoDBTestCase):
                           self.compute_api._check_requested_volume_type,
                           bdm, 'lvm-1', volume_types)
 
+    @mock.patch.object(objects.BuildRequestList, 'get_by_filters',
+                       return_value=objects.BuildRequestList())
+    @mock.patch('nova.compute.instance_list.get_instance_objects_sorted',
+                return_value=(objects.InstanceList(), []))
+    def test_get_all_columns_to_load(self, mock_inst_get, mock_buildreq_get):
+        self.compute_api.get_all(
+            self.context, search_opts={'foo': 'bar'}, sort_keys=['baz'],
+            sort_dirs=['desc'], columns_to_load=['display_name'])
+        # Nothing is joined since the caller only needs a few columns.
+        mock_inst_get.assert_called_once_with(
+            self.context, {'foo': 'bar'}, None, None, [], ['baz'], ['desc'],
+            cell_down_support=False, columns_to_load=['display_name'])
+
+    @mock.patch.object(objects.BuildRequestList, 'get_by_filters',
+                       return_value=objects.BuildRequestList())
+    @mock.patch('nova.compute.instance_list.get_instance_objects_sorted',
+                return_value=(objects.InstanceList(), []))
+    def test_get_all_columns_to_load_ip_filter(self, mock_inst_get,
+                                               mock_buildreq_get):
+        with mock.patch.object(self.compute_api.network_api,
+                               'has_substr_port_filtering_extension',
+                               return_value=False):
+            self.compute_api.get_all(
+                self.context, search_opts={'ip': 'foo'}, limit=10,
+                columns_to_load=['display_name'])
+        # The network info is needed to filter by IP in memory.
+        mock_inst_get.assert_called_once_with(
+            self.context, {'ip': 'foo'}, None, None, ['info_cache'], None,
+            None, cell_down_support=False, columns_to_load=['display_name'])
+
     @mock.patch.object(neutron_api.API, 'has_substr_port_filtering_extension')
     @mock.patch.object(neutron_api.API, 'list_ports')
     @mock.patch.object(objects.BuildRequestList, 'get_by_filters',
@@ -6672,7 +6868,8 @@ class ComputeAPIUnitTestCase(_ComputeAPIUnitTestMixIn, test.NoDBTestCase):
             fields = ['metadata', 'info_cache', 'security_groups']
             mock_inst_get.assert_called_once_with(
                 self.context, {'ip': 'fake', 'uuid': ['fake_device_id']},
-                None, None, fields, ['baz'], ['desc'], cell_down_support=False)
+                None, None, fields, ['baz'], ['desc'], cell_down_support=False,
+                columns_to_load=None)
 
     @mock.patch.object(neutron_api.API, 'has_substr_port_filtering_extension')
     @mock.patch.object(neutron_api.API, 'list_ports')
@@ -6700,7 +6897,8 @@ class ComputeAPIUnitTestCase(_ComputeAPIUnitTestMixIn, test.NoDBTestCase):
             fields = ['metadata', 'info_cache', 'security_groups']
             mock_inst_get.assert_called_once_with(
                 self.context, {'ip6': 'fake', 'uuid': ['fake_device_id']},
-                None, None, fields, ['baz'], ['desc'], cell_down_support=False)
+                None, None, fields, ['baz'], ['desc'], cell_down_support=False,
+                columns_to_load=None)
 
     @mock.patch.object(neutron_api.API, 'has_substr_port_filtering_extension')
     @mock.patch.object(neutron_api.API, 'list_ports')
@@ -6735,7 +6933,8 @@ class ComputeAPIUnitTestCase(_ComputeAPIUnitTestMixIn, test.NoDBTestCase):
             mock_inst_get.assert_called_once_with(
                 self.context, {'ip': 'fake1', 'ip6': 'fake2',
                                'uuid': ['fake_device_id', 'fake_device_id']},
-                None, None, fields, ['baz'], ['desc'], cell_down_support=False)
+                None, None, fields, ['baz'], ['desc'], cell_down_support=False,
+                columns_to_load=None)
 
     @mock.patch.object(neutron_api.API, 'has_substr_port_filtering_extension')
     @mock.patch.object(neutron_api.API, 'list_ports')
@@ -7227,6 +7426,33 @@ class ComputeAPIComputeCellUnitTestCase(Cellsv1DeprecatedTestMixIn,
         self._test_resize(same_flavor=True)
 
 
+class DependencyCallTestCase(test.NoDBTestCase):
+    """Unit tests for _DependencyCall."""
+
+    def test_result(self):
+        func = mock.Mock(return_value=mock.sentinel.result)
+        call = compute_api._DependencyCall(func, 1, foo=2)
+
+        self.assertEqual(mock.sentinel.result, call.result())
+        func.assert_called_once_with(1, foo=2)
+        self.assertIsNotNone(call.elapsed)
+
+    def test_result_raises(self):
+        func = mock.Mock(side_effect=exception.ImageNotFound(image_id='x'))
+        call = compute_api._DependencyCall(func)
+
+        self.assertRaises(exception.ImageNotFound, call.result)
+        self.assertIsNotNone(call.elapsed)
+
+    def test_result_raises_synchronous_spawn(self):
+        self.useFixture(nova_fixtures.SpawnIsSynchronousFixture())
+        func = mock.Mock(side_effect=exception.ImageNotFound(image_id='x'))
+        # The exception is not raised until the result is asked for.
+        call = compute_api._DependencyCall(func)
+
+        self.assertRaises(exception.ImageNotFound, call.result)
+
+
 class DiffDictTestCase(test.NoDBTestCase):
     """Unit tests for _diff_dict()."""
 
@@ -914,6 +914,114 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
         mock_init_instance.assert_called_once_with(
             self.context, active_instance)
 
+    @mock.patch.object(context, 'get_admin_context')
+    @mock.patch.object(objects.InstanceList, 'get_by_host')
+    @mock.patch.object(fake_driver.FakeDriver, 'init_host')
+    @mock.patch.object(fake_driver.FakeDriver, 'get_power_states')
+    @mock.patch('nova.compute.manager.ComputeManager._init_instance')
+    @mock.patch('nova.compute.manager.ComputeManager.'
+                '_destroy_evacuated_instances', return_value={})
+    def test_init_host_concurrent(self, mock_destroy_evac, mock_init_instance,
+                                  mock_power_states, mock_init_host,
+                                  mock_host_get, mock_admin_ctxt):
+        """Assert that with init_host_workers > 1 only instances which are
+        not steady go through _init_instance during init_host.
+        """
+        self.flags(init_host_workers=4, group='compute')
+        steady = fake_instance.fake_instance_obj(
+            self.context, host=self.compute.host, uuid=uuids.steady,
+            vm_state=vm_states.ACTIVE, task_state=None,
+            power_state=power_state.RUNNING)
+        powering_off = fake_instance.fake_instance_obj(
+            self.context, host=self.compute.host, uuid=uuids.powering_off,
+            vm_state=vm_states.ACTIVE, task_state=task_states.POWERING_OFF,
+            power_state=power_state.RUNNING)
+        crashed = fake_instance.fake_instance_obj(
+            self.context, host=self.compute.host, uuid=uuids.crashed,
+            vm_state=vm_states.ACTIVE, task_state=None,
+            power_state=power_state.RUNNING)
+        instance_list = objects.InstanceList(self.context,
+            objects=[steady, powering_off, crashed])
+        mock_host_get.return_value = instance_list
+        mock_admin_ctxt.return_value = self.context
+        mock_power_states.return_value = {
+            uuids.steady: power_state.RUNNING,
+            uuids.powering_off: power_state.RUNNING,
+            uuids.crashed: power_state.SHUTDOWN}
+
+        self.compute.init_host()
+
+        mock_power_states.assert_called_once_with(instance_list.objects)
+        mock_init_instance.assert_has_calls(
+            [mock.call(self.context, powering_off),
+             mock.call(self.context, crashed)], any_order=True)
+        self.assertEqual(2, mock_init_instance.call_count)
+        self.assertEqual({uuids.steady: power_state.RUNNING},
+                         self.compute._deferred_init_instances)
+
+    @mock.patch('nova.compute.manager.ComputeManager._init_deferred_instances')
+    def test_post_start_hook_no_deferred_instances(self, mock_init_deferred):
+        self.compute.post_start_hook()
+        mock_init_deferred.assert_not_called()
+
+    @mock.patch.object(context, 'get_admin_context')
+    @mock.patch('nova.compute.manager.ComputeManager._init_deferred_instances')
+    def test_post_start_hook_deferred_instances(self, mock_init_deferred,
+                                                mock_admin_ctxt):
+        mock_admin_ctxt.return_value = self.context
+        self.compute._deferred_init_instances = {
+            uuids.steady: power_state.RUNNING}
+        self.compute.post_start_hook()
+        mock_init_deferred.assert_called_once_with(self.context)
+
+    @mock.patch.object(objects.InstanceList, 'get_by_filters')
+    @mock.patch.object(objects.Instance, 'get_network_info',
+                       return_value=network_model.NetworkInfo())
+    @mock.patch.object(fake_driver.FakeDriver, 'plug_vifs')
+    @mock.patch.object(fake_driver.FakeDriver,
+                       'ensure_filtering_rules_for_instance')
+    def test_init_deferred_instances(self, mock_filtering, mock_plug,
+                                     mock_nw_info, mock_get):
+        self.flags(init_host_workers=4, group='compute')
+        running = fake_instance.fake_instance_obj(
+            self.context, host=self.compute.host, uuid=uuids.running,
+            vm_state=vm_states.ACTIVE, task_state=None,
+            power_state=power_state.RUNNING)
+        stopped = fake_instance.fake_instance_obj(
+            self.context, host=self.compute.host, uuid=uuids.stopped,
+            vm_state=vm_states.STOPPED, task_state=None,
+            power_state=power_state.SHUTDOWN)
+        # This one started rebooting after the service came up, so it must
+        # be left alone.
+        rebooting = fake_instance.fake_instance_obj(
+            self.context, host=self.compute.host, uuid=uuids.rebooting,
+            vm_state=vm_states.ACTIVE, task_state=task_states.REBOOTING,
+            power_state=power_state.RUNNING)
+        mock_get.return_value = [running, stopped, rebooting]
+        self.compute._deferred_init_instances = {
+            uuids.running: power_state.RUNNING,
+            uuids.stopped: power_state.SHUTDOWN,
+            uuids.rebooting: power_state.RUNNING,
+            uuids.deleted: power_state.RUNNING}
+
+        self.compute._init_deferred_instances(self.context)
+
+        mock_get.assert_called_once_with(
+            self.context,
+            {'uuid': mock.ANY, 'host': self.compute.host, 'deleted': False},
+            expected_attrs=['info_cache', 'metadata'])
+        self.assertEqual(
+            set([uuids.running, uuids.stopped, uuids.rebooting,
+                 uuids.deleted]),
+            set(mock_get.call_args[0][1]['uuid']))
+        mock_plug.assert_has_calls(
+            [mock.call(running, mock_nw_info.return_value),
+             mock.call(stopped, mock_nw_info.return_value)], any_order=True)
+        self.assertEqual(2, mock_plug.call_count)
+        mock_filtering.assert_called_once_with(
+            running, mock_nw_info.return_value)
+        self.assertEqual({}, self.compute._deferred_init_instances)
+
     def test_init_instance_with_binding_failed_vif_type(self):
         # this instance will plug a 'binding_failed' vif
         instance = fake_instance.fake_instance_obj(
@@ -4513,38 +4621,63 @@ class ComputeManagerUnitTestCase(test.NoDBTestCase,
             return_value=(0, 0))
     @mock.patch.object(time, 'time', side_effect=[10, 20, 21])
     @mock.patch.object(objects.InstanceList, 'get_by_host', return_value=[])
-    @mock.patch.object(objects.BandwidthUsage, 'get_by_instance_uuid_and_mac')
-    @mock.patch.object(db, 'bw_usage_update')
-    def test_poll_bandwidth_usage(self, bw_usage_update, get_by_uuid_mac,
+    @mock.patch.object(objects.BandwidthUsageList, 'get_by_uuids')
+    @mock.patch.object(objects.BandwidthUsageList, 'create_bulk')
+    def test_poll_bandwidth_usage(self, create_bulk, get_by_uuids,
             get_by_host, time, last_completed_audit):
         bw_counters = [{'uuid': uuids.instance, 'mac_address': 'fake-mac',
                         'bw_in': 1, 'bw_out': 2}]
         usage = objects.BandwidthUsage()
+        usage.instance_uuid = uuids.instance
+        usage.mac = 'fake-mac'
         usage.bw_in = 3
         usage.bw_out = 4
         usage.last_ctr_in = 0
         usage.last_ctr_out = 0
         self.flags(bandwidth_poll_interval=1)
-        get_by_uuid_mac.return_value = usage
-        _time = timeutils.utcnow()
-        bw_usage_update.return_value = {'uuid': uuids.instance, 'mac': '',
-                'start_period': _time, 'last_refreshed': _time, 'bw_in': 0,
-                'bw_out': 0, 'last_ctr_in': 0, 'last_ctr_out': 0, 'deleted': 0,
-                'created_at': _time, 'updated_at': _time, 'deleted_at': _time}
+        get_by_uuids.return_value = [usage]
         with mock.patch.object(self.compute.driver,
                 'get_all_bw_counters', return_value=bw_counters):
             self.compute._poll_bandwidth_usage(self.context)
-            get_by_uuid_mac.assert_called_once_with(self.context,
-                    uuids.instance, 'fake-mac',
-                    start_period=0, use_slave=True)
+            get_by_uuids.assert_called_once_with(self.context,
+                    [uuids.instance], start_period=0, use_slave=True)
             # NOTE(sdague): bw_usage_update happens at some time in
             # the future, so what last_refreshed is irrelevant.
-            bw_usage_update.assert_called_once_with(self.context,
-                    uuids.instance,
-                    'fake-mac', 0, 4, 6, 1, 2,
-                    last_refreshed=mock.ANY,
+            create_bulk.assert_called_once_with(self.context,
+                    [{'uuid': uuids.instance, 'mac': 'fake-mac',
+                      'bw_in': 4, 'bw_out': 6,
+                      'last_ctr_in': 1, 'last_ctr_out': 2}],
+                    start_period=0, last_refreshed=mock.ANY,
                     update_cells=False)
 
+    @mock.patch.object(utils, 'last_completed_audit_period',
+            return_value=(0, 0))
+    @mock.patch.object(time, 'time', side_effect=[10, 20, 21])
+    @mock.patch.object(objects.InstanceList, 'get_by_host', return_value=[])
+    @mock.patch.object(objects.BandwidthUsageList, 'get_by_uuids')
+    @mock.patch.object(objects.BandwidthUsageList, 'create_bulk')
+    def test_poll_bandwidth_usage_previous_period(self, create_bulk,
+            get_by_uuids, get_by_host, time, last_completed_audit):
+        bw_counters = [{'uuid': uuids.instance, 'mac_address': 'fake-mac',
+                        'bw_in': 5, 'bw_out': 7}]
+        usage = objects.BandwidthUsage()
+        usage.instance_uuid = uuids.instance
+        usage.mac = 'fake-mac'
+        usage.last_ctr_in = 2
+        usage.last_ctr_out = 3
+        self.flags(bandwidth_poll_interval=1)
+        get_by_uuids.side_effect = [[], [usage]]
+        with mock.patch.object(self.compute.driver,
+                'get_all_bw_counters', return_value=bw_counters):
+            self.compute._poll_bandwidth_usage(self.context)
+        self.assertEqual(2, get_by_uuids.call_count)
+        create_bulk.assert_called_once_with(self.context,
+                [{'uuid': uuids.instance, 'mac': 'fake-mac',
+                  'bw_in': 3, 'bw_out': 4,
+                  'last_ctr_in': 5, 'last_ctr_out': 7}],
+                start_period=0, last_refreshed=mock.ANY,
+                update_cells=False)
+
     def test_reverts_task_state_instance_not_found(self):
         # Tests that the reverts_task_state decorator in the compute manager
         # will not trace when an InstanceNotFound is raised.
@@ -5758,6 +5891,15 @@ class ComputeManagerBuildInstanceTestCase(test.NoDBTestCase):
         got_exc = test.TestingException()
         self._test_instance_exception(got_exc, exception.RescheduledException)
 
+    @mock.patch.object(objects.Instance, 'coalesce_saves')
+    def test_build_and_run_instance_coalesces_saves(self, mock_coalesce):
+        self.flags(coalesce_instance_saves=True, group='compute')
+        mock_coalesce.return_value.__exit__.return_value = False
+        self._test_instance_exception(test.TestingException(),
+                                      exception.RescheduledException)
+        mock_coalesce.assert_called_once_with(enabled=True)
+        self.assertTrue(mock_coalesce.return_value.__exit__.called)
+
     def test_spawn_network_alloc_failure(self):
         # Because network allocation is asynchronous, failures may not present
         # themselves until the virt spawn method is called.
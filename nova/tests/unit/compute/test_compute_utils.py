@@ -1310,6 +1310,126 @@ class ComputeUtilsQuotaTestCase(test.TestCase):
         deltas = compute_utils.upsize_quota_delta(new_flavor, old_flavor)
         self.assertEqual(expected_deltas, deltas)
 
+    @mock.patch('nova.objects.Quotas.apply_usage_deltas')
+    def test_record_instance_usage_disabled(self, mock_apply):
+        instance = objects.Instance(flavor=objects.Flavor(vcpus=2,
+                                                          memory_mb=512))
+        compute_utils.record_instance_usage(self.context, instance)
+        mock_apply.assert_not_called()
+
+    @mock.patch('nova.objects.Quotas.apply_usage_deltas')
+    def test_record_instance_usage(self, mock_apply):
+        self.flags(usage_counters=True, group='quota')
+        instance = objects.Instance(
+            project_id='fake-project', user_id='fake-user',
+            vm_state=vm_states.ACTIVE, task_state=None,
+            flavor=objects.Flavor(vcpus=2, memory_mb=512))
+        compute_utils.record_instance_usage(self.context, instance, sign=-1)
+        mock_apply.assert_called_once_with(
+            self.context, 'fake-project', 'fake-user',
+            {'instances': -1, 'cores': -2, 'ram': -512})
+
+    @mock.patch('nova.objects.Quotas.apply_usage_deltas',
+                side_effect=test.TestingException)
+    def test_record_instance_usage_failure_ignored(self, mock_apply):
+        self.flags(usage_counters=True, group='quota')
+        instance = objects.Instance(
+            uuid=uuids.instance, project_id='fake-project',
+            user_id='fake-user', vm_state=vm_states.BUILDING,
+            task_state=None, flavor=objects.Flavor(vcpus=1, memory_mb=1))
+        compute_utils.record_instance_usage(self.context, instance)
+        mock_apply.assert_called_once_with(
+            self.context, 'fake-project', 'fake-user',
+            {'instances': 1, 'cores': 1, 'ram': 1})
+
+    @mock.patch('nova.objects.Quotas.apply_usage_deltas')
+    def test_record_instance_usage_resizing(self, mock_apply):
+        self.flags(usage_counters=True, group='quota')
+        instance = objects.Instance(
+            project_id='fake-project', user_id='fake-user',
+            vm_state=vm_states.RESIZED, task_state=None,
+            flavor=objects.Flavor(vcpus=2, memory_mb=512),
+            old_flavor=objects.Flavor(vcpus=1, memory_mb=1024),
+            new_flavor=objects.Flavor(vcpus=2, memory_mb=512))
+        compute_utils.record_instance_usage(self.context, instance, sign=-1)
+        mock_apply.assert_called_once_with(
+            self.context, 'fake-project', 'fake-user',
+            {'instances': -1, 'cores': -2, 'ram': -1024})
+
+        # The flavors left behind by a failed resize do not count.
+        mock_apply.reset_mock()
+        instance.vm_state = vm_states.ACTIVE
+        compute_utils.record_instance_usage(self.context, instance, sign=-1)
+        mock_apply.assert_called_once_with(
+            self.context, 'fake-project', 'fake-user',
+            {'instances': -1, 'cores': -2, 'ram': -512})
+
+    @mock.patch('nova.objects.Quotas.apply_usage_deltas')
+    def test_record_resize_usage(self, mock_apply):
+        old_flavor = objects.Flavor(vcpus=1, memory_mb=1024)
+        new_flavor = objects.Flavor(vcpus=2, memory_mb=512)
+        instance = objects.Instance(project_id='fake-project',
+                                    user_id='fake-user', flavor=old_flavor)
+        compute_utils.record_resize_usage(self.context, instance, new_flavor)
+        mock_apply.assert_not_called()
+
+        # Only the resources which grow are counted until the resize is
+        # confirmed.
+        self.flags(usage_counters=True, group='quota')
+        compute_utils.record_resize_usage(self.context, instance, new_flavor)
+        mock_apply.assert_called_once_with(
+            self.context, 'fake-project', 'fake-user',
+            {'cores': 1, 'ram': 0})
+
+        # Migrating to the same flavor changes nothing.
+        mock_apply.reset_mock()
+        compute_utils.record_resize_usage(self.context, instance, old_flavor)
+        mock_apply.assert_not_called()
+
+    @mock.patch('nova.objects.Quotas.apply_usage_deltas')
+    def test_record_confirmed_resize_usage(self, mock_apply):
+        old_flavor = objects.Flavor(vcpus=1, memory_mb=1024)
+        new_flavor = objects.Flavor(vcpus=2, memory_mb=512)
+        instance = objects.Instance(project_id='fake-project',
+                                    user_id='fake-user', flavor=new_flavor,
+                                    old_flavor=old_flavor)
+        compute_utils.record_confirmed_resize_usage(self.context, instance)
+        mock_apply.assert_not_called()
+
+        # The resources which shrink are released.
+        self.flags(usage_counters=True, group='quota')
+        compute_utils.record_confirmed_resize_usage(self.context, instance)
+        mock_apply.assert_called_once_with(
+            self.context, 'fake-project', 'fake-user',
+            {'cores': 0, 'ram': -512})
+
+        mock_apply.reset_mock()
+        instance.old_flavor = None
+        compute_utils.record_confirmed_resize_usage(self.context, instance)
+        mock_apply.assert_not_called()
+
+    @mock.patch('nova.objects.Quotas.apply_usage_deltas')
+    def test_record_reverted_resize_usage(self, mock_apply):
+        old_flavor = objects.Flavor(vcpus=1, memory_mb=1024)
+        new_flavor = objects.Flavor(vcpus=2, memory_mb=512)
+        instance = objects.Instance(project_id='fake-project',
+                                    user_id='fake-user', flavor=new_flavor,
+                                    old_flavor=old_flavor)
+        compute_utils.record_reverted_resize_usage(self.context, instance)
+        mock_apply.assert_not_called()
+
+        # The resources which grow are released.
+        self.flags(usage_counters=True, group='quota')
+        compute_utils.record_reverted_resize_usage(self.context, instance)
+        mock_apply.assert_called_once_with(
+            self.context, 'fake-project', 'fake-user',
+            {'cores': -1, 'ram': 0})
+
+        mock_apply.reset_mock()
+        instance.old_flavor = None
+        compute_utils.record_reverted_resize_usage(self.context, instance)
+        mock_apply.assert_not_called()
+
     @mock.patch('nova.objects.Quotas.count_as_dict')
     def test_check_instance_quota_exceeds_with_multiple_resources(self,
                                                                   mock_count):
@@ -231,8 +231,9 @@ class ComputeHostAPITestCase(test.TestCase):
         self.assertEqual(sorted(['host-%s' % uuids.cell0, 'host1-unavailable',
                          'host2-unavailable']),
                          sorted([svc.host for svc in services]))
-        mock_sg.assert_called_once_with(self.ctxt, objects.ServiceList.get_all,
-                                        None, set_zones=False)
+        mock_sg.assert_called_once_with(
+            self.ctxt, context.shared_read(objects.ServiceList.get_all),
+            None, set_zones=False)
         mock_get_hm.assert_called_once_with(self.ctxt, cells[1].id)
 
     def test_service_get_all_no_zones(self):
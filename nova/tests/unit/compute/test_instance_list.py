@@ -101,7 +101,9 @@ class TestInstanceList(test.NoDBTestCase):
                                         None, None,
                                         cell_mappings=mock_cm.return_value,
                                         batch_size=1000,
-                                        cell_down_support=False)
+                                        cell_down_support=False,
+                                        columns_to_load=None,
+                                        cursor=None)
 
     @mock.patch('nova.context.CELLS', new=FAKE_CELLS)
     @mock.patch('nova.context.load_cells')
@@ -119,7 +121,9 @@ class TestInstanceList(test.NoDBTestCase):
                                         None, None,
                                         cell_mappings=FAKE_CELLS,
                                         batch_size=100,
-                                        cell_down_support=False)
+                                        cell_down_support=False,
+                                        columns_to_load=None,
+                                        cursor=None)
         mock_cm.assert_not_called()
         mock_lc.assert_called_once_with()
 
@@ -139,7 +143,9 @@ class TestInstanceList(test.NoDBTestCase):
                                         None, None,
                                         cell_mappings=FAKE_CELLS,
                                         batch_size=100,
-                                        cell_down_support=False)
+                                        cell_down_support=False,
+                                        columns_to_load=None,
+                                        cursor=None)
         mock_lc.assert_called_once_with()
 
     @mock.patch('nova.context.CELLS', new=FAKE_CELLS)
@@ -160,10 +166,85 @@ class TestInstanceList(test.NoDBTestCase):
                                         None, None,
                                         cell_mappings=FAKE_CELLS,
                                         batch_size=100,
-                                        cell_down_support=False)
+                                        cell_down_support=False,
+                                        columns_to_load=None,
+                                        cursor=None)
         mock_cm.assert_not_called()
         mock_lc.assert_called_once_with()
 
+    @mock.patch.object(instance_list.InstanceLister, 'get_records_sorted')
+    def test_get_instances_sorted_columns_to_load(self, mock_records):
+        instance_list.get_instances_sorted(
+            self.context, {}, None, None, [], ['display_name'], ['asc'],
+            columns_to_load=['uuid'])
+        # The sort keys are always loaded.
+        mock_records.assert_called_once_with(
+            self.context, {}, None, None, columns_to_join=[],
+            cell_down_support=False,
+            columns_to_load=['display_name', 'uuid'])
+
+    @mock.patch.object(instance_list.InstanceLister, 'get_records_sorted')
+    def test_get_instances_sorted_all_columns(self, mock_records):
+        instance_list.get_instances_sorted(
+            self.context, {}, None, None, [], None, None)
+        mock_records.assert_called_once_with(
+            self.context, {}, None, None, columns_to_join=[],
+            cell_down_support=False)
+
+    def _get_lister_with_cursor(self):
+        lister = instance_list.InstanceLister(['display_name'], ['asc'])
+        lister._last_record = {'display_name': 'foo', 'uuid': uuids.inst}
+        lister._cell_counts[uuids.cell0] = 3
+        return lister
+
+    @mock.patch.object(instance_list, '_CURSOR_CACHE', new=None)
+    def test_page_cursor_cache_disabled(self):
+        ctx = nova_context.RequestContext('fake', 'fake')
+        instance_list.save_page_cursor(ctx, self._get_lister_with_cursor(),
+                                       uuids.last)
+        self.assertIsNone(instance_list.get_page_cursor(ctx, uuids.last))
+        self.assertIsNone(instance_list._CURSOR_CACHE)
+
+    @mock.patch.object(instance_list, '_CURSOR_CACHE', new=None)
+    def test_page_cursor_cache(self):
+        self.flags(instance_list_cursor_cache_time=60, group='api')
+        ctx = nova_context.RequestContext('fake', 'fake')
+        instance_list.save_page_cursor(ctx, self._get_lister_with_cursor(),
+                                       uuids.last)
+        cursor = instance_list.get_page_cursor(ctx, uuids.last)
+        self.assertEqual(['display_name', 'uuid'], cursor.sort_keys)
+        self.assertEqual(['foo', uuids.inst], cursor.values)
+        self.assertEqual({uuids.cell0: 3}, cursor.cell_counts)
+        self.assertIsNone(instance_list.get_page_cursor(ctx, uuids.other))
+        self.assertIsNone(instance_list.get_page_cursor(ctx, None))
+        # The cursors are scoped to the project.
+        other_ctx = nova_context.RequestContext('fake', 'other')
+        self.assertIsNone(instance_list.get_page_cursor(other_ctx,
+                                                        uuids.last))
+
+    @mock.patch.object(instance_list, 'save_page_cursor')
+    @mock.patch.object(instance_list, 'get_page_cursor')
+    @mock.patch('nova.objects.BuildRequestList.get_by_filters',
+                return_value=[])
+    @mock.patch('nova.objects.instance._make_instance_list')
+    @mock.patch('nova.compute.instance_list.get_instances_sorted')
+    @mock.patch('nova.objects.CellMappingList.get_by_project_id')
+    def test_get_instance_objects_sorted_cursor(self, mock_cm, mock_gi,
+                                                mock_mil, mock_br, mock_gpc,
+                                                mock_spc):
+        lister = instance_list.InstanceLister(None, None)
+        mock_gi.return_value = lister, []
+        mock_mil.return_value = objects.InstanceList(objects=[
+            objects.Instance(uuid=uuids.inst0),
+            objects.Instance(uuid=uuids.inst1)])
+        ctx = nova_context.RequestContext('fake', 'fake')
+        instance_list.get_instance_objects_sorted(
+            ctx, {}, None, uuids.marker, [], None, None)
+        mock_gpc.assert_called_once_with(ctx, uuids.marker)
+        self.assertEqual(mock_gpc.return_value,
+                         mock_gi.call_args[1]['cursor'])
+        mock_spc.assert_called_once_with(ctx, lister, uuids.inst1)
+
     @mock.patch('nova.context.scatter_gather_cells')
     def test_get_instances_with_down_cells(self, mock_sg):
         inst_cell0 = self.insts[uuids.cell0]
@@ -146,7 +146,43 @@ class TestUtils(test.NoDBTestCase):
 
         self.assertEqual([1, 2, 3],
                          list(multi_cell_list.query_wrapper(
-                             None, test, [1, 2, 3])))
+                             mock.MagicMock(), test, [1, 2, 3])))
+
+    @mock.patch('nova.context.CELL_BREAKER')
+    def test_query_wrapper_breaker(self, mock_breaker):
+        def test(ctx):
+            yield 1
+
+        ctx = mock.MagicMock(cell_uuid=uuids.cell)
+        list(multi_cell_list.query_wrapper(ctx, test))
+        mock_breaker.record_response.assert_called_once_with(uuids.cell)
+
+        def timeout(ctx):
+            raise exception.CellTimeout
+
+        list(multi_cell_list.query_wrapper(ctx, timeout))
+        mock_breaker.record_timeout.assert_called_once_with(uuids.cell)
+
+    @mock.patch('nova.context.CELL_BREAKER')
+    def test_query_wrapper_breaker_partially_read(self, mock_breaker):
+        def test(ctx):
+            yield 1
+            yield 2
+
+        ctx = mock.MagicMock(cell_uuid=uuids.cell)
+        records = multi_cell_list.query_wrapper(ctx, test)
+        self.assertEqual(1, next(records))
+        records.close()
+        mock_breaker.record_response.assert_called_once_with(uuids.cell)
+
+    @mock.patch('nova.context.CELL_BREAKER')
+    def test_query_wrapper_breaker_no_records(self, mock_breaker):
+        def test(ctx):
+            return iter([])
+
+        ctx = mock.MagicMock(cell_uuid=uuids.cell)
+        self.assertEqual([], list(multi_cell_list.query_wrapper(ctx, test)))
+        mock_breaker.record_response.assert_called_once_with(uuids.cell)
 
     def test_query_wrapper_timeout(self):
         def test(ctx):
@@ -413,6 +449,43 @@ class TestBaseClass(test.NoDBTestCase):
         self.assertEqual(1, len(lister.cells_failed))
         self.assertEqual(1, len(lister.cells_timed_out))
 
+    def test_skipped_cell(self):
+        self.flags(cell_timeout_failure_threshold=1, group='api')
+        data = [{'id': 'foo-%i' % i} for i in range(0, 100)]
+        cells = [objects.CellMapping(uuid=getattr(uuids, 'cell%i' % i),
+                                     name='cell%i' % i)
+                 for i in range(0, 3)]
+        context.CELL_BREAKER.record_timeout(uuids.cell0)
+
+        lister = TestLister(data, [], [], cells=cells)
+        ctx = context.RequestContext()
+        result = list(lister.get_records_sorted(ctx, {}, 50, None))
+        self.assertEqual(50, len(result))
+        self.assertEqual([uuids.cell0], lister.cells_timed_out)
+        self.assertNotIn(
+            uuids.cell0,
+            lister.call_summary('get_by_filters')['called_in_cell'])
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_skipped_cell_recovers_with_limit(self, mock_now):
+        self.flags(cell_timeout_failure_threshold=1, group='api')
+        data = [{'id': 'foo-%i' % i} for i in range(0, 100)]
+        cells = [objects.CellMapping(uuid=getattr(uuids, 'cell%i' % i),
+                                     name='cell%i' % i)
+                 for i in range(0, 3)]
+        mock_now.return_value = 0
+        context.CELL_BREAKER.record_timeout(uuids.cell0)
+
+        # Once the retry interval passed, a listing which stops reading
+        # before the end of the records of the cell closes the breaker.
+        mock_now.return_value = 1000
+        lister = TestLister(data, [], [], cells=cells)
+        ctx = context.RequestContext()
+        self.assertEqual(
+            10, len(list(lister.get_records_sorted(ctx, {}, 10, None))))
+        self.assertEqual([], lister.cells_timed_out)
+        self.assertFalse(context.CELL_BREAKER.is_tripped(uuids.cell0))
+
     def test_marker_cell_not_requeried(self):
         data = [{'id': 'foo-%i' % i} for i in range(0, 100)]
         cells = [objects.CellMapping(uuid=getattr(uuids, 'cell%i' % i),
@@ -435,3 +508,121 @@ class TestBaseClass(test.NoDBTestCase):
         self.assertEqual(sorted([cell.uuid for cell in cells
                                  if cell.uuid != uuids.cell1]),
                          gmbv_summary['called_in_cell'])
+
+
+class TestPageCursor(test.NoDBTestCase):
+    def test_encode_decode(self):
+        dt = datetime.datetime(2019, 1, 2, 3, 4, 5)
+        cursor = multi_cell_list.PageCursor(
+            ['created_at', 'id'], ['desc', 'asc'], [dt, 42],
+            {uuids.cell0: 3, uuids.cell1: 7})
+        decoded = multi_cell_list.PageCursor.decode(cursor.encode())
+        self.assertEqual(['created_at', 'id'], decoded.sort_keys)
+        self.assertEqual(['desc', 'asc'], decoded.sort_dirs)
+        self.assertEqual([dt, 42], decoded.values)
+        self.assertEqual({uuids.cell0: 3, uuids.cell1: 7},
+                         decoded.cell_counts)
+
+    def test_decode_invalid(self):
+        self.assertIsNone(multi_cell_list.PageCursor.decode('not-a-cursor'))
+
+    def test_matches(self):
+        cursor = multi_cell_list.PageCursor(['key0'], ['asc'], ['foo'])
+        self.assertTrue(cursor.matches(
+            multi_cell_list.RecordSortContext(['key0'], ['asc'])))
+        self.assertFalse(cursor.matches(
+            multi_cell_list.RecordSortContext(['key0'], ['desc'])))
+        self.assertFalse(cursor.matches(
+            multi_cell_list.RecordSortContext(['key1'], ['asc'])))
+
+
+class KeysetLister(TestLister):
+    keyset_pagination = True
+
+    def get_by_sort_values(self, ctx, filters, limit, values, **kwargs):
+        self._method_called(ctx, 'get_by_sort_values', list(values))
+        return self.get_by_filters(ctx, filters, limit, None, **kwargs)
+
+
+@mock.patch('nova.context.target_cell', new=target_cell_cheater)
+class TestKeysetPagination(test.NoDBTestCase):
+    def setUp(self):
+        super(TestKeysetPagination, self).setUp()
+        self.data = [{'id': 'foo-%i' % i} for i in range(0, 1000)]
+        self.cells = [objects.CellMapping(uuid=getattr(uuids, 'cell%i' % i),
+                                          name='cell%i' % i)
+                      for i in range(0, 3)]
+        self.ctx = context.RequestContext()
+
+    def test_cursor_skips_marker_lookup(self):
+        lister = KeysetLister(self.data, ['id'], ['asc'], cells=self.cells)
+        cursor = multi_cell_list.PageCursor(['id'], ['asc'], ['foo-9'])
+        result = list(lister.get_records_sorted(self.ctx, {}, 10, 'foo-9',
+                                                cursor=cursor))
+        self.assertEqual(10, len(result))
+        self.assertEqual(0, lister.call_summary('get_marker_record')['total'])
+        self.assertEqual(
+            0, lister.call_summary('get_marker_by_values')['total'])
+        self.assertEqual(0, lister.call_summary('get_by_filters')['total'] -
+                         lister.call_summary('get_by_sort_values')['total'])
+        self.assertEqual(
+            [[['foo-9']]] * 3,
+            lister.call_summary('get_by_sort_values')['limit_by_cell'])
+
+    def test_cursor_ignored_on_sort_mismatch(self):
+        lister = KeysetLister(self.data, ['id'], ['asc'], cells=self.cells)
+        cursor = multi_cell_list.PageCursor(['id'], ['desc'], ['foo-9'])
+        list(lister.get_records_sorted(self.ctx, {}, 10, 'foo-9',
+                                       cursor=cursor))
+        self.assertEqual(1, lister.call_summary('get_marker_record')['total'])
+        self.assertEqual(
+            0, lister.call_summary('get_by_sort_values')['total'])
+
+    def test_cursor_ignored_without_keyset_support(self):
+        lister = TestLister(self.data, ['id'], ['asc'], cells=self.cells)
+        cursor = multi_cell_list.PageCursor(['id'], ['asc'], ['foo-9'])
+        list(lister.get_records_sorted(self.ctx, {}, 10, 'foo-9',
+                                       cursor=cursor))
+        self.assertEqual(1, lister.call_summary('get_marker_record')['total'])
+
+    def test_batches_follow_values(self):
+        lister = KeysetLister(self.data, ['id'], ['asc'], cells=self.cells,
+                              batch_size=10)
+        result = list(lister.get_records_sorted(self.ctx, {}, 100, None))
+        self.assertEqual(100, len(result))
+        # The first batch of each cell is listed by filters and the next
+        # ones follow the last record of the previous batch.
+        self.assertEqual(
+            3, lister.call_summary('get_by_filters')['total'] -
+            lister.call_summary('get_by_sort_values')['total'])
+        self.assertEqual(
+            0, lister.call_summary('get_marker_by_values')['total'])
+
+    def test_cursor_batch_size(self):
+        lister = KeysetLister(self.data, ['id'], ['asc'], cells=self.cells,
+                              batch_size=10)
+        cursor = multi_cell_list.PageCursor(
+            ['id'], ['asc'], ['foo-9'],
+            {uuids.cell0: 500, uuids.cell1: 5})
+        self.assertEqual(
+            550, lister._get_cell_batch_size(uuids.cell0, 1000, cursor))
+        self.assertEqual(
+            300, lister._get_cell_batch_size(uuids.cell0, 300, cursor))
+        self.assertEqual(
+            multi_cell_list.MIN_BATCH_SIZE,
+            lister._get_cell_batch_size(uuids.cell1, 1000, cursor))
+        self.assertEqual(
+            multi_cell_list.MIN_BATCH_SIZE,
+            lister._get_cell_batch_size(uuids.cell2, 1000, cursor))
+        self.assertEqual(
+            10, lister._get_cell_batch_size(uuids.cell0, 1000, None))
+
+    def test_get_next_cursor(self):
+        lister = KeysetLister(self.data, ['id'], ['asc'], cells=self.cells)
+        self.assertIsNone(lister.get_next_cursor())
+        result = list(lister.get_records_sorted(self.ctx, {}, 10, None))
+        cursor = lister.get_next_cursor()
+        self.assertEqual(['id'], cursor.sort_keys)
+        self.assertEqual(['asc'], cursor.sort_dirs)
+        self.assertEqual([result[-1]['id']], cursor.values)
+        self.assertEqual(10, sum(cursor.cell_counts.values()))
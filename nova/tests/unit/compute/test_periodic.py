@@ -0,0 +1,251 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+
+import eventlet
+import fixtures
+import mock
+from oslo_serialization import jsonutils
+from oslo_service import periodic_task
+from oslo_utils.fixture import uuidsentinel as uuids
+
+from nova.compute import manager as compute_manager
+from nova.compute import periodic
+from nova import context
+from nova import manager
+from nova import objects
+from nova import test
+
+
+class FakeManager(manager.Manager):
+
+    def __init__(self):
+        super(FakeManager, self).__init__(service_name='fake')
+        self.calls = []
+
+    @periodic_task.periodic_task(spacing=10, run_immediately=True)
+    def _plain_task(self, context):
+        self.calls.append('plain')
+
+    @periodic.task_options(deferrable=True)
+    @periodic_task.periodic_task(spacing=10, run_immediately=True)
+    def _deferrable_task(self, context):
+        self.calls.append('deferrable')
+
+    @periodic.task_options(io_bound=True)
+    @periodic_task.periodic_task(spacing=10, run_immediately=True)
+    def _io_task(self, context):
+        self.calls.append('io')
+
+
+class PeriodicTaskRunnerTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(PeriodicTaskRunnerTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.manager = FakeManager()
+        # Tests replace some of the tasks, do not leak that to other tests.
+        self.manager._periodic_tasks = list(self.manager._periodic_tasks)
+        self.busy = False
+        self.runner = periodic.PeriodicTaskRunner(
+            self.manager, is_busy=lambda: self.busy)
+
+    def test_run_all_due_tasks(self):
+        idle_for = self.runner.run(self.context)
+
+        self.assertEqual(['plain', 'deferrable', 'io'], self.manager.calls)
+        self.assertEqual(10, idle_for)
+        stats = self.runner.get_stats()
+        self.assertEqual(set(['_plain_task', '_deferrable_task', '_io_task']),
+                         set(stats))
+        for task_stats in stats.values():
+            self.assertEqual(1, task_stats['runs'])
+            self.assertEqual(0, task_stats['failures'])
+            self.assertIsNotNone(task_stats['last_duration'])
+
+        # Nothing is due anymore.
+        self.runner.run(self.context)
+        self.assertEqual(3, len(self.manager.calls))
+
+    @mock.patch('random.random', return_value=1.0)
+    def test_jitter(self, mock_random):
+        self.flags(periodic_task_jitter=0.5, group='compute')
+        with mock.patch('oslo_utils.timeutils.now', return_value=100.0):
+            self.assertEqual(103.0, self.runner._next_run(98.0, 10))
+            self.assertEqual(100.0, self.runner._next_run(None, 10))
+
+    def test_failure_is_recorded(self):
+        def failing_task(manager, context):
+            raise ValueError()
+
+        failing_task._periodic_external_ok = False
+        self.manager._periodic_tasks[0] = ('_plain_task', failing_task)
+
+        self.runner.run(self.context)
+        self.assertEqual(['deferrable', 'io'], self.manager.calls)
+
+        self.manager._periodic_last_run['_plain_task'] = None
+        self.assertRaises(ValueError, self.runner.run, self.context,
+                          raise_on_error=True)
+        self.assertEqual(2, self.runner.get_stats()['_plain_task']['failures'])
+
+    def test_greenlet_exit_not_caught(self):
+        def killed_task(manager, context):
+            raise eventlet.greenlet.GreenletExit()
+
+        killed_task._periodic_external_ok = False
+        self.manager._periodic_tasks[0] = ('_plain_task', killed_task)
+
+        # The service is stopping, the following tasks must not run.
+        self.assertRaises(eventlet.greenlet.GreenletExit, self.runner.run,
+                          self.context)
+        self.assertEqual([], self.manager.calls)
+        self.assertEqual(1, self.runner.get_stats()['_plain_task']['failures'])
+
+    def test_overrun_is_recorded(self):
+        stats = periodic.TaskStats()
+        stats.record(12.0, 10, False)
+        stats.record(4.0, 10, False)
+        self.assertEqual({'runs': 2, 'failures': 0, 'deferrals': 0,
+                          'overruns': 1, 'skipped_in_flight': 0,
+                          'last_duration': 4.0, 'max_duration': 12.0,
+                          'average_duration': 8.0,
+                          'last_run_at': mock.ANY}, stats.to_dict())
+
+    def test_defer_when_busy(self):
+        self.busy = True
+        idle_for = self.runner.run(self.context)
+
+        self.assertEqual(['plain', 'io'], self.manager.calls)
+        self.assertEqual(1, idle_for)
+        stats = self.runner.get_stats()
+        self.assertEqual(1, stats['_deferrable_task']['deferrals'])
+        self.assertEqual(0, stats['_deferrable_task']['runs'])
+
+        # The task is due again after a tenth of its spacing and is never
+        # deferred twice in a row.
+        last_run = self.manager._periodic_last_run['_deferrable_task']
+        self.manager._periodic_last_run['_deferrable_task'] = last_run - 1
+        self.runner.run(self.context)
+        self.assertEqual(['plain', 'io', 'deferrable'], self.manager.calls)
+
+    def test_concurrent_lane(self):
+        self.flags(periodic_task_workers=2, group='compute')
+        runner = periodic.PeriodicTaskRunner(self.manager)
+        started = eventlet.event.Event()
+        release = eventlet.event.Event()
+
+        def slow_io_task(manager, context):
+            started.send()
+            release.wait()
+            manager.calls.append('io')
+
+        slow_io_task._periodic_external_ok = False
+        slow_io_task._periodic_io_bound = True
+        self.manager._periodic_tasks[2] = ('_io_task', slow_io_task)
+
+        runner.run(self.context)
+        started.wait()
+        self.assertEqual(['plain', 'deferrable'], self.manager.calls)
+
+        # The previous run is still in flight so it is not started again.
+        self.manager._periodic_last_run['_io_task'] = None
+        runner.run(self.context)
+        self.assertEqual(
+            1, runner.get_stats()['_io_task']['skipped_in_flight'])
+
+        release.send()
+        runner._pool.waitall()
+        self.assertEqual(['plain', 'deferrable', 'io'], self.manager.calls)
+        self.assertEqual(1, runner.get_stats()['_io_task']['runs'])
+
+    def test_dump_stats(self):
+        path = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                            'stats.json')
+        self.flags(periodic_task_stats_file=path, group='compute')
+        self.runner.run(self.context)
+
+        with open(path) as f:
+            stats = jsonutils.loads(f.read())
+        self.assertEqual(1, stats['_plain_task']['runs'])
+        self.assertFalse(os.path.exists(path + '.tmp'))
+
+    @mock.patch('nova.compute.periodic.LOG.warning')
+    def test_dump_stats_failure(self, mock_warning):
+        self.flags(periodic_task_stats_file='/nonexistent/dir/stats.json',
+                   group='compute')
+        self.runner.dump_stats()
+        self.assertTrue(mock_warning.called)
+
+
+class ComputeManagerPeriodicTestCase(test.NoDBTestCase):
+
+    def setUp(self):
+        super(ComputeManagerPeriodicTestCase, self).setUp()
+        self.compute = compute_manager.ComputeManager()
+
+    def test_periodic_tasks_uses_runner(self):
+        with mock.patch.object(self.compute._periodic_runner,
+                               'run') as mock_run:
+            self.compute.periodic_tasks(mock.sentinel.context)
+        mock_run.assert_called_once_with(mock.sentinel.context,
+                                         raise_on_error=False)
+
+    def test_is_busy_disabled(self):
+        self.compute._live_migration_futures = {'a', 'b'}
+        self.assertFalse(self.compute._is_busy_for_periodic_tasks())
+
+    def test_is_busy(self):
+        self.flags(periodic_task_busy_threshold=3, group='compute')
+        self.flags(max_concurrent_builds=10)
+        self.compute._build_semaphore = mock.Mock(balance=9)
+        self.compute._live_migration_futures = {'a'}
+        self.assertFalse(self.compute._is_busy_for_periodic_tasks())
+        self.compute._live_migration_futures.add('b')
+        self.assertTrue(self.compute._is_busy_for_periodic_tasks())
+
+    def test_is_busy_counts_running_live_migrations(self):
+        self.flags(periodic_task_busy_threshold=1, group='compute')
+        started = eventlet.event.Event()
+        done = eventlet.event.Event()
+
+        def fake_live_migration(*args):
+            started.send()
+            done.wait()
+
+        migration = objects.Migration(uuid=uuids.migration)
+        instance = objects.Instance(uuid=uuids.instance)
+        with test.nested(
+            mock.patch.object(self.compute, '_do_live_migration',
+                              side_effect=fake_live_migration),
+            mock.patch.object(self.compute, '_set_migration_status'),
+            mock.patch('nova.compute.utils.EventReporter'),
+        ):
+            self.compute.live_migration(
+                mock.sentinel.context, 'dest', instance, False, migration,
+                mock.sentinel.migrate_data)
+            started.wait()
+            # The migration is not queued anymore once it is running.
+            self.compute._waiting_live_migrations.clear()
+            self.assertTrue(self.compute._is_busy_for_periodic_tasks())
+            done.send()
+            self.compute._live_migration_executor.shutdown(wait=True)
+        self.assertFalse(self.compute._is_busy_for_periodic_tasks())
+
+    def test_task_annotations(self):
+        self.assertTrue(
+            compute_manager.ComputeManager._poll_bandwidth_usage.
+            _periodic_io_bound)
+        self.assertFalse(getattr(
+            compute_manager.ComputeManager.update_available_resource,
+            '_periodic_deferrable', False))
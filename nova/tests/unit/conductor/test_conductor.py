@@ -200,6 +200,75 @@ class ConductorTestCase(_BaseTestCase, test.TestCase):
         self.assertIn('dict', updates)
         self.assertEqual({'foo': 'bar'}, updates['dict'])
 
+    def test_object_action_delta(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'id': fields.IntegerField(),
+                      'foo': fields.IntegerField(),
+                      'bar': fields.IntegerField(),
+                      'updated_at': fields.DateTimeField(nullable=True)}
+            obj_delta_save_refreshed = ('updated_at',)
+
+            def save(self):
+                # Refresh every field, like when reading the database.
+                self.foo = 2
+                self.bar = 3
+                self.updated_at = timeutils.utcnow()
+                self.obj_reset_changes()
+
+        obj_base.NovaObjectRegistry.register(TestObject)
+
+        obj = TestObject(id=1, foo=2)
+        updates, result = self.conductor.object_action(
+            self.context, obj, 'save', tuple(), {}, delta=True)
+        # bar was not sent and is not refreshed, foo was sent but did not
+        # change.
+        self.assertEqual(set(['updated_at', 'obj_what_changed']),
+                         set(updates))
+
+        obj = TestObject(id=1, foo=1)
+        updates, result = self.conductor.object_action(
+            self.context, obj, 'save', tuple(), {})
+        self.assertEqual(set(['foo', 'bar', 'updated_at',
+                              'obj_what_changed']),
+                         set(updates))
+
+    def test_object_action_compact(self):
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField()}
+
+            def bar(self):
+                self.foo = 2
+                return TestObject(foo=3)
+
+        obj_base.NovaObjectRegistry.register(TestObject)
+
+        compact = self.conductor.object_action(
+            self.context, TestObject(foo=1), 'bar', tuple(), {},
+            compact=True)
+        self.assertIn('nova_object.compact', compact)
+        updates, result = obj_base.NovaObjectSerializer().deserialize_entity(
+            self.context, compact)
+        self.assertEqual(2, updates['foo'])
+        self.assertIsInstance(result, TestObject)
+        self.assertEqual(3, result.foo)
+
+    def test_object_class_action_versions_compact(self):
+        @obj_base.NovaObjectRegistry.register
+        class TestObject(obj_base.NovaObject):
+            fields = {'foo': fields.IntegerField()}
+
+            @classmethod
+            def get(cls, context):
+                return cls(foo=1)
+
+        compact = self.conductor.object_class_action_versions(
+            self.context, TestObject.obj_name(), 'get', {'TestObject': '1.0'},
+            tuple(), {}, compact=True)
+        result = obj_base.NovaObjectSerializer().deserialize_entity(
+            self.context, compact)
+        self.assertIsInstance(result, TestObject)
+        self.assertEqual(1, result.foo)
+
     def test_object_class_action_versions(self):
         @obj_base.NovaObjectRegistry.register
         class TestObject(obj_base.NovaObject):
@@ -296,6 +365,78 @@ class ConductorRPCAPITestCase(_BaseTestCase, test.TestCase):
         self.conductor_manager = self.conductor_service.manager
         self.conductor = conductor_rpcapi.ConductorAPI()
 
+    def _test_object_action_save(self, objmethod='save', can_send=True):
+        instance = objects.Instance(uuid=uuids.instance, host='fake-host',
+                                    vm_state=vm_states.ACTIVE)
+        instance.obj_reset_changes()
+        instance.task_state = task_states.REBOOTING
+        with test.nested(
+            mock.patch.object(self.conductor.client, 'prepare'),
+            mock.patch.object(self.conductor.client, 'can_send_version',
+                              return_value=can_send)
+        ) as (mock_prepare, mock_can_send):
+            self.conductor.object_action(self.context, instance, objmethod,
+                                         (), {})
+        return mock_prepare, mock_prepare.return_value.call.call_args[1]
+
+    def test_object_action_save(self):
+        mock_prepare, kwargs = self._test_object_action_save()
+        mock_prepare.assert_called_once_with(version='3.0')
+        self.assertNotIn('delta', kwargs)
+        self.assertIn('host', kwargs['objinst'])
+
+    def test_object_action_save_delta(self):
+        self.flags(delta_object_save=True, group='conductor')
+        mock_prepare, kwargs = self._test_object_action_save()
+        mock_prepare.assert_called_once_with(version='3.1')
+        self.assertTrue(kwargs['delta'])
+        objinst = kwargs['objinst']
+        self.assertEqual(set(['uuid', 'task_state']),
+                         set(name for name in objinst.fields
+                             if name in objinst))
+
+    def test_object_action_save_delta_old_conductor(self):
+        self.flags(delta_object_save=True, group='conductor')
+        mock_prepare, kwargs = self._test_object_action_save(can_send=False)
+        mock_prepare.assert_called_once_with(version='3.0')
+        self.assertNotIn('delta', kwargs)
+        self.assertIn('host', kwargs['objinst'])
+
+    def test_object_action_save_compact(self):
+        self.flags(delta_object_save=True, compact_objects=True,
+                   group='conductor')
+        mock_prepare, kwargs = self._test_object_action_save()
+        mock_prepare.assert_called_once_with(version='3.2')
+        self.assertTrue(kwargs['delta'])
+        self.assertTrue(kwargs['compact'])
+        objinst = obj_base.NovaObjectSerializer().deserialize_entity(
+            self.context, kwargs['objinst'])
+        self.assertIsInstance(objinst, objects.Instance)
+        self.assertEqual(set(['uuid', 'task_state']),
+                         set(name for name in objinst.fields
+                             if name in objinst))
+        self.assertEqual(set(['task_state']), objinst.obj_what_changed())
+
+    @mock.patch.object(conductor_rpcapi.ConductorAPI, '_can_send_compact',
+                       return_value=True)
+    def test_object_class_action_versions_compact(self, mock_can_send):
+        with mock.patch.object(self.conductor.client, 'prepare') as prepare:
+            self.conductor.object_class_action_versions(
+                self.context, 'Instance', 'get_by_uuid', {'Instance': '2.4'},
+                (uuids.instance,), {})
+        prepare.assert_called_once_with(version='3.2')
+        prepare.return_value.call.assert_called_once_with(
+            self.context, 'object_class_action_versions', objname='Instance',
+            objmethod='get_by_uuid', object_versions={'Instance': '2.4'},
+            args=(uuids.instance,), kwargs={}, compact=True)
+
+    def test_object_action_delta_only_for_save(self):
+        self.flags(delta_object_save=True, group='conductor')
+        mock_prepare, kwargs = self._test_object_action_save(
+            objmethod='refresh')
+        mock_prepare.assert_called_once_with(version='3.0')
+        self.assertNotIn('delta', kwargs)
+
 
 class ConductorAPITestCase(_BaseTestCase, test.TestCase):
     """Conductor API Tests."""
@@ -1724,6 +1865,13 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
                 else:
                     self.assertEqual(0, len(actions))
 
+    @mock.patch('nova.compute.utils.record_instance_usage')
+    def test_schedule_and_build_instances_records_usage(self, mock_record):
+        instance_uuid = self._do_schedule_and_build_instances_test(
+            self.params)
+        mock_record.assert_called_once_with(self.ctxt, mock.ANY)
+        self.assertEqual(instance_uuid, mock_record.call_args[0][1].uuid)
+
     def test_schedule_and_build_instances_no_tags_provided(self):
         params = copy.deepcopy(self.params)
         del params['tags']
@@ -1801,8 +1949,14 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
             # FIXME(danms): How to validate the db connection here?
 
         build_and_run_instance.side_effect = _build_and_run_instance
-        self.conductor.schedule_and_build_instances(**params)
+        with mock.patch.object(
+                objects.InstanceList, 'create_bulk',
+                wraps=objects.InstanceList.create_bulk) as create_bulk:
+            self.conductor.schedule_and_build_instances(**params)
         self.assertEqual(3, build_and_run_instance.call_count)
+        # All of the instances land in the same cell so they are created
+        # with a single bulk insert.
+        create_bulk.assert_called_once_with(mock.ANY, mock.ANY)
         # We're processing 4 instances over 2 hosts, so we should only lookup
         # the AZ per host once.
         mock_get_az.assert_has_calls([
@@ -1852,9 +2006,14 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
             instance_cells.add(inst_mapping.cell_mapping.uuid)
 
         build_and_run_instance.side_effect = _build_and_run_instance
-        self.conductor.schedule_and_build_instances(**params)
+        with mock.patch.object(
+                objects.InstanceList, 'create_bulk',
+                wraps=objects.InstanceList.create_bulk) as create_bulk:
+            self.conductor.schedule_and_build_instances(**params)
         self.assertEqual(2, build_and_run_instance.call_count)
         self.assertEqual(2, len(instance_cells))
+        # One bulk insert per cell.
+        self.assertEqual(2, create_bulk.call_count)
 
     @mock.patch('nova.compute.utils.notify_about_compute_task_error')
     @mock.patch('nova.scheduler.rpcapi.SchedulerAPI.select_destinations')
@@ -1903,7 +2062,12 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
         self.start_service('compute', host='host1')
         select_destinations.return_value = [[fake_selection1]]
         taglist_create.return_value = self.params['tags']
-        self.conductor.schedule_and_build_instances(**self.params)
+        with mock.patch('nova.compute.utils.record_instance_usage') as record:
+            self.conductor.schedule_and_build_instances(**self.params)
+        # The instance is counted when created and uncounted once destroyed.
+        self.assertEqual([mock.call(self.ctxt, mock.ANY),
+                          mock.call(self.ctxt, mock.ANY, sign=-1)],
+                         record.call_args_list)
         self.assertFalse(build_and_run.called)
         self.assertFalse(bury.called)
         self.assertTrue(br_destroy.called)
@@ -1986,20 +2150,19 @@ class ConductorTaskTestCase(_BaseTaskTestCase, test_compute.BaseTestCase):
 
     @mock.patch('nova.compute.rpcapi.ComputeAPI.build_and_run_instance')
     @mock.patch('nova.scheduler.rpcapi.SchedulerAPI.select_destinations')
-    @mock.patch('nova.objects.BuildRequest.get_by_instance_uuid')
+    @mock.patch('nova.objects.BuildRequestList.get_existing_instance_uuids',
+                return_value=set())
     @mock.patch('nova.objects.BuildRequest.destroy')
     @mock.patch('nova.conductor.manager.ComputeTaskManager._bury_in_cell0')
-    @mock.patch('nova.objects.Instance.create')
+    @mock.patch('nova.objects.InstanceList.create_bulk')
     def test_schedule_and_build_delete_before_scheduling(self, inst_create,
                                                          bury, br_destroy,
-                                                         br_get_by_inst,
+                                                         br_get_existing,
                                                          select_destinations,
                                                          build_and_run):
         """Tests the case that the build request is deleted before the instance
         is created, so we do not create the instance.
         """
-        inst_uuid = self.params['build_requests'][0].instance.uuid
-        br_get_by_inst.side_effect = exc.BuildRequestNotFound(uuid=inst_uuid)
         self.start_service('compute', host='host1')
         select_destinations.return_value = [[fake_selection1]]
         self.conductor.schedule_and_build_instances(**self.params)
@@ -699,6 +699,16 @@ class SqlAlchemyDbApiNoDbTestCase(test.NoDBTestCase):
                                               connection='fake://')
         self.assertEqual('fake://', db_conf['connection'])
 
+    def test_get_cell_db_conf(self):
+        self.flags(max_pool_size=10, max_overflow=20, pool_timeout=30,
+                   group='database')
+        self.flags(max_pool_size=2, max_overflow=0, group='cell_database')
+        db_conf = sqlalchemy_api._get_cell_db_conf(connection='fake://')
+        self.assertEqual('fake://', db_conf['connection'])
+        self.assertEqual(2, db_conf['max_pool_size'])
+        self.assertEqual(0, db_conf['max_overflow'])
+        self.assertEqual(30, db_conf['pool_timeout'])
+
     @mock.patch.object(sqlalchemy_api, 'api_context_manager')
     def test_get_api_engine(self, mock_ctxt_mgr):
         sqlalchemy_api.get_api_engine()
@@ -1894,6 +1904,33 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
         instance = self.create_instance_with_args()
         self.assertTrue(uuidutils.is_uuid_like(instance['uuid']))
 
+    def test_instance_create_bulk(self):
+        values_list = []
+        for i in range(3):
+            values = self.sample_data.copy()
+            values['hostname'] = 'example%d.com' % i
+            values['security_groups'] = ['default']
+            values_list.append(values)
+        instances = db.instance_create_bulk(self.ctxt, values_list)
+
+        self.assertEqual(3, len(instances))
+        for i, instance in enumerate(instances):
+            self.assertTrue(uuidutils.is_uuid_like(instance['uuid']))
+            self.assertIsNone(instance.fault)
+            db_instance = db.instance_get_by_uuid(
+                self.ctxt, instance['uuid'],
+                columns_to_join=['metadata', 'system_metadata',
+                                 'security_groups'])
+            self.assertEqual('example%d.com' % i, db_instance['hostname'])
+            self.assertEqual(
+                self.sample_data['metadata'],
+                utils.metadata_to_dict(db_instance['metadata']))
+            self.assertEqual(
+                ['default'],
+                [group['name'] for group in db_instance['security_groups']])
+            self.assertIsNotNone(
+                db.ec2_instance_get_by_uuid(self.ctxt, instance['uuid']))
+
     @mock.patch.object(sqlalchemy_api, 'security_group_ensure_default')
     def test_instance_create_with_deadlock_retry(self, mock_sg):
         mock_sg.side_effect = [db_exc.DBDeadlock(), None]
@@ -2057,6 +2094,45 @@ class InstanceTestCase(test.TestCase, ModelsObjectComparatorMixin):
             sys_meta = utils.metadata_to_dict(inst['system_metadata'])
             self.assertEqual(sys_meta, {})
 
+    def test_instance_get_all_by_filters_sort_columns_to_load(self):
+        inst = self.create_instance_with_args(display_name='foo')
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {}, columns_to_join=[], sort_keys=['created_at'],
+            sort_dirs=['asc'], columns_to_load=['display_name'])
+        self.assertEqual(1, len(result))
+        self.assertEqual(
+            set(['id', 'uuid', 'deleted', 'cleaned', 'display_name',
+                 'metadata', 'system_metadata', 'fault']),
+            set(result[0]))
+        self.assertEqual(inst['uuid'], result[0]['uuid'])
+        self.assertEqual('foo', result[0]['display_name'])
+        self.assertEqual([], result[0]['system_metadata'])
+
+        instance = objects.Instance._from_db_object(
+            self.ctxt, objects.Instance(), result[0])
+        self.assertEqual('foo', instance.display_name)
+        self.assertFalse(instance.deleted)
+        self.assertNotIn('host', instance)
+
+    def test_instance_get_all_by_filters_sort_columns_to_load_joins(self):
+        self.create_instance_with_args()
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {}, columns_to_join=['info_cache'],
+            columns_to_load=['display_name'])
+        self.assertIn('info_cache', result[0])
+        self.assertNotIn('host', result[0])
+
+    def test_instance_get_all_by_filters_sort_marker_values(self):
+        insts = [self.create_instance_with_args(display_name='inst%i' % i)
+                 for i in range(4)]
+        result = db.instance_get_all_by_filters_sort(
+            self.ctxt, {}, sort_keys=['display_name', 'uuid'],
+            sort_dirs=['asc', 'asc'],
+            marker_values={'display_name': 'inst1',
+                           'uuid': insts[1]['uuid']})
+        self.assertEqual(['inst2', 'inst3'],
+                         [inst['display_name'] for inst in result])
+
     def test_instance_get_all_by_filters_with_fault(self):
         inst = self.create_instance_with_args()
         result = db.instance_get_all_by_filters(self.ctxt, {},
@@ -5515,6 +5591,49 @@ class VolumeUsageDBApiTestCase(test.TestCase):
         for key, value in expected_vol_usages.items():
             self.assertEqual(vol_usages[0][key], value, key)
 
+    def test_vol_usage_update_bulk(self):
+        ctxt = context.get_admin_context()
+        now = timeutils.utcnow()
+        self.useFixture(utils_fixture.TimeFixture(now))
+        start_time = now - datetime.timedelta(seconds=10)
+
+        db.vol_usage_update(ctxt, u'1', rd_req=10, rd_bytes=20,
+                            wr_req=30, wr_bytes=40,
+                            instance_id='fake-instance-uuid1',
+                            project_id='fake-project-uuid1',
+                            user_id='fake-user-uuid1',
+                            availability_zone='fake-az')
+
+        def _usage(volume_id, instance_uuid, value):
+            return {'volume_id': volume_id,
+                    'instance_uuid': instance_uuid,
+                    'project_id': 'fake-project-uuid',
+                    'user_id': 'fake-user-uuid',
+                    'availability_zone': 'fake-az',
+                    'curr_reads': value,
+                    'curr_read_bytes': value * 2,
+                    'curr_writes': value * 3,
+                    'curr_write_bytes': value * 4}
+
+        result = db.vol_usage_update_bulk(
+            ctxt, [_usage(u'1', 'fake-instance-uuid1', 1000),
+                   _usage(u'2', 'fake-instance-uuid2', 100)])
+        self.assertEqual([u'1', u'2'], [r.volume_id for r in result])
+        self.assertEqual([1000, 100], [r.curr_reads for r in result])
+
+        vol_usages = db.vol_get_usage_by_time(ctxt, start_time)
+        self.assertEqual(2, len(vol_usages))
+        for usage in vol_usages:
+            value = 1000 if usage.volume_id == u'1' else 100
+            self.assertEqual(value * 4, usage.curr_write_bytes)
+            self.assertEqual(0, usage.tot_reads)
+
+        result = db.vol_usage_update_bulk(
+            ctxt, [_usage(u'1', 'fake-instance-uuid1', 2000)],
+            update_totals=True)
+        self.assertEqual(2000, result[0].tot_reads)
+        self.assertEqual(0, result[0].curr_reads)
+
     def test_vol_usage_update_when_blockdevicestats_reset(self):
         ctxt = context.get_admin_context()
         now = timeutils.utcnow()
@@ -5719,6 +5838,27 @@ class BlockDeviceMappingTestCase(test.TestCase):
         self.assertIsNotNone(bdm)
         self.assertTrue(uuidutils.is_uuid_like(bdm['uuid']))
 
+    def test_block_device_mapping_create_bulk(self):
+        instance2 = db.instance_create(self.ctxt, {})
+        values_list = [
+            block_device.BlockDeviceDict({
+                'instance_uuid': instance_uuid, 'device_name': device_name,
+                'source_type': 'volume', 'destination_type': 'volume'})
+            for instance_uuid in (self.instance['uuid'], instance2['uuid'])
+            for device_name in ('vda', 'vdb')]
+        bdms = db.block_device_mapping_create_bulk(self.ctxt, values_list,
+                                                   legacy=False)
+
+        self.assertEqual(4, len(bdms))
+        for bdm in bdms:
+            self.assertIsNotNone(bdm['id'])
+            self.assertTrue(uuidutils.is_uuid_like(bdm['uuid']))
+        for instance_uuid in (self.instance['uuid'], instance2['uuid']):
+            db_bdms = db.block_device_mapping_get_all_by_instance(
+                self.ctxt, instance_uuid)
+            self.assertEqual(['/dev/vda', '/dev/vdb'],
+                             sorted(bdm['device_name'] for bdm in db_bdms))
+
     def test_block_device_mapping_create_with_blank_uuid(self):
         bdm = self._create_bdm({'uuid': ''})
         self.assertIsNotNone(bdm)
@@ -8129,6 +8269,63 @@ class BwUsageTestCase(test.TestCase, ModelsObjectComparatorMixin):
 
         self._test_bw_usage_update(**expected_bw_usage)
 
+    def test_bw_usage_update_bulk(self):
+        now = timeutils.utcnow()
+        start_period = now - datetime.timedelta(seconds=10)
+
+        db.bw_usage_update(self.ctxt, 'fake_uuid1', 'fake_mac1',
+                           start_period, 100, 200, 12345, 67890,
+                           update_cells=False)
+        db.bw_usage_update_bulk(self.ctxt, [
+            {'uuid': 'fake_uuid1', 'mac': 'fake_mac1', 'bw_in': 300,
+             'bw_out': 400, 'last_ctr_in': 23456, 'last_ctr_out': 78901},
+            {'uuid': 'fake_uuid2', 'mac': 'fake_mac2', 'bw_in': 1,
+             'bw_out': 2, 'last_ctr_in': 3, 'last_ctr_out': 4}],
+            start_period, update_cells=False)
+
+        bw_usages = db.bw_usage_get_by_uuids(
+            self.ctxt, ['fake_uuid1', 'fake_uuid2'], start_period)
+        self.assertEqual(2, len(bw_usages))
+        expected_bw_usages = {
+            'fake_uuid1': {'uuid': 'fake_uuid1',
+                           'mac': 'fake_mac1',
+                           'start_period': start_period,
+                           'bw_in': 300,
+                           'bw_out': 400,
+                           'last_ctr_in': 23456,
+                           'last_ctr_out': 78901,
+                           'last_refreshed': now},
+            'fake_uuid2': {'uuid': 'fake_uuid2',
+                           'mac': 'fake_mac2',
+                           'start_period': start_period,
+                           'bw_in': 1,
+                           'bw_out': 2,
+                           'last_ctr_in': 3,
+                           'last_ctr_out': 4,
+                           'last_refreshed': now}}
+        for usage in bw_usages:
+            self._assertEqualObjects(expected_bw_usages[usage['uuid']], usage,
+                                     ignored_keys=self._ignored_keys)
+
+    def test_bw_usage_update_bulk_exactly_one_record(self):
+        now = timeutils.utcnow()
+        start_period = now - datetime.timedelta(seconds=10)
+        for id in range(1, 3):
+            self._create_bw_usage(self.ctxt, 'fake_uuid', 'fake_mac',
+                                  start_period, 100, 200, 12345, 67890, id,
+                                  last_refreshed=now)
+
+        db.bw_usage_update_bulk(self.ctxt, [
+            {'uuid': 'fake_uuid', 'mac': 'fake_mac', 'bw_in': 100,
+             'bw_out': 200, 'last_ctr_in': 54321, 'last_ctr_out': 67890}],
+            start_period, update_cells=False)
+
+        bw_usages = db.bw_usage_get_by_uuids(self.ctxt, ['fake_uuid'],
+                                             start_period)
+        last_ctr_in = {usage['id']: usage['last_ctr_in']
+                       for usage in bw_usages}
+        self.assertEqual({1: 54321, 2: 12345}, last_ctr_in)
+
 
 class Ec2TestCase(test.TestCase):
 
@@ -8247,6 +8444,8 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
         self.migrations = models.Migration.__table__
         self.shadow_migrations = sqlalchemyutils.get_table(
             self.engine, "shadow_migrations")
+        self.stub_out('nova.db.sqlalchemy.api._INSTANCE_DEPENDENTS_MARKERS',
+                      {})
 
         self.uuidstrs = []
         for _ in range(6):
@@ -8619,6 +8818,206 @@ class ArchiveTestCase(test.TestCase, ModelsObjectComparatorMixin):
             'shadow_instance_id_mappings'
         )
 
+    def test_archive_deleted_rows_in_batches(self):
+        for uuidstr in self.uuidstrs:
+            ins_stmt = self.instance_id_mappings.insert().values(
+                uuid=uuidstr, deleted=1)
+            self.conn.execute(ins_stmt)
+        timings = {}
+        batch_size_cls = sqlalchemy_api._ArchiveBatchSize
+        with mock.patch.object(sqlalchemy_api, '_ARCHIVE_MIN_BATCH_SIZE', 2):
+            # Every batch is slower than the target so they stay at 2 rows.
+            with mock.patch.object(sqlalchemy_api, '_ArchiveBatchSize',
+                                   lambda: batch_size_cls(size=2, target=-1)):
+                with mock.patch.object(sqlalchemy_api, '_archive_batch',
+                                       wraps=sqlalchemy_api._archive_batch
+                                       ) as archive_batch:
+                    results = db.archive_deleted_rows(
+                        max_rows=5, workers=2, timings=timings)
+        self.assertEqual(dict(instance_id_mappings=5), results[0])
+        # Batches of 2, 2 and the single row left of the budget.
+        self.assertEqual([2, 2, 1], [
+            c[0][5] for c in archive_batch.call_args_list
+            if c[0][1].name == 'instance_id_mappings'])
+        self.assertIn('instance_id_mappings', timings)
+        qsiim = sql.select([self.shadow_instance_id_mappings])
+        self.assertEqual(5, len(self.conn.execute(qsiim).fetchall()))
+        qiim = sql.select([self.instance_id_mappings])
+        self.assertEqual(1, len(self.conn.execute(qiim).fetchall()))
+
+    def test_archive_deleted_rows_for_migrations_in_batches(self):
+        for uuidstr in self.uuidstrs:
+            self.conn.execute(self.instances.insert().values(
+                uuid=uuidstr, deleted=1))
+            self.conn.execute(self.migrations.insert().values(
+                instance_uuid=uuidstr, deleted=0))
+        batch_size_cls = sqlalchemy_api._ArchiveBatchSize
+        with mock.patch.object(sqlalchemy_api, '_ArchiveBatchSize',
+                               lambda: batch_size_cls(size=4)):
+            num = sqlalchemy_api._archive_deleted_rows_for_table(
+                "migrations", max_rows=None)
+        # All of the migrations are soft deleted, over two batches of
+        # deleted instances, and then archived.
+        self.assertEqual(6, num[0])
+        self.assertEqual([], self.conn.execute(
+            sql.select([self.migrations])).fetchall())
+
+    def test_archive_deleted_rows_for_migrations_resumes_walk(self):
+        for uuidstr in self.uuidstrs:
+            self.conn.execute(self.instances.insert().values(
+                uuid=uuidstr, deleted=1))
+            self.conn.execute(self.migrations.insert().values(
+                instance_uuid=uuidstr, deleted=0))
+        batch_size_cls = sqlalchemy_api._ArchiveBatchSize
+
+        def _not_soft_deleted():
+            return set(r[0] for r in self.conn.execute(
+                sql.select([self.migrations.c.instance_uuid]).where(
+                    self.migrations.c.deleted == 0)).fetchall())
+
+        with mock.patch.object(sqlalchemy_api, '_ArchiveBatchSize',
+                               lambda: batch_size_cls(size=2)):
+            # The walk stops once the rows of the first two deleted
+            # instances, which use up the budget, are soft deleted.
+            num = sqlalchemy_api._archive_deleted_rows_for_table(
+                "migrations", max_rows=2)
+            self.assertEqual(2, num[0])
+            self.assertEqual(set(self.uuidstrs[2:]), _not_soft_deleted())
+            # The next call resumes after them.
+            num = sqlalchemy_api._archive_deleted_rows_for_table(
+                "migrations", max_rows=2)
+            self.assertEqual(2, num[0])
+            self.assertEqual(set(self.uuidstrs[4:]), _not_soft_deleted())
+            # A migration of an instance walked already is soft deleted by
+            # wrapping around once the last deleted instance is walked.
+            self.conn.execute(self.migrations.insert().values(
+                instance_uuid=self.uuidstrs[0], deleted=0))
+            num = sqlalchemy_api._archive_deleted_rows_for_table(
+                "migrations", max_rows=None)
+            self.assertEqual(3, num[0])
+            self.assertEqual(set(), _not_soft_deleted())
+        self.assertEqual({}, sqlalchemy_api._INSTANCE_DEPENDENTS_MARKERS)
+
+    @mock.patch.object(sqlalchemy_api, '_soft_delete_instance_dependents')
+    def test_archive_deleted_rows_for_migrations_budget_exhausted(
+            self, mock_soft_delete):
+        budget = sqlalchemy_api._ArchiveBudget(0)
+        num = sqlalchemy_api._archive_deleted_rows_for_table(
+            "migrations", max_rows=0, budget=budget)
+        self.assertEqual(0, num[0])
+        mock_soft_delete.assert_not_called()
+
+    def test_archive_waves(self):
+        metadata = MetaData(bind=self.engine)
+        metadata.reflect()
+        waves = sqlalchemy_api._archive_waves(metadata)
+
+        def _wave(tablename):
+            for index, wave in enumerate(waves):
+                if tablename in wave:
+                    return index
+
+        self.assertIsNone(_wave('migrate_version'))
+        self.assertIsNone(_wave('shadow_instances'))
+        self.assertLess(_wave('consoles'), _wave('console_pools'))
+        self.assertLess(_wave('instance_actions_events'),
+                        _wave('instance_actions'))
+        self.assertLess(_wave('instance_actions'), _wave('instances'))
+        self.assertLess(_wave('migrations'), _wave('instances'))
+        self.assertLess(_wave('instance_extra'), _wave('instances'))
+        self.assertEqual(len(waves) - 1, _wave('instances'))
+
+    def test_purge_shadow_tables_in_batches(self):
+        old = datetime.datetime(2015, 10, 21)
+        new = datetime.datetime(2018, 10, 21)
+        for index, uuidstr in enumerate(self.uuidstrs):
+            self.conn.execute(self.shadow_instance_id_mappings.insert().values(
+                uuid=uuidstr, deleted=1, deleted_at=old if index % 2 else new))
+        batch_size_cls = sqlalchemy_api._ArchiveBatchSize
+        ctxt = context.get_admin_context()
+        qsiim = sql.select([self.shadow_instance_id_mappings])
+
+        with mock.patch.object(sqlalchemy_api, '_ArchiveBatchSize',
+                               lambda: batch_size_cls(size=1)):
+            deleted = sqlalchemy_api.purge_shadow_tables(
+                ctxt, datetime.datetime(2016, 1, 1), max_rows=2)
+            self.assertEqual(2, deleted)
+            self.assertEqual(4, len(self.conn.execute(qsiim).fetchall()))
+            # Running it again picks up where the first run stopped.
+            deleted = sqlalchemy_api.purge_shadow_tables(
+                ctxt, datetime.datetime(2016, 1, 1))
+            self.assertEqual(1, deleted)
+
+        rows = self.conn.execute(qsiim).fetchall()
+        self.assertEqual([new] * 3, [row['deleted_at'] for row in rows])
+
+    def test_purge_table_partitions(self):
+        conn = mock.Mock()
+        conn.engine.name = 'mysql'
+        conn.execute.return_value.fetchall.return_value = [
+            ('p2015', "'2016-01-01 00:00:00'", '`deleted_at`', 10),
+            ('p2016', "'2017-01-01'", '`deleted_at`', 20),
+            ('p2017', "'2018-01-01 00:00:00'", '`deleted_at`', 30),
+            ('pmax', 'MAXVALUE', '`deleted_at`', 40)]
+        status_fn = mock.Mock()
+        table = self.shadow_instance_id_mappings
+
+        dropped = sqlalchemy_api._purge_table_partitions(
+            conn, table, table.c.deleted_at, datetime.datetime(2017, 6, 1),
+            status_fn)
+
+        self.assertEqual(30, dropped)
+        conn.execute.assert_called_with(
+            'ALTER TABLE `shadow_instance_id_mappings` '
+            'DROP PARTITION `p2015`, `p2016`')
+        status_fn.assert_called_once_with(
+            'Dropped partitions p2015, p2016 of shadow_instance_id_mappings '
+            'based on timestamp column deleted_at')
+
+    def test_purge_table_partitions_other_column(self):
+        conn = mock.Mock()
+        conn.engine.name = 'mysql'
+        conn.execute.return_value.fetchall.return_value = [
+            ('p2015', "'2016-01-01 00:00:00'", '`created_at`', 10),
+            ('pmax', 'MAXVALUE', '`created_at`', 40)]
+        table = self.shadow_instance_id_mappings
+
+        dropped = sqlalchemy_api._purge_table_partitions(
+            conn, table, table.c.deleted_at, datetime.datetime(2017, 6, 1),
+            mock.Mock())
+
+        self.assertEqual(0, dropped)
+        self.assertEqual(1, conn.execute.call_count)
+
+    def test_purge_table_partitions_not_mysql(self):
+        conn = mock.Mock()
+        conn.engine.name = 'sqlite'
+        table = self.shadow_instance_id_mappings
+        self.assertEqual(0, sqlalchemy_api._purge_table_partitions(
+            conn, table, table.c.deleted_at, datetime.datetime(2017, 6, 1),
+            mock.Mock()))
+        self.assertFalse(conn.execute.called)
+
+    def test_archive_batch_size(self):
+        batch_size = sqlalchemy_api._ArchiveBatchSize(size=100, target=1.0)
+        # A full batch well under the target grows the batch.
+        batch_size.record(100, 0.1)
+        self.assertEqual(200, batch_size.size)
+        # A partial batch doesn't.
+        batch_size.record(50, 0.1)
+        self.assertEqual(200, batch_size.size)
+        # A slow batch shrinks it.
+        batch_size.record(200, 1.5)
+        self.assertEqual(100, batch_size.size)
+        batch_size.size = sqlalchemy_api._ARCHIVE_MIN_BATCH_SIZE
+        batch_size.record(10, 5)
+        self.assertEqual(sqlalchemy_api._ARCHIVE_MIN_BATCH_SIZE,
+                         batch_size.size)
+        batch_size.size = sqlalchemy_api._ARCHIVE_MAX_BATCH_SIZE
+        batch_size.record(batch_size.size, 0)
+        self.assertEqual(sqlalchemy_api._ARCHIVE_MAX_BATCH_SIZE,
+                         batch_size.size)
+
 
 class PciDeviceDBApiTestCase(test.TestCase, ModelsObjectComparatorMixin):
     def setUp(self):
@@ -8930,6 +9329,20 @@ class TestDBInstanceTags(test.TestCase):
         tags = self._get_tags_from_resp(tag_refs)
         self.assertEqual([(uuid, tag)], tags)
 
+    def test_instance_tag_create_bulk(self):
+        uuid1 = self._create_instance()
+        uuid2 = self._create_instance()
+
+        db.instance_tag_create_bulk(self.context, [uuid1, uuid2],
+                                    [u'tag1', u'tag2', u'tag1'])
+
+        for uuid in (uuid1, uuid2):
+            tag_refs = db.instance_tag_get_by_instance_uuid(self.context,
+                                                            uuid)
+            tags = self._get_tags_from_resp(tag_refs)
+            self.assertEqual([(uuid, u'tag1'), (uuid, u'tag2')],
+                             sorted(tags))
+
     def test_instance_tag_set(self):
         uuid = self._create_instance()
 
@@ -371,7 +371,8 @@ class TestCreateGlanceClient(test.NoDBTestCase):
         result2 = glance._glanceclient_from_endpoint(ctx, endpoint, 2)
 
         # Ensure that session is only loaded once.
-        mock_load.assert_called_once_with(glance.CONF, "glance")
+        mock_load.assert_called_once_with(glance.CONF, "glance",
+                                          session=mock.ANY)
         self.assertEqual(session, glance._SESSION)
         # Ensure new client created every time
         client_call = mock.call(2, auth="fake_auth",
@@ -22,6 +22,7 @@ from nova.db import api as db
 from nova.objects import bandwidth_usage
 from nova import test
 from nova.tests.unit.objects import test_objects
+from nova import utils
 
 
 class _TestBandwidthUsage(test.TestCase):
@@ -140,6 +141,45 @@ class _TestBandwidthUsage(test.TestCase):
                         start_period=self.expected_bw_usage['start_period'])
         self._compare(self, self.expected_bw_usage, bw_usage)
 
+    @mock.patch.object(db, 'bw_usage_update_bulk')
+    def test_create_bulk(self, mock_update_bulk):
+        usages = [{'uuid': uuids.instance, 'mac': 'fake_mac1',
+                   'bw_in': 100, 'bw_out': 200,
+                   'last_ctr_in': 12345, 'last_ctr_out': 67890}]
+        start_period = self.expected_bw_usage['start_period']
+        last_refreshed = self.expected_bw_usage['last_refreshed']
+        bandwidth_usage.BandwidthUsageList.create_bulk(
+            self.context, usages, start_period=start_period,
+            last_refreshed=last_refreshed, update_cells=False)
+        # serialize_args sends the timestamps as strings.
+        mock_update_bulk.assert_called_once_with(
+            self.context, usages, utils.strtime(start_period),
+            last_refreshed=utils.strtime(last_refreshed), update_cells=False)
+
+    def test_create_bulk_with_db(self):
+        start_period = self.expected_bw_usage['start_period']
+        bw_usage = bandwidth_usage.BandwidthUsage(context=self.context)
+        bw_usage.create(uuids.instance, 'fake_mac1', 100, 200, 42, 42,
+                        start_period=start_period)
+        usages = [{'uuid': uuids.instance, 'mac': 'fake_mac1',
+                   'bw_in': 100, 'bw_out': 200,
+                   'last_ctr_in': 12345, 'last_ctr_out': 67890},
+                  {'uuid': uuids.other_instance, 'mac': 'fake_mac2',
+                   'bw_in': 1, 'bw_out': 2,
+                   'last_ctr_in': 3, 'last_ctr_out': 4}]
+        bandwidth_usage.BandwidthUsageList.create_bulk(
+            self.context, usages, start_period=start_period)
+
+        bw_usages = bandwidth_usage.BandwidthUsageList.get_by_uuids(
+            self.context, [uuids.instance, uuids.other_instance],
+            start_period=start_period)
+        self.assertEqual(2, len(bw_usages))
+        by_uuid = {usage.instance_uuid: usage for usage in bw_usages}
+        self.assertEqual(12345, by_uuid[uuids.instance].last_ctr_in)
+        self.assertEqual(67890, by_uuid[uuids.instance].last_ctr_out)
+        self.assertEqual('fake_mac2', by_uuid[uuids.other_instance].mac)
+        self.assertEqual(4, by_uuid[uuids.other_instance].last_ctr_out)
+
 
 class TestBandwidthUsageObject(test_objects._LocalTest,
                                _TestBandwidthUsage):
@@ -650,6 +650,33 @@ class _TestBlockDeviceMappingListObject(object):
             self.context, uuids.bdm_instance)
         self.assertRaises(exception.UndefinedRootBDM, bdm_list.root_bdm)
 
+    @mock.patch.object(db, 'block_device_mapping_create_bulk')
+    def test_create_bulk(self, create_bulk):
+        fakes = [self.fake_bdm(123, instance_uuid=uuids.instance_1),
+                 self.fake_bdm(456, instance_uuid=uuids.instance_2)]
+        create_bulk.return_value = fakes
+        bdms = [objects.BlockDeviceMapping(
+                    context=self.context, instance_uuid=instance_uuid,
+                    source_type='snapshot', destination_type='volume',
+                    snapshot_id='fake-snapshot-id-1')
+                for instance_uuid in (uuids.instance_1, uuids.instance_2)]
+        updates = [bdm.obj_get_changes() for bdm in bdms]
+
+        objects.BlockDeviceMappingList.create_bulk(self.context, bdms)
+
+        create_bulk.assert_called_once_with(self.context, updates,
+                                            legacy=False)
+        for faked, bdm in zip(fakes, bdms):
+            self.assertEqual(faked['id'], bdm.id)
+            self.assertEqual(set(), bdm.obj_what_changed())
+
+    def test_create_bulk_instance_assigned(self):
+        bdm = objects.BlockDeviceMapping(
+            context=self.context, instance=objects.Instance())
+        self.assertRaises(exception.ObjectActionError,
+                          objects.BlockDeviceMappingList.create_bulk,
+                          self.context, [bdm])
+
 
 class TestBlockDeviceMappingListObject(test_objects._LocalTest,
                                        _TestBlockDeviceMappingListObject):
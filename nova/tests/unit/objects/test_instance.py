@@ -25,6 +25,7 @@ from nova.cells import rpcapi as cells_rpcapi
 from nova.compute import flavors
 from nova.compute import task_states
 from nova.compute import vm_states
+from nova import context
 from nova.db import api as db
 from nova import exception
 from nova.network import model as network_model
@@ -694,6 +695,25 @@ class _TestInstanceObject(object):
         mock_update.assert_called_once_with(
             self.context, inst.uuid, {'migration_context': None})
 
+    def test_obj_delta_for_save(self):
+        inst = objects.Instance(context=self.context, uuid=uuids.instance,
+                                host='fake-host', vm_state=vm_states.ACTIVE,
+                                flavor=objects.Flavor(), old_flavor=None)
+        inst.obj_reset_changes()
+        inst.task_state = task_states.REBOOTING
+        delta = inst.obj_delta_for_save()
+        self.assertEqual(set(['uuid', 'task_state']),
+                         set(name for name in delta.fields if name in delta))
+        self.assertEqual(set(['task_state']), delta.obj_what_changed())
+
+        # The flavors are saved together.
+        inst.flavor = objects.Flavor(name='new')
+        delta = inst.obj_delta_for_save()
+        self.assertEqual(set(['uuid', 'task_state', 'flavor', 'old_flavor']),
+                         set(name for name in delta.fields if name in delta))
+        self.assertEqual(set(['task_state', 'flavor']),
+                         delta.obj_what_changed())
+
     def test_save_flavor_skips_unchanged_flavors(self):
         inst = objects.Instance(context=self.context,
                                 flavor=objects.Flavor())
@@ -718,6 +738,118 @@ class _TestInstanceObject(object):
         mock_update.assert_called_once_with(self.context, inst.uuid,
                                             expected_vals)
 
+    def _coalesce_saves_instance(self, mock_update):
+        self.flags(enable=False, group='cells')
+        old_ref = dict(self.fake_instance, vm_state='building',
+                       task_state=None)
+
+        def fake_update(context, uuid, updates, columns_to_join=None):
+            new_ref = dict(old_ref)
+            new_ref.update({k: v for k, v in updates.items()
+                            if not k.startswith('expected_')})
+            return old_ref, new_ref
+
+        mock_update.side_effect = fake_update
+        return objects.Instance._from_db_object(
+            self.context, objects.Instance(), old_ref,
+            expected_attrs=['system_metadata'])
+
+    @mock.patch.object(notifications, 'send_update')
+    @mock.patch.object(db, 'instance_update_and_get_original')
+    def test_coalesce_saves(self, mock_update, mock_send):
+        inst = self._coalesce_saves_instance(mock_update)
+        with inst.coalesce_saves():
+            inst.display_name = 'foo'
+            inst.save()
+            inst.task_state = task_states.BLOCK_DEVICE_MAPPING
+            inst.save()
+            self.assertFalse(mock_update.called)
+
+            inst.task_state = task_states.SPAWNING
+            inst.save(expected_task_state=task_states.BLOCK_DEVICE_MAPPING)
+            # The database still holds the task_state known before the
+            # deferred saves, it is accepted as well.
+            mock_update.assert_called_once_with(
+                self.context, inst.uuid,
+                {'display_name': 'foo',
+                 'task_state': task_states.SPAWNING,
+                 'expected_task_state': [task_states.BLOCK_DEVICE_MAPPING,
+                                         None]},
+                columns_to_join=mock.ANY)
+            self.assertEqual(set(), inst.obj_what_changed())
+
+            inst.progress = 50
+            inst.save()
+            self.assertEqual(1, mock_update.call_count)
+
+        # The deferred changes are written when leaving the block.
+        self.assertEqual(2, mock_update.call_count)
+        mock_update.assert_called_with(self.context, inst.uuid,
+                                       {'progress': 50},
+                                       columns_to_join=mock.ANY)
+        self.assertEqual(set(), inst.obj_what_changed())
+
+    @mock.patch.object(notifications, 'send_update')
+    @mock.patch.object(db, 'instance_update_and_get_original')
+    def test_coalesce_saves_disabled(self, mock_update, mock_send):
+        inst = self._coalesce_saves_instance(mock_update)
+        with inst.coalesce_saves(enabled=False):
+            inst.display_name = 'foo'
+            inst.save()
+            self.assertEqual(1, mock_update.call_count)
+
+    @mock.patch.object(notifications, 'send_update')
+    @mock.patch.object(db, 'instance_update_and_get_original')
+    def test_coalesce_saves_error(self, mock_update, mock_send):
+        inst = self._coalesce_saves_instance(mock_update)
+
+        def _test():
+            with inst.coalesce_saves():
+                inst.task_state = task_states.BLOCK_DEVICE_MAPPING
+                inst.save()
+                raise test.TestingException()
+
+        self.assertRaises(test.TestingException, _test)
+        # The deferred changes are only written if the task_state in the
+        # database is the one known before the block.
+        mock_update.assert_called_once_with(
+            self.context, inst.uuid,
+            {'task_state': task_states.BLOCK_DEVICE_MAPPING,
+             'expected_task_state': [None]},
+            columns_to_join=mock.ANY)
+
+    @mock.patch.object(notifications, 'send_update')
+    @mock.patch.object(db, 'instance_update_and_get_original')
+    def test_coalesce_saves_error_flush_fails(self, mock_update, mock_send):
+        inst = self._coalesce_saves_instance(mock_update)
+        mock_update.side_effect = exception.UnexpectedDeletingTaskStateError(
+            instance_uuid=inst.uuid, expected=[None],
+            actual=task_states.DELETING)
+
+        def _test():
+            with inst.coalesce_saves():
+                inst.task_state = task_states.BLOCK_DEVICE_MAPPING
+                inst.save()
+                raise test.TestingException()
+
+        # The original exception is raised.
+        self.assertRaises(test.TestingException, _test)
+        self.assertIn('task_state', inst.obj_what_changed())
+
+    @mock.patch.object(notifications, 'send_update')
+    @mock.patch.object(db, 'instance_update_and_get_original')
+    def test_coalesce_saves_refresh(self, mock_update, mock_send):
+        inst = self._coalesce_saves_instance(mock_update)
+        with mock.patch.object(objects.Instance, 'get_by_uuid',
+                               return_value=inst.obj_clone()):
+            with inst.coalesce_saves():
+                inst.display_name = 'foo'
+                inst.save()
+                inst.refresh()
+                mock_update.assert_called_once_with(
+                    self.context, inst.uuid, {'display_name': 'foo'},
+                    columns_to_join=mock.ANY)
+
     @mock.patch.object(notifications, 'send_update')
     @mock.patch.object(cells_rpcapi.CellsAPI, 'instance_update_from_api')
     @mock.patch.object(cells_rpcapi.CellsAPI, 'instance_update_at_top')
@@ -1337,6 +1469,28 @@ class _TestInstanceObject(object):
                              expected_attrs=['security_groups'])
         self.assertEqual([], inst.security_groups.objects)
 
+    def test_from_db_object_loaded_columns(self):
+        db_inst = fake_instance.fake_db_instance()
+        db_inst = {key: db_inst[key] for key in ('id', 'uuid', 'deleted',
+                                                 'cleaned', 'display_name')}
+        inst = instance.Instance._from_db_object(
+            self.context, objects.Instance(), db_inst, expected_attrs=[],
+            loaded_columns=['uuid', 'display_name'])
+        self.assertEqual(db_inst['display_name'], inst.display_name)
+        self.assertEqual(db_inst['id'], inst.id)
+        self.assertFalse(inst.obj_attr_is_set('host'))
+
+    def test_from_db_object_missing_column(self):
+        db_inst = fake_instance.fake_db_instance()
+        db_inst.pop('host')
+        self.assertRaises(KeyError, instance.Instance._from_db_object,
+                          self.context, objects.Instance(), db_inst,
+                          expected_attrs=[])
+        # A column which was asked for must be there.
+        self.assertRaises(KeyError, instance.Instance._from_db_object,
+                          self.context, objects.Instance(), db_inst,
+                          expected_attrs=[], loaded_columns=['host'])
+
     @mock.patch('nova.db.api.instance_extra_get_by_instance_uuid',
                 return_value=None)
     def test_from_db_object_no_extra_db_calls(self, mock_get):
@@ -2020,6 +2174,38 @@ class _TestInstanceListObject(object):
         self.assertEqual(fake_instances, actual_uuids)
         mock_get_all.assert_called_once_with(self.context, 'b')
 
+    @mock.patch.object(db, 'instance_create_bulk')
+    def test_create_bulk(self, mock_create_bulk):
+        extras = {'vcpu_model': None,
+                  'numa_topology': None,
+                  'pci_requests': None,
+                  'device_metadata': None,
+                  'trusted_certs': None,
+                  }
+        fake_insts = [fake_instance.fake_db_instance(id=1, host='foo'),
+                      fake_instance.fake_db_instance(id=2, host='bar')]
+        mock_create_bulk.return_value = fake_insts
+        orig_context = context.RequestContext('fake-user', 'fake-project')
+        insts = [objects.Instance(context=orig_context, host=host)
+                 for host in ('foo', 'bar')]
+
+        objects.InstanceList.create_bulk(self.context, insts)
+
+        mock_create_bulk.assert_called_once_with(
+            self.context, [{'deleted': 0, 'host': 'foo', 'extra': extras},
+                           {'deleted': 0, 'host': 'bar', 'extra': extras}])
+        self.assertEqual([1, 2], [inst.id for inst in insts])
+        for inst in insts:
+            self.assertIsNotNone(inst.ec2_ids)
+            # The instances keep their own context.
+            self.assertIs(orig_context, inst._context)
+
+    def test_create_bulk_already_created(self):
+        inst = objects.Instance(context=self.context, id=1)
+        self.assertRaises(exception.ObjectActionError,
+                          objects.InstanceList.create_bulk, self.context,
+                          [inst])
+
 
 class TestInstanceListObject(test_objects._LocalTest,
                              _TestInstanceListObject):
@@ -13,6 +13,7 @@
 import mock
 from oslo_utils import uuidutils
 
+from nova import context
 from nova import exception
 from nova import objects
 from nova.objects import instance_mapping
@@ -160,6 +161,115 @@ class _TestInstanceMappingObject(object):
         mapping_obj.destroy()
         destroy_in_db.assert_called_once_with(self.context, uuid)
 
+    @mock.patch.object(instance_mapping.InstanceMapping,
+            '_get_by_instance_uuid_from_db')
+    def test_get_by_instance_uuid_cached_disabled(self, uuid_from_db):
+        db_mapping = get_db_mapping()
+        uuid_from_db.return_value = db_mapping
+        for i in range(2):
+            objects.InstanceMapping.get_by_instance_uuid_cached(
+                self.context, db_mapping['instance_uuid'])
+        self.assertEqual(2, uuid_from_db.call_count)
+
+    @mock.patch.object(instance_mapping.InstanceMapping,
+            '_get_by_instance_uuid_from_db')
+    def test_get_by_instance_uuid_cached(self, uuid_from_db):
+        self.flags(instance_mapping_cache_size=10, group='api')
+        db_mapping = get_db_mapping()
+        uuid = db_mapping['instance_uuid']
+        uuid_from_db.return_value = db_mapping
+
+        first = objects.InstanceMapping.get_by_instance_uuid_cached(
+            self.context, uuid)
+        other_ctxt = context.RequestContext('fake-user', 'fake-project')
+        second = objects.InstanceMapping.get_by_instance_uuid_cached(
+            other_ctxt, uuid)
+        uuid_from_db.assert_called_once_with(self.context, uuid)
+        # Each caller gets its own copy, bound to its own context.
+        self.assertIsNot(first, second)
+        self.assertIs(other_ctxt, second._context)
+        self.assertIs(other_ctxt, second.cell_mapping._context)
+        self.assertEqual(42, second.cell_mapping.id)
+        self.assertEqual({}, second.obj_get_changes())
+
+        # Updating the copy does not change the cached mapping.
+        second.project_id = 'other-project'
+        third = objects.InstanceMapping.get_by_instance_uuid_cached(
+            self.context, uuid)
+        self.assertEqual('fake-project', third.project_id)
+        self.assertEqual(1, uuid_from_db.call_count)
+
+    @mock.patch.object(instance_mapping.InstanceMapping,
+            '_get_by_instance_uuid_from_db')
+    def test_get_by_instance_uuid_cached_unscheduled(self, uuid_from_db):
+        self.flags(instance_mapping_cache_size=10, group='api')
+        db_mapping = get_db_mapping(cell_mapping=None, cell_id=None)
+        uuid_from_db.return_value = db_mapping
+        for i in range(2):
+            objects.InstanceMapping.get_by_instance_uuid_cached(
+                self.context, db_mapping['instance_uuid'])
+        self.assertEqual(2, uuid_from_db.call_count)
+
+    @mock.patch('oslo_utils.timeutils.now', return_value=1000)
+    @mock.patch.object(instance_mapping.InstanceMapping,
+            '_get_by_instance_uuid_from_db')
+    def test_get_by_instance_uuid_cached_evicts_and_expires(self,
+                                                             uuid_from_db,
+                                                             mock_now):
+        self.flags(instance_mapping_cache_size=2,
+                   instance_mapping_cache_time=60, group='api')
+        db_mappings = {}
+
+        def fake_get(context, uuid):
+            return db_mappings.setdefault(uuid,
+                                          get_db_mapping(instance_uuid=uuid))
+
+        uuid_from_db.side_effect = fake_get
+        uuids = [uuidutils.generate_uuid() for i in range(3)]
+        for uuid in uuids[:2]:
+            objects.InstanceMapping.get_by_instance_uuid_cached(
+                self.context, uuid)
+        # Using the first mapping again makes the second the least recently
+        # used one, which is evicted by the third.
+        objects.InstanceMapping.get_by_instance_uuid_cached(
+            self.context, uuids[0])
+        objects.InstanceMapping.get_by_instance_uuid_cached(
+            self.context, uuids[2])
+        self.assertEqual(3, uuid_from_db.call_count)
+        self.assertEqual([uuids[0], uuids[2]],
+                         list(objects.InstanceMapping._CACHE))
+
+        mock_now.return_value = 1061
+        objects.InstanceMapping.get_by_instance_uuid_cached(
+            self.context, uuids[0])
+        self.assertEqual(4, uuid_from_db.call_count)
+
+    @mock.patch.object(instance_mapping.InstanceMapping, '_destroy_in_db')
+    @mock.patch.object(instance_mapping.InstanceMapping, '_save_in_db')
+    @mock.patch.object(instance_mapping.InstanceMapping,
+            '_get_by_instance_uuid_from_db')
+    def test_get_by_instance_uuid_cached_invalidation(self, uuid_from_db,
+                                                      save_in_db,
+                                                      destroy_in_db):
+        self.flags(instance_mapping_cache_size=10, group='api')
+        db_mapping = get_db_mapping()
+        uuid = db_mapping['instance_uuid']
+        uuid_from_db.return_value = db_mapping
+        save_in_db.return_value = db_mapping
+
+        mapping = objects.InstanceMapping.get_by_instance_uuid_cached(
+            self.context, uuid)
+        mapping.queued_for_delete = True
+        mapping.save()
+        self.assertNotIn(uuid, objects.InstanceMapping._CACHE)
+
+        mapping = objects.InstanceMapping.get_by_instance_uuid_cached(
+            self.context, uuid)
+        self.assertIn(uuid, objects.InstanceMapping._CACHE)
+        mapping.destroy()
+        self.assertNotIn(uuid, objects.InstanceMapping._CACHE)
+        self.assertEqual(2, uuid_from_db.call_count)
+
     def test_cell_mapping_nullable(self):
         mapping_obj = objects.InstanceMapping(self.context)
         # Just ensure this doesn't raise an exception
@@ -211,6 +321,30 @@ class _TestInstanceMappingListObject(object):
     def _check_cell_map_value(self, db_val, cell_obj):
         self.assertEqual(db_val, cell_obj.id)
 
+    @mock.patch.object(instance_mapping.InstanceMappingList,
+                       '_destroy_bulk_in_db')
+    def test_destroy_bulk_clears_cache(self, destroy_bulk_in_db):
+        uuids = [uuidutils.generate_uuid() for i in range(2)]
+        for uuid in uuids:
+            objects.InstanceMapping._CACHE[uuid] = (None, None)
+        objects.InstanceMappingList.destroy_bulk(self.context, uuids[:1])
+        destroy_bulk_in_db.assert_called_once_with(self.context, uuids[:1])
+        self.assertEqual([uuids[1]], list(objects.InstanceMapping._CACHE))
+
+    @mock.patch.object(instance_mapping.InstanceMappingList,
+                       '_set_cell_mapping_bulk_in_db', return_value=1)
+    def test_set_cell_mapping_bulk(self, set_cell_mapping_bulk_in_db):
+        uuids = [uuidutils.generate_uuid() for i in range(2)]
+        for uuid in uuids:
+            objects.InstanceMapping._CACHE[uuid] = (None, None)
+        cell_mapping = objects.CellMapping(self.context, id=42)
+        result = objects.InstanceMappingList.set_cell_mapping_bulk(
+            self.context, uuids[:1], cell_mapping)
+        self.assertEqual(1, result)
+        set_cell_mapping_bulk_in_db.assert_called_once_with(
+            self.context, uuids[:1], 42)
+        self.assertEqual([uuids[1]], list(objects.InstanceMapping._CACHE))
+
     @mock.patch.object(instance_mapping.InstanceMappingList,
             '_get_by_project_id_from_db')
     def test_get_by_project_id(self, project_id_from_db):
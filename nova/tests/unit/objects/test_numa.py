@@ -302,12 +302,18 @@ class _TestNUMA(object):
         limits = objects.NUMATopologyLimits(
             cpu_allocation_ratio=1.0,
             ram_allocation_ratio=1.0,
-            network_metadata=network_meta)
+            network_metadata=network_meta,
+            host_cells=[1, 0])
 
         versions = ovo_base.obj_tree_get_versions('NUMATopologyLimits')
+        primitive = limits.obj_to_primitive(target_version='1.2',
+                                            version_manifest=versions)
+        self.assertIn('host_cells', primitive['nova_object.data'])
+
         primitive = limits.obj_to_primitive(target_version='1.1',
                                             version_manifest=versions)
         self.assertIn('network_metadata', primitive['nova_object.data'])
+        self.assertNotIn('host_cells', primitive['nova_object.data'])
 
         primitive = limits.obj_to_primitive(target_version='1.0',
                                             version_manifest=versions)
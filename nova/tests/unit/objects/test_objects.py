@@ -20,6 +20,7 @@ import pprint
 
 import fixtures
 import mock
+from oslo_serialization import jsonutils
 from oslo_utils import timeutils
 from oslo_versionedobjects import base as ovo_base
 from oslo_versionedobjects import exception as ovo_exc
@@ -584,6 +585,26 @@ class _TestObject(object):
                              obj._context)
         self.assertEqual(self.context, obj._context)
 
+    def test_obj_delta_for_save(self):
+        @base.NovaObjectRegistry.register_if(False)
+        class TestObj(base.NovaObject):
+            fields = {'id': fields.IntegerField(),
+                      'foo': fields.IntegerField(),
+                      'bar': fields.StringField()}
+            obj_delta_save_keys = ('id',)
+
+        obj = TestObj(context=self.context, id=1, foo=2, bar='bar')
+        obj.obj_reset_changes()
+        obj.foo = 3
+        delta = obj.obj_delta_for_save()
+        self.assertEqual(self.context, delta._context)
+        self.assertEqual(1, delta.id)
+        self.assertEqual(3, delta.foo)
+        self.assertNotIn('bar', delta)
+        self.assertEqual(set(['foo']), delta.obj_what_changed())
+        # The object itself is left alone.
+        self.assertEqual(set(['foo']), obj.obj_what_changed())
+
     def test_get_changes(self):
         obj = MyObj()
         self.assertEqual({}, obj.obj_get_changes())
@@ -803,6 +824,64 @@ class TestObjectSerializer(_BaseTestCase):
         ser = base.NovaObjectSerializer()
         self.assertEqual([1, 2], ser.serialize_entity(None, set([1, 2])))
 
+    def _get_compact_objects(self):
+        obj = MyObj(foo=1, bar='bar', rel_object=MyOwnedObject(baz=2),
+                    rel_objects=[MyOwnedObject(baz=3), MyOwnedObject()])
+        obj.obj_reset_changes(['foo'])
+        return [obj, MyObj(foo=4)]
+
+    def test_obj_primitive_compact_round_trip(self):
+        value = {'objects': [obj.obj_to_primitive()
+                             for obj in self._get_compact_objects()],
+                 'other': [1, 'two', None, {'three': 3.0}]}
+        compact = base.obj_primitive_to_compact(value)
+        # Sent over the wire as JSON, like everything else.
+        compact = jsonutils.loads(jsonutils.dumps(compact))
+        self.assertEqual(base.COMPACT_VERSION, compact['nova_object.compact'])
+        # The name, namespace and version of the objects and their field
+        # names are recorded once for each kind of object.
+        self.assertEqual(
+            [['MyObj', 'nova', '1.6',
+              ['bar', 'foo', 'rel_object', 'rel_objects']],
+             ['MyOwnedObject', 'nova', '1.0', ['baz']],
+             ['MyOwnedObject', 'nova', '1.0', []],
+             ['MyObj', 'nova', '1.6', ['foo']]],
+            compact['nova_object.schemas'])
+        self.assertEqual(jsonutils.loads(jsonutils.dumps(value)),
+                         base.obj_primitive_from_compact(compact))
+
+    def test_obj_primitive_compact_keeps_backports(self):
+        # Objects made compatible with an older version round-trip with the
+        # changes made by obj_make_compatible().
+        primitive = MyObj(foo=1, bar='bar').obj_to_primitive(
+            target_version='1.1')
+        self.assertEqual('oldbar', primitive['nova_object.data']['bar'])
+        compact = base.obj_primitive_to_compact(primitive)
+        self.assertEqual(['MyObj', 'nova', '1.1', ['bar', 'foo']],
+                         compact['nova_object.schemas'][0])
+        self.assertEqual(primitive, base.obj_primitive_from_compact(compact))
+
+    def test_obj_primitive_compact_non_string_keys(self):
+        compact = base.obj_primitive_to_compact({1: 'one', None: 'none'})
+        self.assertEqual({'1': 'one', 'null': 'none'},
+                         base.obj_primitive_from_compact(compact))
+
+    def test_deserialize_entity_compact(self):
+        ser = base.NovaObjectSerializer()
+        objs = self._get_compact_objects()
+        compact = base.obj_primitive_to_compact(
+            ser.serialize_entity(self.context, objs))
+        result = ser.deserialize_entity(self.context, compact)
+        self.assertEqual(2, len(result))
+        self.assertIsInstance(result[0], MyObj)
+        self.assertEqual('bar', result[0].bar)
+        self.assertEqual(2, result[0].rel_object.baz)
+        self.assertEqual(3, result[0].rel_objects[0].baz)
+        self.assertEqual(objs[0].obj_what_changed(),
+                         result[0].obj_what_changed())
+        self.assertEqual(set(['foo']), result[1].obj_what_changed())
+        self.assertEqual(self.context, result[1]._context)
+
     def _test_deserialize_entity_newer(self, obj_version, backported_to,
                                        my_version='1.6'):
         ser = base.NovaObjectSerializer()
@@ -1036,7 +1115,7 @@ object_data = {
     'Aggregate': '1.3-f315cb68906307ca2d1cca84d4753585',
     'AggregateList': '1.3-3ea55a050354e72ef3306adefa553957',
     'BandwidthUsage': '1.2-c6e4c779c7f40f2407e3d70022e3cd1c',
-    'BandwidthUsageList': '1.2-5fe7475ada6fe62413cbfcc06ec70746',
+    'BandwidthUsageList': '1.3-9fe9d60881cf84bbc000c888e05205eb',
     'BlockDeviceMapping': '1.20-45a6ad666ddf14bbbedece2293af77e2',
     'BlockDeviceMappingList': '1.17-1e568eecb91d06d4112db9fd656de235',
     'BuildRequest': '1.3-077dee42bed93f8a5b62be77657b7152',
@@ -1104,7 +1183,7 @@ object_data = {
     'NUMACell': '1.3-64b5fec7c51c0a85760c56b42dd307a5',
     'NUMAPagesTopology': '1.1-edab9fa2dc43c117a38d600be54b4542',
     'NUMATopology': '1.2-c63fad38be73b6afd04715c9c1b29220',
-    'NUMATopologyLimits': '1.1-4235c5da7a76c7e36075f0cd2f5cf922',
+    'NUMATopologyLimits': '1.2-c21b40ae2eb7abf1286708959993f496',
     'Network': '1.2-a977ab383aa462a479b2fae8211a5dde',
     'NetworkInterfaceMetadata': '1.2-6f3d480b40fe339067b1c0dd4d656716',
     'NetworkList': '1.2-69eca910d8fa035dfecd8ba10877ee59',
@@ -1147,6 +1226,7 @@ object_data = {
     'VirtualInterface': '1.3-efd3ca8ebcc5ce65fff5a25f31754c54',
     'VirtualInterfaceList': '1.0-9750e2074437b3077e46359102779fc6',
     'VolumeUsage': '1.0-6c8190c46ce1469bb3286a1f21c2e475',
+    'VolumeUsageList': '1.0-289597d52a3e4bd4e5dda616be4b34a3',
     'XenDeviceBus': '1.0-272a4f899b24e31e42b2b9a7ed7e9194',
     'XenapiLiveMigrateData': '1.4-7dc9417e921b2953faa6751f18785f3f'
 }
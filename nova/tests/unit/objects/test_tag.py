@@ -101,6 +101,20 @@ class _TestTagList(object):
                                         RESOURCE_ID, [TAG_NAME1, TAG_NAME2])
         self._compare_tag_list(fake_tag_list, tag_list_obj)
 
+    @mock.patch('nova.db.api.instance_tag_create_bulk')
+    def test_create_bulk(self, tag_create_bulk):
+        tag_lists = tag.TagList.create_bulk(
+            self.context, [RESOURCE_ID, '456'], [TAG_NAME2, TAG_NAME1])
+
+        tag_create_bulk.assert_called_once_with(
+            self.context, [RESOURCE_ID, '456'], [TAG_NAME1, TAG_NAME2])
+        self.assertEqual({RESOURCE_ID, '456'}, set(tag_lists))
+        for resource_id, tag_list_obj in tag_lists.items():
+            self._compare_tag_list(
+                [{'resource_id': resource_id, 'tag': TAG_NAME1},
+                 {'resource_id': resource_id, 'tag': TAG_NAME2}],
+                tag_list_obj)
+
     @mock.patch('nova.db.api.instance_tag_delete_all')
     def test_destroy(self, tag_delete_all):
         tag.TagList.destroy(self.context, RESOURCE_ID)
@@ -81,6 +81,25 @@ class _TestVolumeUsage(object):
             'fake-project-id', 'fake-user-id', None, update_totals=True)
         self.compare_obj(vol_usage, fake_vol_usage)
 
+    @mock.patch('nova.db.api.vol_usage_update_bulk',
+                return_value=[fake_vol_usage])
+    def test_update_bulk(self, mock_upd):
+        usages = [{'volume_id': uuids.volume_id,
+                   'instance_uuid': uuids.instance,
+                   'project_id': 'fake-project-id',
+                   'user_id': 'fake-user-id',
+                   'availability_zone': None,
+                   'curr_reads': 10,
+                   'curr_read_bytes': 20,
+                   'curr_writes': 30,
+                   'curr_write_bytes': 40}]
+        vol_usages = objects.VolumeUsageList.update_bulk(self.context,
+                                                         usages)
+        mock_upd.assert_called_once_with(self.context, usages,
+                                         update_totals=False)
+        self.assertEqual(1, len(vol_usages))
+        self.compare_obj(vol_usages[0], fake_vol_usage)
+
 
 class TestVolumeUsage(test_objects._LocalTest, _TestVolumeUsage):
     pass
@@ -158,7 +158,7 @@ class TestConstructor(test.NoDBTestCase):
 
         load_auth_mock.assert_called_once_with(CONF, 'placement')
         load_sess_mock.assert_called_once_with(CONF, 'placement',
-                                              auth=load_auth_mock.return_value)
+                                               session=mock.ANY)
         self.assertEqual(['internal', 'public'], client._client.interface)
         self.assertEqual({'accept': 'application/json'},
                          client._client.additional_headers)
@@ -171,7 +171,7 @@ class TestConstructor(test.NoDBTestCase):
 
         load_auth_mock.assert_called_once_with(CONF, 'placement')
         load_sess_mock.assert_called_once_with(CONF, 'placement',
-                                              auth=load_auth_mock.return_value)
+                                               session=mock.ANY)
         self.assertEqual(['admin'], client._client.interface)
         self.assertEqual({'accept': 'application/json'},
                          client._client.additional_headers)
@@ -1064,6 +1064,46 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self._test_not_enough_alternates(num_hosts=3, max_attempts=5)
         self._test_not_enough_alternates(num_hosts=20, max_attempts=5)
 
+    def test_set_numa_host_cells(self):
+        numa_limits = objects.NUMATopologyLimits(cpu_allocation_ratio=2.0,
+                                                 ram_allocation_ratio=1.0)
+        selection = objects.Selection(
+            limits=objects.SchedulerLimits(numa_topology=numa_limits))
+        numa_topology = objects.InstanceNUMATopology(cells=[
+            objects.InstanceNUMACell(id=1, cpuset=set([0]), memory=512),
+            objects.InstanceNUMACell(id=0, cpuset=set([1]), memory=512)])
+
+        self.driver._set_numa_host_cells(selection, numa_topology)
+
+        self.assertEqual([1, 0], selection.limits.numa_topology.host_cells)
+        # The limits shared with the host state are left untouched.
+        self.assertNotIn('host_cells', numa_limits)
+
+    def test_set_numa_host_cells_no_numa(self):
+        selection = objects.Selection(
+            limits=objects.SchedulerLimits(numa_topology=None))
+        self.driver._set_numa_host_cells(
+            selection, objects.InstanceNUMATopology(cells=[]))
+        self.assertIsNone(selection.limits.numa_topology)
+
+    @mock.patch.object(filter_scheduler.FilterScheduler,
+                       '_set_numa_host_cells')
+    def test_get_alternate_hosts_sets_numa_host_cells(self, mock_set):
+        host_states = [
+            host_manager.HostState('host%s' % i, 'node%s' % i, uuids.cell)
+            for i in range(2)]
+        for host_state in host_states:
+            host_state.uuid = getattr(uuids, host_state.host)
+            host_state.limits = {}
+
+        selections = self.driver._get_alternate_hosts(
+            host_states, mock.sentinel.spec_obj, host_states, 0, 0,
+            numa_topologies=[mock.sentinel.numa0, mock.sentinel.numa1])
+
+        mock_set.assert_has_calls([
+            mock.call(selections[0][0], mock.sentinel.numa0),
+            mock.call(selections[1][0], mock.sentinel.numa1)])
+
     @mock.patch('nova.compute.utils.notify_about_scheduler_action')
     @mock.patch.object(filter_scheduler.FilterScheduler, '_schedule')
     def test_select_destinations_notifications(self, mock_schedule,
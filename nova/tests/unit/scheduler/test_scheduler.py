@@ -335,6 +335,16 @@ class SchedulerManagerTestCase(test.NoDBTestCase):
                                                           cell_mapping=cm2)]
         self.manager._discover_hosts_in_cells(mock.sentinel.context)
 
+    @mock.patch('nova.quota.reconcile_usage_counters')
+    def test_reconcile_quota_usage_counters(self, mock_reconcile):
+        self.manager._reconcile_quota_usage_counters(mock.sentinel.context)
+        mock_reconcile.assert_not_called()
+
+        self.flags(usage_counters=True, usage_counter_reconcile_batch_size=10,
+                   group='quota')
+        self.manager._reconcile_quota_usage_counters(mock.sentinel.context)
+        mock_reconcile.assert_called_once_with(mock.sentinel.context, 10)
+
 
 class SchedulerTestCase(test.NoDBTestCase):
     """Test case for base scheduler driver class."""
@@ -18,6 +18,7 @@ import sys
 
 import fixtures
 from jsonschema import exceptions as jsonschema_exc
+import mock
 import six
 
 from nova.api.openstack import api_version_request as api_version
@@ -269,6 +270,18 @@ class MicroversionsSchemaTestCase(APIValidationTestCase):
         self.check_validation_error(post, body={'foo': 'bar'},
                                     expected_detail=detail, req=req)
 
+    @mock.patch.object(validators, '_SchemaValidator',
+                       wraps=validators._SchemaValidator)
+    def test_validators_reused(self, mock_validator):
+        req = FakeRequest()
+        for i in range(3):
+            self.post(body={'foo': 1}, req=req)
+        req.legacy_v2 = True
+        for i in range(3):
+            self.post(body={'foo': 'bar'}, req=req)
+        # One validator was built for each schema.
+        self.assertEqual(2, mock_validator.call_count)
+
 
 class QueryParamsSchemaTestCase(test.NoDBTestCase):
 
@@ -291,3 +291,49 @@ class AvailabilityZoneTestCases(test.TestCase):
 
         result = az.get_instance_availability_zone(self.context, fake_inst)
         self.assertIsNone(result)
+
+    def test_get_instance_availability_zones(self):
+        az.reset_cache()
+        service1 = self._create_service_with_topic('compute', 'host1')
+        self._add_to_aggregate(service1, self.agg)
+        self._create_service_with_topic('compute', 'host2')
+        insts = [
+            objects.Instance(uuid=uuidsentinel.inst1, host='host1',
+                             availability_zone=self.availability_zone),
+            objects.Instance(uuid=uuidsentinel.inst2, host='host1',
+                             availability_zone=None),
+            objects.Instance(uuid=uuidsentinel.inst3, host='host2',
+                             availability_zone=None),
+            objects.Instance(uuid=uuidsentinel.inst4, host=None,
+                             availability_zone='inst-az')]
+
+        with mock.patch.object(
+                objects.AggregateList, 'get_by_metadata_key',
+                wraps=objects.AggregateList.get_by_metadata_key) as mock_get:
+            result = az.get_instance_availability_zones(self.context, insts)
+            # The hosts are looked up with a single query.
+            mock_get.assert_called_once_with(
+                mock.ANY, 'availability_zone', hosts=set(['host1', 'host2']))
+
+            expected = {uuidsentinel.inst1: self.availability_zone,
+                        uuidsentinel.inst2: self.availability_zone,
+                        uuidsentinel.inst3: self.default_az,
+                        uuidsentinel.inst4: 'inst-az'}
+            self.assertEqual(expected, result)
+
+            # The availability zones of the hosts are cached now.
+            mock_get.reset_mock()
+            result = az.get_instance_availability_zones(self.context, insts)
+            mock_get.assert_not_called()
+            self.assertEqual(expected, result)
+
+    @mock.patch.object(az._get_cache(), 'get_multi')
+    def test_get_instance_availability_zones_cache_differs(self, get_multi):
+        service = self._create_service_with_topic('compute', 'host1')
+        self._add_to_aggregate(service, self.agg)
+        get_multi.return_value = [self.default_az]
+        inst = objects.Instance(uuid=uuidsentinel.inst1, host='host1',
+                                availability_zone=self.availability_zone)
+        self.assertEqual(
+            {uuidsentinel.inst1: self.availability_zone},
+            az.get_instance_availability_zones(self.context, [inst]))
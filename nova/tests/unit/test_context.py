@@ -12,10 +12,15 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
+import eventlet
+import fixtures
 import mock
 from oslo_context import context as o_context
 from oslo_context import fixture as o_fixture
 from oslo_utils.fixture import uuidsentinel as uuids
+import sqlalchemy
 
 from nova import context
 from nova import exception
@@ -324,7 +329,8 @@ class ContextTestCase(test.NoDBTestCase):
         with context.target_cell(ctxt, mapping) as cctxt:
             self.assertEqual(mock.sentinel.db_conn_obj, cctxt.db_connection)
             self.assertEqual(mock.sentinel.mq_conn_obj, cctxt.mq_connection)
-        mock_create_cm.assert_called_once_with('fake://db')
+        mock_create_cm.assert_called_once_with(
+            'fake://db', on_engine_create=mock.ANY)
         mock_create_tport.assert_called_once_with('fake://mq')
         # Second call should use cached objects.
         mock_create_cm.reset_mock()
@@ -504,3 +510,343 @@ class ContextTestCase(test.NoDBTestCase):
             ctxt, [mapping0], context.CELL_TIMEOUT,
             objects.InstanceList.get_by_filters, filters,
             sort_dir='foo')
+
+
+class CellCircuitBreakerTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CellCircuitBreakerTestCase, self).setUp()
+        self.breaker = context.CellCircuitBreaker()
+
+    def test_disabled(self):
+        for i in range(10):
+            self.breaker.record_timeout(uuids.cell)
+        self.assertFalse(self.breaker.is_tripped(uuids.cell))
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_trip_and_retry(self, mock_now):
+        self.flags(cell_timeout_failure_threshold=2,
+                   cell_timeout_retry_interval=30, group='api')
+        mock_now.return_value = 100
+        self.breaker.record_timeout(uuids.cell)
+        self.assertFalse(self.breaker.is_tripped(uuids.cell))
+        self.breaker.record_timeout(uuids.cell)
+        self.assertTrue(self.breaker.is_tripped(uuids.cell))
+        self.assertFalse(self.breaker.is_tripped(uuids.other))
+
+        # A single call is let through once the interval is over.
+        mock_now.return_value = 131
+        self.assertFalse(self.breaker.is_tripped(uuids.cell))
+        self.assertTrue(self.breaker.is_tripped(uuids.cell))
+
+        # It timed out again.
+        self.breaker.record_timeout(uuids.cell)
+        mock_now.return_value = 160
+        self.assertTrue(self.breaker.is_tripped(uuids.cell))
+
+        # It responded.
+        mock_now.return_value = 161
+        self.assertFalse(self.breaker.is_tripped(uuids.cell))
+        self.breaker.record_response(uuids.cell)
+        self.assertFalse(self.breaker.is_tripped(uuids.cell))
+        self.breaker.record_timeout(uuids.cell)
+        self.assertFalse(self.breaker.is_tripped(uuids.cell))
+
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_scatter_gather_cells_skips_tripped_cell(self, mock_get_inst):
+        self.useFixture(nova_fixtures.SpawnIsSynchronousFixture())
+        self.flags(cell_timeout_failure_threshold=1, group='api')
+        ctxt = context.get_context()
+        mapping0 = objects.CellMapping(database_connection='fake://db0',
+                                       transport_url='none:///',
+                                       uuid=uuids.cell0)
+        mapping1 = objects.CellMapping(database_connection='fake://db1',
+                                       transport_url='fake://mq1',
+                                       uuid=uuids.cell1)
+        mock_get_inst.return_value = mock.sentinel.instances
+        context.CELL_BREAKER.record_timeout(uuids.cell1)
+
+        results = context.scatter_gather_cells(
+            ctxt, [mapping0, mapping1], 30,
+            objects.InstanceList.get_by_filters)
+        self.assertEqual({uuids.cell0: mock.sentinel.instances,
+                          uuids.cell1: context.did_not_respond_sentinel},
+                         results)
+        mock_get_inst.assert_called_once_with(mock.ANY)
+
+
+class CellConnectionRegistryTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(CellConnectionRegistryTestCase, self).setUp()
+        self.registry = context.CellConnectionRegistry()
+        self.mock_create_cm = self.useFixture(fixtures.MockPatch(
+            'nova.db.api.create_context_manager')).mock
+        self.mock_create_tport = self.useFixture(fixtures.MockPatch(
+            'nova.rpc.create_transport')).mock
+        self.mapping = objects.CellMapping(
+            database_connection='fake://db', transport_url='fake://mq',
+            uuid=uuids.cell, name='cell1',
+            updated_at=datetime.datetime(2019, 1, 1))
+        self.mock_spawn_after = self.useFixture(fixtures.MockPatch(
+            'eventlet.spawn_after')).mock
+
+    def _updated_mapping(self, database_connection, updated_at):
+        return objects.CellMapping(
+            database_connection=database_connection,
+            transport_url='fake://mq', uuid=uuids.cell, name='cell1',
+            updated_at=updated_at)
+
+    def test_get_cached(self):
+        cell = self.registry.get(self.mapping)
+        self.assertIs(self.mock_create_cm.return_value, cell.db_connection)
+        self.assertIs(self.mock_create_tport.return_value,
+                      cell.mq_connection)
+        self.assertIs(cell, self.registry.get(self.mapping))
+        self.mock_create_cm.assert_called_once_with(
+            'fake://db', on_engine_create=cell._watch_engine)
+        self.mock_create_tport.assert_called_once_with('fake://mq')
+
+    def test_get_no_transport(self):
+        self.mapping.transport_url = 'none:///'
+        self.assertIsNone(self.registry.get(self.mapping).mq_connection)
+        self.mock_create_tport.assert_not_called()
+
+    def test_get_updated_mapping(self):
+        cell = self.registry.get(self.mapping)
+        updated = self._updated_mapping('fake://db2',
+                                        datetime.datetime(2019, 1, 2))
+        new_cell = self.registry.get(updated)
+        self.assertIsNot(cell, new_cell)
+        self.mock_create_cm.assert_called_with(
+            'fake://db2', on_engine_create=new_cell._watch_engine)
+        # The transport may still be used by in-flight requests.
+        cell.mq_connection.cleanup.assert_not_called()
+        self.mock_spawn_after.assert_called_once_with(
+            1800, context._cleanup_transport, self.mapping.identity,
+            cell.mq_connection)
+        # A mapping loaded before the update does not bring the old
+        # connections back.
+        self.assertIs(new_cell, self.registry.get(self.mapping))
+
+    def test_evicted_transport_cleaned_up(self):
+        self.useFixture(fixtures.MockPatch(
+            'eventlet.spawn_after', new=eventlet.greenthread.spawn_after))
+        self.flags(long_rpc_timeout=0)
+        cell = self.registry.get(self.mapping)
+        self.registry.evict(uuids.cell)
+        cell.mq_connection.cleanup.assert_not_called()
+        eventlet.sleep(0.01)
+        cell.mq_connection.cleanup.assert_called_once_with()
+
+    def test_cleanup_transport_error(self):
+        transport = mock.Mock()
+        transport.cleanup.side_effect = test.TestingException
+        with mock.patch.object(context.LOG, 'exception') as mock_log:
+            context._cleanup_transport('cell1', transport)
+        mock_log.assert_called_once_with(mock.ANY, 'cell1')
+
+    def test_get_stale_mapping(self):
+        cell = self.registry.get(self.mapping)
+        stale = self._updated_mapping('fake://old',
+                                      datetime.datetime(2018, 1, 1))
+        self.assertIs(cell, self.registry.get(stale))
+        self.mock_create_cm.assert_called_once_with(
+            'fake://db', on_engine_create=mock.ANY)
+
+    def test_prune(self):
+        cell = self.registry.get(self.mapping)
+        engine = mock.Mock()
+        cell._watch_engine(engine)
+        mapping2 = objects.CellMapping(
+            database_connection='fake://db2', transport_url='none:///',
+            uuid=uuids.cell2, name='cell2')
+        cell2 = self.registry.get(mapping2)
+
+        self.registry.prune([mapping2])
+        self.assertEqual([uuids.cell2], list(self.registry.get_stats()))
+        engine.dispose.assert_called_once_with()
+        self.mock_spawn_after.assert_called_once_with(
+            1800, context._cleanup_transport, self.mapping.identity,
+            cell.mq_connection)
+        self.assertIs(cell2, self.registry.get(mapping2))
+
+        updated = objects.CellMapping(
+            database_connection='fake://db3', transport_url='none:///',
+            uuid=uuids.cell2, name='cell2',
+            updated_at=datetime.datetime(2019, 1, 2))
+        self.registry.prune([updated])
+        self.assertEqual({}, self.registry.get_stats())
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_dispose_idle(self, mock_now):
+        self.flags(idle_timeout=60, group='cell_database')
+        mock_now.return_value = 100
+        cell = self.registry.get(self.mapping)
+        engine = mock.Mock()
+        cell._watch_engine(engine)
+        mapping2 = objects.CellMapping(
+            database_connection='fake://db2', transport_url='none:///',
+            uuid=uuids.cell2, name='cell2')
+
+        # The pools are only checked every idle_timeout seconds.
+        mock_now.return_value = 150
+        self.registry.get(mapping2)
+        engine.dispose.assert_not_called()
+        mock_now.return_value = 170
+        self.registry.get(mapping2)
+        engine.dispose.assert_called_once_with()
+        self.assertEqual(1, self.registry.get_stats()[uuids.cell]['disposals'])
+
+        # An idle cell is only disposed once, until it is used again.
+        engine.reset_mock()
+        mock_now.return_value = 300
+        self.registry.get(mapping2)
+        engine.dispose.assert_not_called()
+        self.assertIs(cell, self.registry.get(self.mapping))
+        mock_now.return_value = 400
+        self.registry.get(mapping2)
+        engine.dispose.assert_called_once_with()
+
+    def test_get_stats(self):
+        cell = self.registry.get(self.mapping)
+        engine = sqlalchemy.create_engine(
+            'sqlite://', poolclass=sqlalchemy.pool.QueuePool, pool_size=1,
+            max_overflow=1)
+        self.addCleanup(engine.dispose)
+        cell._watch_engine(engine)
+
+        conn1 = engine.connect()
+        conn2 = engine.connect()
+        stats = self.registry.get_stats()[uuids.cell]
+        self.assertEqual(2, stats['connects'])
+        self.assertEqual(2, stats['checkouts'])
+        self.assertEqual(1, stats['overflow_checkouts'])
+        self.assertEqual(1, stats['exhausted'])
+        self.assertEqual(2, stats['checked_out'])
+        self.assertEqual(0, stats['pooled'])
+
+        conn2.close()
+        conn1.invalidate(exception=ValueError('gone away'))
+        conn1.close()
+        stats = self.registry.get_stats()[uuids.cell]
+        self.assertEqual(1, stats['invalidations'])
+        self.assertEqual('gone away', stats['last_error'])
+        self.assertEqual(0, stats['checked_out'])
+
+        # The listeners are kept when the engine is disposed.
+        cell.dispose()
+        engine.connect().close()
+        stats = self.registry.get_stats()[uuids.cell]
+        self.assertEqual(3, stats['connects'])
+        self.assertEqual(3, stats['checkouts'])
+        self.assertEqual(1, stats['pooled'])
+
+
+class SharedReadTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(SharedReadTestCase, self).setUp()
+        self.ctxt = context.RequestContext('fake-user', 'fake-project')
+        self.ctxt.cell_uuid = uuids.cell
+        self.calls = []
+
+    def _read(self, ctxt, *args, **kwargs):
+        self.calls.append((args, kwargs))
+        eventlet.sleep(0.01)
+        return {'args': list(args)}
+
+    def _call_concurrently(self, calls):
+        threads = [eventlet.spawn(fn, ctxt, *args) for fn, ctxt, args in calls]
+        return [thread.wait() for thread in threads]
+
+    def test_shares_calls_in_progress(self):
+        read = context.shared_read(self._read)
+        results = self._call_concurrently([(read, self.ctxt, ('foo',)),
+                                           (read, self.ctxt, ('foo',))])
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual([{'args': ['foo']}] * 2, results)
+        # Each caller gets its own copy.
+        self.assertIsNot(results[0], results[1])
+
+    def test_waiters_not_affected_by_owner_changes(self):
+        read = context.shared_read(self._read)
+
+        def read_and_change(ctxt, *args):
+            result = read(ctxt, *args)
+            # The owner changes its result before the waiter is scheduled.
+            result['args'].append('changed')
+            return result
+
+        results = self._call_concurrently([
+            (read_and_change, self.ctxt, ('foo',)),
+            (read, self.ctxt, ('foo',))])
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual({'args': ['foo', 'changed']}, results[0])
+        self.assertEqual({'args': ['foo']}, results[1])
+
+    def test_different_calls_not_shared(self):
+        read = context.shared_read(self._read)
+        other_ctxt = context.RequestContext('other-user', 'fake-project')
+        other_ctxt.cell_uuid = uuids.cell
+        other_cell_ctxt = context.RequestContext('fake-user', 'fake-project')
+        other_cell_ctxt.cell_uuid = uuids.other_cell
+        self._call_concurrently([(read, self.ctxt, ('foo',)),
+                                 (read, self.ctxt, ('bar',)),
+                                 (read, other_ctxt, ('foo',)),
+                                 (read, other_cell_ctxt, ('foo',))])
+        self.assertEqual(4, len(self.calls))
+
+    def test_unhashable_args_not_shared(self):
+        class Unhashable(object):
+            __hash__ = None
+
+        read = context.shared_read(self._read)
+        arg = Unhashable()
+        self._call_concurrently([(read, self.ctxt, (arg,)),
+                                 (read, self.ctxt, (arg,))])
+        self.assertEqual(2, len(self.calls))
+
+    def test_exception_shared(self):
+        def fail(ctxt):
+            self.calls.append(ctxt)
+            eventlet.sleep(0.01)
+            raise exception.NotFound()
+
+        read = context.shared_read(fail)
+        threads = [eventlet.spawn(read, self.ctxt) for i in range(2)]
+        for thread in threads:
+            self.assertRaises(exception.NotFound, thread.wait)
+        self.assertEqual(1, len(self.calls))
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_cache_time(self, mock_now):
+        mock_now.return_value = 100
+        read = context.shared_read(self._read, cache_time=10)
+        self.assertEqual({'args': ['foo']}, read(self.ctxt, 'foo'))
+        mock_now.return_value = 109
+        self.assertEqual({'args': ['foo']}, read(self.ctxt, 'foo'))
+        self.assertEqual(1, len(self.calls))
+        mock_now.return_value = 110
+        self.assertEqual({'args': ['foo']}, read(self.ctxt, 'foo'))
+        self.assertEqual(2, len(self.calls))
+
+    def test_no_cache_time(self):
+        read = context.shared_read(self._read)
+        read(self.ctxt, 'foo')
+        read(self.ctxt, 'foo')
+        self.assertEqual(2, len(self.calls))
+
+    def test_object_result_context(self):
+        def get_list(ctxt):
+            eventlet.sleep(0.01)
+            return objects.InstanceList(ctxt, objects=[
+                objects.Instance(ctxt, uuid=uuids.instance)])
+
+        read = context.shared_read(get_list)
+        other_ctxt = context.RequestContext('fake-user', 'fake-project')
+        other_ctxt.cell_uuid = uuids.cell
+        results = self._call_concurrently([(read, self.ctxt, ()),
+                                           (read, other_ctxt, ())])
+        self.assertIs(self.ctxt, results[0]._context)
+        self.assertIs(self.ctxt, results[0][0]._context)
+        self.assertIs(other_ctxt, results[1]._context)
+        self.assertIs(other_ctxt, results[1][0]._context)
+        self.assertEqual(uuids.instance, results[1][0].uuid)
@@ -14,6 +14,7 @@
 #    under the License.
 
 import datetime
+import os
 import sys
 import warnings
 
@@ -34,6 +35,7 @@ from nova.db import migration
 from nova.db.sqlalchemy import migration as sqla_migration
 from nova import exception
 from nova import objects
+from nova.scheduler.client import report
 from nova import test
 from nova.tests import fixtures as nova_fixtures
 from nova.tests.unit.db import fakes as db_fakes
@@ -399,7 +401,8 @@ class DBCommandsTestCase(test.NoDBTestCase):
     def _test_archive_deleted_rows(self, mock_get_all, mock_db_archive,
                                    verbose=False):
         result = self.commands.archive_deleted_rows(20, verbose=verbose)
-        mock_db_archive.assert_called_once_with(20)
+        mock_db_archive.assert_called_once_with(
+            20, context=mock.ANY, workers=1, throttle=0, timings=mock.ANY)
         output = self.output.getvalue()
         if verbose:
             expected = '''\
@@ -450,9 +453,9 @@ Archiving.....complete
             expected = ''
 
         self.assertEqual(expected, self.output.getvalue())
-        mock_db_archive.assert_has_calls([mock.call(20),
-                                          mock.call(20),
-                                          mock.call(20)])
+        archive_call = mock.call(20, context=mock.ANY, workers=1,
+                                 throttle=0, timings=mock.ANY)
+        mock_db_archive.assert_has_calls([archive_call] * 3)
 
     def test_archive_deleted_rows_until_complete_quiet(self):
         self.test_archive_deleted_rows_until_complete(verbose=False)
@@ -488,11 +491,12 @@ Rows were archived, running purge...
             expected = ''
 
         self.assertEqual(expected, self.output.getvalue())
-        mock_db_archive.assert_has_calls([mock.call(20),
-                                          mock.call(20),
-                                          mock.call(20)])
+        archive_call = mock.call(20, context=mock.ANY, workers=1,
+                                 throttle=0, timings=mock.ANY)
+        mock_db_archive.assert_has_calls([archive_call] * 3)
         mock_db_purge.assert_called_once_with(mock.ANY, None,
-                                              status_fn=mock.ANY)
+                                              status_fn=mock.ANY,
+                                              max_rows=None, throttle=0)
 
     def test_archive_deleted_rows_until_stopped_quiet(self):
         self.test_archive_deleted_rows_until_stopped(verbose=False)
@@ -503,7 +507,8 @@ Rows were archived, running purge...
                                                      mock_db_archive):
         result = self.commands.archive_deleted_rows(20, verbose=True,
                                                     purge=True)
-        mock_db_archive.assert_called_once_with(20)
+        mock_db_archive.assert_called_once_with(
+            20, context=mock.ANY, workers=1, throttle=0, timings=mock.ANY)
         output = self.output.getvalue()
         # If nothing was archived, there should be no purge messages
         self.assertIn('Nothing was archived.', output)
@@ -541,7 +546,8 @@ Rows were archived, running purge...
         result = self.commands.archive_deleted_rows(20, verbose=verbose)
 
         self.assertEqual(1, result)
-        mock_db_archive.assert_called_once_with(20)
+        mock_db_archive.assert_called_once_with(
+            20, context=mock.ANY, workers=1, throttle=0, timings=mock.ANY)
         self.assertEqual(1, mock_reqspec_destroy.call_count)
         mock_members_destroy.assert_called_once()
 
@@ -577,12 +583,93 @@ is set and run this command again.
         self.assertEqual(expected, output)
         self.assertEqual(3, result)
 
+    def test_archive_deleted_rows_invalid_workers(self):
+        self.assertEqual(2, self.commands.archive_deleted_rows(workers=0))
+
+    def test_archive_deleted_rows_invalid_sleep(self):
+        self.assertEqual(2, self.commands.archive_deleted_rows(sleep=-1))
+
+    @mock.patch.object(db, 'archive_deleted_rows')
+    @mock.patch.object(objects.CellMappingList, 'get_all')
+    def test_archive_deleted_rows_rates(self, mock_get_all, mock_db_archive):
+        def fake_archive(max_rows, timings=None, **kwargs):
+            timings.update({'instances': 2.0, 'consoles': 0.5,
+                            'instance_faults': 1.0})
+            return dict(instances=10, consoles=5), []
+        mock_db_archive.side_effect = fake_archive
+
+        result = self.commands.archive_deleted_rows(20, verbose=True,
+                                                    workers=4, sleep=0.1)
+
+        self.assertEqual(1, result)
+        mock_db_archive.assert_called_once_with(
+            20, context=mock.ANY, workers=4, throttle=0.1, timings=mock.ANY)
+        expected = """\
++-----------+-------------------------+
+| Table     | Number of Rows Archived |
++-----------+-------------------------+
+| consoles  | 5                       |
+| instances | 10                      |
++-----------+-------------------------+
++-----------+--------------------------+
+| Table     | Rows Archived Per Second |
++-----------+--------------------------+
+| consoles  | 10                       |
+| instances | 5                        |
++-----------+--------------------------+
+"""
+        self.assertEqual(expected, self.output.getvalue())
+
+    @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables',
+                return_value=1)
+    @mock.patch.object(db, 'archive_deleted_rows')
+    @mock.patch.object(objects.CellMappingList, 'get_all')
+    def test_archive_deleted_rows_all_cells(self, mock_get_all,
+                                            mock_db_archive, mock_purge):
+        cell1 = objects.CellMapping(uuid=uuidsentinel.cell1, name='cell1',
+                                    database_connection='foo1',
+                                    transport_url='bar1')
+        cell2 = objects.CellMapping(uuid=uuidsentinel.cell2, name='cell2',
+                                    database_connection='foo2',
+                                    transport_url='bar2')
+        mock_get_all.return_value = [cell1, cell2]
+        archived = {'foo1': dict(instances=10, consoles=5),
+                    'foo2': dict(instances=2)}
+
+        def fake_archive(max_rows, context=None, **kwargs):
+            return archived[context.db_connection], []
+        mock_db_archive.side_effect = fake_archive
+        self.useFixture(fixtures.MockPatch(
+            'nova.context.set_target_cell',
+            side_effect=lambda ctxt, cell: setattr(
+                ctxt, 'db_connection', cell.database_connection)))
+
+        result = self.commands.archive_deleted_rows(20, verbose=True,
+                                                    purge=True,
+                                                    all_cells=True)
+
+        self.assertEqual(1, result)
+        self.assertEqual(2, mock_db_archive.call_count)
+        expected = """\
++-----------------+-------------------------+
+| Table           | Number of Rows Archived |
++-----------------+-------------------------+
+| cell1.consoles  | 5                       |
+| cell1.instances | 10                      |
+| cell2.instances | 2                       |
++-----------------+-------------------------+
+Rows were archived, running purge...
+"""
+        self.assertEqual(expected, self.output.getvalue())
+        self.assertEqual(2, mock_purge.call_count)
+
     @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
     def test_purge_all(self, mock_purge):
         mock_purge.return_value = 1
         ret = self.commands.purge(purge_all=True)
         self.assertEqual(0, ret)
-        mock_purge.assert_called_once_with(mock.ANY, None, status_fn=mock.ANY)
+        mock_purge.assert_called_once_with(mock.ANY, None, status_fn=mock.ANY,
+                                           max_rows=None, throttle=0)
 
     @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
     def test_purge_date(self, mock_purge):
@@ -591,7 +678,22 @@ is set and run this command again.
         self.assertEqual(0, ret)
         mock_purge.assert_called_once_with(mock.ANY,
                                            datetime.datetime(2015, 10, 21),
-                                           status_fn=mock.ANY)
+                                           status_fn=mock.ANY,
+                                           max_rows=None, throttle=0)
+
+    @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
+    def test_purge_in_batches(self, mock_purge):
+        mock_purge.return_value = 1
+        ret = self.commands.purge(purge_all=True, max_rows=100, sleep=0.5)
+        self.assertEqual(0, ret)
+        mock_purge.assert_called_once_with(mock.ANY, None, status_fn=mock.ANY,
+                                           max_rows=100, throttle=0.5)
+
+    @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
+    def test_purge_invalid_batches(self, mock_purge):
+        self.assertEqual(1, self.commands.purge(purge_all=True, max_rows=0))
+        self.assertEqual(1, self.commands.purge(purge_all=True, sleep=-1))
+        self.assertFalse(mock_purge.called)
 
     @mock.patch('nova.db.sqlalchemy.api.purge_shadow_tables')
     def test_purge_date_fail(self, mock_purge):
@@ -858,6 +960,129 @@ Running batches of 50 until complete
             self.assertEqual(1,
                              self.commands.online_data_migrations(max_count=5))
 
+    def _fake_all_cells_command(self, cell_remaining, api_remaining):
+        cell1 = objects.CellMapping(uuid=uuidsentinel.cell1, name='cell1',
+                                    database_connection='foo1',
+                                    transport_url='bar1')
+        cell2 = objects.CellMapping(uuid=uuidsentinel.cell2, name='cell2',
+                                    database_connection='foo2',
+                                    transport_url='bar2')
+        self.useFixture(fixtures.MockPatch(
+            'nova.objects.CellMappingList.get_all',
+            return_value=[cell1, cell2]))
+        self.useFixture(fixtures.MockPatch(
+            'nova.context.set_target_cell',
+            side_effect=lambda ctxt, cell: setattr(
+                ctxt, 'db_connection', cell.database_connection)))
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', StringIO()))
+        calls = []
+
+        def cell_migration(context, count):
+            self.assertIn(context.db_connection, cell_remaining)
+            calls.append(('cell_migration', context.db_connection, count))
+            done = min(count, cell_remaining[context.db_connection])
+            cell_remaining[context.db_connection] -= done
+            return done, done
+
+        def api_migration(context, count):
+            self.assertIsNone(context.db_connection)
+            calls.append(('api_migration', None, count))
+            done = min(count, api_remaining[0])
+            api_remaining[0] -= done
+            return done, done
+
+        class _CommandSub(manage.DbCommands):
+            online_migrations = (cell_migration, api_migration)
+            api_db_online_migrations = (api_migration,)
+
+        return _CommandSub(), calls
+
+    def test_online_migrations_all_cells(self):
+        cell_remaining = {'foo1': 120, 'foo2': 30}
+        api_remaining = [10]
+        command, calls = self._fake_all_cells_command(cell_remaining,
+                                                      api_remaining)
+
+        self.assertEqual(0, command.online_data_migrations(all_cells=True))
+
+        self.assertEqual({'foo1': 0, 'foo2': 0}, cell_remaining)
+        self.assertEqual([0], api_remaining)
+        # The API migration only ran against the API database, and the cell
+        # migration only against the cell databases.
+        self.assertEqual(
+            {('api_migration', None), ('cell_migration', 'foo1'),
+             ('cell_migration', 'foo2')},
+            set(call[:2] for call in calls))
+        output = sys.stdout.getvalue()
+        self.assertIn('cell1: 50 rows matched query cell_migration, '
+                      '50 migrated', output)
+        self.assertIn('cell2: 30 rows matched query cell_migration, '
+                      '30 migrated', output)
+        self.assertIn('API: 10 rows matched query api_migration, '
+                      '10 migrated', output)
+        self.assertIn(
+            '| cell_migration |  cell1   |     120      |    120    |', output)
+
+    def test_online_migrations_all_cells_max_count_and_resume(self):
+        state_file = os.path.join(self.useFixture(fixtures.TempDir()).path,
+                                  'state.json')
+        cell_remaining = {'foo1': 120, 'foo2': 30}
+        api_remaining = [10]
+        command, calls = self._fake_all_cells_command(cell_remaining,
+                                                      api_remaining)
+
+        self.assertEqual(1, command.online_data_migrations(
+            max_count=40, all_cells=True, state_file=state_file))
+
+        self.assertEqual({'foo1': 80, 'foo2': 0}, cell_remaining)
+        with open(state_file) as f:
+            state = jsonutils.loads(f.read())
+        self.assertTrue(state['API']['api_migration']['complete'])
+        self.assertTrue(state['cell2']['cell_migration']['complete'])
+        self.assertFalse(state['cell1']['cell_migration']['complete'])
+        self.assertEqual(40, state['cell1']['cell_migration']['done'])
+
+        # The second run only runs what was not complete.
+        del calls[:]
+        self.assertEqual(0, command.online_data_migrations(
+            all_cells=True, state_file=state_file))
+        self.assertEqual({('cell_migration', 'foo1')},
+                         set(call[:2] for call in calls))
+        self.assertEqual({'foo1': 0, 'foo2': 0}, cell_remaining)
+        # Once everything is complete the state is dropped, so the next run
+        # checks every migration again.
+        self.assertFalse(os.path.exists(state_file))
+        del calls[:]
+        self.assertEqual(0, command.online_data_migrations(
+            all_cells=True, state_file=state_file))
+        self.assertEqual(
+            {('api_migration', None), ('cell_migration', 'foo1'),
+             ('cell_migration', 'foo2')},
+            set(call[:2] for call in calls))
+
+    def test_online_migrations_all_cells_error(self):
+        command, calls = self._fake_all_cells_command({'foo1': 0, 'foo2': 0},
+                                                      [0])
+        bad_migration = mock.MagicMock(side_effect=test.TestingException,
+                                       __name__='bad')
+        command.online_migrations += (bad_migration,)
+
+        self.assertEqual(2, command.online_data_migrations(all_cells=True))
+        self.assertEqual(2, bad_migration.call_count)
+
+    def test_online_migrations_bad_workers(self):
+        self.assertEqual(127, self.commands.online_data_migrations(
+            all_cells=True, workers=0))
+
+    def test_migration_batch_size(self):
+        batch_size = manage._MigrationBatchSize()
+        batch_size.record(50, 0.1)
+        self.assertEqual(100, batch_size.size)
+        batch_size.record(10, 0.1)
+        self.assertEqual(100, batch_size.size)
+        batch_size.record(100, 10)
+        self.assertEqual(50, batch_size.size)
+
 
 class ApiDbCommandsTestCase(test.NoDBTestCase):
     def setUp(self):
@@ -2796,6 +3021,191 @@ class TestNovaManagePlacement(test.NoDBTestCase):
             '/allocations/%s' % uuidsentinel.instance, expected_put_data,
             version='1.28')
 
+    @ddt.data(-1, 0)
+    def test_heal_allocations_invalid_workers(self, workers):
+        self.assertEqual(127, self.cli.heal_allocations(workers=workers))
+        self.assertIn('Must supply a positive integer for --workers',
+                      self.output.getvalue())
+
+    def _get_bulk_instances(self):
+        return objects.InstanceList(objects=[
+            objects.Instance(
+                uuid=uuid, host='fake', node='fake', task_state=None,
+                flavor=objects.Flavor(), project_id='fake-project',
+                user_id='fake-user')
+            for uuid in (uuidsentinel.instance1, uuidsentinel.instance2)])
+
+    @mock.patch('nova.objects.CellMappingList.get_all',
+                new=mock.Mock(return_value=objects.CellMappingList(objects=[
+                    objects.CellMapping(name='cell1',
+                                        uuid=uuidsentinel.cell1)])))
+    @mock.patch('nova.objects.ComputeNodeList.get_all',
+                new=mock.Mock(return_value=objects.ComputeNodeList(objects=[
+                    objects.ComputeNode(uuid=uuidsentinel.node,
+                                        hypervisor_hostname='fake')])))
+    @mock.patch('nova.objects.ComputeNode.get_by_host_and_nodename',
+                new_callable=mock.NonCallableMock)
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocations_for_resource_provider',
+                return_value=report.ProviderAllocInfo(
+                    allocations={uuidsentinel.instance1: {}}))
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocs_for_consumer',
+                return_value={'allocations': {uuidsentinel.node: {}},
+                              'project_id': 'fake-project',
+                              'user_id': 'fake-user'})
+    @mock.patch('nova.scheduler.utils.resources_from_flavor',
+                return_value=mock.sentinel.resources)
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.post',
+                return_value=fake_requests.FakeResponse(204))
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'put_allocations', new_callable=mock.NonCallableMock)
+    def test_heal_allocations_workers(
+            self, mock_put_allocations, mock_post, mock_res_from_flavor,
+            mock_get_allocs, mock_get_provider_allocs, mock_get_instances,
+            mock_get_compute_node):
+        """Tests that with --workers the allocations are retrieved per
+        provider and only the missing ones are created, in bulk.
+        """
+        mock_get_instances.side_effect = [self._get_bulk_instances(),
+                                          objects.InstanceList()]
+        self.assertEqual(0, self.cli.heal_allocations(workers=2))
+        mock_get_provider_allocs.assert_called_once_with(
+            test.MatchType(context.RequestContext), uuidsentinel.node)
+        # Only the instance with allocations is checked for its consumer
+        # project/user.
+        mock_get_allocs.assert_called_once_with(
+            test.MatchType(context.RequestContext), uuidsentinel.instance1)
+        mock_post.assert_called_once_with(
+            '/allocations',
+            {uuidsentinel.instance2: {
+                'allocations': {
+                    uuidsentinel.node: {'resources': mock.sentinel.resources}},
+                'project_id': 'fake-project',
+                'user_id': 'fake-user',
+                'consumer_generation': None}},
+            version='1.28', global_request_id=mock.ANY)
+
+    @mock.patch('nova.objects.CellMappingList.get_all',
+                new=mock.Mock(return_value=objects.CellMappingList(objects=[
+                    objects.CellMapping(name='cell1',
+                                        uuid=uuidsentinel.cell1)])))
+    @mock.patch('nova.objects.ComputeNodeList.get_all',
+                new=mock.Mock(return_value=objects.ComputeNodeList(objects=[
+                    objects.ComputeNode(uuid=uuidsentinel.node,
+                                        hypervisor_hostname='fake')])))
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocations_for_resource_provider',
+                new=mock.Mock(return_value=report.ProviderAllocInfo(
+                    allocations={})))
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocs_for_consumer', return_value={})
+    @mock.patch('nova.scheduler.utils.resources_from_flavor',
+                new=mock.Mock(return_value=mock.sentinel.resources))
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.post',
+                return_value=fake_requests.FakeResponse(
+                    409, content='consumer generation conflict'))
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'put_allocations', return_value=True)
+    def test_heal_allocations_workers_bulk_create_fails(
+            self, mock_put_allocations, mock_post, mock_get_allocs,
+            mock_get_instances):
+        """Tests that the instances are healed one at a time when the bulk
+        creation of their allocations fails.
+        """
+        mock_get_instances.side_effect = [self._get_bulk_instances(),
+                                          objects.InstanceList()]
+        self.assertEqual(0, self.cli.heal_allocations(workers=2,
+                                                      verbose=True))
+        output = self.output.getvalue()
+        self.assertIn('Failed to create allocations in bulk', output)
+        self.assertIn('Processed 2 instances.', output)
+        mock_post.assert_called_once()
+        self.assertEqual(2, mock_get_allocs.call_count)
+        self.assertEqual(2, mock_put_allocations.call_count)
+
+    @mock.patch('nova.objects.CellMappingList.get_all',
+                new=mock.Mock(return_value=objects.CellMappingList(objects=[
+                    objects.CellMapping(name='cell1',
+                                        uuid=uuidsentinel.cell1)])))
+    @mock.patch('nova.objects.ComputeNodeList.get_all',
+                new=mock.Mock(return_value=objects.ComputeNodeList(objects=[
+                    objects.ComputeNode(uuid=uuidsentinel.node,
+                                        hypervisor_hostname='fake')])))
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocations_for_resource_provider',
+                new=mock.Mock(side_effect=(
+                    exception.ResourceProviderAllocationRetrievalFailed(
+                        rp_uuid=uuidsentinel.node, error='ERROR'))))
+    def test_heal_allocations_workers_provider_allocs_fail(
+            self, mock_get_instances):
+        mock_get_instances.return_value = self._get_bulk_instances()
+        self.assertEqual(3, self.cli.heal_allocations(workers=2))
+        self.assertIn('Failed to retrieve allocations for resource provider',
+                      self.output.getvalue())
+
+    @mock.patch('nova.objects.CellMappingList.get_all',
+                new=mock.Mock(return_value=objects.CellMappingList(objects=[
+                    objects.CellMapping(name='cell1',
+                                        uuid=uuidsentinel.cell1)])))
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    @mock.patch('nova.scheduler.client.report.SchedulerReportClient.'
+                'get_allocs_for_consumer',
+                new=mock.Mock(return_value={
+                    'allocations': {uuidsentinel.node: {}},
+                    'project_id': 'fake-project',
+                    'user_id': 'fake-user'}))
+    def test_heal_allocations_marker_file(self, mock_get_instances):
+        """Tests that the last instance processed in each cell is recorded
+        in the marker file, that the next run resumes after it and that the
+        marker is removed once the cell has been processed entirely.
+        """
+        marker_file = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'markers.json')
+        # The first run is interrupted after its first page.
+        mock_get_instances.side_effect = [self._get_bulk_instances(),
+                                          test.TestingException]
+        self.assertRaises(test.TestingException, self.cli.heal_allocations,
+                          marker_file=marker_file)
+        with open(marker_file) as f:
+            self.assertEqual({uuidsentinel.cell1: uuidsentinel.instance2},
+                             jsonutils.loads(f.read()))
+        self.assertEqual(uuidsentinel.instance2,
+                         mock_get_instances.call_args[1]['marker'])
+
+        mock_get_instances.reset_mock()
+        mock_get_instances.side_effect = [objects.InstanceList()]
+        self.assertEqual(4, self.cli.heal_allocations(
+            marker_file=marker_file))
+        mock_get_instances.assert_called_once_with(
+            test.MatchType(context.RequestContext), filters={'deleted': False},
+            sort_key='created_at', sort_dir='asc', limit=50,
+            marker=uuidsentinel.instance2, expected_attrs=['flavor'])
+        self.assertFalse(os.path.exists(marker_file))
+
+    @mock.patch('nova.objects.CellMappingList.get_all',
+                new=mock.Mock(return_value=objects.CellMappingList(objects=[
+                    objects.CellMapping(name='cell1',
+                                        uuid=uuidsentinel.cell1)])))
+    @mock.patch('nova.objects.InstanceList.get_by_filters')
+    def test_heal_allocations_marker_not_found(self, mock_get_instances):
+        marker_file = os.path.join(
+            self.useFixture(fixtures.TempDir()).path, 'markers.json')
+        with open(marker_file, 'w') as f:
+            f.write(jsonutils.dumps(
+                {uuidsentinel.cell1: uuidsentinel.deleted}))
+        mock_get_instances.side_effect = [
+            exception.MarkerNotFound(marker=uuidsentinel.deleted),
+            objects.InstanceList()]
+        self.assertEqual(4, self.cli.heal_allocations(
+            marker_file=marker_file, verbose=True))
+        self.assertIn('starting from the first instance',
+                      self.output.getvalue())
+        self.assertNotIn('marker', mock_get_instances.call_args[1])
+
     @mock.patch('nova.compute.api.AggregateAPI.get_aggregate_list',
                 return_value=objects.AggregateList(objects=[
                     objects.Aggregate(name='foo', hosts=['host1'])]))
@@ -2971,6 +3381,106 @@ class TestNovaManagePlacement(test.NoDBTestCase):
                       self.output.getvalue())
 
 
+class RpcCommandsTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(RpcCommandsTestCase, self).setUp()
+        self.output = StringIO()
+        self.useFixture(fixtures.MonkeyPatch('sys.stdout', self.output))
+        self.commands = manage.RpcCommands()
+        self.stats_dir = self.useFixture(fixtures.TempDir()).path
+
+    @staticmethod
+    def _method_stats(count, duration, payload_bytes, calls=0, casts=0):
+        return {
+            'count': count, 'calls': calls, 'casts': casts, 'failures': 0,
+            'payload_bytes': payload_bytes,
+            'max_payload_bytes': payload_bytes // count,
+            'serialization_time': 0.001 * count, 'duration': duration,
+            'max_duration': duration / count, 'queue_latency': 0.0,
+            'max_queue_latency': 0.0, 'queue_samples': 0,
+        }
+
+    def _write_stats(self, name, client=None, server=None):
+        with open(os.path.join(self.stats_dir, name), 'w') as f:
+            f.write(jsonutils.dumps({'binary': name, 'client': client or {},
+                                     'server': server or {}}))
+
+    def _write_all_stats(self):
+        self._write_stats('nova-conductor-1.json', server={
+            'conductor.object_action': self._method_stats(2, 0.2, 2000),
+            'conductor.object_class_action_versions': self._method_stats(
+                1, 1.0, 100000)})
+        self._write_stats('nova-conductor-2.json', server={
+            'conductor.object_action': self._method_stats(2, 0.2, 4000)})
+        self._write_stats('nova-compute-1.json', client={
+            'conductor.object_action': self._method_stats(4, 0.5, 8000,
+                                                          calls=4)})
+
+    def test_stats(self):
+        self._write_all_stats()
+        self.flags(rpc_stats_dir=self.stats_dir)
+
+        self.assertEqual(0, self.commands.stats(sort_by='count'))
+
+        output = self.output.getvalue()
+        self.assertIn('RPC statistics of 3 processes', output)
+        lines = [line for line in output.splitlines()
+                 if 'conductor.' in line]
+        self.assertEqual(3, len(lines))
+        # Both conductors are merged, and the methods are sorted by count.
+        self.assertEqual(
+            ['client', 'conductor.object_action', '4', '4', '0', '0',
+             '2000.0', '2000', '1.0', '125.0', '125.0', '-'],
+            [field.strip() for field in lines[0].split('|')[1:-1]])
+        self.assertEqual(
+            ['server', 'conductor.object_action', '4', '0', '0', '0',
+             '1500.0', '2000', '1.0', '100.0', '100.0', '-'],
+            [field.strip() for field in lines[1].split('|')[1:-1]])
+        self.assertIn('conductor.object_class_action_versions', lines[2])
+
+    def test_stats_json(self):
+        self._write_all_stats()
+
+        self.assertEqual(0, self.commands.stats(
+            stats_dir=self.stats_dir, side='server', limit=1,
+            as_json=True))
+
+        stats = jsonutils.loads(self.output.getvalue())
+        self.assertEqual(1, len(stats))
+        self.assertEqual('server', stats[0]['side'])
+        self.assertEqual('conductor.object_class_action_versions',
+                         stats[0]['method'])
+        self.assertEqual(1.0, stats[0]['duration'])
+
+    def test_stats_ignores_invalid_files(self):
+        self._write_all_stats()
+        with open(os.path.join(self.stats_dir, 'broken.json'), 'w') as f:
+            f.write('{')
+
+        self.assertEqual(0, self.commands.stats(stats_dir=self.stats_dir))
+
+        output = self.output.getvalue()
+        self.assertIn('Ignoring broken.json', output)
+        self.assertIn('RPC statistics of 3 processes', output)
+
+    def test_stats_no_dir(self):
+        self.assertEqual(1, self.commands.stats())
+        self.assertIn('[DEFAULT]/rpc_stats_dir is not set',
+                      self.output.getvalue())
+
+    def test_stats_missing_dir(self):
+        self.assertEqual(1, self.commands.stats(
+            stats_dir=os.path.join(self.stats_dir, 'missing')))
+        self.assertIn('Unable to list', self.output.getvalue())
+
+    def test_stats_empty(self):
+        self._write_stats('nova-api-1.json')
+
+        self.assertEqual(1, self.commands.stats(stats_dir=self.stats_dir))
+        self.assertIn('No RPC statistics were found',
+                      self.output.getvalue())
+
+
 class TestNovaManageMain(test.NoDBTestCase):
     """Tests the nova-manage:main() setup code."""
 
@@ -18,6 +18,7 @@
 import os.path
 import subprocess
 
+import fixtures
 import mock
 from oslo_policy import policy as oslo_policy
 from oslo_serialization import jsonutils
@@ -209,6 +210,104 @@ class PolicyTestCase(test.NoDBTestCase):
         self.assertFalse(using_old_action)
 
 
+class CachedPolicyFileTestCase(PolicyFileTestCase):
+    def setUp(self):
+        super(CachedPolicyFileTestCase, self).setUp()
+        self.flags(policy_cache_size=10, group='api')
+
+
+class CachedPolicyTestCase(PolicyTestCase):
+    """Runs the PolicyTestCase tests with the policy check cache enabled."""
+
+    def setUp(self):
+        super(CachedPolicyTestCase, self).setUp()
+        self.flags(policy_cache_size=3, group='api')
+        self.authorize = self.useFixture(fixtures.MockPatchObject(
+            policy._ENFORCER, 'authorize',
+            side_effect=policy._ENFORCER.authorize)).mock
+
+    def test_result_cached(self):
+        other_context = context.RequestContext('fake', 'another',
+                                               roles=['member'])
+        self.authorize.reset_mock()
+        target_mine = {'project_id': 'fake', 'uuid': 'one'}
+        action = "example:my_file"
+        for uuid in ('one', 'two'):
+            target = {'project_id': 'fake', 'uuid': uuid}
+            self.assertTrue(policy.authorize(self.context, action, target))
+        self.assertEqual(1, self.authorize.call_count)
+
+        self.assertFalse(policy.authorize(other_context, action, target_mine,
+                                          do_raise=False))
+        self.assertRaises(exception.PolicyNotAuthorized, policy.authorize,
+                          other_context, action, target_mine)
+        self.assertRaises(exception.PolicyNotAuthorized, policy.authorize,
+                          self.context, action, {'project_id': 'another'})
+        self.assertEqual(3, self.authorize.call_count)
+
+    def test_result_cached_by_rule(self):
+        self.assertTrue(policy.authorize(self.context, 'example:allowed',
+                                         self.target))
+        self.assertTrue(policy.authorize(self.context, 'example:allowed',
+                                         self.target))
+        self.assertEqual(1, self.authorize.call_count)
+
+        # Changing the rule drops the cached results.
+        policy.set_rules(oslo_policy.Rules.from_dict(
+            {'example:allowed': '!'}), overwrite=False)
+        self.assertFalse(policy.authorize(self.context, 'example:allowed',
+                                          self.target, do_raise=False))
+        self.assertEqual(2, self.authorize.call_count)
+
+    def test_result_cached_referenced_rule_changed(self):
+        policy.set_rules(oslo_policy.Rules.from_dict(
+            {'example:allowed': 'rule:true'}), overwrite=False)
+        self.assertTrue(policy.authorize(self.context, 'example:allowed',
+                                         self.target))
+        # The referenced rule is replaced without telling nova.policy.
+        policy._ENFORCER.rules['true'] = oslo_policy.Rules.from_dict(
+            {'true': '!'})['true']
+        self.assertFalse(policy.authorize(self.context, 'example:allowed',
+                                          self.target, do_raise=False))
+        self.assertEqual(2, self.authorize.call_count)
+
+    @mock.patch('oslo_utils.timeutils.now', return_value=1000)
+    def test_result_expires_and_evicts(self, mock_now):
+        for action in ('example:allowed', 'true', 'new_action'):
+            policy.authorize(self.context, action, self.target)
+        self.assertEqual(3, self.authorize.call_count)
+        policy.authorize(self.context, 'example:allowed', self.target)
+        self.assertEqual(3, self.authorize.call_count)
+
+        # The least recently used result is evicted.
+        policy.authorize(self.context, 'example:lowercase_admin',
+                         self.target, do_raise=False)
+        policy.authorize(self.context, 'true', self.target)
+        self.assertEqual(5, self.authorize.call_count)
+
+        mock_now.return_value = 1061
+        policy.authorize(self.context, 'example:allowed', self.target)
+        self.assertEqual(6, self.authorize.call_count)
+
+    @requests_mock.mock()
+    def test_http_check_not_cached(self, req_mock):
+        req_mock.post('http://www.example.com/', text='True')
+        policy.authorize(self.context, 'example:get_http', {})
+        policy.authorize(self.context, 'example:get_http', {})
+        self.assertEqual(2, self.authorize.call_count)
+        self.assertIsNone(policy._compile_rule('example:get_http')[1])
+
+    def test_compile_rule(self):
+        policy.set_rules(oslo_policy.Rules.from_dict(
+            {'example:rule': 'rule:example:my_file and '
+                             'not user_id:%(user_id)s'}), overwrite=False)
+        used_rules, keys = policy._compile_rule('example:rule')
+        self.assertEqual(['example:rule', 'example:my_file'],
+                         [name for name, rule in used_rules])
+        self.assertEqual(['project_id', 'user_id'], keys)
+        self.assertIs(used_rules, policy._compile_rule('example:rule')[0])
+
+
 class IsAdminCheckTestCase(test.NoDBTestCase):
     def setUp(self):
         super(IsAdminCheckTestCase, self).setUp()
@@ -15,11 +15,17 @@
 #    under the License.
 
 import mock
+from oslo_db import exception as db_exc
 from oslo_db.sqlalchemy import enginefacade
+from oslo_utils.fixture import uuidsentinel as uuids
+from oslo_utils import timeutils
 from six.moves import range
 
 from nova import compute
 from nova.compute import flavors
+from nova.compute import task_states
+from nova.compute import utils as compute_utils
+from nova.compute import vm_states
 import nova.conf
 from nova import context
 from nova.db import api as db
@@ -265,6 +271,284 @@ class QuotaIntegrationTestCase(test.TestCase):
                           self._create_with_injected_files, files)
 
 
+class UsageCountersTestCase(test.TestCase):
+
+    def setUp(self):
+        super(UsageCountersTestCase, self).setUp()
+        self.flags(usage_counters=True, group='quota')
+        self.context = context.RequestContext('fake-user', 'fake-project',
+                                              is_admin=True)
+
+    def _create_instance(self, user_id='fake-user', flavor_name='m1.small'):
+        cell1 = self.cell_mappings[test.CELL1_NAME]
+        with context.target_cell(self.context, cell1) as cctxt:
+            inst = objects.Instance(context=cctxt, user_id=user_id,
+                                    project_id='fake-project')
+            inst.flavor = flavors.get_flavor_by_name(flavor_name)
+            inst.vcpus = inst.flavor.vcpus
+            inst.memory_mb = inst.flavor.memory_mb
+            inst.create()
+        objects.InstanceMapping(
+            self.context, instance_uuid=inst.uuid,
+            project_id=inst.project_id, cell_mapping=cell1).create()
+        return inst
+
+    def test_apply_usage_deltas_untracked_project(self):
+        self.assertFalse(objects.Quotas.apply_usage_deltas(
+            self.context, 'fake-project', 'fake-user',
+            {'instances': 1, 'cores': 1, 'ram': 512}))
+        self.assertIsNone(objects.Quotas.get_usage_counts(
+            self.context, 'fake-project', user_id='fake-user'))
+
+    def test_apply_usage_deltas(self):
+        objects.Quotas.reconcile_usage_counts(
+            self.context, 'fake-project',
+            lambda: {'fake-user': {'instances': 1, 'cores': 2, 'ram': 512}})
+        self.assertTrue(objects.Quotas.apply_usage_deltas(
+            self.context, 'fake-project', 'fake-user',
+            {'instances': 1, 'cores': 1, 'ram': 256}))
+        # A user without a row yet gets one.
+        self.assertTrue(objects.Quotas.apply_usage_deltas(
+            self.context, 'fake-project', 'other-user',
+            {'instances': 1, 'cores': 4, 'ram': 1024}))
+        counts = objects.Quotas.get_usage_counts(
+            self.context, 'fake-project', user_id='fake-user')
+        self.assertEqual(
+            {'project': {'instances': 3, 'cores': 7, 'ram': 1792},
+             'user': {'instances': 2, 'cores': 3, 'ram': 768}}, counts)
+        counts = objects.Quotas.get_usage_counts(
+            self.context, 'fake-project', user_id='unknown-user')
+        self.assertEqual({'instances': 0, 'cores': 0, 'ram': 0},
+                         counts['user'])
+
+    def test_reconcile_empty_project_stays_tracked(self):
+        self.assertEqual({}, objects.Quotas.reconcile_usage_counts(
+            self.context, 'fake-project', dict))
+        self.assertEqual(
+            {'project': {'instances': 0, 'cores': 0, 'ram': 0}},
+            objects.Quotas.get_usage_counts(self.context, 'fake-project'))
+
+    def test_reconcile_incomplete_count(self):
+        # The placeholder row of an untracked project is removed again.
+        self.assertIsNone(objects.Quotas.reconcile_usage_counts(
+            self.context, 'fake-project', lambda: None))
+        self.assertIsNone(objects.Quotas.get_usage_counts(
+            self.context, 'fake-project'))
+
+        # The counters of a tracked project are left unchanged.
+        counts = {'fake-user': {'instances': 1, 'cores': 2, 'ram': 512}}
+        objects.Quotas.reconcile_usage_counts(self.context, 'fake-project',
+                                              lambda: counts)
+        self.assertIsNone(objects.Quotas.reconcile_usage_counts(
+            self.context, 'fake-project', lambda: None))
+        self.assertEqual(
+            {'project': counts['fake-user'], 'user': counts['fake-user']},
+            objects.Quotas.get_usage_counts(self.context, 'fake-project',
+                                            user_id='fake-user'))
+
+    @mock.patch('nova.objects.Quotas._replace_usage_counts_in_db',
+                side_effect=[db_exc.DBDuplicateEntry(), True])
+    def test_reconcile_retried_on_duplicate(self, mock_replace):
+        # Another request started tracking the project first.
+        count_usage = mock.Mock(return_value={})
+        self.assertEqual({}, objects.Quotas.reconcile_usage_counts(
+            self.context, 'fake-project', count_usage))
+        self.assertEqual(2, count_usage.call_count)
+        mock_replace.assert_has_calls(
+            [mock.call(self.context, 'fake-project', {}, {})] * 2)
+
+    def test_reconcile_retried_when_changed(self):
+        counts = {'fake-user': {'instances': 1, 'cores': 2, 'ram': 512}}
+        objects.Quotas.reconcile_usage_counts(self.context, 'fake-project',
+                                              lambda: counts)
+        recounts = [{'fake-user': {'instances': 5, 'cores': 5, 'ram': 5}},
+                    {'fake-user': {'instances': 2, 'cores': 3, 'ram': 768}}]
+
+        def count_usage():
+            # A delta is applied while the first count is running, and the
+            # counters are not locked meanwhile.
+            if len(recounts) == 2:
+                self.assertTrue(objects.Quotas.apply_usage_deltas(
+                    self.context, 'fake-project', 'fake-user',
+                    {'instances': 1, 'cores': 1, 'ram': 256}))
+            return recounts.pop(0)
+
+        self.assertEqual(
+            {'fake-user': {'instances': 2, 'cores': 3, 'ram': 768}},
+            objects.Quotas.reconcile_usage_counts(self.context,
+                                                  'fake-project',
+                                                  count_usage))
+        self.assertEqual(
+            {'instances': 2, 'cores': 3, 'ram': 768},
+            objects.Quotas.get_usage_counts(self.context, 'fake-project',
+                                            user_id='fake-user')['user'])
+
+    def test_reconcile_gives_up_when_always_changed(self):
+        counts = {'fake-user': {'instances': 1, 'cores': 2, 'ram': 512}}
+        objects.Quotas.reconcile_usage_counts(self.context, 'fake-project',
+                                              lambda: counts)
+
+        def count_usage():
+            objects.Quotas.apply_usage_deltas(
+                self.context, 'fake-project', 'fake-user',
+                {'instances': 1, 'cores': 1, 'ram': 256})
+            return {'fake-user': {'instances': 5, 'cores': 5, 'ram': 5}}
+
+        self.assertIsNone(objects.Quotas.reconcile_usage_counts(
+            self.context, 'fake-project', count_usage))
+        # The deltas are kept and the counts are not replaced.
+        attempts = objects.quotas.USAGE_COUNTER_RECONCILE_ATTEMPTS
+        self.assertEqual(
+            {'instances': 1 + attempts, 'cores': 2 + attempts,
+             'ram': 512 + 256 * attempts},
+            objects.Quotas.get_usage_counts(self.context, 'fake-project',
+                                            user_id='fake-user')['user'])
+
+    def test_instances_cores_ram_count_seeds_counters(self):
+        self._create_instance()
+        self._create_instance(user_id='other-user')
+        expected = {'project': {'instances': 2, 'cores': 2, 'ram': 4096},
+                    'user': {'instances': 1, 'cores': 1, 'ram': 2048}}
+        counts = quota._instances_cores_ram_count(
+            self.context, 'fake-project', user_id='fake-user')
+        self.assertEqual(expected, counts)
+        self.assertEqual(expected, objects.Quotas.get_usage_counts(
+            self.context, 'fake-project', user_id='fake-user'))
+
+        # Once seeded, the counters are read instead of the cells, so an
+        # instance created behind their back is only seen after the
+        # reconciliation.
+        self._create_instance()
+        with mock.patch.object(context,
+                               'scatter_gather_cells') as mock_sg:
+            counts = quota._instances_cores_ram_count(
+                self.context, 'fake-project', user_id='fake-user')
+            mock_sg.assert_not_called()
+        self.assertEqual(expected, counts)
+
+        self.assertEqual(1, quota.reconcile_usage_counters(self.context,
+                                                           10))
+        counts = quota._instances_cores_ram_count(
+            self.context, 'fake-project', user_id='fake-user')
+        self.assertEqual(
+            {'project': {'instances': 3, 'cores': 3, 'ram': 6144},
+             'user': {'instances': 2, 'cores': 2, 'ram': 4096}}, counts)
+
+    def _reconcile(self):
+        # Reconciling the counters of the project leaves them unchanged.
+        counts = objects.Quotas.get_usage_counts(
+            self.context, 'fake-project', user_id='fake-user')
+        self.assertEqual(1, quota.reconcile_usage_counters(self.context, 10))
+        self.assertEqual(counts, objects.Quotas.get_usage_counts(
+            self.context, 'fake-project', user_id='fake-user'))
+        return counts['user']
+
+    def _resize(self, inst, flavor_name):
+        new_flavor = flavors.get_flavor_by_name(flavor_name)
+        # The API starts the resize.
+        inst.task_state = task_states.RESIZE_PREP
+        inst.save()
+        compute_utils.record_resize_usage(self.context, inst, new_flavor)
+        # The destination compute service prepares and finishes it.
+        inst.new_flavor = new_flavor
+        inst.save()
+        self.assertEqual(self._usage(1, inst.flavor.name, flavor_name),
+                         self._reconcile())
+        inst.old_flavor = inst.flavor
+        inst.flavor = new_flavor
+        inst.vcpus = new_flavor.vcpus
+        inst.memory_mb = new_flavor.memory_mb
+        inst.vm_state = vm_states.RESIZED
+        inst.task_state = None
+        inst.save()
+
+    def _finish(self, inst, flavor):
+        inst.flavor = flavor
+        inst.vcpus = flavor.vcpus
+        inst.memory_mb = flavor.memory_mb
+        inst.old_flavor = None
+        inst.new_flavor = None
+        inst.vm_state = vm_states.ACTIVE
+        inst.save()
+
+    @staticmethod
+    def _usage(instances, *flavor_names):
+        resize_flavors = [flavors.get_flavor_by_name(name)
+                          for name in flavor_names]
+        return {'instances': instances,
+                'cores': max(f.vcpus for f in resize_flavors),
+                'ram': max(f.memory_mb for f in resize_flavors)}
+
+    def test_resize_reconcile_confirm_revert(self):
+        inst = self._create_instance()
+        inst.vm_state = vm_states.ACTIVE
+        inst.save()
+        quota._instances_cores_ram_count(self.context, 'fake-project')
+
+        # An upsize counts the new flavor as soon as it starts, and is
+        # recounted the same until it is confirmed.
+        self._resize(inst, 'm1.medium')
+        self.assertEqual(self._usage(1, 'm1.medium'), self._reconcile())
+        compute_utils.record_confirmed_resize_usage(self.context, inst)
+        self._finish(inst, inst.flavor)
+        self.assertEqual(self._usage(1, 'm1.medium'), self._reconcile())
+
+        # A downsize keeps counting the old flavor until it is reverted.
+        self._resize(inst, 'm1.small')
+        self.assertEqual(self._usage(1, 'm1.medium'), self._reconcile())
+        compute_utils.record_reverted_resize_usage(self.context, inst)
+        self._finish(inst, inst.old_flavor)
+        self.assertEqual(self._usage(1, 'm1.medium'), self._reconcile())
+
+        # The old and new flavors left behind by a failed resize do not
+        # count.
+        inst.new_flavor = flavors.get_flavor_by_name('m1.large')
+        inst.save()
+        self.assertEqual(self._usage(1, 'm1.medium'), self._reconcile())
+
+    @mock.patch('nova.context.scatter_gather_cells')
+    def test_seed_skipped_when_cell_fails(self, mock_sg):
+        mock_sg.return_value = {
+            uuids.cell1: {'fake-user': {'instances': 1, 'cores': 1,
+                                        'ram': 512}},
+            uuids.cell2: context.did_not_respond_sentinel}
+        counts = quota._instances_cores_ram_count(
+            self.context, 'fake-project', user_id='fake-user')
+        self.assertEqual(
+            {'project': {'instances': 1, 'cores': 1, 'ram': 512},
+             'user': {'instances': 1, 'cores': 1, 'ram': 512}}, counts)
+        # The partial count is returned but not stored.
+        self.assertIsNone(objects.Quotas.get_usage_counts(
+            self.context, 'fake-project'))
+        self.assertEqual(0, quota.reconcile_usage_counters(self.context,
+                                                           10))
+
+    def test_get_usage_counter_projects(self):
+        self.useFixture(test.TimeOverride())
+        for project_id in ('project-a', 'project-b', 'project-c'):
+            objects.Quotas.reconcile_usage_counts(self.context, project_id,
+                                                  dict)
+            timeutils.advance_time_seconds(60)
+        # Reconciling project-a again moves it to the back of the queue.
+        objects.Quotas.reconcile_usage_counts(self.context, 'project-a',
+                                              dict)
+        self.assertEqual(
+            ['project-b', 'project-c'],
+            objects.Quotas.get_usage_counter_projects(self.context, 2))
+
+    @mock.patch('nova.context.scatter_gather_cells')
+    def test_counters_disabled(self, mock_sg):
+        self.flags(usage_counters=False, group='quota')
+        objects.Quotas.reconcile_usage_counts(
+            self.context, 'fake-project',
+            lambda: {'fake-user': {'instances': 5, 'cores': 5, 'ram': 5}})
+        mock_sg.return_value = {}
+        counts = quota._instances_cores_ram_count(self.context,
+                                                  'fake-project')
+        self.assertEqual(
+            {'project': {'instances': 0, 'cores': 0, 'ram': 0}}, counts)
+        mock_sg.assert_called_once()
+
 @enginefacade.transaction_context_provider
 class FakeContext(context.RequestContext):
     def __init__(self, project_id, quota_class):
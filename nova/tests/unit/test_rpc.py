@@ -12,11 +12,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import copy
+import os
 
 import fixtures
 import mock
 import oslo_messaging as messaging
 from oslo_messaging.rpc import dispatcher
+from oslo_messaging.rpc import server as rpc_server
 from oslo_serialization import jsonutils
 import six
 
@@ -233,6 +235,51 @@ class TestRPC(test.NoDBTestCase):
                                          access_policy=access_policy)
         self.assertEqual('server', server)
 
+    @mock.patch.object(rpc, 'profiler', None)
+    @mock.patch.object(rpc, 'RequestContextSerializer')
+    @mock.patch.object(rpc, 'InstrumentedRPCClient')
+    def test_get_client_stats_enabled(self, mock_client, mock_ser):
+        self.flags(rpc_stats_dir='/tmp/rpc-stats')
+        rpc.TRANSPORT = mock.Mock()
+        tgt = mock.Mock()
+
+        client = rpc.get_client(tgt, version_cap='1.0', serializer='foo')
+
+        mock_ser.assert_called_once_with('foo')
+        mock_client.assert_called_once_with(rpc.TRANSPORT,
+                                            tgt, version_cap='1.0',
+                                            call_monitor_timeout=None,
+                                            serializer=mock.ANY)
+        ser = mock_client.call_args[1]['serializer']
+        self.assertIsInstance(ser, rpc.InstrumentedSerializer)
+        self.assertEqual(mock_ser.return_value, ser._base)
+        self.assertEqual(mock_client.return_value, client)
+
+    @mock.patch.object(rpc, 'profiler', None)
+    @mock.patch.object(rpc, 'RequestContextSerializer')
+    @mock.patch.object(rpc, 'InstrumentedRPCDispatcher')
+    @mock.patch.object(rpc_server, 'RPCServer')
+    @mock.patch.object(messaging, 'get_rpc_server')
+    def test_get_server_stats_enabled(self, mock_get, mock_server,
+                                      mock_dispatcher, mock_ser):
+        self.flags(rpc_stats_dir='/tmp/rpc-stats')
+        rpc.TRANSPORT = mock.Mock()
+        tgt = mock.Mock()
+        ends = mock.Mock()
+
+        server = rpc.get_server(tgt, ends, serializer='foo')
+
+        mock_ser.assert_called_once_with('foo')
+        mock_dispatcher.assert_called_once_with(
+            tgt.topic, ends, mock.ANY, dispatcher.DefaultRPCAccessPolicy)
+        ser = mock_dispatcher.call_args[0][2]
+        self.assertIsInstance(ser, rpc.InstrumentedSerializer)
+        self.assertEqual(mock_ser.return_value, ser._base)
+        mock_server.assert_called_once_with(
+            rpc.TRANSPORT, tgt, mock_dispatcher.return_value, 'eventlet')
+        self.assertFalse(mock_get.called)
+        self.assertEqual(mock_server.return_value, server)
+
     @mock.patch.object(rpc, 'profiler', mock.Mock())
     @mock.patch.object(rpc, 'ProfilerRequestContextSerializer')
     @mock.patch.object(messaging, 'RPCClient')
@@ -469,6 +516,195 @@ class TestProfilerRequestContextSerializer(test.NoDBTestCase):
             hmac_key='swordfish', base_id='baseid', parent_id='parentid')
 
 
+class TestRPCStats(test.NoDBTestCase):
+    def setUp(self):
+        super(TestRPCStats, self).setUp()
+        self.stats = rpc.RPCStats()
+        self.useFixture(fixtures.MonkeyPatch('nova.rpc.RPC_STATS',
+                                             self.stats))
+        self.ctxt = context.RequestContext('fake-user', 'fake-project')
+        self.ser = rpc.InstrumentedSerializer(
+            rpc.RequestContextSerializer(rpc.JsonPayloadSerializer()))
+
+    def _send(self, ctxt, method, **kwargs):
+        self.assertIsNotNone(self.stats.current)
+        self.message = {
+            'ctxt': self.ser.serialize_context(ctxt),
+            'args': {name: self.ser.serialize_entity(ctxt, value)
+                     for name, value in kwargs.items()}}
+        return 'reply'
+
+    def test_measure_client(self):
+        result = self.stats.measure('client', 'conductor', 'ping', 'call',
+                                    self._send, self.ctxt, 'ping',
+                                    arg='foo')
+
+        self.assertEqual('reply', result)
+        self.assertIsNone(self.stats.current)
+        self.assertIn(rpc._SENT_AT_KEY, self.message['ctxt'])
+        stats = self.stats.get_stats()
+        self.assertEqual({}, stats['server'])
+        method_stats = stats['client']['conductor.ping']
+        self.assertEqual(1, method_stats['count'])
+        self.assertEqual(1, method_stats['calls'])
+        self.assertEqual(0, method_stats['casts'])
+        self.assertEqual(0, method_stats['failures'])
+        self.assertGreater(method_stats['payload_bytes'],
+                           len(jsonutils.dumps('foo')))
+        self.assertEqual(method_stats['payload_bytes'],
+                         method_stats['max_payload_bytes'])
+        self.assertEqual(0, method_stats['queue_samples'])
+
+    def test_measure_server(self):
+        self.stats.measure('client', 'conductor', 'ping', 'cast',
+                           self._send, self.ctxt, 'ping', arg='foo')
+
+        def _handle(message):
+            ctxt = self.ser.deserialize_context(message['ctxt'])
+            self.assertEqual('foo', self.ser.deserialize_entity(
+                ctxt, message['args']['arg']))
+            return self.ser.serialize_entity(ctxt, 'reply')
+
+        self.stats.measure('server', 'conductor', 'ping', None, _handle,
+                           self.message)
+
+        self.assertNotIn(rpc._SENT_AT_KEY, self.message['ctxt'])
+        stats = self.stats.get_stats()
+        self.assertEqual(1, stats['client']['conductor.ping']['casts'])
+        method_stats = stats['server']['conductor.ping']
+        self.assertEqual(1, method_stats['count'])
+        self.assertEqual(0, method_stats['calls'])
+        self.assertEqual(0, method_stats['casts'])
+        self.assertEqual(len(jsonutils.dumps('reply')),
+                         method_stats['payload_bytes'])
+        self.assertEqual(1, method_stats['queue_samples'])
+        self.assertGreaterEqual(method_stats['queue_latency'], 0)
+
+    def test_measure_failure(self):
+        def _fail():
+            raise test.TestingException()
+
+        self.assertRaises(test.TestingException, self.stats.measure,
+                          'server', 'compute', 'reboot_instance', None, _fail)
+
+        method_stats = self.stats.get_stats()['server'][
+            'compute.reboot_instance']
+        self.assertEqual(1, method_stats['count'])
+        self.assertEqual(1, method_stats['failures'])
+
+    def test_measure_nested(self):
+        def _handle():
+            self.stats.measure('client', 'compute', 'ping', 'call',
+                               self._send, self.ctxt, 'ping')
+            # The outer measurement is restored, the reply is recorded
+            # against the server side.
+            self.ser.serialize_entity(self.ctxt, 'reply')
+
+        self.stats.measure('server', 'conductor', 'ping', None, _handle)
+
+        stats = self.stats.get_stats()
+        self.assertEqual(len(jsonutils.dumps('reply')),
+                         stats['server']['conductor.ping']['payload_bytes'])
+        self.assertEqual(1, stats['client']['compute.ping']['calls'])
+
+    def test_serializer_not_measuring(self):
+        ctxt = self.ser.serialize_context(self.ctxt)
+
+        self.assertNotIn(rpc._SENT_AT_KEY, ctxt)
+        self.assertEqual('foo', self.ser.serialize_entity(self.ctxt, 'foo'))
+        self.assertEqual({'client': {}, 'server': {}},
+                         self.stats.get_stats())
+
+    def test_dump(self):
+        stats_dir = self.useFixture(fixtures.TempDir()).path
+        self.flags(rpc_stats_dir=stats_dir, host='fake-host')
+        self.stats.measure('client', 'conductor', 'ping', 'call',
+                           self._send, self.ctxt, 'ping')
+
+        self.stats.dump()
+
+        names = os.listdir(stats_dir)
+        self.assertEqual(1, len(names))
+        self.assertTrue(names[0].endswith('-%d.json' % os.getpid()))
+        with open(os.path.join(stats_dir, names[0])) as f:
+            dumped = jsonutils.loads(f.read())
+        self.assertEqual('fake-host', dumped['host'])
+        self.assertEqual(os.getpid(), dumped['pid'])
+        self.assertEqual(self.stats.get_stats()['client'], dumped['client'])
+        self.assertEqual({}, dumped['server'])
+
+    def test_dump_disabled(self):
+        with mock.patch('nova.rpc.open', create=True) as mock_open:
+            self.stats.dump()
+        self.assertFalse(mock_open.called)
+
+    @mock.patch.object(rpc.LOG, 'warning')
+    def test_dump_failure(self, mock_warning):
+        self.flags(rpc_stats_dir='/nonexistent/rpc-stats')
+
+        self.stats.dump()
+
+        self.assertEqual(1, mock_warning.call_count)
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_record_dumps_after_interval(self, mock_now):
+        self.flags(rpc_stats_dir='/tmp/rpc-stats', rpc_stats_interval=60)
+        mock_now.return_value = 100
+        self.stats = rpc.RPCStats()
+        measurement = rpc._Measurement()
+
+        with mock.patch.object(self.stats, 'dump') as mock_dump:
+            mock_now.return_value = 159
+            self.stats.record('client', 'conductor.ping', 'call', 0.1,
+                              measurement, False)
+            self.assertFalse(mock_dump.called)
+            mock_now.return_value = 160
+            self.stats.record('client', 'conductor.ping', 'call', 0.1,
+                              measurement, False)
+            mock_dump.assert_called_once_with()
+
+
+class TestInstrumentedRPCClient(test.NoDBTestCase):
+    def setUp(self):
+        super(TestInstrumentedRPCClient, self).setUp()
+        self.stats = rpc.RPCStats()
+        self.useFixture(fixtures.MonkeyPatch('nova.rpc.RPC_STATS',
+                                             self.stats))
+        self.target = messaging.Target(topic='compute', version='5.0')
+        self.client = rpc.InstrumentedRPCClient(mock.Mock(), self.target)
+
+    @mock.patch('oslo_messaging.RPCClient.prepare')
+    def test_call_and_cast(self, mock_prepare):
+        cctxt = mock_prepare.return_value
+        cctxt.target = self.target
+        cctxt.call.return_value = 'reply'
+        cctxt.can_send_version.return_value = True
+
+        prepared = self.client.prepare(version='5.0')
+        self.assertTrue(prepared.can_send_version('5.0'))
+        self.assertEqual('reply', prepared.call('ctxt', 'ping', arg=1))
+        self.client.cast('ctxt', 'reboot_instance', arg=2)
+
+        cctxt.call.assert_called_once_with('ctxt', 'ping', arg=1)
+        cctxt.cast.assert_called_once_with('ctxt', 'reboot_instance', arg=2)
+        stats = self.stats.get_stats()['client']
+        self.assertEqual(1, stats['compute.ping']['calls'])
+        self.assertEqual(1, stats['compute.reboot_instance']['casts'])
+
+    @mock.patch.object(dispatcher.RPCDispatcher, 'dispatch',
+                       return_value='reply')
+    def test_dispatcher(self, mock_dispatch):
+        rpc_dispatcher = rpc.InstrumentedRPCDispatcher(
+            'compute', [], None, dispatcher.DefaultRPCAccessPolicy)
+        incoming = mock.Mock(message={'method': 'ping'})
+
+        self.assertEqual('reply', rpc_dispatcher.dispatch(incoming))
+
+        mock_dispatch.assert_called_once_with(incoming)
+        stats = self.stats.get_stats()['server']
+        self.assertEqual(1, stats['compute.ping']['count'])
+
+
 class TestClientRouter(test.NoDBTestCase):
     @mock.patch('oslo_messaging.RPCClient')
     def test_by_instance(self, mock_rpcclient):
@@ -490,6 +726,23 @@ class TestClientRouter(test.NoDBTestCase):
         # verify cell client was returned
         self.assertEqual(cell_client, client)
 
+    @mock.patch.object(rpc, 'InstrumentedRPCClient')
+    def test_by_instance_stats_enabled(self, mock_rpcclient):
+        self.flags(rpc_stats_dir='/tmp/rpc-stats')
+        default_client = mock.Mock()
+        ctxt = mock.Mock()
+        ctxt.mq_connection = mock.sentinel.transport
+
+        router = rpc.ClientRouter(default_client)
+        client = router.client(ctxt)
+
+        mock_rpcclient.assert_called_once_with(
+                mock.sentinel.transport, default_client.target,
+                version_cap=default_client.version_cap,
+                call_monitor_timeout=default_client.call_monitor_timeout,
+                serializer=default_client.serializer)
+        self.assertEqual(mock_rpcclient.return_value, client)
+
     @mock.patch('oslo_messaging.RPCClient')
     def test_by_instance_untargeted(self, mock_rpcclient):
         default_client = mock.Mock()
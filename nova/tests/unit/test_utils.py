@@ -1263,14 +1263,72 @@ class GetKSAAdapterTestCase(test.NoDBTestCase):
         self.assertEqual(self.load_adap.return_value, ret)
         # Had to load the auth
         self.load_auth.assert_called_once_with(utils.CONF, 'cinder')
-        # Had to load the session, passed in the loaded auth
+        # Had to load the shared session, without the auth
         self.load_sess.assert_called_once_with(utils.CONF, 'cinder',
-                                               auth=self.auth)
+                                               session=mock.ANY)
         # load_adapter* called with the loaded auth & session
         self.load_adap.assert_called_once_with(
             utils.CONF, 'cinder', session=self.sess, auth=self.auth,
             min_version=None, max_version=None, raise_exc=False)
 
+    def test_session_shared(self):
+        utils.get_ksa_adapter('volumev3', ksa_auth='auth1')
+        utils.get_ksa_adapter('volumev3', ksa_auth='auth2')
+        utils.get_ksa_adapter('placement')
+
+        # One session is loaded per conf group, the auth being set on each
+        # adapter.
+        self.assertEqual(
+            [mock.call(utils.CONF, 'cinder', session=mock.ANY),
+             mock.call(utils.CONF, 'placement', session=mock.ANY)],
+            self.load_sess.call_args_list)
+        self.load_adap.assert_has_calls([
+            mock.call(utils.CONF, 'cinder', session=self.sess, auth='auth1',
+                      min_version=None, max_version=None, raise_exc=False),
+            mock.call(utils.CONF, 'cinder', session=self.sess, auth='auth2',
+                      min_version=None, max_version=None, raise_exc=False)])
+        self.assertEqual(self.sess, utils.get_ksa_session('cinder'))
+        self.assertEqual(2, self.load_sess.call_count)
+
+
+class GetKSASessionTestCase(test.NoDBTestCase):
+    def setUp(self):
+        super(GetKSASessionTestCase, self).setUp()
+        self.flags(http_connection_pool_size=4,
+                   http_connection_pool_block=True)
+        self.flags(timeout=30, group='placement')
+
+    def test_get_ksa_session(self):
+        sess = utils.get_ksa_session('placement')
+
+        self.assertIsNone(sess.auth)
+        self.assertEqual(30, sess.timeout)
+        adapter = sess.session.get_adapter('https://placement')
+        self.assertIsInstance(adapter, ks_session.TCPKeepAliveAdapter)
+        self.assertIs(adapter, sess.session.get_adapter('http://placement'))
+        self.assertEqual(4, adapter._pool_maxsize)
+        self.assertTrue(adapter._pool_block)
+        self.assertIs(sess, utils.get_ksa_session('placement'))
+        self.assertIsNot(sess, utils.get_ksa_session('glance'))
+
+        utils.reset_ksa_sessions()
+        self.assertIsNot(sess, utils.get_ksa_session('placement'))
+
+    def test_get_ksa_session_stats(self):
+        self.assertEqual({}, utils.get_ksa_session_stats())
+        utils.get_ksa_adapter('placement')
+        utils.get_ksa_adapter('placement')
+        sess = utils.get_ksa_session('placement')
+        adapter = sess.session.get_adapter('http://placement')
+        pool = adapter.poolmanager.connection_from_url('http://placement')
+        pool.num_connections = 2
+        pool.num_requests = 10
+
+        self.assertEqual(
+            {'placement': {'adapters': 2, 'pools': 1, 'connections': 2,
+                           'requests': 10, 'idle_connections': 0}},
+            utils.get_ksa_session_stats())
+
 
 class GetEndpointTestCase(test.NoDBTestCase):
     def setUp(self):
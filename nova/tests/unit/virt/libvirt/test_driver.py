@@ -7272,6 +7272,27 @@ class LibvirtConnTestCase(test.NoDBTestCase,
         self.assertEqual(uuids[3], vm4.UUIDString())
         mock_list.assert_called_with(only_guests=True, only_running=False)
 
+    @mock.patch.object(host.Host, "list_guests")
+    def test_get_power_states(self, mock_list):
+        running = mock.Mock(uuid=uuids.running)
+        running.get_power_state.return_value = power_state.RUNNING
+        vanished = mock.Mock(uuid=uuids.vanished)
+        vanished.get_power_state.side_effect = exception.InstanceNotFound(
+            instance_id=uuids.vanished)
+        mock_list.return_value = [running, vanished]
+        instances = [objects.Instance(uuid=uuids.running),
+                     objects.Instance(uuid=uuids.vanished),
+                     objects.Instance(uuid=uuids.missing)]
+
+        drvr = libvirt_driver.LibvirtDriver(fake.FakeVirtAPI(), False)
+        states = drvr.get_power_states(instances)
+
+        self.assertEqual({uuids.running: power_state.RUNNING,
+                          uuids.vanished: power_state.NOSTATE,
+                          uuids.missing: power_state.NOSTATE}, states)
+        mock_list.assert_called_once_with(only_running=False)
+        running.get_power_state.assert_called_once_with(drvr._host)
+
     @mock.patch('nova.virt.libvirt.host.Host.get_online_cpus',
                 return_value=None)
     @mock.patch('nova.virt.libvirt.host.Host.get_cpu_count',
@@ -1911,6 +1911,29 @@ class VirtNUMAHostTopologyTestCase(test.NoDBTestCase):
                 self.host, self.instance2, self.limits)
         self.assertIsNone(fitted_instance)
 
+    def test_get_fitting_host_cells_hint(self):
+        self.limits.host_cells = [2]
+        with mock.patch.object(hw, '_numa_fit_instance_cell',
+                               wraps=hw._numa_fit_instance_cell) as mock_fit:
+            fitted_instance = hw.numa_fit_instance_to_host(
+                    self.host, self.instance3, self.limits)
+        self.assertEqual(2, fitted_instance.cells[0].id)
+        # Only the hinted host cell was tried.
+        self.assertEqual(1, mock_fit.call_count)
+
+    def test_get_fitting_host_cells_hint_diverged(self):
+        self.host.cells[1].cpu_usage = 4
+        self.limits.host_cells = [2]
+        fitted_instance = hw.numa_fit_instance_to_host(
+                self.host, self.instance3, self.limits)
+        self.assertEqual(1, fitted_instance.cells[0].id)
+
+    def test_get_fitting_host_cells_hint_unknown_cell(self):
+        self.limits.host_cells = [5]
+        fitted_instance = hw.numa_fit_instance_to_host(
+                self.host, self.instance3, self.limits)
+        self.assertEqual(1, fitted_instance.cells[0].id)
+
     def test_get_fitting_culmulative_fails_limits(self):
         fitted_instance1 = hw.numa_fit_instance_to_host(
                 self.host, self.instance1, self.limits)
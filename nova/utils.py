@@ -17,6 +17,7 @@
 
 """Utilities and helper functions."""
 
+import collections
 import contextlib
 import copy
 import datetime
@@ -28,11 +29,13 @@ import random
 import re
 import shutil
 import tempfile
+import threading
 import time
 
 import eventlet
 from keystoneauth1 import exceptions as ks_exc
 from keystoneauth1 import loading as ks_loading
+from keystoneauth1 import session as ks_session
 import netaddr
 import os_resource_classes as orc
 from os_service_types import service_types
@@ -47,6 +50,7 @@ from oslo_utils import importutils
 from oslo_utils import strutils
 from oslo_utils import timeutils
 from oslo_utils import units
+import requests
 import six
 from six.moves import range
 
@@ -1158,6 +1162,95 @@ def strtime(at):
     return at.strftime("%Y-%m-%dT%H:%M:%S.%f")
 
 
+# The keystoneauth1 Sessions shared by the clients of each conf group, see
+# get_ksa_session().
+_KSA_SESSIONS = {}
+_KSA_SESSIONS_LOCK = threading.Lock()
+_KSA_ADAPTER_COUNTS = collections.Counter()
+
+
+def get_ksa_session(confgrp):
+    """Returns the keystoneauth1 Session shared by the clients of a conf group.
+
+    The session is loaded from the session options of the conf group the first
+    time it is requested, without an auth plugin: the adapters and clients
+    using it pass their auth plugin, for example one built from the user token
+    of a request context, along with every request. Sharing the session lets
+    all of them reuse the same HTTP connections, and TLS sessions, rather than
+    opening new ones for every client.
+
+    The number of connections kept open to each host is bounded by
+    [DEFAULT]/http_connection_pool_size.
+
+    :param confgrp: The name of the conf group, e.g. 'glance' or 'placement'.
+    :return: A keystoneauth1 Session.
+    """
+    with _KSA_SESSIONS_LOCK:
+        sess = _KSA_SESSIONS.get(confgrp)
+        if sess is None:
+            adapter = ks_session.TCPKeepAliveAdapter(
+                pool_maxsize=CONF.http_connection_pool_size,
+                pool_block=CONF.http_connection_pool_block)
+            requests_session = requests.Session()
+            for scheme in list(requests_session.adapters):
+                requests_session.mount(scheme, adapter)
+            sess = ks_loading.load_session_from_conf_options(
+                CONF, confgrp, session=requests_session)
+            _KSA_SESSIONS[confgrp] = sess
+        return sess
+
+
+def get_ksa_session_stats():
+    """Returns statistics about the shared keystoneauth1 sessions.
+
+    The statistics are keyed by conf group. For each group they include the
+    number of adapters built on the shared session by get_ksa_adapter() and,
+    over the connection pools of the session (one per host), the number of
+    connections opened, the number of requests sent and the number of idle
+    connections. Connections being opened almost as often as requests are sent
+    shows that connections are not reused, for example because the pools are
+    too small for the concurrency of the service.
+    """
+    stats = {}
+    with _KSA_SESSIONS_LOCK:
+        sessions = list(_KSA_SESSIONS.items())
+    for confgrp, sess in sessions:
+        group_stats = {
+            'adapters': _KSA_ADAPTER_COUNTS[confgrp],
+            'pools': 0,
+            'connections': 0,
+            'requests': 0,
+            'idle_connections': 0,
+        }
+        # NOTE: The same HTTP adapter is mounted for http and https.
+        adapters = {id(adapter): adapter
+                    for adapter in sess.session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                group_stats['pools'] += 1
+                group_stats['connections'] += pool.num_connections
+                group_stats['requests'] += pool.num_requests
+                # NOTE: The queue of a pool is filled with None placeholders
+                # for the connections which have not been opened yet.
+                if pool.pool is not None:
+                    group_stats['idle_connections'] += sum(
+                        1 for conn in list(pool.pool.queue)
+                        if conn is not None)
+        stats[confgrp] = group_stats
+    return stats
+
+
+def reset_ksa_sessions():
+    """Drops the shared keystoneauth1 sessions. Used by the tests."""
+    with _KSA_SESSIONS_LOCK:
+        _KSA_SESSIONS.clear()
+        _KSA_ADAPTER_COUNTS.clear()
+
+
 def get_ksa_adapter(service_type, ksa_auth=None, ksa_session=None,
                     min_version=None, max_version=None):
     """Construct a keystoneauth1 Adapter for a given service type.
@@ -1177,8 +1270,9 @@ def get_ksa_adapter(service_type, ksa_auth=None, ksa_session=None,
     :param ksa_auth: A keystoneauth1 auth plugin. If not specified, we attempt
                      to find one in ksa_session.  Failing that, we attempt to
                      load one from the conf.
-    :param ksa_session: A keystoneauth1 Session.  If not specified, we attempt
-                        to load one from the conf.
+    :param ksa_session: A keystoneauth1 Session.  If not specified, the session
+                        shared by the clients of the conf group is used, see
+                        get_ksa_session().
     :param min_version: The minimum major version of the adapter's endpoint,
                         intended to be used as the lower bound of a range with
                         max_version.
@@ -1213,8 +1307,8 @@ def get_ksa_adapter(service_type, ksa_auth=None, ksa_session=None,
             ksa_auth = ks_loading.load_auth_from_conf_options(CONF, confgrp)
 
     if not ksa_session:
-        ksa_session = ks_loading.load_session_from_conf_options(
-            CONF, confgrp, auth=ksa_auth)
+        ksa_session = get_ksa_session(confgrp)
+        _KSA_ADAPTER_COUNTS[confgrp] += 1
 
     return ks_loading.load_adapter_from_conf_options(
         CONF, confgrp, session=ksa_session, auth=ksa_auth,
@@ -28,7 +28,9 @@ from oslo_log import log as logging
 from oslo_utils import importutils
 import six
 
+from nova.compute import power_state
 import nova.conf
+from nova import exception
 from nova.i18n import _
 from nova.virt import event as virtevent
 
@@ -196,6 +198,29 @@ class ComputeDriver(object):
         # TODO(Vek): Need to pass context in for access to auth_token
         raise NotImplementedError()
 
+    def get_power_states(self, instances):
+        """Get the current power state of several instances at once.
+
+        :param instances: list of nova.objects.instance.Instance objects
+        :returns: dict, keyed by instance uuid, of nova.compute.power_state
+                  values. Instances unknown to the hypervisor are reported
+                  as NOSTATE.
+
+        .. note::
+
+            This implementation works for all drivers, but it is
+            not particularly efficient. Maintainers of the virt drivers are
+            encouraged to override this method with something more
+            efficient.
+        """
+        states = {}
+        for instance in instances:
+            try:
+                states[instance.uuid] = self.get_info(instance).state
+            except exception.InstanceNotFound:
+                states[instance.uuid] = power_state.NOSTATE
+        return states
+
     def get_num_instances(self):
         """Return the total number of virtual machines.
 
@@ -1699,6 +1699,49 @@ def _numa_cells_support_network_metadata(
     return True
 
 
+def _numa_fit_instance_to_host_cells(
+        host_topology, host_cells, instance_topology, limits,
+        pci_requests, pci_stats, network_metadata):
+    """Fit the instance cells onto the given host cells, in order.
+
+    :returns: the list of fitted instance cells, or None
+    """
+    chosen_instance_cells = []
+    chosen_host_cells = []
+    for host_cell, instance_cell in zip(host_cells, instance_topology.cells):
+        try:
+            cpuset_reserved = 0
+            if (instance_topology.emulator_threads_isolated
+                and len(chosen_instance_cells) == 0):
+                # For the case of isolate emulator threads, to
+                # make predictable where that CPU overhead is
+                # located we always configure it to be on host
+                # NUMA node associated to the guest NUMA node
+                # 0.
+                cpuset_reserved = 1
+            got_cell = _numa_fit_instance_cell(
+                host_cell, instance_cell, limits, cpuset_reserved)
+        except exception.MemoryPageSizeNotSupported:
+            # This exception will been raised if instance cell's
+            # custom pagesize is not supported with host cell in
+            # _numa_cell_supports_pagesize_request function.
+            return
+        if got_cell is None:
+            return
+        chosen_host_cells.append(host_cell)
+        chosen_instance_cells.append(got_cell)
+
+    if pci_requests and pci_stats and not pci_stats.support_requests(
+            pci_requests, chosen_instance_cells):
+        return
+
+    if network_metadata and not _numa_cells_support_network_metadata(
+            host_topology, chosen_host_cells, network_metadata):
+        return
+
+    return chosen_instance_cells
+
+
 def numa_fit_instance_to_host(
         host_topology, instance_topology, limits=None,
         pci_requests=None, pci_stats=None):
@@ -1710,6 +1753,10 @@ def numa_fit_instance_to_host(
     with its cell ids set to host cell ids of the first successful
     permutation, or None.
 
+    If the limits carry the host cells the scheduler fitted the instance
+    onto, that permutation is tried first and the others are only tried if
+    it does not fit anymore.
+
     :param host_topology: objects.NUMATopology object to fit an
                           instance on
     :param instance_topology: objects.InstanceNUMATopology to be fitted
@@ -1742,6 +1789,24 @@ def numa_fit_instance_to_host(
 
     host_cells = host_topology.cells
 
+    if limits and 'host_cells' in limits:
+        cells_by_id = {cell.id: cell for cell in host_cells}
+        if (len(limits.host_cells) == len(instance_topology) and
+                all(cell_id in cells_by_id
+                    for cell_id in limits.host_cells)):
+            chosen_instance_cells = _numa_fit_instance_to_host_cells(
+                host_topology,
+                [cells_by_id[cell_id] for cell_id in limits.host_cells],
+                instance_topology, limits, pci_requests, pci_stats,
+                network_metadata)
+            if chosen_instance_cells:
+                return objects.InstanceNUMATopology(
+                    cells=chosen_instance_cells,
+                    emulator_threads_policy=emulator_threads_policy)
+        LOG.debug("The instance does not fit on the host NUMA cells "
+                  "%(cells)s anymore, trying all the host NUMA cells.",
+                  {'cells': limits.host_cells})
+
     # If PCI device(s) are not required, prefer host cells that don't have
     # devices attached. Presence of a given numa_node in a PCI pool is
     # indicative of a PCI device being associated with that node
@@ -1753,46 +1818,13 @@ def numa_fit_instance_to_host(
     # depending on whether we want packing/spreading over NUMA nodes
     for host_cell_perm in itertools.permutations(
             host_cells, len(instance_topology)):
-        chosen_instance_cells = []
-        chosen_host_cells = []
-        for host_cell, instance_cell in zip(
-                host_cell_perm, instance_topology.cells):
-            try:
-                cpuset_reserved = 0
-                if (instance_topology.emulator_threads_isolated
-                    and len(chosen_instance_cells) == 0):
-                    # For the case of isolate emulator threads, to
-                    # make predictable where that CPU overhead is
-                    # located we always configure it to be on host
-                    # NUMA node associated to the guest NUMA node
-                    # 0.
-                    cpuset_reserved = 1
-                got_cell = _numa_fit_instance_cell(
-                    host_cell, instance_cell, limits, cpuset_reserved)
-            except exception.MemoryPageSizeNotSupported:
-                # This exception will been raised if instance cell's
-                # custom pagesize is not supported with host cell in
-                # _numa_cell_supports_pagesize_request function.
-                break
-            if got_cell is None:
-                break
-            chosen_host_cells.append(host_cell)
-            chosen_instance_cells.append(got_cell)
-
-        if len(chosen_instance_cells) != len(host_cell_perm):
-            continue
-
-        if pci_requests and pci_stats and not pci_stats.support_requests(
-                pci_requests, chosen_instance_cells):
-            continue
-
-        if network_metadata and not _numa_cells_support_network_metadata(
-                host_topology, chosen_host_cells, network_metadata):
-            continue
-
-        return objects.InstanceNUMATopology(
-            cells=chosen_instance_cells,
-            emulator_threads_policy=emulator_threads_policy)
+        chosen_instance_cells = _numa_fit_instance_to_host_cells(
+            host_topology, host_cell_perm, instance_topology, limits,
+            pci_requests, pci_stats, network_metadata)
+        if chosen_instance_cells:
+            return objects.InstanceNUMATopology(
+                cells=chosen_instance_cells,
+                emulator_threads_policy=emulator_threads_policy)
 
 
 def numa_get_reserved_huge_pages():
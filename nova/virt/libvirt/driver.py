@@ -858,6 +858,23 @@ class LibvirtDriver(driver.ComputeDriver):
 
         return uuids
 
+    def get_power_states(self, instances):
+        """Efficient override of base get_power_states method."""
+        guests = {guest.uuid: guest
+                  for guest in self._host.list_guests(only_running=False)}
+        states = {}
+        for instance in instances:
+            states[instance.uuid] = power_state.NOSTATE
+            guest = guests.get(instance.uuid)
+            if guest is None:
+                continue
+            try:
+                states[instance.uuid] = guest.get_power_state(self._host)
+            except exception.InstanceNotFound:
+                # The domain went away since we listed it.
+                pass
+        return states
+
     def plug_vifs(self, instance, network_info):
         """Plug VIFs into networks."""
         for vif in network_info:
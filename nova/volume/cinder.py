@@ -43,6 +43,7 @@ from nova.i18n import _
 from nova.i18n import _LE
 from nova.i18n import _LW
 from nova import service_auth
+from nova import utils
 
 
 CONF = nova.conf.CONF
@@ -82,8 +83,7 @@ def _load_session():
     global _SESSION
 
     if not _SESSION:
-        _SESSION = ks_loading.load_session_from_conf_options(
-            CONF, nova.conf.cinder.cinder_group.name)
+        _SESSION = utils.get_ksa_session(nova.conf.cinder.cinder_group.name)
 
 
 def _get_auth(context):
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the per request costs of the API microversion handling.
+
+Reports, for the versioned methods of the keypairs, quota sets and
+hypervisors controllers, the time taken to resolve the method to call for every
+microversion supported by the API with the dispatch dict built by
+_build_version_dispatch and by comparing the version with the range of every
+version of the method, as done before. Then reports the time taken to get the
+JSON-Schema validator of the server create request body with the validator
+cache and by building a new validator, and to validate a request body with it.
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+from nova.api.openstack import api_version_request as api_version
+from nova.api.openstack.compute.schemas import servers as servers_schema
+from nova.api.openstack.compute import hypervisors
+from nova.api.openstack.compute import keypairs
+from nova.api.openstack.compute import quota_sets
+from nova.api.openstack import wsgi
+from nova.api import validation
+from nova.api.validation import validators
+
+
+def _versions():
+    min_version = api_version.min_api_version()
+    max_version = api_version.max_api_version()
+    return [api_version.APIVersionRequest('%d.%d' % (
+                min_version.ver_major, minor))
+            for minor in range(min_version.ver_minor,
+                               max_version.ver_minor + 1)]
+
+
+def _scan(func_list, ver):
+    for func in func_list:
+        if ver.matches(func.start_version, func.end_version):
+            return func
+
+
+def _time(fn, repeat, number):
+    # The time of a single call, in microseconds.
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) * 1e6 / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--number', type=int, default=100,
+                        help='Number of calls in each timing.')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Number of times each step is timed.')
+    args = parser.parse_args()
+
+    versions = _versions()
+    print('%-28s %8s %12s %12s' % ('Method', 'Versions', 'Dict (us)',
+                                   'Scan (us)'))
+    for controller in (keypairs.KeypairController,
+                       quota_sets.QuotaSetsController,
+                       hypervisors.HypervisorsController):
+        versioned_methods = getattr(controller, wsgi.VER_METHOD_ATTR)
+        dispatch = getattr(controller, wsgi.VER_DISPATCH_ATTR)
+        for name in sorted(versioned_methods):
+            func_list = versioned_methods[name]
+            by_version = dispatch[name]
+            for ver in versions:
+                assert (by_version.get((ver.ver_major, ver.ver_minor)) is
+                        _scan(func_list, ver))
+            print('%-28s %8d %12.2f %12.2f' % (
+                '%s.%s' % (controller.__name__, name),
+                len(func_list),
+                _time(lambda: [by_version.get((ver.ver_major, ver.ver_minor))
+                               for ver in versions],
+                      args.repeat, args.number) / len(versions),
+                _time(lambda: [_scan(func_list, ver) for ver in versions],
+                      args.repeat, args.number) / len(versions)))
+        print('%-28s %8s %12.2f' % (
+            'Building the dispatch', '',
+            _time(lambda: wsgi._build_version_dispatch(versioned_methods),
+                  args.repeat, 1)))
+    print()
+
+    schema = servers_schema.base_create_v267
+    body = {'server': {'name': 'server-1',
+                       'imageRef': 'cedef40a-ed67-4d10-800e-17455edce175',
+                       'flavorRef': '1',
+                       'networks': 'auto',
+                       'metadata': {'role': 'web'}}}
+    validator = validation._get_validator(schema, False, True)
+    validator.validate(body)
+    print('Cached validator lookup: %.2f us' % _time(
+        lambda: validation._get_validator(schema, False, True),
+        args.repeat, args.number))
+    print('Validator build:         %.2f us' % _time(
+        lambda: validators._SchemaValidator(schema, False, True),
+        args.repeat, args.number))
+    print('Request body validation: %.2f us' % _time(
+        lambda: validator.validate(body), args.repeat, args.number))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the JSON and compact encodings of objects sent over RPC.
+
+Builds an InstanceList like the one returned to a compute service by
+InstanceList.get_by_host, with flavors, info caches and metadata, and
+reports the size of the message and the time taken to encode its primitive
+into a message and to decode it with the default JSON encoding and with the
+compact encoding used when [conductor]/compact_objects is enabled.
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import timeit
+
+from oslo_serialization import jsonutils
+from oslo_utils import uuidutils
+
+from nova import context
+from nova.network import model as network_model
+from nova import objects
+from nova.objects import base
+
+
+def _network_info(index):
+    return network_model.NetworkInfo([network_model.VIF(
+        id=uuidutils.generate_uuid(),
+        address='fa:16:3e:%02x:%02x:%02x' % (
+            index >> 16 & 0xff, index >> 8 & 0xff, index & 0xff),
+        type=network_model.VIF_TYPE_OVS,
+        devname='tap%d' % index,
+        ovs_interfaceid=uuidutils.generate_uuid(),
+        details={network_model.VIF_DETAILS_PORT_FILTER: True},
+        network=network_model.Network(
+            id=uuidutils.generate_uuid(),
+            bridge='br-int',
+            label='private',
+            subnets=[network_model.Subnet(
+                cidr='10.0.0.0/16',
+                gateway=network_model.IP(address='10.0.0.1',
+                                         type='gateway'),
+                dns=[network_model.IP(address='8.8.8.8', type='dns')],
+                ips=[network_model.FixedIP(
+                    address='10.0.%d.%d' % (index >> 8 & 0xff,
+                                            index & 0xff))])]))])
+
+
+def _instances(ctxt, count):
+    flavor = objects.Flavor(
+        id=1, flavorid='1', name='m1.small', memory_mb=2048, vcpus=1,
+        root_gb=20, ephemeral_gb=0, swap=0, rxtx_factor=1.0,
+        vcpu_weight=0, disabled=False, is_public=True,
+        extra_specs={'hw:cpu_policy': 'shared'}, projects=[])
+    now = datetime.datetime(2019, 1, 1)
+    instances = []
+    for index in range(count):
+        uuid = uuidutils.generate_uuid()
+        instances.append(objects.Instance(
+            ctxt, id=index, uuid=uuid, user_id='fake-user',
+            project_id='fake-project', host='compute1', node='compute1',
+            hostname='server-%d' % index, display_name='server-%d' % index,
+            vm_state='active', power_state=1, task_state=None,
+            image_ref=uuidutils.generate_uuid(), launched_at=now,
+            created_at=now, updated_at=now, deleted=False, locked=False,
+            availability_zone='nova', memory_mb=flavor.memory_mb,
+            vcpus=flavor.vcpus, root_gb=flavor.root_gb,
+            ephemeral_gb=flavor.ephemeral_gb, instance_type_id=flavor.id,
+            flavor=flavor, old_flavor=None, new_flavor=None,
+            metadata={'role': 'web'},
+            system_metadata={'image_min_disk': '20',
+                             'image_disk_format': 'qcow2',
+                             'image_container_format': 'bare'},
+            info_cache=objects.InstanceInfoCache(
+                instance_uuid=uuid, network_info=_network_info(index)),
+            security_groups=objects.SecurityGroupList(objects=[
+                objects.SecurityGroup(name='default')])))
+    return objects.InstanceList(ctxt, objects=instances)
+
+
+def _time(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--instances', type=int, default=500,
+                        help='Number of instances in the list.')
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of times each step is timed.')
+    args = parser.parse_args()
+
+    objects.register_all()
+    ctxt = context.get_admin_context()
+    serializer = base.NovaObjectSerializer()
+    instances = _instances(ctxt, args.instances)
+
+    # Turning the objects into primitives and back is the same for both
+    # encodings, so it is timed separately.
+    primitive = serializer.serialize_entity(ctxt, instances)
+    print('Objects to primitives: %.1f ms' % _time(
+        lambda: serializer.serialize_entity(ctxt, instances), args.repeat))
+    print('Primitives to objects: %.1f ms' % _time(
+        lambda: serializer.deserialize_entity(ctxt, primitive), args.repeat))
+    print()
+
+    print('%-8s %12s %12s %12s' % ('Encoding', 'Bytes', 'Encode (ms)',
+                                   'Decode (ms)'))
+    encodings = (
+        ('json', jsonutils.dumps, jsonutils.loads),
+        ('compact',
+         lambda value: jsonutils.dumps(base.obj_primitive_to_compact(value)),
+         lambda message: base.obj_primitive_from_compact(
+             jsonutils.loads(message))))
+    for name, encode, decode in encodings:
+        message = encode(primitive)
+        assert decode(message) == jsonutils.loads(jsonutils.dumps(primitive))
+        print('%-8s %12d %12.1f %12.1f' % (
+            name, len(message),
+            _time(lambda: encode(primitive), args.repeat),
+            _time(lambda: decode(message), args.repeat)))
+
+
+if __name__ == '__main__':
+    main()